@@ -1,12 +1,14 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, make_response, render_template, request, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from utils.dashboard_api import init_dashboard_api
+from utils.metrics import init_metrics_endpoint
+from utils.static_assets import cacheable_page, init_static_assets
 
-class Base(DeclarativeBase):
-    pass
+# Shared with the bot, so its counter tables (utils.sql_models) are queryable here
+from utils.sql_models import Base
 
 
 db = SQLAlchemy(model_class=Base)
@@ -24,11 +26,22 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 # Initialize the database with our app
 db.init_app(app)
 
+# Hashed, precompressed assets under /assets (see utils/static_assets.py)
+init_static_assets(app)
+
+# Read-only JSON API over the snapshot the bot publishes (see utils/snapshot.py)
+init_dashboard_api(app)
+
+# This worker's metrics (API cache hit rates); the bot serves its own on a local port.
+# Answered for scrapers on this host only, or remote ones sending the METRICS_TOKEN bearer token
+init_metrics_endpoint(app)
+
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return cacheable_page(make_response(render_template('index.html')))
 
 
 if __name__ == '__main__':
+    # Development server; in production use: gunicorn -c gunicorn.conf.py app:app
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""Micro-benchmark for the EmbedCreator prototype layer
+
+Compares the prototype builders against the previous path, which
+built every embed from scratch and looked colors and emojis up in CONFIG on
+each call. Run from the multipurpos directory:
+
+    python benchmarks/embed_creator_bench.py [--number N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+
+from config import CONFIG
+from utils.embed_creator import EmbedCreator
+
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/avatars/1/abc.png"
+
+
+class FakeMember:
+    display_name = "Benchmark User"
+    mention = "<@930131254106550333>"
+    display_avatar = FakeAsset()
+
+
+# The builders as they were before the prototype layer, kept for comparison
+def legacy_error_embed(title, description):
+    return discord.Embed(
+        title=f"{CONFIG['emojis']['error']} {title}",
+        description=description,
+        color=CONFIG['colors']['error']
+    )
+
+
+def legacy_invite_stats_embed(member, stats):
+    embed = discord.Embed(
+        title=f"📨 Invite Statistics for {member.display_name}",
+        description=f"{member.mention} has invited **{stats.get('total', 0)}** members to this server.",
+        color=CONFIG['colors']['default']
+    )
+    embed.set_thumbnail(url=member.display_avatar.url)
+    embed.add_field(
+        name="Invite Breakdown",
+        value=f"✅ **{stats.get('regular', 0)}** Regular\n"
+              f"❌ **{stats.get('fake', 0)}** Fake\n"
+              f"🚶 **{stats.get('left', 0)}** Left",
+        inline=True
+    )
+    embed.add_field(
+        name="What counts as...",
+        value="**Regular**: Real users who stayed\n"
+              "**Fake**: New accounts or potential alts\n"
+              "**Left**: Users who have left the server",
+        inline=True
+    )
+    embed.set_footer(text="Invite someone new today!")
+    return embed
+
+
+def legacy_level_up_embed(user, level):
+    embed = discord.Embed(
+        title="⬆️ Level Up!",
+        description=f"**{user.mention}** Your Level Increased to **{level}**. Chat More!",
+        color=CONFIG['colors']['success']
+    )
+    embed.set_thumbnail(url=user.display_avatar.url)
+    return embed
+
+
+def legacy_leaderboard_embed(leaderboard_type, entries):
+    embed = discord.Embed(
+        title=f"{leaderboard_type} Leaderboard",
+        description="Top members in the server:",
+        color=CONFIG['colors']['default']
+    )
+    value = ""
+    for i, entry in enumerate(entries):
+        if i == 0:
+            medal = "🥇"
+        elif i == 1:
+            medal = "🥈"
+        elif i == 2:
+            medal = "🥉"
+        else:
+            medal = f"{i+1}."
+        value += f"{medal} <@{entry['user_id']}> - **{entry['count']}**\n"
+    embed.add_field(name="Rankings", value=value, inline=False)
+    return embed
+
+
+def build_cases():
+    """Return (name, legacy callable, current callable) triples"""
+    member = FakeMember()
+    stats = {'total': 12, 'regular': 10, 'fake': 1, 'left': 1}
+    entries = [{'user_id': 930131254106550333 + i, 'count': 1000 - i} for i in range(10)]
+
+    return [
+        (
+            "error (permission)",
+            lambda: legacy_error_embed("Missing Permissions", "You don't have permission to use this command."),
+            lambda: EmbedCreator.create_error_embed("Missing Permissions", "You don't have permission to use this command.")
+        ),
+        (
+            "invite_stats",
+            lambda: legacy_invite_stats_embed(member, stats),
+            lambda: EmbedCreator.create_invite_stats_embed(member, stats)
+        ),
+        (
+            "level_up",
+            lambda: legacy_level_up_embed(member, 7),
+            lambda: EmbedCreator.create_level_up_embed(member, 7)
+        ),
+        (
+            "leaderboard",
+            lambda: legacy_leaderboard_embed("Messages", entries),
+            lambda: EmbedCreator.create_leaderboard_embed("Messages", entries)
+        ),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'builder':<20} {'legacy us':>10} {'current us':>11} {'speedup':>8}")
+    for name, legacy, current in build_cases():
+        # Both paths must produce the same payload for the comparison to mean anything
+        assert legacy().to_dict() == current().to_dict(), name
+
+        legacy_best = min(timeit.repeat(legacy, number=args.number, repeat=args.repeat))
+        current_best = min(timeit.repeat(current, number=args.number, repeat=args.repeat))
+
+        legacy_us = legacy_best / args.number * 1e6
+        current_us = current_best / args.number * 1e6
+        print(f"{name:<20} {legacy_us:>10.2f} {current_us:>11.2f} {legacy_us / current_us:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""Synthetic data files at production scale
+
+Writes a data root the bot, benchmarks and migrations can run against
+(BOT_DATA_ROOT=DIR):
+
+- bot_database.json: levels, message counts with a daily bucket per active
+  day, invites, giveaways, tickets, autoroles and reaction roles
+- data/guild_<id>_levels.json: SimpleLevels' per-guild XP
+- data/moderation_settings.json: warnings
+- data/polls_data.json and data/role_menus.json
+
+Activity is Zipfian, like real servers: most members never post, and among
+those who do, the member at activity rank r posts in proportion to
+1 / r**zipf. Inviters, warnings and giveaway entries are skewed the same
+way. Files are streamed out in the exact layout the bot writes them
+(json.dump with indent=4), so a dataset never has to fit in memory and
+parse times match the real thing. Generation is deterministic per --seed.
+Run from the multipurpos directory:
+
+    python benchmarks/fixtures.py --output /tmp/fixtures                   # 10 guilds of 10k members, 1 year
+    python benchmarks/fixtures.py --output /tmp/big --guilds 20 --members 1000000 --years 3  # ~11 GB, ~20 minutes
+    BOT_DATA_ROOT=/tmp/big python run_bot.py                               # the bot on the generated data
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import random
+import sys
+import time
+from json.encoder import encode_basestring_ascii
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.fake_discord import make_snowflake
+
+INDENT = '    '
+EMOJIS = ('👍', '🎉', '🔥', '✅', '❤️', '⭐', '🎮', '🎵', '📢', '🧪')
+NUMBER_EMOJIS = ('1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣', '7️⃣', '8️⃣', '9️⃣', '🔟')
+REASONS = ('Spam', 'Rude behaviour', 'Off-topic', 'Advertising', 'Excessive caps', 'No reason provided')
+PRIZES = ('Nitro', 'Steam key', 'Custom role', 'Merch pack', 'Gift card')
+
+
+class Lazy:
+    """A JSON object whose members are produced while it is written
+
+    Args:
+        items (callable): Returns an iterator of (key, value) pairs; values may be Lazy too
+    """
+
+    def __init__(self, items):
+        self.items = items
+
+
+def write_json(f, value, level=0):
+    """Write a value exactly as json.dump(value, f, indent=4) would, expanding Lazy objects as it goes"""
+    pad = INDENT * (level + 1)
+    if type(value) is int:
+        f.write(str(value))  # Most values are counts; json.dumps would take ten times as long
+        return
+    if not isinstance(value, Lazy):
+        f.write(json.dumps(value, indent=4).replace('\n', '\n' + INDENT * level))
+        return
+    first = True
+    for key, item in value.items():
+        f.write(('{\n' if first else ',\n') + pad + encode_basestring_ascii(str(key)) + ': ')
+        first = False
+        write_json(f, item, level + 1)
+    f.write('{}' if first else '\n' + INDENT * level + '}')
+
+
+def zipf_counts(rng, n, mean, exponent, cap=None):
+    """Split n * mean between n members by Zipf's law, in random rank order
+
+    Args:
+        rng (random.Random): Randomness
+        n (int): Members
+        mean (float): Mean count per member before capping
+        exponent (float): Zipf exponent; 0 spreads evenly, higher concentrates on the top ranks
+        cap (int): Most any one member gets
+
+    Returns:
+        list: Integer counts, fractions rounded up or down at random so the total is right on average
+    """
+    if n <= 0:
+        return []
+    weights = [1 / rank ** exponent for rank in range(1, n + 1)]
+    scale = mean * n / math.fsum(weights)
+    counts = []
+    for weight in weights:
+        count = weight * scale
+        whole = int(count)
+        count = whole + (rng.random() < count - whole)
+        counts.append(count if cap is None else min(count, cap))
+    rng.shuffle(counts)
+    return counts
+
+
+def snowflakes(rng, count, start, end):
+    """Unique, ascending snowflakes for things created between two datetimes"""
+    start_ms, end_ms = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+    step = max((end_ms - start_ms) // max(count, 1), 1)
+    return [make_snowflake(start_ms + i * step + rng.randrange(step), i) for i in range(count)]
+
+
+class Guild:
+    """One synthetic guild: its members and who did what
+
+    Everything per member is held in flat lists, a few ints each, so a
+    guild of millions fits in memory; daily buckets and other bulky
+    detail are generated while the files are written.
+    """
+
+    def __init__(self, args, index, now):
+        self.rng = random.Random(f"{args.seed}:{index}")
+        rng = self.rng
+        self.args = args
+        self.now = now
+        created = now - datetime.timedelta(days=rng.uniform(365 * args.years, 365 * (args.years + 3)))
+        self.id = make_snowflake(int(created.timestamp() * 1000), index)
+        self.channels = snowflakes(rng, 12, created, created + datetime.timedelta(days=1))
+        self.roles = snowflakes(rng, 15, created, created + datetime.timedelta(days=1))
+        self.members = snowflakes(rng, args.members, created, now)
+        self.moderators = self.members[:max(len(self.members) // 500, 2)]
+
+        # Messages and XP of the active members, indexed like self.active
+        active = rng.sample(range(args.members), int(args.members * args.active_ratio))
+        self.active = [self.members[i] for i in active]
+        self.messages = zipf_counts(
+            rng, len(self.active), args.messages_per_year * args.years, args.zipf, args.max_daily * args.days
+        )
+        self.xp = [
+            int(messages * rng.uniform(0.5, 0.9) * 17.5) for messages in self.messages
+        ]  # 15-20 XP per message that isn't on the 60s cooldown
+
+    def stamp(self, days_ago_max):
+        """A naive ISO timestamp some time in the last days_ago_max days, like datetime.now().isoformat()"""
+        return (self.now - datetime.timedelta(seconds=self.rng.uniform(0, days_ago_max * 86400))).isoformat()
+
+    # bot_database.json
+
+    def levels(self):
+        for user_id, xp in zip(self.active, self.xp):
+            yield str(user_id), {'level': xp // 100, 'xp': xp}
+
+    def message_counts(self):
+        for user_id, messages in zip(self.active, self.messages):
+            yield str(user_id), Lazy(lambda messages=messages: self.user_messages(messages))
+
+    def user_messages(self, messages):
+        yield 'all_time', messages
+        yield 'daily', Lazy(lambda: self.daily_buckets(messages))
+
+    def daily_buckets(self, messages):
+        """Spread a member's messages over randomly chosen days, oldest first"""
+        rng = self.rng
+        if not messages:
+            return
+        days = min(self.args.days, messages, max(1, round(messages / rng.uniform(2, 20))))
+        cuts = [0] + sorted(rng.sample(range(1, messages), days - 1)) + [messages]
+        for i, days_ago in enumerate(sorted(rng.sample(range(self.args.days), days), reverse=True)):
+            yield self.args.day_names[days_ago], cuts[i + 1] - cuts[i]
+
+    def invites(self):
+        rng = self.rng
+        inviters = rng.sample(self.members, max(int(len(self.members) * self.args.inviter_ratio), 1))
+        invited = zipf_counts(rng, len(inviters), self.args.invitees, self.args.zipf)
+        pool = rng.sample(self.members, len(self.members))
+        taken = 0
+        for inviter_id, count in zip(inviters, invited):
+            invitees = []
+            stats = {'joins': 0, 'left': 0, 'fake': 0, 'rejoins': 0}
+            for user_id in pool[taken:taken + count]:
+                is_fake = rng.random() < 0.05
+                is_rejoin = rng.random() < 0.03
+                invitees.append({
+                    'user_id': str(user_id),
+                    'joined_at': self.stamp(self.args.days),
+                    'is_fake': is_fake,
+                    'is_rejoin': is_rejoin
+                })
+                stats['joins'] += 1
+                stats['fake'] += is_fake
+                stats['rejoins'] += is_rejoin
+                stats['left'] += rng.random() < 0.15
+            taken += count
+            if invitees:
+                yield str(inviter_id), {**stats, 'invitees': invitees}
+
+    def giveaways(self):
+        rng = self.rng
+        message_ids = snowflakes(rng, self.args.giveaways, self.now - datetime.timedelta(days=self.args.days), self.now)
+        entrants = zipf_counts(rng, len(message_ids), self.args.entrants, self.args.zipf / 2, len(self.members))
+        for i, (message_id, count) in enumerate(zip(message_ids, entrants)):
+            active = i == len(message_ids) - 1
+            giveaway = {
+                'channel_id': str(rng.choice(self.channels)),
+                'prize': rng.choice(PRIZES),
+                'host_id': str(rng.choice(self.moderators)),
+                'end_time': (self.now + datetime.timedelta(days=3)).isoformat() if active else self.stamp(self.args.days),
+                'winners': rng.randint(1, 3),
+                'participants': [str(user_id) for user_id in rng.sample(self.members, count)]
+            }
+            if not active:
+                giveaway['ended'] = True
+            yield str(message_id), giveaway
+
+    def tickets(self):
+        rng = self.rng
+        count = max(len(self.members) // 1000, 1)
+        channel_ids = snowflakes(rng, count, self.now - datetime.timedelta(days=self.args.days), self.now)
+        for channel_id in channel_ids:
+            created_at = self.stamp(self.args.days)
+            ticket = {'user_id': str(rng.choice(self.members)), 'created_at': created_at, 'status': 'open'}
+            if rng.random() < 0.9:
+                ticket['status'] = 'closed'
+                ticket['closed_at'] = (datetime.datetime.fromisoformat(created_at)
+                                       + datetime.timedelta(hours=rng.uniform(0.1, 48))).isoformat()
+            yield str(channel_id), ticket
+
+    def reaction_roles(self):
+        rng = self.rng
+        for message_id in snowflakes(rng, 2, self.now - datetime.timedelta(days=self.args.days), self.now):
+            yield str(message_id), [
+                {'role_id': role_id, 'emoji': emoji}
+                for role_id, emoji in zip(rng.sample(self.roles, 4), rng.sample(EMOJIS, 4))
+            ]
+
+    # data/*.json
+
+    def simple_levels(self):
+        for user_id, messages, xp in zip(self.active, self.messages, self.xp):
+            yield str(user_id), {'user_id': user_id, 'xp': xp, 'level': int(math.sqrt(xp / 100)), 'messages': messages}
+
+    def warnings(self):
+        rng = self.rng
+        warned = rng.sample(self.members, int(len(self.members) * self.args.warned_ratio))
+        for user_id, count in zip(warned, zipf_counts(rng, len(warned), self.args.warnings, self.args.zipf)):
+            if not count:
+                continue
+            moderators = [rng.choice(self.moderators) for _ in range(count)]
+            yield str(user_id), [
+                {
+                    'reason': rng.choice(REASONS),
+                    'timestamp': self.stamp(self.args.days),
+                    'moderator_id': str(moderator_id),
+                    'moderator_name': f"mod{moderator_id % 10000}"
+                }
+                for moderator_id in moderators
+            ]
+
+    def polls(self):
+        rng = self.rng
+        for message_id in snowflakes(rng, self.args.polls, self.now - datetime.timedelta(days=30), self.now):
+            options = [f"Option {i + 1}" for i in range(rng.randint(2, 10))]
+            timed = rng.random() < 0.5
+            yield str(message_id), {
+                'question': f"Poll {message_id % 10000}?",
+                'options': options,
+                'emojis': list(NUMBER_EMOJIS[:len(options)]),
+                'channel_id': str(rng.choice(self.channels)),
+                'author_id': str(rng.choice(self.moderators)),
+                'created_at': self.stamp(30),
+                'timed': timed,
+                'end_time': (self.now + datetime.timedelta(hours=rng.uniform(1, 72))).isoformat() if timed else None
+            }
+
+    def role_menus(self):
+        rng = self.rng
+        for message_id in snowflakes(rng, self.args.role_menus, self.now - datetime.timedelta(days=self.args.days), self.now):
+            roles = rng.sample(self.roles, rng.randint(2, 10))
+            yield str(message_id), {
+                'title': 'Pick your roles',
+                'description': 'Select roles from the menu below',
+                'roles': {
+                    str(role_id): {'name': f"role{role_id % 1000}", 'description': '', 'emoji': rng.choice(EMOJIS)}
+                    for role_id in roles
+                },
+                'channel_id': str(rng.choice(self.channels)),
+                'author_id': str(rng.choice(self.moderators))
+            }
+
+
+def per_guild(guilds, method):
+    """A Lazy object keyed by guild ID, each guild's value produced by one of its generator methods"""
+    return Lazy(lambda: ((guild.id, Lazy(getattr(guild, method))) for guild in guilds))
+
+
+def write_file(root, path, value):
+    """Write one data file and report its size"""
+    started = time.perf_counter()
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path) or '.', exist_ok=True)
+    with open(full_path, 'w') as f:
+        write_json(f, value)
+        size = f.tell()
+    print(f"  {path:<44} {size / 1048576:>12,.1f} MiB  {time.perf_counter() - started:>8.1f}s", flush=True)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic data files at production scale")
+    parser.add_argument("--output", required=True, help="data root to write; point BOT_DATA_ROOT at it")
+    parser.add_argument("--force", action="store_true", help="write into a directory that isn't empty")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=10000, help="members per guild")
+    parser.add_argument("--years", type=float, default=1.0, help="history, in years of daily message buckets")
+    parser.add_argument("--active-ratio", type=float, default=0.3, help="share of members who have posted")
+    parser.add_argument("--messages-per-year", type=float, default=150, help="mean messages per active member per year")
+    parser.add_argument("--max-daily", type=int, default=500, help="messages per day the most active member can average")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Zipf exponent of activity, invites and warnings")
+    parser.add_argument("--inviter-ratio", type=float, default=0.05, help="share of members who invited someone")
+    parser.add_argument("--invitees", type=float, default=5, help="mean invitees per inviter")
+    parser.add_argument("--warned-ratio", type=float, default=0.02, help="share of members with warnings")
+    parser.add_argument("--warnings", type=float, default=2, help="mean warnings per warned member")
+    parser.add_argument("--giveaways", type=int, default=5, help="giveaways per guild")
+    parser.add_argument("--entrants", type=float, default=200, help="mean entrants per giveaway")
+    parser.add_argument("--polls", type=int, default=3, help="polls per guild")
+    parser.add_argument("--role-menus", type=int, default=2, help="role menus per guild")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.output) and os.listdir(args.output) and not args.force:
+        parser.error(f"{args.output} is not empty; pass --force to overwrite its data files")
+
+    now = datetime.datetime.now().replace(microsecond=0)
+    args.days = max(int(365 * args.years), 1)
+    args.day_names = [(now - datetime.timedelta(days=days_ago)).strftime("%Y-%m-%d") for days_ago in range(args.days)]
+
+    started = time.perf_counter()
+    print(f"Generating {args.guilds} guild(s) of {args.members:,} members, {args.days} days of history, seed {args.seed}")
+    guilds = [Guild(args, index, now) for index in range(args.guilds)]
+    print(f"  {'members and activity':<44} {'':>16}  {time.perf_counter() - started:>8.1f}s", flush=True)
+
+    total = write_file(args.output, 'bot_database.json', Lazy(lambda: iter([
+        ('autoroles', {str(guild.id): guild.roles[0] for guild in guilds}),
+        ('levels', per_guild(guilds, 'levels')),
+        ('tickets', per_guild(guilds, 'tickets')),
+        ('invites', per_guild(guilds, 'invites')),
+        ('message_counts', per_guild(guilds, 'message_counts')),
+        ('reaction_roles', per_guild(guilds, 'reaction_roles')),
+        ('giveaways', per_guild(guilds, 'giveaways')),
+    ])))
+    for guild in guilds:
+        total += write_file(args.output, f'data/guild_{guild.id}_levels.json', Lazy(guild.simple_levels))
+    total += write_file(args.output, 'data/moderation_settings.json', Lazy(
+        lambda: ((guild.id, Lazy(lambda guild=guild: iter([('warnings', Lazy(guild.warnings))]))) for guild in guilds)
+    ))
+    total += write_file(args.output, 'data/polls_data.json', per_guild(guilds, 'polls'))
+    total += write_file(args.output, 'data/role_menus.json', per_guild(guilds, 'role_menus'))
+
+    print(f"\n{total / 1048576:,.1f} MiB written to {args.output} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
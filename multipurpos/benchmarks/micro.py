@@ -0,0 +1,474 @@
+"""Micro-benchmarks for the storage layer and hot helpers
+
+Times JsonDatabase writes and leaderboards on databases of 1k to 1M users,
+loading such a database from its JSON and from its binary snapshot,
+DataManager set/get with concurrent callers, SimpleLevels' per-guild file
+reads and writes, Helpers.get_level_from_xp and the EmbedCreator builders.
+Cases take a pytest-benchmark style `benchmark` argument (call it with the
+function to time), so they read like, and port directly to, pytest-benchmark
+tests. Run from the multipurpos directory:
+
+    python benchmarks/micro.py                              # 1k and 100k users
+    python benchmarks/micro.py --sizes 1000,100000,1000000  # the full run (~1.5 GB of RAM, several minutes)
+    python benchmarks/micro.py -k leaderboard               # only matching cases
+    python benchmarks/micro.py --output main.json           # save results to compare against
+    python benchmarks/micro.py --compare main.json --threshold 10
+
+With --compare it exits non-zero when a case got slower than the baseline
+by more than the threshold percentage. Everything runs against a temporary
+data directory.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before the bot's modules are imported: utils.database opens its global database on import
+from utils.storage import DATA_ROOT_ENV
+
+DATA_ROOT = tempfile.mkdtemp(prefix='bot-bench-')
+os.environ[DATA_ROOT_ENV] = DATA_ROOT
+os.makedirs(os.path.join(DATA_ROOT, 'data'))
+
+from cogs.simple_levels import SimpleLevel, SimpleLevels
+from embed_creator_bench import build_cases as build_embed_cases
+from utils.data_manager import DataManager
+from utils.database import JsonDatabase
+from utils.embed_creator import EmbedCreator
+from utils.helpers import Helpers
+from utils.store_snapshot import load_json_store, write_store_snapshot
+
+GUILD = '100'
+DEFAULT_SIZES = (1000, 100000)
+COMPARE_STATS = ('min', 'median', 'mean')
+
+
+class Benchmark:
+    """Times one case, the way pytest-benchmark's `benchmark` fixture does
+
+    Each round runs the function enough times to take at least
+    min_round_time, and rounds repeat until min_time has passed (at least
+    min_rounds, at most max_time).
+    """
+
+    def __init__(self, min_rounds=3, min_time=0.5, max_time=5.0, min_round_time=0.01):
+        self.min_rounds = min_rounds
+        self.min_time = min_time
+        self.max_time = max_time
+        self.min_round_time = min_round_time
+        self.times = []  # Seconds per call, one entry per round
+        self.iterations = 0
+        self.extra_info = {}
+
+    def __call__(self, func, *args, **kwargs):
+        """Time func(*args, **kwargs) and return its result"""
+        def run(iterations):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = func(*args, **kwargs)
+            return time.perf_counter() - start, result
+
+        # Calibrate; a single call that already takes a round's time counts as the first round
+        iterations = 1
+        elapsed, result = run(iterations)
+        if elapsed >= self.min_round_time:
+            self.times.append(elapsed)
+        while elapsed < self.min_round_time:
+            iterations = max(iterations * 2, math.ceil(iterations * self.min_round_time / max(elapsed, 1e-9)))
+            elapsed, result = run(iterations)
+        self.iterations = iterations
+
+        started = time.perf_counter() - sum(self.times)
+        while True:
+            elapsed, result = run(iterations)
+            self.times.append(elapsed / iterations)
+            spent = time.perf_counter() - started
+            if len(self.times) >= self.min_rounds and (spent >= self.min_time or spent + elapsed > self.max_time):
+                return result
+
+    def pedantic(self, func, setup=None, rounds=1, iterations=1):
+        """Time exactly rounds x iterations calls, running setup before each round
+
+        Args:
+            func: The function to time
+            setup: Called untimed before each round; may return (args, kwargs) for func
+            rounds (int): Rounds to time
+            iterations (int): Calls per round
+
+        Returns:
+            Whatever func last returned
+        """
+        self.iterations = iterations
+        result = None
+        for _ in range(rounds):
+            args, kwargs = (setup() if setup else None) or ((), {})
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = func(*args, **kwargs)
+            self.times.append((time.perf_counter() - start) / iterations)
+        return result
+
+    def stats(self):
+        times = self.times
+        return {
+            'min': min(times),
+            'max': max(times),
+            'mean': statistics.fmean(times),
+            'median': statistics.median(times),
+            'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'rounds': len(times),
+            'iterations': self.iterations,
+            'ops': 1 / statistics.fmean(times),
+        }
+
+
+# Cases: (name, function, parameter name, parameter values or None for the --sizes user counts)
+CASES = []
+
+
+def case(name, param=None, values=None):
+    """Register a benchmark case
+
+    Args:
+        name (str): Case name, e.g. 'JsonDatabase.add_user_xp'
+        param (str): Parameter passed to the case by name ('users' takes --sizes)
+        values (tuple): Parameter values, if param isn't 'users'
+    """
+    def register(func):
+        CASES.append((name, func, param, values))
+        return func
+    return register
+
+
+# Fixtures, cached per size since the large ones take a while to build
+_fixtures = {}
+
+
+def fixture(kind, size, build):
+    key = (kind, size)
+    if key not in _fixtures:
+        for stale in [stale for stale in _fixtures if stale[0] == kind]:
+            del _fixtures[stale]  # Free the previous size first; 1M users take a lot of memory
+        _fixtures[key] = build(size)
+    return _fixtures[key]
+
+
+def sample_ids(users, count=1000):
+    """Cycle through user ids spread over the whole database"""
+    return itertools.cycle([str(user_id) for user_id in range(0, users, max(users // count, 1))])
+
+
+def build_database(users):
+    """A JsonDatabase with one guild of `users` members, each with XP, messages and an inviter"""
+    db = JsonDatabase()
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    joined_at = datetime.datetime.now().isoformat()
+
+    db.data['levels'][GUILD] = {
+        str(user_id): {'level': xp // 100, 'xp': xp}
+        for user_id, xp in ((user_id, user_id * 7919 % 50000) for user_id in range(users))
+    }
+    db.data['message_counts'][GUILD] = {
+        str(user_id): {'all_time': user_id * 31 % 5000, 'daily': {today: user_id % 40}}
+        for user_id in range(users)
+    }
+    # Every tenth member invited the nine after them
+    db.data['invites'][GUILD] = {
+        str(inviter_id): {
+            'joins': 9,
+            'left': inviter_id % 3,
+            'fake': inviter_id % 2,
+            'rejoins': 0,
+            'invitees': [
+                {'user_id': str(user_id), 'joined_at': joined_at, 'is_fake': False, 'is_rejoin': False}
+                for user_id in range(inviter_id + 1, min(inviter_id + 10, users))
+            ]
+        }
+        for inviter_id in range(0, users, 10)
+    }
+    return db
+
+
+def build_levels_cog(users):
+    """A SimpleLevels cog whose guild file holds `users` members"""
+    all_data = {
+        str(user_id): SimpleLevel(user_id, xp=user_id * 7919 % 50000, level=user_id % 22, messages=user_id % 900).to_dict()
+        for user_id in range(users)
+    }
+    with open(os.path.join(DATA_ROOT, 'data', f'guild_{GUILD}_levels.json'), 'w') as f:
+        json.dump(all_data, f, indent=4)
+    return SimpleLevels(bot=None)
+
+
+def build_data_manager(keys):
+    """A DataManager holding `keys` small records, plus a loop to drive it"""
+    manager = DataManager(os.path.join(DATA_ROOT, 'data', 'bench_store.json'))
+    manager.data = {str(key): {'count': key, 'enabled': True} for key in range(keys)}
+    return manager, asyncio.new_event_loop()
+
+
+# JsonDatabase
+
+@case('JsonDatabase.add_user_xp', 'users')
+def bench_add_user_xp(benchmark, users):
+    db = fixture('database', users, build_database)
+    ids = sample_ids(users)
+    benchmark(lambda: db.add_user_xp(GUILD, next(ids), 15))
+
+
+@case('JsonDatabase.increment_message_count', 'users')
+def bench_increment_message_count(benchmark, users):
+    db = fixture('database', users, build_database)
+    ids = sample_ids(users)
+    benchmark(lambda: db.increment_message_count(GUILD, next(ids)))
+
+
+@case('JsonDatabase.track_invite', 'users')
+def bench_track_invite(benchmark, users):
+    db = fixture('database', users, build_database)
+    inviters = itertools.cycle([str(inviter_id) for inviter_id in range(0, users, max(users // 100, 10))])
+    invitees = itertools.count(users)
+    benchmark(lambda: db.track_invite(GUILD, next(inviters), str(next(invitees))))
+
+
+@case('JsonDatabase.get_level_leaderboard', 'users')
+def bench_level_leaderboard(benchmark, users):
+    db = fixture('database', users, build_database)
+    benchmark(db.get_level_leaderboard, GUILD)
+
+
+@case('JsonDatabase.get_message_leaderboard', 'users')
+def bench_message_leaderboard(benchmark, users):
+    db = fixture('database', users, build_database)
+    benchmark(db.get_message_leaderboard, GUILD)
+
+
+@case('JsonDatabase.get_message_leaderboard_today', 'users')
+def bench_message_leaderboard_today(benchmark, users):
+    db = fixture('database', users, build_database)
+    benchmark(db.get_message_leaderboard, GUILD, period='today')
+
+
+@case('JsonDatabase.get_invite_leaderboard', 'users')
+def bench_invite_leaderboard(benchmark, users):
+    db = fixture('database', users, build_database)
+    benchmark(db.get_invite_leaderboard, GUILD)
+
+
+# Cold start: a database store read from its JSON, and from its snapshot
+
+def build_store_files(users):
+    """The same database as a JSON store, and as a JSON store with a snapshot"""
+    data = fixture('database', users, build_database).data
+    paths = {}
+    for name in ('json', 'snapshot'):
+        paths[name] = os.path.join(DATA_ROOT, 'data', f'store_{name}.json')
+        with open(paths[name], 'w') as f:
+            json.dump(data, f, indent=4)
+    write_store_snapshot(paths['snapshot'], data)
+    return paths
+
+
+@case('load_json_store.json', 'users')
+def bench_load_store_json(benchmark, users):
+    paths = fixture('store_files', users, build_store_files)
+    benchmark(load_json_store, paths['json'])
+
+
+@case('load_json_store.snapshot', 'users')
+def bench_load_store_snapshot(benchmark, users):
+    paths = fixture('store_files', users, build_store_files)
+    benchmark(load_json_store, paths['snapshot'])
+
+
+# DataManager, with `concurrency` callers awaiting at once
+
+@case('DataManager.set', 'concurrency', (1, 16, 128))
+def bench_data_manager_set(benchmark, concurrency):
+    manager, loop = fixture('data_manager', 1000, build_data_manager)
+    keys = itertools.cycle([str(key) for key in range(1000)])
+
+    async def burst():
+        await asyncio.gather(*(manager.set(next(keys), {'count': 1, 'enabled': False}) for _ in range(concurrency)))
+
+    benchmark(lambda: loop.run_until_complete(burst()))
+
+
+@case('DataManager.get', 'concurrency', (1, 16, 128))
+def bench_data_manager_get(benchmark, concurrency):
+    manager, loop = fixture('data_manager', 1000, build_data_manager)
+    keys = itertools.cycle([str(key) for key in range(1000)])
+
+    async def burst():
+        await asyncio.gather(*(manager.get(next(keys)) for _ in range(concurrency)))
+
+    benchmark(lambda: loop.run_until_complete(burst()))
+
+
+# SimpleLevels
+
+@case('SimpleLevels.get_user_data', 'users')
+def bench_levels_get(benchmark, users):
+    cog = fixture('levels_cog', users, build_levels_cog)
+    ids = sample_ids(users)
+    benchmark(lambda: cog.get_user_data(GUILD, next(ids)))
+
+
+@case('SimpleLevels.save_user_data', 'users')
+def bench_levels_save(benchmark, users):
+    cog = fixture('levels_cog', users, build_levels_cog)
+    ids = sample_ids(users)
+    benchmark(lambda: cog.save_user_data(GUILD, SimpleLevel(int(next(ids)), xp=1234, level=3, messages=50)))
+
+
+# Helpers and EmbedCreator
+
+@case('Helpers.get_level_from_xp')
+def bench_get_level_from_xp(benchmark):
+    benchmark(Helpers.get_level_from_xp, 123456)
+
+
+def _register_embed_case(label, build):
+    @case(f'EmbedCreator.{label}')
+    def bench_embed(benchmark):
+        benchmark(build)
+
+
+for _label, _legacy, _build in build_embed_cases():
+    _register_embed_case(_label.split()[0], _build)
+_register_embed_case('success', lambda: EmbedCreator.create_success_embed("Saved", "Your settings were saved."))
+
+
+def expand_cases(sizes, keyword=None):
+    """List (full name, function, params) for every case and parameter value"""
+    expanded = []
+    for name, func, param, values in CASES:
+        if param is None:
+            grid = [({}, name)]
+        else:
+            grid = [({param: value}, f"{name}[{param}={value}]") for value in (sizes if param == 'users' else values)]
+        for params, full_name in grid:
+            if keyword is None or keyword in full_name:
+                expanded.append((full_name, func, params))
+    return expanded
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'id': git('rev-parse', 'HEAD'), 'branch': git('rev-parse', '--abbrev-ref', 'HEAD'), 'dirty': bool(git('status', '--porcelain'))}
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def compare(baseline, results, stat, threshold):
+    """Print each case's change against the baseline and list the regressions
+
+    Args:
+        baseline (dict): Results loaded from a previous --output
+        results (dict): This run's results
+        stat (str): One of COMPARE_STATS
+        threshold (float): Percent slowdown that counts as a regression
+
+    Returns:
+        list: Names of the cases that regressed
+    """
+    before = {entry['name']: entry['stats'] for entry in baseline['benchmarks']}
+    regressions = []
+    commit = baseline.get('commit_info', {})
+    print(f"\nCompared with {commit.get('branch')}@{(commit.get('id') or '?')[:10]} by {stat}, threshold {threshold:g}%:")
+    for entry in results['benchmarks']:
+        old = before.get(entry['name'])
+        if old is None:
+            print(f"  {'new':>8}  {entry['name']}")
+            continue
+        change = (entry['stats'][stat] / old[stat] - 1) * 100
+        regressed = change > threshold
+        if regressed:
+            regressions.append(entry['name'])
+        print(f"  {change:>+7.1f}%  {entry['name']}  {format_seconds(old[stat])} -> {format_seconds(entry['stats'][stat])}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the storage layer and hot helpers")
+    parser.add_argument("--sizes", default=','.join(map(str, DEFAULT_SIZES)), help="users per database, comma separated")
+    parser.add_argument("-k", dest="keyword", help="only cases whose name contains this")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--min-rounds", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend per case at least")
+    parser.add_argument("--max-time", type=float, default=5.0, help="seconds to spend per case at most, past min-rounds")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--compare-stat", choices=COMPARE_STATS, default='min')
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that fails --compare")
+    args = parser.parse_args()
+
+    cases = expand_cases([int(size) for size in args.sizes.split(',')], args.keyword)
+    if args.list:
+        print('\n'.join(name for name, _, _ in cases))
+        return 0
+
+    results = {
+        'machine_info': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'commit_info': git_info(),
+        'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'benchmarks': [],
+    }
+
+    print(f"{'case':<60} {'min':>10} {'median':>10} {'stddev':>10} {'rounds':>7} {'ops/s':>12}")
+    try:
+        for name, func, params in cases:
+            benchmark = Benchmark(args.min_rounds, args.min_time, args.max_time)
+            func(benchmark, **params)
+            stats = benchmark.stats()
+            results['benchmarks'].append({'name': name, 'params': params, 'extra_info': benchmark.extra_info, 'stats': stats})
+            print(f"{name:<60} {format_seconds(stats['min']):>10} {format_seconds(stats['median']):>10} "
+                  f"{format_seconds(stats['stddev']):>10} {stats['rounds']:>7} {stats['ops']:>12,.1f}", flush=True)
+    finally:
+        _fixtures.clear()
+        shutil.rmtree(DATA_ROOT, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.compare_stat, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:g}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
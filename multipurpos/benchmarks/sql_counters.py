@@ -0,0 +1,178 @@
+"""Consistency check and timings for the batched SQL counter writer
+
+Fills RedisDatabase (on an in-process fake server) with counters as if
+the bot had run before the mirror was turned on, seeds the mirror from it,
+then drives a random mix of XP, message, invite, leave and reset updates
+through SqlMirroredDatabase, closes the writer, then reads the tables back with a plain synchronous
+engine, the way the dashboard does, and checks every row against the
+primary database. Finally it times batched flushes against one upsert per
+update. Run from the multipurpos directory:
+
+    python benchmarks/sql_counters.py [--events N] [--url DATABASE_URL]
+
+Without --url it uses a temporary SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+
+from utils.fake_redis import FakeRedisServer
+from utils.redis_client import RedisClient
+from utils.redis_database import RedisDatabase
+from utils.sql_models import InviteStat, LevelStat, MessageStat
+from utils.sql_store import CounterWriter, SqlMirroredDatabase, create_sql_engine
+
+GUILDS = ['100', '200', '300']
+USERS = [str(user_id) for user_id in range(1, 41)]
+
+
+async def drive(db, events, seed):
+    """Apply random counter updates, yielding to the flush loop now and then"""
+    rng = random.Random(seed)
+    joined = []
+    for index in range(events):
+        guild_id, user_id = rng.choice(GUILDS), rng.choice(USERS)
+        roll = rng.random()
+        if roll < 0.45:
+            db.increment_message_count(guild_id, user_id)
+        elif roll < 0.85:
+            db.add_user_xp(guild_id, user_id, rng.randint(5, 40))
+        elif roll < 0.93:
+            invitee_id = f"9{index}"
+            db.track_invite(guild_id, user_id, invitee_id, is_fake=rng.random() < 0.2, is_rejoin=rng.random() < 0.1)
+            joined.append((guild_id, invitee_id))
+        elif roll < 0.98 and joined:
+            db.track_leave(*joined.pop(rng.randrange(len(joined))))
+        else:
+            db.reset_message_stats(guild_id, user_id)
+
+        if index % 50 == 0:
+            await asyncio.sleep(0)
+
+
+def check(db, url):
+    """Compare the SQL tables with the primary database
+
+    Returns:
+        list: Descriptions of mismatched rows
+    """
+    engine = create_engine(url)
+    today = datetime.now().strftime("%Y-%m-%d")
+    with engine.connect() as conn:
+        levels = {(row.guild_id, row.user_id): (row.xp, row.level) for row in conn.execute(select(LevelStat))}
+        messages = {(row.guild_id, row.user_id, row.day): row.count for row in conn.execute(select(MessageStat))}
+        invites = {
+            (row.guild_id, row.inviter_id): {'joins': row.joins, 'left': row.left, 'fake': row.fake, 'rejoins': row.rejoins}
+            for row in conn.execute(select(InviteStat))
+        }
+    engine.dispose()
+
+    mismatches = []
+    for guild_id in GUILDS:
+        for user_id in USERS:
+            expected = db.get_user_level(guild_id, user_id)
+            if expected['xp'] and levels.get((guild_id, user_id)) != (expected['xp'], expected['level']):
+                mismatches.append(f"level {guild_id}/{user_id}: {levels.get((guild_id, user_id))} != {expected}")
+
+            expected = db.get_message_stats(guild_id, user_id)
+            actual = {
+                'all_time': messages.get((guild_id, user_id, ''), 0),
+                'today': messages.get((guild_id, user_id, today), 0)
+            }
+            if actual != expected:
+                mismatches.append(f"messages {guild_id}/{user_id}: {actual} != {expected}")
+
+            expected = db.get_invite_stats(guild_id, user_id)
+            actual = invites.get((guild_id, user_id), {'joins': 0, 'left': 0, 'fake': 0, 'rejoins': 0})
+            if actual != {name: expected[name] for name in actual}:
+                mismatches.append(f"invites {guild_id}/{user_id}: {actual} != {expected}")
+    return mismatches
+
+
+async def time_flushes(url, updates):
+    """Time message count updates flushed in batches and one upsert at a time
+
+    Returns:
+        tuple: (batched seconds, one-at-a-time seconds)
+    """
+    writer = CounterWriter(create_sql_engine(url), flush_interval=3600)
+    await writer.start()
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    start = time.perf_counter()
+    for index in range(updates):
+        writer.set_messages('bench', str(index % 500), today, index, index)
+        if writer.pending >= writer.max_batch:
+            await writer.flush()
+    await writer.flush()
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for index in range(updates):
+        writer.set_messages('bench', str(index % 500), today, index, index)
+        await writer.flush()
+    single = time.perf_counter() - start
+
+    await writer.close()
+    return batched, single
+
+
+async def run(args, url):
+    server = FakeRedisServer()
+    client = RedisClient.from_url(server.start())
+
+    # Counters from before the mirror was turned on
+    primary = RedisDatabase(client, prefix='sqlcheck:')
+    await drive(primary, args.events, args.seed + 1)
+
+    writer = CounterWriter(create_sql_engine(url), flush_interval=0.05, max_batch=200)
+    db = SqlMirroredDatabase(primary, writer)
+    await writer.start()
+    seeded = sum(db.seed(guild_id) for guild_id in GUILDS)
+    await drive(db, args.events, args.seed)
+    await writer.close()
+
+    stats = writer.stats()
+    print(f"{seeded:,} seeded rows + {args.events:,} updates -> {stats['rows_written']:,} rows in {stats['flushes']} flushes "
+          f"({stats['failures']} failed)")
+
+    mismatches = check(db, url)
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    print(f"Consistency: {len(mismatches)} mismatched rows")
+
+    client.close()
+    server.stop()
+
+    batched, single = await time_flushes(url, args.updates)
+    print(f"{args.updates:,} message updates: batched {batched * 1000:.0f}ms ({args.updates / batched:,.0f}/s), "
+          f"one upsert each {single * 1000:.0f}ms ({args.updates / single:,.0f}/s)")
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the SQL counter writer against the primary database")
+    parser.add_argument("--events", type=int, default=3000, help="random updates in the consistency check")
+    parser.add_argument("--updates", type=int, default=2000, help="message updates in the timed comparison")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="database URL (defaults to a temporary SQLite file)")
+    args = parser.parse_args()
+
+    if args.url:
+        return asyncio.run(run(args, args.url))
+
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(run(args, f"sqlite:///{os.path.join(directory, 'counters.db')}"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
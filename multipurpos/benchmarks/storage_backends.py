@@ -0,0 +1,191 @@
+"""Parity check and timings for the JSON and Redis storage backends
+
+Runs the same sequence of database calls against JsonDatabase (in a
+temporary data directory) and RedisDatabase (on an in-process fake Redis
+server), checks every result matches, then times a write-heavy workload on
+each. Run from the multipurpos directory:
+
+    python benchmarks/storage_backends.py [--users N] [--redis-url URL]
+
+Pass --redis-url to check against a real server instead of the fake one.
+"""
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_manager import DataManager
+from utils.database import JsonDatabase
+from utils.fake_redis import FakeRedisServer
+from utils.redis_client import RedisClient
+from utils.redis_database import RedisDatabase, RedisDataManager
+from utils.storage import DATA_ROOT_ENV
+
+GUILD = '100'
+
+
+def _leaderboard_entries(entries, key):
+    """Leaderboard entries as a set, ignoring order between tied scores and zero rows"""
+    return {tuple(sorted(entry.items())) for entry in entries if entry[key]}
+
+
+class RecordedResults(list):
+    """Results copied when recorded, since JsonDatabase returns its live dicts and lists"""
+
+    def append(self, value):
+        super().append(copy.deepcopy(value))
+
+
+def run_sequence(db):
+    """Exercise every database method and collect the results"""
+    end_time = datetime.now() + timedelta(hours=1)
+    results = RecordedResults()
+
+    results.append(db.set_autorole(GUILD, 555))
+    results.append(db.get_autorole(GUILD))
+    results.append(db.remove_autorole(GUILD))
+    results.append(db.get_autorole(GUILD))
+
+    leveled_up = [db.add_user_xp(GUILD, user_id, 40) for user_id in ('1', '2', '1', '3', '1')]
+    results.append(leveled_up)
+    results.append(db.get_user_level(GUILD, '1'))
+    results.append(db.get_user_level(GUILD, 'missing'))
+    results.append({(user_id, data['xp']) for user_id, data in db.get_level_leaderboard(GUILD, 3)})
+
+    results.append(db.create_ticket(GUILD, '900', '1'))
+    results.append(db.get_ticket(GUILD, '900')['status'])
+    results.append(db.close_ticket(GUILD, '900'))
+    results.append(db.get_ticket(GUILD, '900')['status'])
+    results.append(sorted(db.get_guild_tickets(GUILD)))
+    results.append(db.close_ticket(GUILD, 'missing'))
+
+    db.track_invite(GUILD, '1', '10')
+    db.track_invite(GUILD, '1', '11', is_fake=True)
+    db.track_invite(GUILD, '2', '12', is_rejoin=True)
+    results.append(db.track_leave(GUILD, '10'))
+    results.append(db.track_leave(GUILD, 'missing'))
+    results.append(db.has_invitee(GUILD, '12'))
+    results.append(db.has_invitee(GUILD, 'missing'))
+    results.append(db.get_inviter(GUILD, '12'))
+    results.append(db.get_inviter(GUILD, 'missing'))
+    results.append(db.get_invite_stats(GUILD, '1'))
+    results.append(db.get_invite_stats(GUILD, '2'))
+    results.append(_leaderboard_entries(db.get_invite_leaderboard(GUILD), 'total'))
+
+    for user_id in ('1', '1', '2', '3', '1', '2'):
+        db.increment_message_count(GUILD, user_id)
+    results.append(db.get_message_stats(GUILD, '1'))
+    results.append(_leaderboard_entries(db.get_message_leaderboard(GUILD), 'count'))
+    results.append(_leaderboard_entries(db.get_message_leaderboard(GUILD, period='today'), 'count'))
+    results.append(db.reset_message_stats(GUILD, '3'))
+    results.append(db.reset_message_stats(GUILD, 'missing'))
+    results.append(db.get_message_stats(GUILD, '3'))
+
+    db.set_reaction_role(GUILD, '700', 1, '👍')
+    db.set_reaction_role(GUILD, '700', 2, '👎')
+    db.set_reaction_role(GUILD, '700', 3, '👍')
+    results.append(db.get_reaction_roles(GUILD, '700'))
+    results.append(db.remove_reaction_role(GUILD, '700', '👎'))
+    results.append(db.remove_reaction_role(GUILD, '700', 'missing'))
+    results.append(db.get_guild_reaction_roles(GUILD))
+    results.append(db.get_all_reaction_roles())
+    results.append(db.delete_reaction_roles(GUILD, '700'))
+    results.append(db.get_reaction_roles(GUILD, '700'))
+
+    db.create_giveaway(GUILD, '800', '801', 'Nitro', '1', end_time, winners=2)
+    results.append(db.add_giveaway_participant(GUILD, '801', '1'))
+    results.append(db.add_giveaway_participant(GUILD, '801', '1'))
+    results.append(db.add_giveaway_participant(GUILD, '801', '2'))
+    results.append(db.remove_giveaway_participant(GUILD, '801', '2'))
+    giveaway = db.get_giveaway(GUILD, '801')
+    results.append((giveaway['prize'], giveaway['winners'], sorted(giveaway['participants'])))
+    results.append([(entry['guild_id'], entry['message_id']) for entry in db.get_active_giveaways()])
+    results.append(db.end_giveaway(GUILD, '801'))
+    results.append(db.get_giveaway(GUILD, '801').get('ended'))
+    results.append(db.get_giveaway(GUILD, 'missing'))
+
+    return results
+
+
+async def run_data_manager_sequence(manager):
+    """Exercise every data manager method and collect the results"""
+    results = [
+        await manager.get('missing', 'default'),
+        await manager.set('config', {'enabled': True}),
+        await manager.get('config'),
+        await manager.increment('counter'),
+        await manager.increment('counter', 5),
+        await manager.delete('config'),
+        await manager.delete('config'),
+    ]
+    results.append(await manager.get_all())
+    return results
+
+
+def time_writes(db, users):
+    """Time a message-tracking workload (one write per message)"""
+    start = time.perf_counter()
+    for index in range(users * 5):
+        db.increment_message_count(GUILD, str(index % users))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Redis storage backend matches the JSON one")
+    parser.add_argument("--users", type=int, default=200, help="users in the timed write workload")
+    parser.add_argument("--redis-url", help="use a real server instead of the in-process fake")
+    args = parser.parse_args()
+
+    server = None
+    url = args.redis_url
+    if not url:
+        server = FakeRedisServer()
+        url = server.start()
+
+    client = RedisClient.from_url(url)
+    client.execute('FLUSHDB')
+
+    with tempfile.TemporaryDirectory() as data_root:
+        os.environ[DATA_ROOT_ENV] = data_root
+        json_db = JsonDatabase()
+        redis_db = RedisDatabase(client, prefix='parity:')
+
+        json_results = run_sequence(json_db)
+        redis_results = run_sequence(redis_db)
+
+        json_manager = DataManager(os.path.join(data_root, 'data', 'parity.json'))
+        redis_manager = RedisDataManager(client, 'parity', prefix='parity:')
+        json_results += asyncio.run(run_data_manager_sequence(json_manager))
+        redis_results += asyncio.run(run_data_manager_sequence(redis_manager))
+
+        mismatches = [
+            (index, expected, actual)
+            for index, (expected, actual) in enumerate(zip(json_results, redis_results))
+            if expected != actual
+        ]
+        for index, expected, actual in mismatches:
+            print(f"MISMATCH #{index}: json={expected!r} redis={actual!r}")
+        print(f"Parity: {len(json_results) - len(mismatches)}/{len(json_results)} results match")
+
+        json_seconds = time_writes(JsonDatabase(), args.users)
+        redis_seconds = time_writes(RedisDatabase(client, prefix='bench:'), args.users)
+
+    writes = args.users * 5
+    print(f"{writes:,} message writes: json {json_seconds * 1000:.0f}ms "
+          f"({writes / json_seconds:,.0f}/s), redis {redis_seconds * 1000:.0f}ms ({writes / redis_seconds:,.0f}/s)")
+
+    client.close()
+    if server:
+        server.stop()
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Load test for the dashboard's serving profiles
+
+Starts app.py under each profile in turn, drives it with concurrent
+keep-alive clients requesting the page and the hashed asset URLs (the ones
+asset_url() returns) for the GIFs under assets/images, and prints requests
+per second:
+
+- dev: the Werkzeug development server, as `python app.py` ran it
+- gunicorn: gunicorn -c gunicorn.conf.py
+- gunicorn+cache: the same, with clients revalidating via If-None-Match
+  like a browser with a warm cache
+
+Run from the multipurpos directory:
+
+    python benchmarks/web_load.py [--seconds 10] [--concurrency 32]
+    python benchmarks/web_load.py --url http://127.0.0.1:5000   # an already running server
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+from utils.static_assets import AssetManifest
+
+# The (hashed, immutable) asset URLs the page links
+ASSET_LINK = re.compile(r'(?:src|href)="(/assets/[^"]+)"')
+
+DEV_SERVER = (
+    "import logging, sys; logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+    "from app import app; app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(profile, port):
+    """Start app.py under a serving profile
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    if profile == 'dev':
+        command = [sys.executable, '-c', DEV_SERVER, str(port)]
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app']
+    return subprocess.Popen(command, cwd=BOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+async def page_paths(url):
+    """Get the page's path, the asset URLs it links and the images' hashed URLs"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url + '/') as response:
+            page = await response.text()
+    manifest = AssetManifest()
+    images = {manifest.url_for(path) for path in manifest.assets if path.startswith('images/') and path.endswith('.gif')}
+    return ['/'] + sorted(set(ASSET_LINK.findall(page)) | images)
+
+
+async def run_load(url, seconds, concurrency, revalidate):
+    """Request the page and its assets round-robin from concurrent clients
+
+    Returns:
+        dict: Requests, errors, 304s and body bytes received
+    """
+    paths = await page_paths(url)
+    totals = {'requests': 0, 'errors': 0, 'not_modified': 0, 'bytes': 0}
+    deadline = time.monotonic() + seconds
+
+    async def client(session, offset):
+        etags = {}
+        index = offset
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            headers = {'Accept-Encoding': 'gzip'}
+            if revalidate and path in etags:
+                headers['If-None-Match'] = etags[path]
+            try:
+                async with session.get(url + path, headers=headers, auto_decompress=False) as response:
+                    body = await response.read()
+                    if response.status == 304:
+                        totals['not_modified'] += 1
+                    elif response.status != 200:
+                        totals['errors'] += 1
+                    if 'ETag' in response.headers:
+                        etags[path] = response.headers['ETag']
+                    totals['bytes'] += len(body)
+                    totals['requests'] += 1
+            except aiohttp.ClientError:
+                totals['errors'] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(client(session, offset) for offset in range(concurrency)))
+    return totals
+
+
+def report(name, totals, seconds):
+    print(
+        f"{name:<16} {totals['requests'] / seconds:>9,.0f} req/s  "
+        f"{totals['bytes'] / seconds / 1024 / 1024:>8,.1f} MiB/s  "
+        f"{totals['not_modified']:>7,} not modified  {totals['errors']:,} errors"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare the dashboard's serving profiles under load")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--url", help="load an already running server instead")
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url.rstrip('/')
+        report('server', await run_load(url, args.seconds, args.concurrency, False), args.seconds)
+        report('server+cache', await run_load(url, args.seconds, args.concurrency, True), args.seconds)
+        return 0
+
+    for name, profile, revalidate in (
+        ('dev', 'dev', False),
+        ('gunicorn', 'gunicorn', False),
+        ('gunicorn+cache', 'gunicorn', True),
+    ):
+        port = free_port()
+        server = start_server(profile, port)
+        try:
+            url = f'http://127.0.0.1:{port}'
+            await wait_until_up(url)
+            report(name, await run_load(url, args.seconds, args.concurrency, revalidate), args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
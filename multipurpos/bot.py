@@ -3,7 +3,11 @@ from discord.ext import commands
 import os
 import logging
 import asyncio
-from config import PREFIX
+from config import CONFIG
+from utils.extensions import load_extensions
+from utils.intents_planner import plan_intents
+
+PREFIX = CONFIG['prefix']
 
 # Configure logging
 logging.basicConfig(
@@ -13,37 +17,47 @@ logging.basicConfig(
 logger = logging.getLogger('discord_bot')
 
 def initialize_bot():
-    # Set intents - we need all of them for the features we're implementing
-    intents = discord.Intents.all()
+    extensions = sorted(filename[:-3] for filename in os.listdir('./cogs') if filename.endswith('.py'))
+    
+    # Set intents - only the ones the cogs listen for or declare
+    if CONFIG['gateway']['plan_intents']:
+        plan = plan_intents(extensions, include_optional=CONFIG['gateway']['presences'])
+        intents, member_cache_flags = plan.intents, plan.member_cache_flags
+    else:
+        intents = discord.Intents.all()
+        intents.presences = CONFIG['gateway']['presences']
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    
+    if CONFIG['memory']['member_cache'] is not None:
+        member_cache_flags = discord.MemberCacheFlags(**CONFIG['memory']['member_cache'])
     
-    # Initialize the bot with prefix and intents
-    bot = commands.Bot(command_prefix=PREFIX, intents=intents, help_command=None)
+    # Initialize the bot with prefix and intents; the status is sent with IDENTIFY
+    bot = commands.Bot(
+        command_prefix=PREFIX,
+        intents=intents,
+        member_cache_flags=member_cache_flags,
+        chunk_guilds_at_startup=not CONFIG['memory']['budget_mode'],
+        max_messages=CONFIG['memory']['max_messages'],
+        help_command=None,
+        activity=discord.Activity(
+            type=discord.ActivityType.watching,
+            name=f"for {PREFIX}help"
+        )
+    )
     
     @bot.event
     async def on_ready():
         """Event triggered when the bot is ready and connected to Discord."""
         logger.info(f'Logged in as {bot.user.name} ({bot.user.id})')
-        await bot.change_presence(activity=discord.Activity(
-            type=discord.ActivityType.watching, 
-            name=f"for {PREFIX}help"
-        ))
         logger.info("Bot is ready!")
     
     # Load all cogs
     async def load_cogs():
-        """Load all cogs from the cogs directory."""
-        for filename in os.listdir('./cogs'):
-            if filename.endswith('.py'):
-                try:
-                    await bot.load_extension(f'cogs.{filename[:-3]}')
-                    logger.info(f'Loaded cog: {filename[:-3]}')
-                except Exception as e:
-                    logger.error(f'Failed to load cog {filename[:-3]}: {e}')
+        """Load all cogs from the cogs directory, once, before connecting."""
+        await load_extensions(bot, extensions, dependencies=CONFIG.get('cog_dependencies'))
     
-    @bot.event
-    async def on_connect():
-        """Event triggered when the bot connects to Discord."""
-        await load_cogs()
+    # setup_hook runs once per process, unlike on_connect which fires on every reconnect
+    bot.setup_hook = load_cogs
     
     @bot.event
     async def on_command_error(ctx, error):
@@ -0,0 +1,245 @@
+"""Cluster launcher
+
+Runs the bot as several processes, each owning a contiguous range of shards
+and its own data directory, so gateway decoding and listener work is spread
+over multiple cores:
+
+    python cluster.py --clusters 4              # shard count from Discord
+    python cluster.py --clusters 4 --shards 16
+    python cluster.py --fake-gateway --clusters 2 --shards 4 --smoke-test
+
+Each guild is owned by exactly one shard, so each cluster's data directory
+(config sharding.data_root) only ever holds its own guilds. Before the
+first clustered start, and after changing the shard or cluster count, the
+data has to be split between the clusters:
+
+    python cluster.py --clusters 4 --shards 16 --partition-data
+
+Until it is, the launcher refuses to start (see utils.data_partition).
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+
+import aiohttp
+
+from config import CONFIG
+from utils.cluster import ClusterInfo, format_shard_ids, ipc_request, shard_ranges
+from utils.data_partition import check_layout, partition_data
+from utils.fake_discord import FAKE_DISCORD_ENV, FakeDiscord
+from utils.storage import DATA_ROOT_ENV
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('cluster')
+
+# Seconds to wait before restarting a cluster that exited
+RESTART_DELAY = 5
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def fetch_recommended_shards(token):
+    """Ask Discord how many shards the bot should run"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            'https://discord.com/api/v10/gateway/bot',
+            headers={'Authorization': f'Bot {token}'}
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data['shards']
+
+
+class ClusterLauncher:
+    """Starts one bot process per cluster and restarts any that exit"""
+
+    def __init__(self, shard_count, clusters, extra_env=None):
+        sharding = CONFIG['sharding']
+        self.ipc_dir = os.path.join(BOT_DIR, sharding['ipc_dir'])
+        self.data_root = os.path.join(BOT_DIR, sharding['data_root'])
+        self.shard_count = shard_count
+        self.extra_env = extra_env or {}
+        self.processes = {}  # Cluster ID -> asyncio.subprocess.Process
+        self.stopping = False
+
+        ranges = shard_ranges(shard_count, clusters)
+        self.clusters = [
+            ClusterInfo(cluster_id, len(ranges), shard_ids, shard_count, self.ipc_dir)
+            for cluster_id, shard_ids in enumerate(ranges)
+        ]
+
+    @staticmethod
+    def root_name(cluster):
+        """Get the name of a cluster's data root under sharding.data_root"""
+        return f'cluster-{cluster.cluster_id}-of-{cluster.cluster_count}'
+
+    def cluster_env(self, cluster):
+        """Build the environment for a cluster process"""
+        env = dict(os.environ)
+        env.update(cluster.to_env())
+        env[DATA_ROOT_ENV] = os.path.join(self.data_root, self.root_name(cluster))
+        env.update(self.extra_env)
+        return env
+
+    def check_data(self):
+        """Get why the clusters' data roots aren't ready for this layout, or None if they are"""
+        return check_layout(self.data_root, BOT_DIR, self.shard_count, [self.root_name(cluster) for cluster in self.clusters])
+
+    def partition_data(self):
+        """Split the current data between this layout's clusters"""
+        return partition_data(
+            self.data_root, BOT_DIR, self.shard_count,
+            [self.root_name(cluster) for cluster in self.clusters],
+            [cluster.shard_ids for cluster in self.clusters]
+        )
+
+    async def run_cluster(self, cluster):
+        """Run one cluster's process, restarting it until the launcher stops"""
+        while not self.stopping:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(BOT_DIR, 'discord_bot.py'),
+                cwd=BOT_DIR,
+                env=self.cluster_env(cluster)
+            )
+            self.processes[cluster.cluster_id] = process
+            logger.info(
+                f"Started cluster {cluster.cluster_id} (shards {format_shard_ids(cluster.shard_ids)}) "
+                f"as PID {process.pid}"
+            )
+
+            code = await process.wait()
+            if self.stopping:
+                break
+
+            logger.warning(f"Cluster {cluster.cluster_id} exited with code {code}, restarting in {RESTART_DELAY}s")
+            await asyncio.sleep(RESTART_DELAY)
+
+    async def stop(self):
+        """Stop every cluster"""
+        self.stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.terminate()
+
+        for cluster_id, process in self.processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except asyncio.TimeoutError:
+                logger.warning(f"Cluster {cluster_id} did not stop, killing it")
+                process.kill()
+
+    async def gather_stats(self):
+        """Ask every cluster for its stats over IPC"""
+        responses = await asyncio.gather(*(
+            ipc_request(self.ipc_dir, cluster.cluster_id, 'stats') for cluster in self.clusters
+        ))
+        return dict(zip((cluster.cluster_id for cluster in self.clusters), responses))
+
+
+async def smoke_test(launcher, fake, timeout):
+    """Wait until every cluster reports all of its fake guilds over IPC
+
+    Returns:
+        bool: True if the stats added up before the timeout
+    """
+    expected = len(fake.guilds)
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(2)
+        stats = await launcher.gather_stats()
+        if all(stats.values()) and sum(entry['servers'] for entry in stats.values()) == expected:
+            for cluster_id, entry in stats.items():
+                logger.info(f"Cluster {cluster_id}: {entry}")
+            logger.info(
+                f"Smoke test passed: {expected} guilds over {fake.shard_count} shards in "
+                f"{len(stats)} clusters, {sum(fake.identifies.values())} identifies"
+            )
+            return True
+
+    logger.error(f"Smoke test failed: clusters reported {await launcher.gather_stats()}, expected {expected} guilds")
+    return False
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the bot as multiple shard clusters")
+    parser.add_argument("--clusters", type=int, default=CONFIG['sharding']['clusters'], help="number of processes")
+    parser.add_argument("--shards", type=int, default=CONFIG['sharding']['shard_count'], help="total shard count")
+    parser.add_argument("--fake-gateway", action="store_true", help="serve generated guilds instead of connecting to Discord")
+    parser.add_argument("--fake-guilds", type=int, default=100, help="guilds the fake gateway serves")
+    parser.add_argument("--fake-members", type=int, default=50, help="members per fake guild")
+    parser.add_argument("--smoke-test", action="store_true", help="with --fake-gateway, exit once all clusters report in")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds the smoke test waits")
+    parser.add_argument("--partition-data", action="store_true", help="split the data between the clusters, then exit")
+    args = parser.parse_args()
+
+    fake = None
+    extra_env = {}
+    shard_count = args.shards
+
+    if args.fake_gateway:
+        shard_count = shard_count or args.clusters
+        fake = FakeDiscord(shard_count=shard_count, guilds=args.fake_guilds, members_per_guild=args.fake_members)
+        extra_env[FAKE_DISCORD_ENV] = await fake.start()
+    elif not shard_count:
+        token = os.getenv("DISCORD_TOKEN")
+        if not token:
+            logger.critical("No Discord token found in environment variables!")
+            return 1
+        shard_count = await fetch_recommended_shards(token)
+        logger.info(f"Discord recommends {shard_count} shards")
+
+    launcher = ClusterLauncher(shard_count, args.clusters, extra_env)
+
+    if args.partition_data:
+        if fake:
+            await fake.close()
+        for name, files in launcher.partition_data().items():
+            logger.info(f"{name}: {len(files)} data files")
+        logger.info(f"Partitioned the data for {shard_count} shards in {len(launcher.clusters)} clusters")
+        return 0
+
+    # Generated guilds have no data to lose
+    problem = None if fake else launcher.check_data()
+    if problem:
+        logger.critical(
+            f"{problem}. Clusters would start without their guilds' data; run "
+            f"`python cluster.py --clusters {args.clusters} --shards {shard_count} --partition-data` first."
+        )
+        return 1
+
+    logger.info(f"Launching {len(launcher.clusters)} clusters for {shard_count} shards")
+
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_requested.set)
+
+    runners = [asyncio.create_task(launcher.run_cluster(cluster)) for cluster in launcher.clusters]
+
+    passed = True
+    if fake and args.smoke_test:
+        check = asyncio.create_task(smoke_test(launcher, fake, args.timeout))
+        await asyncio.wait([check, asyncio.create_task(stop_requested.wait())], return_when=asyncio.FIRST_COMPLETED)
+        passed = check.done() and check.result()
+        check.cancel()
+    else:
+        await stop_requested.wait()
+
+    logger.info("Stopping clusters...")
+    await launcher.stop()
+    await asyncio.gather(*runners, return_exceptions=True)
+    if fake:
+        await fake.close()
+
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
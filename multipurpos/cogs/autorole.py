@@ -23,7 +23,7 @@ class Autorole(commands.Cog):
             return
         
         # Get the autorole from database
-        role_id = db.get_autorole(member.guild.id)
+        role_id = await db.get_autorole(member.guild.id)
         if not role_id:
             return
         
@@ -52,7 +52,7 @@ class Autorole(commands.Cog):
         """
         if role is None:
             # Display current autorole
-            role_id = db.get_autorole(ctx.guild.id)
+            role_id = await db.get_autorole(ctx.guild.id)
             if not role_id:
                 embed = EmbedCreator.create_info_embed(
                     "Autorole",
@@ -85,7 +85,7 @@ class Autorole(commands.Cog):
             return
         
         # Set the autorole
-        success = db.set_autorole(ctx.guild.id, role.id)
+        success = await db.set_autorole(ctx.guild.id, role.id)
         
         if success:
             embed = EmbedCreator.create_success_embed(
@@ -120,7 +120,7 @@ class Autorole(commands.Cog):
     @commands.has_permissions(manage_roles=True)
     async def clearautorole(self, ctx):
         """Clear the autorole setting"""
-        success = db.remove_autorole(ctx.guild.id)
+        success = await db.remove_autorole(ctx.guild.id)
         
         if success:
             embed = EmbedCreator.create_success_embed(
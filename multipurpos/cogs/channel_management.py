@@ -1,8 +1,10 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
 import logging
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.channel_stats import ChannelMessageCounters
 
 logger = logging.getLogger('discord_bot')
 
@@ -11,8 +13,70 @@ class ChannelManagement(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
+        self.message_counters = ChannelMessageCounters()
+        self.backfills = {}  # Channel ID -> running backfill task
+        self.save_counters.start()
         logger.info("ChannelManagement cog initialized")
     
+    def cog_unload(self):
+        self.save_counters.cancel()
+        for task in self.backfills.values():
+            task.cancel()
+        self.message_counters.save()
+    
+    @tasks.loop(seconds=60)
+    async def save_counters(self):
+        """Persist the message counters if they changed"""
+        self.message_counters.save()
+    
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        """Count new messages per channel"""
+        if not message.guild:
+            return
+        
+        self.message_counters.record_message(message.channel.id, message.id)
+    
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        """Uncount a deleted message"""
+        self.message_counters.record_deletes(payload.channel_id, (payload.message_id,))
+    
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        """Uncount bulk deleted messages"""
+        self.message_counters.record_deletes(payload.channel_id, payload.message_ids)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        """Drop counters for deleted channels"""
+        self.message_counters.forget(channel.id)
+    
+    async def backfill_channel(self, channel):
+        """Count a channel's messages from before tracking started, once
+        
+        Args:
+            channel: The text channel to backfill
+            
+        Returns:
+            int: The number of older messages found
+        """
+        stats = self.message_counters.get_stats(channel.id)
+        if stats is None:
+            # Nothing tracked yet, so count everything up to now
+            before_id = discord.utils.time_snowflake(discord.utils.utcnow())
+        else:
+            before_id = stats['since']
+        
+        count = 0
+        async for _ in channel.history(limit=None, before=discord.Object(id=before_id)):
+            count += 1
+        
+        self.message_counters.record_backfill(channel.id, before_id, count)
+        self.message_counters.save()
+        logger.info(f"Backfilled {count} messages for channel {channel.id}")
+        return count
+    
     @commands.command(name="lock")
     @commands.has_permissions(manage_channels=True)
     @commands.bot_has_permissions(manage_channels=True)
@@ -303,6 +367,13 @@ class ChannelManagement(commands.Cog):
             inline=True
         )
         
+        # Add position
+        embed.add_field(
+            name="📊 Position",
+            value=channel.position,
+            inline=True
+        )
+        
         # Add slowmode
         slowmode = channel.slowmode_delay
         if slowmode > 0:
@@ -346,29 +417,92 @@ class ChannelManagement(commands.Cog):
                 inline=True
             )
         
-        # Add message count if available
-        try:
-            message_count = 0
-            async for _ in channel.history(limit=None):
-                message_count += 1
-                if message_count >= 100:  # Cap at 100 for performance
-                    message_count = "100+"
-                    break
-            
-            if isinstance(message_count, int):
-                count_str = str(message_count)
+        # Add message counts from the event-maintained counters
+        stats = self.message_counters.get_stats(channel.id)
+        if stats:
+            if stats['backfilled']:
+                count_str = f"{stats['total']:,}"
             else:
-                count_str = message_count
-                
+                since_timestamp = int(discord.utils.snowflake_time(stats['since']).timestamp())
+                count_str = f"{stats['total']:,} since <t:{since_timestamp}:d>"
+            
             embed.add_field(
                 name="💬 Message Count",
                 value=count_str,
                 inline=True
             )
-        except:
-            pass
+            
+            embed.add_field(
+                name="📈 Activity",
+                value=f"Last hour: {stats['last_hour']:,}\n"
+                      f"Last 24h: {stats['last_day']:,}\n"
+                      f"Average: {stats['per_hour']:.1f}/hour",
+                inline=True
+            )
         
         await ctx.send(embed=embed)
+    
+    @commands.command(name="backfillcount")
+    @commands.has_permissions(manage_channels=True)
+    async def backfill_count(self, ctx, channel: discord.TextChannel = None):
+        """Count a channel's older messages once so channelinfo shows exact totals
+        
+        Args:
+            channel: The channel to backfill (defaults to current channel)
+        """
+        channel = channel or ctx.channel
+        
+        # The history is read from the target channel, not the one the command was sent in
+        permissions = channel.permissions_for(ctx.guild.me)
+        if not (permissions.read_messages and permissions.read_message_history):
+            await ctx.send(embed=EmbedCreator.create_error_embed(
+                "Missing Permissions",
+                f"I need View Channel and Read Message History in {channel.mention} to count its messages."
+            ))
+            return
+        
+        stats = self.message_counters.get_stats(channel.id)
+        if stats and stats['backfilled']:
+            await ctx.send(embed=EmbedCreator.create_info_embed(
+                "Already Backfilled",
+                f"{channel.mention} already has an exact message count."
+            ))
+            return
+        
+        if channel.id in self.backfills:
+            await ctx.send(embed=EmbedCreator.create_info_embed(
+                "Backfill Running",
+                f"A backfill for {channel.mention} is already in progress."
+            ))
+            return
+        
+        await ctx.send(embed=EmbedCreator.create_info_embed(
+            "Backfill Started",
+            f"Counting older messages in {channel.mention}. This runs in the background."
+        ))
+        
+        # Run in the background so large channels don't hold up the command
+        task = asyncio.create_task(self.backfill_channel(channel))
+        self.backfills[channel.id] = task
+        
+        try:
+            count = await task
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.error(f"Error backfilling channel {channel.id}: {e}")
+            await ctx.send(embed=EmbedCreator.create_error_embed(
+                "Backfill Failed",
+                f"Failed to count messages in {channel.mention}: {str(e)}"
+            ))
+            return
+        finally:
+            self.backfills.pop(channel.id, None)
+        
+        await ctx.send(embed=EmbedCreator.create_success_embed(
+            "Backfill Complete",
+            f"Found {count:,} older messages in {channel.mention}."
+        ))
 
 async def setup(bot):
     await bot.add_cog(ChannelManagement(bot))
\ No newline at end of file
@@ -7,6 +7,9 @@ import asyncio
 from datetime import datetime, timedelta
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.event_stream import publish_moderation
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -16,7 +19,7 @@ class DirectModeration(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.moderation_settings = {}
-        self.data_file = 'data/moderation_settings.json'
+        self.data_file = data_path('data/moderation_settings.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -24,14 +27,34 @@ class DirectModeration(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Warnings and settings are snapshotted for faster startups
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.data_file, lambda: self.moderation_settings, 'DirectModeration')
+        
+        # Warnings are shown on the dashboard
+        if getattr(bot, 'snapshot', None):
+            bot.snapshot.register('warnings', self.snapshot_warnings)
+        
         logger.info("DirectModeration cog initialized")
         
+    def cog_unload(self):
+        if getattr(self.bot, 'snapshot', None):
+            self.bot.snapshot.unregister('warnings')
+    
+    def snapshot_warnings(self, guild):
+        """Get a guild's warning counts for the dashboard snapshot, with each member's latest warning"""
+        warnings = self.moderation_settings.get(str(guild.id), {}).get("warnings", {})
+        return [
+            {'user_id': user_id, 'count': len(user_warnings), 'latest': dict(user_warnings[-1])}
+            for user_id, user_warnings in warnings.items()
+            if user_warnings
+        ]
+    
     def load_settings(self):
         """Load moderation settings from file"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.moderation_settings = json.load(f)
+                self.moderation_settings = load_json_store(self.data_file)
             else:
                 self.moderation_settings = {}
                 self.save_settings()
@@ -79,6 +102,7 @@ class DirectModeration(commands.Cog):
         
         self.moderation_settings[guild_id]["warnings"][user_id].append(warning)
         self.save_settings()
+        publish_moderation(self.bot, ctx, 'warn', member, reason)
         
         # Create warning embed
         embed = discord.Embed(
@@ -209,6 +233,7 @@ class DirectModeration(commands.Cog):
         # Clear warnings
         self.moderation_settings[guild_id]["warnings"][user_id] = []
         self.save_settings()
+        publish_moderation(self.bot, ctx, 'clear_warnings', member)
         
         # Create embed
         embed = discord.Embed(
@@ -274,6 +299,7 @@ class DirectModeration(commands.Cog):
         # Kick the member
         try:
             await member.kick(reason=reason)
+            publish_moderation(self.bot, ctx, 'kick', member, reason)
             await ctx.send(embed=embed)
         except Exception as e:
             error_embed = discord.Embed(
@@ -338,6 +364,7 @@ class DirectModeration(commands.Cog):
         # Ban the member
         try:
             await member.ban(reason=reason)
+            publish_moderation(self.bot, ctx, 'ban', member, reason)
             await ctx.send(embed=embed)
         except Exception as e:
             error_embed = discord.Embed(
@@ -368,6 +395,7 @@ class DirectModeration(commands.Cog):
                 # Unban the user
                 try:
                     await ctx.guild.unban(user)
+                    publish_moderation(self.bot, ctx, 'unban', user)
                     
                     embed = discord.Embed(
                         title=f"✅ User Unbanned",
@@ -8,6 +8,10 @@ from datetime import datetime, timedelta
 
 from utils.database import db
 from utils.embed_creator import EmbedCreator
+from utils.event_stream import publish_event
+from utils.member_cache import ensure_chunked
+from utils.leader import start_singleton_loop, cancel_singleton_loop, lease_token
+from utils.metrics import QUEUE_DEPTH
 from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
@@ -25,32 +29,48 @@ TIME_DICT = {
 class Giveaway(commands.Cog):
     """Giveaway system"""
     
+    # Winners are resolved from the member cache
+    required_intents = ('members',)
+    
     def __init__(self, bot):
         self.bot = bot
-        self.check_giveaways.start()
+        # Only one process may announce winners
+        start_singleton_loop(bot, self.check_giveaways)
         logger.info("Giveaway cog initialized")
     
     def cog_unload(self):
-        self.check_giveaways.cancel()
+        cancel_singleton_loop(self.bot, self.check_giveaways)
     
     @tasks.loop(seconds=60)
     async def check_giveaways(self):
         """Check for ended giveaways and announce winners"""
-        active_giveaways = db.get_active_giveaways()
+        active_giveaways = await db.get_active_giveaways()
         now = datetime.now()
+        QUEUE_DEPTH.labels('giveaways').set(len(active_giveaways))
         
         for giveaway in active_giveaways:
             if giveaway['end_time'] <= now:
+                # Another process may have taken over if this one stalled
+                held, token = await lease_token(self.bot)
+                if not held:
+                    logger.warning("Lost the singleton lease, leaving ended giveaways to the new leader")
+                    return
+                
                 # Giveaway has ended
-                await self.end_giveaway(giveaway)
+                await self.end_giveaway(giveaway, fencing_token=token)
     
     @check_giveaways.before_loop
     async def before_check_giveaways(self):
         """Wait until the bot is ready before starting the giveaway checker"""
         await self.bot.wait_until_ready()
     
-    async def end_giveaway(self, giveaway):
-        """End a giveaway and announce winners"""
+    async def end_giveaway(self, giveaway, fencing_token=None):
+        """End a giveaway and announce winners
+        
+        Args:
+            giveaway: The giveaway, as returned by get_active_giveaways
+            fencing_token: The singleton lease token, when ended by the checker loop
+        """
         guild_id = int(giveaway['guild_id'])
         channel_id = int(giveaway['channel_id'])
         message_id = int(giveaway['message_id'])
@@ -71,8 +91,10 @@ class Giveaway(commands.Cog):
             logger.error(f"Could not fetch message {message_id} for giveaway: {e}")
             return
         
-        # Mark giveaway as ended
-        db.end_giveaway(guild_id, message_id)
+        # Mark giveaway as ended; only the process whose write succeeds announces it
+        if not await db.end_giveaway(guild_id, message_id, fencing_token=fencing_token):
+            logger.warning(f"Giveaway {message_id} was already ended or the lease moved on, not announcing it")
+            return
         
         # Get giveaway data
         giveaway_data = giveaway['data']
@@ -83,6 +105,8 @@ class Giveaway(commands.Cog):
         # Select winners
         winners = []
         if participants:
+            await ensure_chunked(self.bot, guild)
+            
             # Make sure we don't try to select more winners than participants
             winners_count = min(winners_count, len(participants))
             winner_ids = random.sample(participants, winners_count)
@@ -185,7 +209,7 @@ class Giveaway(commands.Cog):
         await message.add_reaction(CONFIG['emojis']['giveaway'])
         
         # Store giveaway in database
-        db.create_giveaway(
+        await db.create_giveaway(
             ctx.guild.id,
             ctx.channel.id,
             message.id,
@@ -215,12 +239,13 @@ class Giveaway(commands.Cog):
             return
         
         # Get the giveaway data
-        giveaway = db.get_giveaway(payload.guild_id, payload.message_id)
+        giveaway = await db.get_giveaway(payload.guild_id, payload.message_id)
         if not giveaway:
             return
         
         # Add participant
-        db.add_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id)
+        if await db.add_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id):
+            await self.publish_entrants(payload, 'giveaway_entry')
     
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
@@ -230,12 +255,23 @@ class Giveaway(commands.Cog):
             return
         
         # Get the giveaway data
-        giveaway = db.get_giveaway(payload.guild_id, payload.message_id)
+        giveaway = await db.get_giveaway(payload.guild_id, payload.message_id)
         if not giveaway:
             return
         
         # Remove participant
-        db.remove_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id)
+        if await db.remove_giveaway_participant(payload.guild_id, payload.message_id, payload.user_id):
+            await self.publish_entrants(payload, 'giveaway_leave')
+    
+    async def publish_entrants(self, payload, event):
+        """Publish a giveaway entry change for the dashboard's live view"""
+        giveaway = await db.get_giveaway(payload.guild_id, payload.message_id) or {}
+        publish_event(
+            self.bot, event, payload.guild_id,
+            message_id=str(payload.message_id),
+            user_id=str(payload.user_id),
+            entrants=len(giveaway.get('participants', []))
+        )
     
     @commands.hybrid_command(name="gend", description="End a giveaway early")
     @commands.has_permissions(manage_guild=True)
@@ -246,7 +282,7 @@ class Giveaway(commands.Cog):
             message_id: The ID of the giveaway message
         """
         # Get the giveaway
-        giveaway = db.get_giveaway(ctx.guild.id, message_id)
+        giveaway = await db.get_giveaway(ctx.guild.id, message_id)
         if not giveaway:
             embed = EmbedCreator.create_error_embed(
                 "Giveaway Not Found",
@@ -293,7 +329,7 @@ class Giveaway(commands.Cog):
             message_id: The ID of the giveaway message
         """
         # Get the giveaway
-        giveaway = db.get_giveaway(ctx.guild.id, message_id)
+        giveaway = await db.get_giveaway(ctx.guild.id, message_id)
         if not giveaway:
             embed = EmbedCreator.create_error_embed(
                 "Giveaway Not Found",
@@ -312,6 +348,7 @@ class Giveaway(commands.Cog):
             return
         
         # Select new winners
+        await ensure_chunked(self.bot, ctx.guild)
         winners_count = min(giveaway['winners'], len(giveaway['participants']))
         winner_ids = random.sample(giveaway['participants'], winners_count)
         
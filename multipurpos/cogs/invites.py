@@ -122,14 +122,7 @@ class Invites(commands.Cog):
             
             try:
                 # Get previous join/leave entries for this user from database
-                guild_invites = db.data.get('invites', {}).get(str(member.guild.id), {})
-                for inviter_id_str, inviter_data in guild_invites.items():
-                    for invitee in inviter_data.get('invitees', []):
-                        if invitee.get('user_id') == str(member.id):
-                            is_rejoin = True
-                            break
-                    if is_rejoin:
-                        break
+                is_rejoin = await db.has_invitee(member.guild.id, member.id)
             except Exception as e:
                 logger.error(f"Error checking rejoin status: {e}")
                 is_rejoin = False
@@ -180,7 +173,7 @@ class Invites(commands.Cog):
             # If we found which invite was used
             if invite_used and inviter_id:
                 # Track the invite in the database
-                db.track_invite(member.guild.id, inviter_id, member.id, is_fake, is_rejoin)
+                await db.track_invite(member.guild.id, inviter_id, member.id, is_fake, is_rejoin)
                 
                 # Log the invite
                 inviter = member.guild.get_member(inviter_id)
@@ -209,7 +202,7 @@ class Invites(commands.Cog):
             return
         
         # Track the leave
-        db.track_leave(member.guild.id, member.id)
+        await db.track_leave(member.guild.id, member.id)
         
         logger.info(f"Member {member.name} left {member.guild.name}")
     
@@ -225,7 +218,7 @@ class Invites(commands.Cog):
             member = ctx.author
         
         # Get invite stats
-        stats = db.get_invite_stats(ctx.guild.id, member.id)
+        stats = await db.get_invite_stats(ctx.guild.id, member.id)
         
         # Create embed
         embed = EmbedCreator.create_invite_stats_embed(member, stats)
@@ -1,4 +1,5 @@
 import discord
+import functools
 from discord.ext import commands
 import logging
 import json
@@ -6,6 +7,7 @@ import os
 import random
 import datetime
 from config import CONFIG
+from utils.storage import data_path
 
 logger = logging.getLogger('discord_bot')
 
@@ -14,13 +16,17 @@ class IslamicCommands(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_file = 'data/islamic_settings.json'
+        self.data_file = data_path('data/islamic_settings.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         
-        # Define daily hadith database
-        self.hadiths = [
+        logger.info("IslamicCommands cog initialized")
+    
+    @functools.cached_property
+    def hadiths(self):
+        """Hadiths for .hadith, built on first use"""
+        return [
             {"text": "The Messenger of Allah (ﷺ) said, 'The world is sweet and green, and verily Allah is going to install you as vicegerent in it in order to see how you act. So avoid the allurement of women: verily, the first trial for the people of Israel was caused by women.'", "source": "Sahih Muslim"},
             {"text": "The Prophet (ﷺ) said, 'Religion is very easy and whoever overburdens himself in his religion will not be able to continue in that way. So you should not be extremists, but try to be near to perfection and receive the good tidings that you will be rewarded.'", "source": "Sahih al-Bukhari"},
             {"text": "The Prophet (ﷺ) said, 'The best among you are those who have the best manners and character.'", "source": "Sahih al-Bukhari"},
@@ -37,9 +43,11 @@ class IslamicCommands(commands.Cog):
             {"text": "The Prophet (ﷺ) said, 'Allah does not look at your figures, nor at your attire but He looks at your hearts and accomplishments.'", "source": "Sahih Muslim"},
             {"text": "The Prophet (ﷺ) said, 'The strong person is not the one who overcomes people by his strength, but the strong person is the one who controls himself while in anger.'", "source": "Sahih al-Bukhari"},
         ]
-        
-        # Define Quran verses for reminder
-        self.quran_verses = [
+    
+    @functools.cached_property
+    def quran_verses(self):
+        """Quran verses for .quran and .islamic reminder, built on first use"""
+        return [
             {"verse": "Indeed, Allah is with those who fear Him and those who are doers of good.", "surah": "An-Nahl 16:128"},
             {"verse": "And whoever relies upon Allah - then He is sufficient for him. Indeed, Allah will accomplish His purpose. Allah has already set for everything a [decreed] extent.", "surah": "At-Talaq 65:3"},
             {"verse": "And whoever fears Allah - He will make for him a way out. And will provide for him from where he does not expect.", "surah": "At-Talaq 65:2-3"},
@@ -61,9 +69,11 @@ class IslamicCommands(commands.Cog):
             {"verse": "And of His signs is that He created for you from yourselves mates that you may find tranquility in them; and He placed between you affection and mercy. Indeed in that are signs for a people who give thought.", "surah": "Ar-Rum 30:21"},
             {"verse": "And the servants of the Most Merciful are those who walk upon the earth easily, and when the ignorant address them [harshly], they say [words of] peace.", "surah": "Al-Furqan 25:63"},
         ]
-        
-        # Define Islamic duas
-        self.duas = [
+    
+    @functools.cached_property
+    def duas(self):
+        """Duas for .dua, built on first use"""
+        return [
             {"name": "Morning Supplication", "arabic": "أَصْبَحْنَا وَأَصْبَحَ الْمُلْكُ لِلَّهِ، وَالْحَمْدُ لِلَّهِ، لاَ إِلَٰهَ إِلاَّ اللهُ وَحْدَهُ لاَ شَرِيكَ لَهُ", "translation": "We have reached the morning and at this very time all sovereignty belongs to Allah, and all praise is for Allah. None has the right to be worshipped except Allah, alone, without any partner."},
             {"name": "Evening Supplication", "arabic": "أَمْسَيْنَا وَأَمْسَى الْمُلْكُ للهِ، وَالْحَمْدُ للهِ، لَا إِلَهَ إِلَّا اللهُ وَحْدَهُ لَا شَرِيكَ لَهُ", "translation": "We have reached the evening and at this very time all sovereignty belongs to Allah, and all praise is for Allah. None has the right to be worshipped except Allah, alone, without any partner."},
             {"name": "Before Sleeping", "arabic": "بِاسْمِكَ اللَّهُمَّ أَمُوتُ وَأَحْيَا", "translation": "In Your name, O Allah, I die and I live."},
@@ -75,8 +85,6 @@ class IslamicCommands(commands.Cog):
             {"name": "When Afflicted with Hardship", "arabic": "لَا إِلَهَ إِلَّا أَنْتَ سُبْحَانَكَ إِنِّي كُنْتُ مِنَ الظَّالِمِينَ", "translation": "There is no deity except You; exalted are You. Indeed, I have been of the wrongdoers."},
             {"name": "For Anxiety and Sorrow", "arabic": "اللَّهُمَّ إِنِّي عَبْدُكَ، ابْنُ عَبْدِكَ، ابْنُ أَمَتِكَ، نَاصِيَتِي بِيَدِكَ، مَاضٍ فِيَّ حُكْمُكَ، عَدْلٌ فِيَّ قَضَاؤُكَ", "translation": "O Allah, I am Your servant, son of Your servant, son of Your maidservant, my forelock is in Your hand, Your command over me is forever executed and Your decree over me is just."},
         ]
-        
-        logger.info("IslamicCommands cog initialized")
     
     @commands.group(name="islamic", invoke_without_command=True)
     async def islamic(self, ctx):
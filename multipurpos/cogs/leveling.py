@@ -6,7 +6,7 @@ import json
 import os
 import logging
 from datetime import datetime
-from utils.data_manager import DataManager
+from utils.data_manager import open_data_manager
 from utils.embed_creator import EmbedCreator
 from utils.helpers import Helpers
 from config import LEVEL_DATA_FILE, COLORS
@@ -16,7 +16,9 @@ logger = logging.getLogger('discord_bot')
 class Leveling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.data_manager = DataManager(LEVEL_DATA_FILE)
+        self.data_manager = open_data_manager(LEVEL_DATA_FILE)
+        if getattr(bot, 'store_snapshots', None) and hasattr(self.data_manager, 'file_path'):
+            bot.store_snapshots.register(self.data_manager.file_path, lambda: self.data_manager.data, 'Leveling')
         self.xp_cooldown = commands.CooldownMapping.from_cooldown(1, 60, commands.BucketType.member)
         self.xp_per_message = 15  # Base XP per message
         self.xp_randomizer = 5    # Random XP bonus
@@ -6,8 +6,9 @@ import datetime
 import json
 import os
 from utils.helpers import Helpers
-from utils.data_manager import DataManager
+from utils.data_manager import open_data_manager
 from utils.embed_creator import EmbedCreator
+from utils.storage import data_path
 from config import CONFIG
 
 logger = logging.getLogger('discord_bot')
@@ -17,7 +18,10 @@ class Levels(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_manager = DataManager("bot_database.json")
+        self.data_manager = open_data_manager(data_path("bot_database.json"))
+        # Shares bot_database.json with utils.database, so the snapshots skip it
+        if getattr(bot, 'store_snapshots', None) and hasattr(self.data_manager, 'file_path'):
+            bot.store_snapshots.register(self.data_manager.file_path, lambda: self.data_manager.data, 'Levels')
         self.xp_cooldown = commands.CooldownMapping.from_cooldown(
             1, 60, commands.BucketType.member
         )
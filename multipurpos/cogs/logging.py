@@ -4,6 +4,8 @@ import logging
 import datetime
 import os
 from config import CONFIG
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -13,7 +15,7 @@ class Logging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.log_channels = {}  # Guild ID -> Log Channel ID
-        self.log_file = 'data/logging_settings.json'
+        self.log_file = data_path('data/logging_settings.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
@@ -21,6 +23,10 @@ class Logging(commands.Cog):
         # Load settings from file if it exists
         self.load_settings()
         
+        # The snapshot keeps the int keys, which load_settings accepts too
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.log_file, lambda: {'log_channels': self.log_channels}, 'Logging')
+        
         logger.info("Logging cog initialized")
     
     def load_settings(self):
@@ -28,11 +34,10 @@ class Logging(commands.Cog):
         try:
             import json
             if os.path.exists(self.log_file):
-                with open(self.log_file, 'r') as f:
-                    data = json.load(f)
-                    self.log_channels = data.get('log_channels', {})
-                    # Convert string keys to int
-                    self.log_channels = {int(k): v for k, v in self.log_channels.items()}
+                data = load_json_store(self.log_file)
+                self.log_channels = data.get('log_channels', {})
+                # Convert string keys to int
+                self.log_channels = {int(k): v for k, v in self.log_channels.items()}
                 logger.info(f"Loaded logging settings for {len(self.log_channels)} guilds")
             else:
                 logger.info("No logging settings file found, using defaults")
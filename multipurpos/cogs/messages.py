@@ -23,7 +23,7 @@ class Messages(commands.Cog):
             return
         
         # Track the message
-        db.increment_message_count(message.guild.id, message.author.id)
+        await db.increment_message_count(message.guild.id, message.author.id)
     
     @commands.hybrid_command(name="messages", aliases=["m"], description="Check your message stats or someone else's")
     async def messages(self, ctx, member: discord.Member = None):
@@ -37,7 +37,7 @@ class Messages(commands.Cog):
             member = ctx.author
         
         # Get message stats
-        stats = db.get_message_stats(ctx.guild.id, member.id)
+        stats = await db.get_message_stats(ctx.guild.id, member.id)
         
         # Create embed
         embed = EmbedCreator.create_message_stats_embed(member, stats)
@@ -53,15 +53,7 @@ class Messages(commands.Cog):
             member: The member whose stats to reset.
         """
         # Reset the stats in the database
-        guild_id, user_id = str(ctx.guild.id), str(member.id)
-        
-        if 'message_counts' in db.data and guild_id in db.data['message_counts'] and user_id in db.data['message_counts'][guild_id]:
-            db.data['message_counts'][guild_id][user_id] = {
-                'all_time': 0,
-                'daily': {}
-            }
-            db._save_data()
-            
+        if await db.reset_message_stats(ctx.guild.id, member.id):
             embed = EmbedCreator.create_success_embed(
                 "Stats Reset",
                 f"Message statistics for {member.mention} have been reset."
@@ -90,7 +82,7 @@ class Messages(commands.Cog):
             return
         
         # Get the leaderboard
-        leaderboard = db.get_message_leaderboard(ctx.guild.id, 10, period.lower())
+        leaderboard = await db.get_message_leaderboard(ctx.guild.id, 10, period.lower())
         
         if not leaderboard:
             embed = EmbedCreator.create_info_embed(
@@ -6,6 +6,10 @@ import os
 import asyncio
 from datetime import datetime, timedelta
 from config import CONFIG
+from utils.event_stream import publish_moderation
+from utils.metrics import QUEUE_DEPTH
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -15,7 +19,7 @@ class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.moderation_settings = {}
-        self.data_file = 'data/moderation_settings.json'
+        self.data_file = data_path('data/moderation_settings.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -23,14 +27,41 @@ class Moderation(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Warnings and settings are snapshotted for faster startups
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.data_file, lambda: self.moderation_settings, 'Moderation')
+        
+        # Warnings are shown on the dashboard
+        if getattr(bot, 'snapshot', None):
+            bot.snapshot.register('warnings', self.snapshot_warnings)
+        
+        QUEUE_DEPTH.labels('mute_timers').set_function(self.pending_unmutes)
+        
         logger.info("Moderation cog initialized")
         
+    def cog_unload(self):
+        if getattr(self.bot, 'snapshot', None):
+            self.bot.snapshot.unregister('warnings')
+        QUEUE_DEPTH.remove('mute_timers')
+    
+    def pending_unmutes(self):
+        """Count timed mutes waiting to expire"""
+        return sum(len(settings.get("mutes", {})) for settings in self.moderation_settings.values())
+    
+    def snapshot_warnings(self, guild):
+        """Get a guild's warning counts for the dashboard snapshot, with each member's latest warning"""
+        warnings = self.moderation_settings.get(str(guild.id), {}).get("warnings", {})
+        return [
+            {'user_id': user_id, 'count': len(user_warnings), 'latest': dict(user_warnings[-1])}
+            for user_id, user_warnings in warnings.items()
+            if user_warnings
+        ]
+    
     def load_settings(self):
         """Load moderation settings from file"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.moderation_settings = json.load(f)
+                self.moderation_settings = load_json_store(self.data_file)
             else:
                 self.moderation_settings = {}
                 self.save_settings()
@@ -110,6 +141,7 @@ class Moderation(commands.Cog):
         
         self.moderation_settings[guild_id]["warnings"][user_id].append(warning)
         self.save_settings()
+        publish_moderation(self.bot, ctx, 'warn', member, reason)
         
         # Create warning embed
         embed = discord.Embed(
@@ -240,6 +272,7 @@ class Moderation(commands.Cog):
         # Clear warnings
         self.moderation_settings[guild_id]["warnings"][user_id] = []
         self.save_settings()
+        publish_moderation(self.bot, ctx, 'clear_warnings', member)
         
         # Create embed
         embed = discord.Embed(
@@ -305,6 +338,7 @@ class Moderation(commands.Cog):
         # Kick the member
         try:
             await member.kick(reason=reason)
+            publish_moderation(self.bot, ctx, 'kick', member, reason)
             await ctx.send(embed=embed)
         except Exception as e:
             error_embed = discord.Embed(
@@ -369,6 +403,7 @@ class Moderation(commands.Cog):
         # Ban the member
         try:
             await member.ban(reason=reason)
+            publish_moderation(self.bot, ctx, 'ban', member, reason)
             await ctx.send(embed=embed)
         except Exception as e:
             error_embed = discord.Embed(
@@ -399,6 +434,7 @@ class Moderation(commands.Cog):
                 # Unban the user
                 try:
                     await ctx.guild.unban(user)
+                    publish_moderation(self.bot, ctx, 'unban', user)
                     
                     embed = discord.Embed(
                         title=f"✅ User Unbanned",
@@ -586,6 +622,7 @@ class Moderation(commands.Cog):
         # Add role to member
         try:
             await member.add_roles(muted_role, reason=reason)
+            publish_moderation(self.bot, ctx, 'mute', member, reason)
             
             # Create mute embed
             if duration:
@@ -730,6 +767,7 @@ class Moderation(commands.Cog):
         # Remove role
         try:
             await member.remove_roles(muted_role, reason=f"Unmuted by {ctx.author}")
+            publish_moderation(self.bot, ctx, 'unmute', member)
             
             # Remove from muted list if present
             if (guild_id in self.moderation_settings and 
@@ -6,6 +6,10 @@ import os
 import asyncio
 import datetime
 from config import CONFIG
+from utils.event_stream import publish_event
+from utils.metrics import QUEUE_DEPTH
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -15,7 +19,7 @@ class Polls(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.active_polls = {}
-        self.data_file = 'data/polls_data.json'
+        self.data_file = data_path('data/polls_data.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -23,14 +27,26 @@ class Polls(commands.Cog):
         # Load active polls
         self.load_polls()
         
+        # Polls are snapshotted for faster startups
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.data_file, lambda: self.active_polls, 'Polls')
+        
+        QUEUE_DEPTH.labels('poll_timers').set_function(self.pending_timed_polls)
+        
         logger.info("Polls cog initialized")
+    
+    def cog_unload(self):
+        QUEUE_DEPTH.remove('poll_timers')
+    
+    def pending_timed_polls(self):
+        """Count timed polls waiting to end"""
+        return sum(1 for polls in self.active_polls.values() for poll in polls.values() if poll.get("timed"))
         
     def load_polls(self):
         """Load active polls from file"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.active_polls = json.load(f)
+                self.active_polls = load_json_store(self.data_file)
             else:
                 self.active_polls = {}
                 self.save_polls()
@@ -469,10 +485,45 @@ class Polls(commands.Cog):
         # Send results
         await message.channel.send(embed=embed)
         
+        publish_event(
+            self.bot, 'poll_ended', guild_id,
+            poll_id=poll_id,
+            question=poll_data['question'],
+            results=[{'option': option, 'votes': count} for option, count in results]
+        )
+        
         # Remove from active polls
         del self.active_polls[guild_id][poll_id]
         self.save_polls()
     
+    def publish_vote(self, payload, delta):
+        """Publish a vote added to or removed from an active poll"""
+        if payload.guild_id is None or payload.user_id == self.bot.user.id:
+            return
+        
+        poll_data = self.active_polls.get(str(payload.guild_id), {}).get(str(payload.message_id))
+        emoji = str(payload.emoji)
+        if not poll_data or emoji not in poll_data["emojis"]:
+            return
+        
+        publish_event(
+            self.bot, 'poll_vote', payload.guild_id,
+            poll_id=str(payload.message_id),
+            option=poll_data["options"][poll_data["emojis"].index(emoji)],
+            emoji=emoji,
+            delta=delta
+        )
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        """Stream poll votes to the dashboard"""
+        self.publish_vote(payload, 1)
+    
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        """Stream withdrawn poll votes to the dashboard"""
+        self.publish_vote(payload, -1)
+    
     async def end_poll_after(self, guild_id, poll_id, seconds):
         """End a poll after a specified duration"""
         await asyncio.sleep(seconds)
@@ -128,7 +128,7 @@ class ReactionRoles(commands.Cog):
     async def on_ready(self):
         """Register all existing reaction role views when the bot starts"""
         # Get all reaction role messages from the database
-        all_reaction_roles = db.data.get('reaction_roles', {})
+        all_reaction_roles = await db.get_all_reaction_roles()
         
         for guild_id, guild_data in all_reaction_roles.items():
             for message_id, roles_data in guild_data.items():
@@ -299,7 +299,7 @@ class ReactionRoles(commands.Cog):
             
             # Store in database
             for role in roles:
-                db.set_reaction_role(
+                await db.set_reaction_role(
                     ctx.guild.id,
                     reaction_message.id,
                     role['id'],
@@ -325,7 +325,7 @@ class ReactionRoles(commands.Cog):
         """
         try:
             # Check if message exists in the database
-            reaction_roles = db.data.get('reaction_roles', {}).get(str(ctx.guild.id), {}).get(message_id)
+            reaction_roles = await db.get_reaction_roles(ctx.guild.id, message_id)
             
             if not reaction_roles:
                 embed = EmbedCreator.create_error_embed(
@@ -349,9 +349,7 @@ class ReactionRoles(commands.Cog):
                 await ctx.send("Could not delete the message, but will remove it from the database.")
             
             # Remove from database
-            if str(ctx.guild.id) in db.data.get('reaction_roles', {}) and message_id in db.data['reaction_roles'][str(ctx.guild.id)]:
-                del db.data['reaction_roles'][str(ctx.guild.id)][message_id]
-                db._save_data()
+            await db.delete_reaction_roles(ctx.guild.id, message_id)
             
             embed = EmbedCreator.create_success_embed(
                 "Deleted",
@@ -371,7 +369,7 @@ class ReactionRoles(commands.Cog):
     @commands.has_permissions(manage_roles=True)
     async def list(self, ctx):
         """List all reaction role messages in the server"""
-        reaction_roles = db.data.get('reaction_roles', {}).get(str(ctx.guild.id), {})
+        reaction_roles = await db.get_guild_reaction_roles(ctx.guild.id)
         
         if not reaction_roles:
             embed = EmbedCreator.create_info_embed(
@@ -6,6 +6,9 @@ import os
 from discord import ui, SelectOption
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.member_cache import ensure_chunked
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -118,7 +121,7 @@ class RoleMenu(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.role_menus = {}
-        self.data_file = 'data/role_menus.json'
+        self.data_file = data_path('data/role_menus.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -126,14 +129,17 @@ class RoleMenu(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Role menus are snapshotted for faster startups
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.data_file, lambda: self.role_menus, 'RoleMenu')
+        
         logger.info("RoleMenu cog initialized")
         
     def load_settings(self):
         """Load role menu settings from file"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.role_menus = json.load(f)
+                self.role_menus = load_json_store(self.data_file)
             else:
                 self.role_menus = {}
                 self.save_settings()
@@ -507,6 +513,9 @@ class RoleMenu(commands.Cog):
             color=CONFIG['colors']['info']
         )
         
+        # Creator names come from the member cache
+        await ensure_chunked(self.bot, ctx.guild)
+        
         # Add each menu
         for message_id, menu_data in self.role_menus[guild_id].items():
             # Get channel
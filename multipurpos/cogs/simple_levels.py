@@ -6,6 +6,8 @@ import os
 import logging
 import math
 from datetime import datetime
+from utils.event_stream import publish_event
+from utils.storage import data_path
 
 # Set up logging
 logger = logging.getLogger('discord_bot')
@@ -39,7 +41,7 @@ class SimpleLevels(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.data_file = "data/levels.json"
+        self.data_file = data_path("data/levels.json")
         self.cooldowns = {}  # Store user cooldowns
         self.level_up_channels = {}  # Store guild-specific level up channels
         self.load_data()
@@ -77,7 +79,7 @@ class SimpleLevels(commands.Cog):
     
     def get_user_data(self, guild_id, user_id):
         """Get user data from the database or create a new entry"""
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+        guild_data_file = data_path(f"data/guild_{guild_id}_levels.json")
         
         try:
             if os.path.exists(guild_data_file):
@@ -98,7 +100,7 @@ class SimpleLevels(commands.Cog):
     
     def save_user_data(self, guild_id, user_data):
         """Save user data to the database"""
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+        guild_data_file = data_path(f"data/guild_{guild_id}_levels.json")
         
         try:
             # Load existing data
@@ -190,6 +192,8 @@ class SimpleLevels(commands.Cog):
         
         # Check for level up
         if user_data.level > old_level:
+            publish_event(self.bot, 'level_up', guild_id, user_id=str(user_id), level=user_data.level, xp=user_data.xp)
+            
             # Get the level up channel or use current channel
             level_up_channel = self.get_level_up_channel(message.guild)
             
@@ -269,7 +273,7 @@ class SimpleLevels(commands.Cog):
             type: The type of leaderboard (level or messages)
         """
         guild_id = ctx.guild.id
-        guild_data_file = f"data/guild_{guild_id}_levels.json"
+        guild_data_file = data_path(f"data/guild_{guild_id}_levels.json")
         
         if not os.path.exists(guild_data_file):
             await ctx.send("No leveling data found for this server.")
@@ -23,7 +23,7 @@ class TicketButton(discord.ui.Button):
     async def callback(self, interaction: discord.Interaction):
         """Handle button click"""
         # Check if user already has an open ticket
-        guild_tickets = db.data.get('tickets', {}).get(str(interaction.guild.id), {})
+        guild_tickets = await db.get_guild_tickets(interaction.guild.id)
         for channel_id, ticket_data in guild_tickets.items():
             if ticket_data.get('user_id') == str(interaction.user.id) and ticket_data.get('status') == 'open':
                 # User already has an open ticket
@@ -63,7 +63,7 @@ class TicketButton(discord.ui.Button):
             await channel.set_permissions(interaction.user, read_messages=True, send_messages=True)
             
             # Save ticket to database
-            db.create_ticket(interaction.guild.id, channel.id, interaction.user.id)
+            await db.create_ticket(interaction.guild.id, channel.id, interaction.user.id)
             
             # Create ticket welcome message
             embed = discord.Embed(
@@ -174,7 +174,7 @@ class Tickets(commands.Cog):
         # Handle close ticket button
         if interaction.data.get('custom_id') == 'close_ticket':
             # Check if this is a ticket channel
-            ticket_data = db.get_ticket(interaction.guild.id, interaction.channel.id)
+            ticket_data = await db.get_ticket(interaction.guild.id, interaction.channel.id)
             if not ticket_data:
                 await interaction.response.send_message(
                     "This is not a ticket channel.",
@@ -192,7 +192,7 @@ class Tickets(commands.Cog):
                 return
             
             # Update database
-            db.close_ticket(interaction.guild.id, interaction.channel.id)
+            await db.close_ticket(interaction.guild.id, interaction.channel.id)
             
             # Send closing message
             await interaction.response.send_message(
@@ -213,7 +213,7 @@ class Tickets(commands.Cog):
     async def close(self, ctx):
         """Close a ticket channel"""
         # Check if this is a ticket channel
-        ticket_data = db.get_ticket(ctx.guild.id, ctx.channel.id)
+        ticket_data = await db.get_ticket(ctx.guild.id, ctx.channel.id)
         if not ticket_data:
             embed = EmbedCreator.create_error_embed(
                 "Not a Ticket",
@@ -233,7 +233,7 @@ class Tickets(commands.Cog):
             return
         
         # Update database
-        db.close_ticket(ctx.guild.id, ctx.channel.id)
+        await db.close_ticket(ctx.guild.id, ctx.channel.id)
         
         # Send closing message
         embed = EmbedCreator.create_success_embed(
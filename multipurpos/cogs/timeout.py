@@ -4,6 +4,7 @@ import logging
 import datetime
 from config import CONFIG
 from utils.embed_creator import EmbedCreator
+from utils.event_stream import publish_moderation
 
 logger = logging.getLogger('discord_bot')
 
@@ -92,6 +93,7 @@ class Timeout(commands.Cog):
             # Apply timeout
             try:
                 await member.timeout(until, reason=reason)
+                publish_moderation(self.bot, ctx, 'timeout', member, reason)
                 
                 # Create timeout embed
                 embed = discord.Embed(
@@ -172,6 +174,7 @@ class Timeout(commands.Cog):
         # Remove timeout
         try:
             await member.timeout(None, reason=reason)
+            publish_moderation(self.bot, ctx, 'remove_timeout', member, reason)
             
             # Create embed
             embed = discord.Embed(
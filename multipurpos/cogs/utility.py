@@ -7,28 +7,143 @@ import asyncio
 import datetime
 import random
 import platform
+import sys
 import time
 from config import CONFIG
+from utils.guild_stats import GuildStatsTracker
+from utils.member_cache import ensure_chunked, memory_stats
+from utils import profiling
+from utils.perf import SORT_FIELDS
+from utils.rest_accounting import REPORT_FIELDS
 
 logger = logging.getLogger('discord_bot')
 
 class Utility(commands.Cog):
     """Utility commands for server management and information"""
     
+    # Guild statistics need the member cache, and emojis lists the emoji cache;
+    # presences only feed the online count
+    required_intents = ('members', 'emojis_and_stickers')
+    optional_intents = ('presences',)
+    
     def __init__(self, bot):
         self.bot = bot
         self.start_time = datetime.datetime.utcnow()
+        self.guild_stats = GuildStatsTracker()
+        self.approximate_counts = {}  # Guild ID -> (fetched at, approximate online count)
+        
+        # Let the other clusters ask for this one's botinfo numbers
+        if getattr(bot, 'cluster_ipc', None):
+            bot.cluster_ipc.register('stats', self.local_stats)
+        
         logger.info("Utility cog initialized")
     
+    def cog_unload(self):
+        if getattr(self.bot, 'cluster_ipc', None):
+            self.bot.cluster_ipc.unregister('stats')
+    
+    async def local_stats(self):
+        """Get this process's botinfo statistics
+        
+        Returns:
+            dict: servers, users (humans) and channels for the guilds on this process's shards
+        """
+        return {
+            'servers': len(self.bot.guilds),
+            'users': self.guild_stats.total_humans(self.bot.guilds),
+            'channels': sum(1 for _ in self.bot.get_all_channels())
+        }
+    
+    async def cluster_stats(self):
+        """Get botinfo statistics summed over every cluster
+        
+        Returns:
+            tuple: (stats dict, clusters that answered, total clusters)
+        """
+        ipc = getattr(self.bot, 'cluster_ipc', None)
+        if not ipc:
+            return await self.local_stats(), 1, 1
+        
+        responses = await ipc.request_all('stats')
+        answered = [stats for stats in responses.values() if stats]
+        totals = {
+            key: sum(stats[key] for stats in answered)
+            for key in ('servers', 'users', 'channels')
+        }
+        return totals, len(answered), len(responses)
+    
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        """Keep guild statistics up to date when a member joins"""
+        self.guild_stats.member_joined(member)
+    
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        """Keep guild statistics up to date when a member leaves"""
+        self.guild_stats.member_left(member)
+    
+    @commands.Cog.listener()
+    async def on_presence_update(self, before, after):
+        """Keep online counts up to date"""
+        self.guild_stats.presence_updated(before, after)
+    
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        """Keep per-role member counts up to date"""
+        self.guild_stats.member_updated(before, after)
+    
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        """Drop counts for deleted roles"""
+        self.guild_stats.role_deleted(role)
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        """Drop statistics for guilds the bot left"""
+        self.guild_stats.forget(guild.id)
+    
+    async def get_online_count(self, guild):
+        """Get a guild's online member count
+        
+        Exact when presences are enabled. Otherwise uses Discord's approximate
+        count, fetched at most once every five minutes per guild.
+        
+        Returns:
+            tuple: (count, whether it is approximate)
+        """
+        if self.bot.intents.presences:
+            return self.guild_stats.get(guild).online, False
+        
+        cached = self.approximate_counts.get(guild.id)
+        now = time.monotonic()
+        if cached and now - cached[0] < 300:
+            return cached[1], True
+        
+        try:
+            fetched = await self.bot.fetch_guild(guild.id, with_counts=True)
+            count = fetched.approximate_presence_count or 0
+        except discord.HTTPException as e:
+            logger.error(f"Error fetching approximate counts for guild {guild.id}: {e}")
+            return (cached[1], True) if cached else (None, True)
+        
+        self.approximate_counts[guild.id] = (now, count)
+        return count, True
+    
     @commands.command(name="serverinfo")
     async def server_info(self, ctx):
         """Show information about the server"""
         guild = ctx.guild
         
-        # Get member counts
+        # Get member counts from the event-maintained statistics
+        await ensure_chunked(self.bot, guild)
+        stats = self.guild_stats.get(guild)
         total_members = guild.member_count
-        online_members = len([m for m in guild.members if m.status != discord.Status.offline])
-        bot_count = len([m for m in guild.members if m.bot])
+        online_count, approximate = await self.get_online_count(guild)
+        if online_count is None:
+            online_members = "Unknown"
+        else:
+            online_members = f"~{online_count}" if approximate else online_count
+        bot_count = stats.bots
         human_count = total_members - bot_count
         
         # Get channel counts
@@ -146,7 +261,8 @@ class Utility(commands.Cog):
         member = member or ctx.author
         
         # Get join position
-        join_position = sorted(ctx.guild.members, key=lambda m: m.joined_at or datetime.datetime.utcnow()).index(member) + 1
+        await ensure_chunked(self.bot, ctx.guild)
+        join_position = self.guild_stats.get(ctx.guild).join_position(member)
         
         # Create embed
         embed = discord.Embed(
@@ -189,7 +305,7 @@ class Utility(commands.Cog):
             
             embed.add_field(
                 name="📥 Joined Server",
-                value=f"{joined_date}\n(#{join_position} to join)",
+                value=f"{joined_date}\n(#{join_position} to join)" if join_position else joined_date,
                 inline=True
             )
         
@@ -203,7 +319,8 @@ class Utility(commands.Cog):
         
         embed.add_field(
             name="📶 Status",
-            value=status_emojis.get(member.status, "Unknown"),
+            # Without presences every member looks offline
+            value=status_emojis.get(member.status, "Unknown") if self.bot.intents.presences else "Unknown",
             inline=True
         )
         
@@ -330,7 +447,7 @@ class Utility(commands.Cog):
         await message.edit(content=None, embed=embed)
     
     @commands.command(name="botinfo")
-    async def bot_info(self, ctx):
+    async def botinfo(self, ctx):
         """Show information about the bot"""
         # Calculate uptime
         uptime_delta = datetime.datetime.utcnow() - self.start_time
@@ -340,14 +457,11 @@ class Utility(commands.Cog):
         
         uptime_str = f"{days}d {hours}h {minutes}m {seconds}s"
         
-        # Get server count
-        server_count = len(self.bot.guilds)
-        
-        # Get user count (excluding bots)
-        user_count = sum(1 for m in self.bot.get_all_members() if not m.bot)
-        
-        # Get channel count
-        channel_count = sum(1 for _ in self.bot.get_all_channels())
+        # Get server, user (excluding bots) and channel counts across all clusters
+        stats, clusters_answered, cluster_count = await self.cluster_stats()
+        server_count = stats['servers']
+        user_count = stats['users']
+        channel_count = stats['channels']
         
         # Create embed
         embed = discord.Embed(
@@ -397,6 +511,17 @@ class Utility(commands.Cog):
             inline=True
         )
         
+        # Add sharding info
+        if self.bot.shard_count and self.bot.shard_count > 1:
+            shard_info = f"Shard {ctx.guild.shard_id if ctx.guild else 0} of {self.bot.shard_count}"
+            if cluster_count > 1:
+                shard_info += f"\n{clusters_answered}/{cluster_count} clusters reporting"
+            embed.add_field(
+                name="🧩 Shards",
+                value=shard_info,
+                inline=True
+            )
+        
         # Add commands count
         command_count = len(self.bot.commands)
         cog_count = len(self.bot.cogs)
@@ -430,6 +555,278 @@ class Utility(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.command(name="memstats")
+    @commands.is_owner()
+    async def memstats(self, ctx, limit: int = 10):
+        """Show cache memory usage per guild (owner only)
+        
+        Args:
+            limit: How many of the largest guilds to list
+        """
+        stats = memory_stats(self.bot)
+        
+        embed = discord.Embed(
+            title="🧠 Memory Statistics",
+            description=f"RSS: **{stats['rss'] / 1048576:.1f} MiB**\n"
+                        f"Cached members: {stats['cached_members']:,}\n"
+                        f"Cached messages: {stats['cached_messages']:,} (max {CONFIG['memory']['max_messages'] or 0:,})\n"
+                        f"Estimated cache size: {stats['estimated_bytes'] / 1048576:.1f} MiB",
+            color=CONFIG['colors']['info']
+        )
+        
+        chunked = sum(1 for guild in stats['guilds'] if guild['chunked'])
+        embed.add_field(
+            name="Guilds",
+            value=f"{len(stats['guilds'])} total, {chunked} chunked",
+            inline=False
+        )
+        
+        lines = [
+            f"`{guild['id']}` {guild['name'][:24]} - {guild['cached_members']:,}/{guild['member_count']:,} members"
+            f"{'' if guild['chunked'] else ' (not chunked)'}, {guild['cached_messages']:,} msgs, "
+            f"~{guild['estimated_bytes'] / 1048576:.1f} MiB"
+            for guild in stats['guilds'][:limit]
+        ]
+        
+        if lines:
+            value = "\n".join(lines)
+            embed.add_field(
+                name=f"Largest {len(lines)} Guilds",
+                value=value if len(value) <= 1024 else value[:1021] + "...",
+                inline=False
+            )
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name="perf")
+    @commands.is_owner()
+    async def perf(self, ctx, sort: str = "cpu", limit: int = 10):
+        """Show the listeners and commands using the most time (owner only)
+        
+        Args:
+            sort: cpu, wall, rest, max, calls, errors or slow; "reset" clears the totals
+            limit: How many handlers to list
+        """
+        profiler = getattr(self.bot, 'profiler', None)
+        if profiler is None:
+            await ctx.send("Handler profiling is disabled (`perf.enabled` in config).")
+            return
+        
+        if sort == "reset":
+            profiler.reset()
+            await ctx.send("✅ Handler timings reset.")
+            return
+        
+        if sort not in SORT_FIELDS:
+            await ctx.send(f"❌ Sort by one of: {', '.join(SORT_FIELDS)}")
+            return
+        
+        handlers = profiler.top(sort, min(max(limit, 1), 25))
+        lines = []
+        for stats in handlers:
+            other = max(stats.wall - stats.cpu - stats.rest, 0)
+            lines.append(
+                f"`{stats.label}` ({stats.kind}) {stats.calls:,} calls, "
+                f"avg {stats.wall / stats.calls * 1000:.1f}ms, max {stats.max * 1000:.0f}ms\n"
+                f"⠀cpu {stats.cpu:.2f}s · rest {stats.rest:.2f}s · other {other:.2f}s"
+                f"{f' · ⚠️ {stats.errors} errors' if stats.errors else ''}"
+                f"{f' · 🐢 {stats.slow} slow' if stats.slow else ''}"
+            )
+        
+        embed = discord.Embed(
+            title=f"⏱️ Handler Timings by {sort}",
+            description="\n".join(lines) or "No handlers have run yet.",
+            color=CONFIG['colors']['info']
+        )
+        embed.set_footer(text=f"Since {datetime.datetime.fromtimestamp(profiler.since):%Y-%m-%d %H:%M:%S} · "
+                              f"slow = over {profiler.slow_threshold * 1000:.0f}ms · "
+                              f"Bot.on_message includes the commands it runs")
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name="rest")
+    @commands.is_owner()
+    async def rest(self, ctx, sort: str = "requests"):
+        """Show which routes, cogs and guilds make the most Discord API requests (owner only)
+        
+        Args:
+            sort: requests, ratelimited, wait, time or errors
+        """
+        accountant = getattr(self.bot, 'rest_accountant', None)
+        if accountant is None:
+            await ctx.send("REST accounting is disabled (`rest_accounting.enabled` in config).")
+            return
+        
+        if sort not in REPORT_FIELDS:
+            await ctx.send(f"❌ Sort by one of: {', '.join(REPORT_FIELDS)}")
+            return
+        
+        report = accountant.report(sort)
+        started = datetime.datetime.fromtimestamp(report['start'])
+        embed = discord.Embed(
+            title=f"📡 REST Requests by {sort}",
+            description=f"**{report['requests']:,}** requests, **{report['ratelimited']:,}** rate limited "
+                        f"since {discord.utils.format_dt(started, 'R')}",
+            color=CONFIG['colors']['info']
+        )
+        
+        for section, title in (('routes', "Routes"), ('callers', "Cogs and Commands"), ('paths', "Caller → Route"), ('guilds', "Guilds")):
+            lines = [
+                f"`{entry['key'][:70]}` {entry['requests']:,} req, {entry['ratelimited']:,}×429, {entry['wait']:.1f}s wait"
+                for entry in report[section]
+            ]
+            value = "\n".join(lines) or "None"
+            embed.add_field(name=title, value=value if len(value) <= 1024 else value[:1021] + "...", inline=False)
+        
+        await ctx.send(embed=embed)
+    
+    @commands.command(name="blocking")
+    @commands.is_owner()
+    async def blocking(self, ctx, sort: str = "total", limit: int = 10):
+        """Show the code that blocked the event loop the most (owner only)
+        
+        Args:
+            sort: total, count or max; "reset" clears the hotspots
+            limit: How many hotspots to list
+        """
+        watchdog = getattr(self.bot, 'watchdog', None)
+        if watchdog is None:
+            await ctx.send("The loop watchdog is disabled (`watchdog.enabled` in config).")
+            return
+        
+        if sort == "reset":
+            watchdog.reset()
+            await ctx.send("✅ Blocking hotspots reset.")
+            return
+        
+        if sort not in ("total", "count", "max"):
+            await ctx.send("❌ Sort by one of: total, count, max")
+            return
+        
+        lines = [
+            f"`{hotspot.location[-80:]}`\n⠀{hotspot.count:,} blocks, {hotspot.total:.2f}s total, "
+            f"worst {hotspot.max * 1000:.0f}ms, last in `{hotspot.task}`"
+            for hotspot in watchdog.top(min(max(limit, 1), 20), sort)
+        ]
+        
+        embed = discord.Embed(
+            title=f"🧱 Event Loop Blocking by {sort}",
+            description="\n".join(lines) or "The loop has not been blocked.",
+            color=CONFIG['colors']['info']
+        )
+        embed.set_footer(text=f"{watchdog.blocks:,} blocks over {watchdog.threshold * 1000:.0f}ms since "
+                              f"{datetime.datetime.fromtimestamp(watchdog.since):%Y-%m-%d %H:%M:%S}; stacks are in the log")
+        
+        await ctx.send(embed=embed)
+    
+    def _profile_window(self, seconds):
+        """Clamp a profiling window to 1s..profiling.max_seconds"""
+        return min(max(seconds, 1), CONFIG['profiling']['max_seconds'])
+    
+    @commands.command(name="profile")
+    @commands.is_owner()
+    async def profile(self, ctx, seconds: int = 30, mode: str = "sample"):
+        """Profile the running bot's CPU use for a while (owner only)
+        
+        Args:
+            seconds: How long to profile
+            mode: sample (stack sampling, low overhead) or cprofile (exact call counts, slows the bot)
+        """
+        if mode not in ("sample", "cprofile"):
+            await ctx.send("❌ Mode must be `sample` or `cprofile`")
+            return
+        if mode == "sample" and not hasattr(sys, '_current_frames'):
+            mode = "cprofile"  # Stacks can only be sampled on CPython
+        
+        seconds = self._profile_window(seconds)
+        size_limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        stamp = f"{datetime.datetime.now():%Y%m%d-%H%M%S}"
+        await ctx.send(f"🔬 Profiling ({mode}) for {seconds}s...")
+        
+        try:
+            if mode == "sample":
+                result = await profiling.sample_stacks(seconds, CONFIG['profiling']['sample_interval_ms'] / 1000)
+                summary, collapsed = await asyncio.to_thread(lambda: (result.summary(), result.collapsed()))
+                files = [
+                    profiling.attachment(f"profile-{stamp}.txt", summary, size_limit),
+                    profiling.attachment(f"profile-{stamp}.collapsed", collapsed, size_limit)
+                ]
+            else:
+                result = await profiling.profile_calls(seconds)
+                summary, dump = await asyncio.to_thread(profiling.call_report, result)
+                files = [
+                    profiling.attachment(f"profile-{stamp}.txt", summary, size_limit),
+                    profiling.attachment(f"profile-{stamp}.prof", dump, size_limit)
+                ]
+        except profiling.ProfileBusy:
+            await ctx.send("❌ Another profile (or profiler) is already running.")
+            return
+        
+        logger.info(f"{ctx.author} profiled the bot ({mode}) for {seconds}s")
+        await ctx.send(
+            "✅ Profile done. Open the `.collapsed` file in speedscope or flamegraph.pl."
+            if mode == "sample" else "✅ Profile done. Open the `.prof` file in snakeviz or gprof2dot.",
+            files=files
+        )
+    
+    @commands.command(name="memprofile")
+    @commands.is_owner()
+    async def memprofile(self, ctx, seconds: int = 60):
+        """Show what allocated memory that is still held after a while (owner only)
+        
+        Args:
+            seconds: Window between the two tracemalloc snapshots
+        """
+        seconds = self._profile_window(seconds)
+        size_limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+        stamp = f"{datetime.datetime.now():%Y%m%d-%H%M%S}"
+        await ctx.send(f"🔬 Tracing memory allocations for {seconds}s...")
+        
+        try:
+            result = await profiling.memory_diff(seconds, CONFIG['profiling']['memory_frames'])
+        except profiling.ProfileBusy:
+            await ctx.send("❌ Another profile is already running.")
+            return
+        
+        summary, collapsed = await asyncio.to_thread(lambda: (result.summary(), result.collapsed()))
+        
+        logger.info(f"{ctx.author} profiled memory for {seconds}s")
+        await ctx.send(
+            "✅ Memory profile done. The `.collapsed` file is weighted by bytes.",
+            files=[
+                profiling.attachment(f"memprofile-{stamp}.txt", summary, size_limit),
+                profiling.attachment(f"memprofile-{stamp}.collapsed", collapsed, size_limit)
+            ]
+        )
+    
+    @commands.command(name="leader")
+    @commands.is_owner()
+    async def leader(self, ctx):
+        """Show this process's singleton lease status (owner only)"""
+        elector = getattr(self.bot, 'leader', None)
+        if elector is None:
+            await ctx.send("Leader election is disabled; singleton loops run in every process.")
+            return
+        
+        metrics = elector.metrics
+        if elector.is_leader:
+            status = f"👑 Leader since {discord.utils.format_dt(datetime.datetime.fromtimestamp(metrics['leader_since']), 'R')} (token {elector.token})"
+        else:
+            status = "Standby"
+        
+        handover = metrics['last_handover_seconds']
+        embed = discord.Embed(
+            title="🗳️ Leader Election",
+            description=f"**{status}**\nHolder ID: `{elector.holder}`\nLease: `{elector.name}`",
+            color=CONFIG['colors']['info']
+        )
+        embed.add_field(name="Renewals", value=f"{metrics['renewals']:,} ok, {metrics['renewal_failures']:,} failed", inline=True)
+        embed.add_field(name="Elections", value=f"{metrics['elections_won']:,} won, {metrics['leases_lost']:,} lost", inline=True)
+        embed.add_field(name="Last Handover", value=f"{handover:.1f}s" if handover is not None else "None", inline=True)
+        embed.add_field(name="Singleton Loops", value=", ".join(loop.coro.__name__ for loop in elector.loops) or "None", inline=False)
+        
+        await ctx.send(embed=embed)
+    
     @commands.command(name="roleinfo")
     async def role_info(self, ctx, *, role: discord.Role):
         """Show information about a role
@@ -438,7 +835,11 @@ class Utility(commands.Cog):
             role: The role to show info for
         """
         # Get member count with this role
-        member_count = len(role.members)
+        if role.is_default():
+            member_count = ctx.guild.member_count
+        else:
+            await ensure_chunked(self.bot, ctx.guild)
+            member_count = self.guild_stats.get(ctx.guild).role_member_count(role.id)
         
         # Create embed
         embed = discord.Embed(
@@ -534,99 +935,6 @@ class Utility(commands.Cog):
         
         await ctx.send(embed=embed)
     
-    @commands.command(name="channelinfo")
-    async def channel_info(self, ctx, channel: discord.TextChannel = None):
-        """Show information about a channel
-        
-        Args:
-            channel: The channel to show info for (defaults to current channel)
-        """
-        # Default to the current channel if none specified
-        channel = channel or ctx.channel
-        
-        # Create embed
-        embed = discord.Embed(
-            title=f"#{channel.name} Channel Information",
-            description=channel.topic or "No topic set",
-            color=CONFIG['colors']['info']
-        )
-        
-        # Add channel ID
-        embed.add_field(
-            name="🆔 Channel ID",
-            value=channel.id,
-            inline=True
-        )
-        
-        # Add category
-        embed.add_field(
-            name="📁 Category",
-            value=channel.category.name if channel.category else "None",
-            inline=True
-        )
-        
-        # Add creation date
-        created_timestamp = int(channel.created_at.timestamp())
-        created_date = f"<t:{created_timestamp}:F>\n<t:{created_timestamp}:R>"
-        
-        embed.add_field(
-            name="📅 Created",
-            value=created_date,
-            inline=True
-        )
-        
-        # Add position
-        embed.add_field(
-            name="📊 Position",
-            value=channel.position,
-            inline=True
-        )
-        
-        # Add slowmode
-        slowmode = channel.slowmode_delay
-        if slowmode > 0:
-            # Format slowmode (e.g. 5s, 1m, 1h)
-            if slowmode < 60:
-                slowmode_str = f"{slowmode}s"
-            elif slowmode < 3600:
-                slowmode_str = f"{slowmode // 60}m"
-            else:
-                slowmode_str = f"{slowmode // 3600}h"
-        else:
-            slowmode_str = "Off"
-            
-        embed.add_field(
-            name="⏱️ Slowmode",
-            value=slowmode_str,
-            inline=True
-        )
-        
-        # Add NSFW status
-        embed.add_field(
-            name="🔞 NSFW",
-            value="Yes" if channel.is_nsfw() else "No",
-            inline=True
-        )
-        
-        # Add news status (if applicable)
-        if hasattr(channel, 'is_news'):
-            embed.add_field(
-                name="📰 Announcement Channel",
-                value="Yes" if channel.is_news() else "No",
-                inline=True
-            )
-        
-        # Add permission synced status
-        if hasattr(channel, 'permissions_synced'):
-            synced = await channel.permissions_synced() if callable(channel.permissions_synced) else channel.permissions_synced
-            embed.add_field(
-                name="🔄 Synced Permissions",
-                value="Yes" if synced else "No",
-                inline=True
-            )
-        
-        await ctx.send(embed=embed)
-    
     @commands.command(name="emojis")
     async def emojis(self, ctx):
         """Show all emojis in the server"""
@@ -4,6 +4,8 @@ import logging
 import json
 import os
 from config import CONFIG
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
 
 logger = logging.getLogger('discord_bot')
 
@@ -13,7 +15,7 @@ class Welcome(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.welcome_settings = {}
-        self.data_file = 'data/welcome_settings.json'
+        self.data_file = data_path('data/welcome_settings.json')
         
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
@@ -21,14 +23,17 @@ class Welcome(commands.Cog):
         # Load settings
         self.load_settings()
         
+        # Welcome settings are snapshotted for faster startups
+        if getattr(bot, 'store_snapshots', None):
+            bot.store_snapshots.register(self.data_file, lambda: self.welcome_settings, 'Welcome')
+        
         logger.info("Welcome cog initialized")
         
     def load_settings(self):
         """Load welcome settings from file"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    self.welcome_settings = json.load(f)
+                self.welcome_settings = load_json_store(self.data_file)
             else:
                 self.welcome_settings = {}
                 self.save_settings()
@@ -21,6 +21,143 @@ CONFIG = {
         'channel_management',
         'direct_moderation'
     ],
+    # Cogs that must be loaded after others - format: {cog: [cogs it needs first]}
+    # Cogs not listed here are loaded concurrently
+    'cog_dependencies': {},
+    'memory': {
+        'budget_mode': False,  # Chunk guild members on first use instead of at startup
+        'max_messages': 1000,  # Messages kept in the cache (None disables it; deleted/edited
+                               # message logs only see cached messages)
+        'member_cache': None   # Override member cache flags, e.g. {'joined': True, 'voice': False}
+    },
+    'gateway': {
+        'plan_intents': True,  # Request only the intents the loaded cogs need (see utils/intents_planner.py)
+        'presences': True      # Presence updates are most of the gateway traffic; when False,
+                               # online counts fall back to Discord's approximate counts
+    },
+    'sharding': {
+        'enabled': False,      # Run an AutoShardedBot (always on for processes started by cluster.py)
+        'shard_count': None,   # Total shards; None uses Discord's recommendation
+        'clusters': 1,         # Processes cluster.py starts, each owning a contiguous range of shards
+        'data_root': 'clusters',  # Per-cluster data directories, so clusters never share a file
+        'ipc_dir': 'ipc'       # Unix sockets clusters use to share stats (e.g. for botinfo)
+    },
+    'storage': {
+        'backend': 'json',     # 'json' for the local files, or 'redis' to share state between processes
+                               # and the dashboard through a Redis-protocol server
+        'redis_url': 'redis://127.0.0.1:6379/0',  # Overridden by the REDIS_URL environment variable
+        'redis_prefix': 'bot:',
+        'sql': {
+            'enabled': False,  # Also write XP, message and invite counters to the dashboard's SQL database
+            'url': None,       # Defaults to DATABASE_URL, then the dashboard's SQLite file
+            'flush_interval_ms': 500,  # Counter updates are batched into one upsert per table this often
+            'max_batch': 500,  # Rows per statement; a backlog this size flushes early
+            'pool_size': 5,
+            'max_overflow': 5,
+            'seed_on_start': True  # Copy every guild's current counters to SQL once the bot is ready
+        },
+        'snapshots': {
+            'enabled': True,   # Keep a binary snapshot next to each JSON store and start from it while it matches
+            'interval': 600    # Seconds between snapshots; one is also written when the bot closes
+        }
+    },
+    'leader': {
+        'enabled': True,       # Run singleton loops (e.g. giveaway checks) only in the process holding the lease;
+                               # processes sharing a data directory compete for it, or every cluster with Redis storage
+        'ttl': 15,             # Seconds before a silent leader's lease expires and another process takes over
+        'renew_interval': 5    # Seconds between lease renewals and takeover attempts
+    },
+    'supervisor': {            # run_bot.py
+        'log_file': 'logs/bot.log',
+        'max_bytes': 10 * 1024 * 1024,  # Rotate the log at this size
+        'backup_count': 5,     # Rotated logs kept
+        'echo': True,          # Also print the bot's output to the console
+        'min_backoff': 1,      # Seconds before the first restart; doubles per quick crash
+        'max_backoff': 300,
+        'stable_after': 120,   # Uptime after which a crash counts as the first again
+        'stop_timeout': 30,    # Seconds the bot gets to close and flush storage after SIGTERM
+        'heartbeat_file': 'logs/heartbeat.json',
+        'heartbeat_interval': 5,
+        'hang_timeout': 90,    # Restart the bot when its heartbeat is this old (e.g. a blocked event loop)
+        'startup_timeout': 300,
+        'health_host': '127.0.0.1',
+        'health_port': 8081    # /healthz and /readyz
+    },
+    'dashboard_api': {
+        'publish': False,      # Write the snapshot the dashboard API reads (utils/snapshot.py); costs a copy of
+                               # each guild's leaderboard data every snapshot_interval
+        'snapshot_file': 'data/dashboard_snapshot.json',
+        'snapshot_interval': 30,  # Seconds between snapshots
+        'leaderboard_size': 1000,  # Entries kept per leaderboard
+        'page_size': 50,
+        'max_page_size': 200,
+        'cache_ttl': {         # Seconds responses are cached, per endpoint
+            'default': 15,
+            'guilds': 60,
+            'giveaways': 5
+        },
+        'cache_entries': 2048
+    },
+    'events': {
+        'enabled': True,       # Publish live activity for the dashboard's event stream (utils/event_stream.py)
+        'publisher_queue': 1000,  # Events buffered per dashboard worker before the oldest are dropped
+        'client_buffer': 256,  # Events buffered per browser before the oldest are dropped
+        'host': '127.0.0.1',   # events_server.py serves /api/v1/events here, behind the dashboard's reverse proxy
+        'port': 5001,
+        'max_streams': 5000,   # Streams open at once before new ones get a 503; each costs a socket and
+                               # up to client_buffer events of memory, not a thread
+        'keepalive': 15        # Seconds between keep-alive comments on idle streams
+    },
+    'metrics': {
+        'enabled': True,       # Collect Prometheus-style metrics (see utils/metrics.py)
+        'host': '127.0.0.1',   # The bot serves them at http://host:port/metrics
+        'port': 9108           # Cluster processes add their cluster id; None disables the endpoint
+    },
+    'watchdog': {
+        'enabled': True,       # Capture the stack when synchronous code blocks the event loop (see utils/watchdog.py)
+        'threshold_ms': 100,   # Loop lag that counts as blocked
+        'interval': 0.1,       # Seconds between loop lag samples
+        'log_interval': 60     # Seconds between full stack logs for the same hotspot
+    },
+    'startup': {
+        # Seconds each phase of `discord_bot.py --startup-report` may take before it warns (see utils/startup.py)
+        'budgets': {
+            'imports': 2.0,
+            'cog_setup': 2.0,
+            'per_cog': 0.5,
+            'views': 0.2,
+            'login': 3.0,
+            'ready': 10.0,
+            'chunking': 30.0
+        }
+    },
+    'profiling': {
+        'max_seconds': 120,    # Longest window .profile and .memprofile accept (see utils/profiling.py)
+        'sample_interval_ms': 10,  # Stack sampling period for .profile
+        'memory_frames': 15    # Stack depth tracemalloc records per allocation for .memprofile
+    },
+    'perf': {
+        'enabled': False,      # Time every listener and command (see utils/perf.py and .perf). A diagnostic
+                               # layer on every event; the listener latency metric, .profile and
+                               # .memprofile work without it
+        'slow_threshold_ms': 250,  # Log handlers slower than this
+        'slow_log_interval': 10    # Seconds between slow logs for the same handler
+    },
+    'rest_accounting': {
+        'enabled': True,       # Attribute Discord API requests to routes, cogs and guilds (see utils/rest_accounting.py)
+        'report_interval': 3600,  # Seconds per window; each window is logged as a top-N report
+        'top_n': 10
+    },
+    'tracing': {
+        'enabled': False,      # Trace gateway events through listeners, storage and REST (see utils/tracing.py);
+                               # a diagnostic layer on every event, so turn it on while investigating
+        'file': 'logs/traces.jsonl',  # Exported spans; cluster processes add their cluster id
+        'otlp_url': None,      # Post to an OTLP/HTTP collector instead, e.g. 'http://127.0.0.1:4318/v1/traces'
+        'sample_rate': 0.01,   # Share of traces exported regardless of speed
+        'slow_threshold_ms': 500,  # Traces with a span this slow (or a failed one) are always exported
+        'linger': 2,           # Seconds a finished trace waits for late tasks (e.g. view callbacks)
+        'ignore_events': ['PRESENCE_UPDATE', 'TYPING_START', 'GUILD_MEMBERS_CHUNK']
+    },
     'colors': {
         'default': 0x5865F2,  # Discord Blurple
         'success': 0x57F287,  # Green
@@ -1,47 +1,410 @@
 import os
+import sys
+import time
+from utils.startup import StartupReport, report_requested
+
+# Before the other imports, so they are timed too
+startup_report = StartupReport.start() if __name__ == "__main__" and report_requested() else None
+
+import argparse
 import discord
 import asyncio
 import logging
+import signal
 from discord.ext import commands
 from config import CONFIG
+from utils.extensions import load_extensions
+from utils.intents_planner import plan_intents, enabled_flags
+from utils.cluster import ClusterInfo, ClusterIPC, format_shard_ids
+from utils.fake_discord import FAKE_DISCORD_ENV, use_fake_discord
+from utils.leader import LEASE_FILE, SINGLETON_LEASE, LeaderElector, RedisLeaseStore, SQLiteLeaseStore
+from utils.metrics import GATEWAY_EVENTS, GATEWAY_LATENCY, GUILDS, LISTENER_SECONDS, QUEUE_DEPTH, MetricsServer
+from utils.perf import HandlerProfiler, handler_cog, handler_scope
+from utils.rest_accounting import RestAccountant, instrument_http
+from utils.watchdog import LoopWatchdog
+from utils.tracing import JsonlSpanExporter, OtlpSpanExporter, Tracer, span, traced
+from utils.event_stream import EventPublisher, events_socket_path
+from utils.snapshot import SnapshotPublisher
+from utils.store_snapshot import StoreSnapshots
+from utils.storage import data_path
+from utils.supervisor import EXIT_CONFIG_ERROR, HEARTBEAT_ENV, write_heartbeats
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('discord_bot')
 
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Discord Intents configuration
-intents = discord.Intents.default()
-intents.members = True
-intents.message_content = True
-intents.presences = True
-intents.guilds = True
-intents.invites = True
-intents.reactions = True
+if CONFIG['gateway']['plan_intents']:
+    # Only what the configured cogs listen for or declare
+    intents_plan = plan_intents(CONFIG['cogs'], include_optional=CONFIG['gateway']['presences'])
+    intents = intents_plan.intents
+    member_cache_flags = intents_plan.member_cache_flags
+    logger.info(f"Planned gateway intents: {', '.join(enabled_flags(intents))}")
+else:
+    intents = discord.Intents.default()
+    intents.members = True
+    intents.message_content = True
+    intents.presences = CONFIG['gateway']['presences']
+    intents.guilds = True
+    intents.invites = True
+    intents.reactions = True
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
+if CONFIG['memory']['member_cache'] is not None:
+    member_cache_flags = discord.MemberCacheFlags(**CONFIG['memory']['member_cache'])
+
+class MultipurposeBotMixin:
+    """Loads the cogs once, before connecting to the gateway, and joins the
+    cluster IPC channel when started by the cluster launcher"""
+    
+    def __init__(self, *, cluster=None, startup_report=None, **kwargs):
+        super().__init__(**kwargs)
+        self.extension_load_results = []
+        self.cluster = cluster
+        self.startup_report = startup_report
+        self.cluster_ipc = ClusterIPC(cluster) if cluster else None
+        self.sql_writer = None
+        self.sql_seed_task = None
+        
+        # Prometheus-style metrics (utils/metrics.py), served on a local port
+        self.collect_metrics = CONFIG['metrics']['enabled']
+        self.metrics_server = None
+        if self.collect_metrics and CONFIG['metrics']['port'] is not None:
+            port = CONFIG['metrics']['port'] + (cluster.cluster_id if cluster else 0)
+            self.metrics_server = MetricsServer(CONFIG['metrics']['host'], port)
+        
+        # Loop lag, and the stacks of whatever blocks the loop, shown by .blocking
+        self.watchdog = None
+        if CONFIG['watchdog']['enabled']:
+            self.watchdog = LoopWatchdog(
+                threshold_ms=CONFIG['watchdog']['threshold_ms'],
+                interval=CONFIG['watchdog']['interval'],
+                log_interval=CONFIG['watchdog']['log_interval']
+            )
+        
+        # Discord API requests by route, caller and guild, shown by .rest
+        self.rest_accountant = None
+        if CONFIG['rest_accounting']['enabled']:
+            self.rest_accountant = RestAccountant(
+                self,
+                top_n=CONFIG['rest_accounting']['top_n'],
+                report_interval=CONFIG['rest_accounting']['report_interval']
+            )
+        if self.collect_metrics or self.rest_accountant:
+            # Read when the HTTP session is created at login
+            self.http.http_trace = instrument_http(self, self.rest_accountant)
+        
+        # Listener and command timing, shown by .perf
+        self.profiler = None
+        if CONFIG['perf']['enabled']:
+            self.profiler = HandlerProfiler(CONFIG['perf']['slow_threshold_ms'], CONFIG['perf']['slow_log_interval'])
+            self.profiler.instrument_http(self)
+        
+        # Spans from each gateway event to the REST calls it causes
+        self.tracer = None
+        if CONFIG['tracing']['enabled']:
+            self.tracer = self.create_tracer(cluster)
+            self.tracer.instrument_gateway(self)
+            self.tracer.instrument_http(self)
+        
+        # Live activity for the dashboard; cogs publish through utils.event_stream.publish_event
+        self.events = None
+        if CONFIG['events']['enabled']:
+            self.events = EventPublisher(events_socket_path(cluster), CONFIG['events']['publisher_queue'])
+        
+        # Cogs register extra snapshot sections while loading, so this exists first
+        self.snapshot = None
+        if CONFIG['dashboard_api']['publish']:
+            self.snapshot = SnapshotPublisher(
+                self,
+                interval=CONFIG['dashboard_api']['snapshot_interval'],
+                leaderboard_size=CONFIG['dashboard_api']['leaderboard_size']
+            )
+        
+        # Cogs register their JSON stores while loading, to start from binary snapshots of them
+        self.store_snapshots = None
+        if CONFIG['storage']['snapshots']['enabled']:
+            self.store_snapshots = StoreSnapshots(CONFIG['storage']['snapshots']['interval'])
+        
+        # Processes sharing a data directory would otherwise all run the singleton loops
+        self.leader = None
+        if CONFIG['leader']['enabled']:
+            self.leader = LeaderElector(
+                self.create_lease_store(),
+                SINGLETON_LEASE,
+                ttl=CONFIG['leader']['ttl'],
+                renew_interval=CONFIG['leader']['renew_interval']
+            )
+    
+    async def seed_sql_counters(self):
+        """Copy every guild's current counters to SQL, once the guilds are known"""
+        from utils.database import db
+        from utils.sql_store import SEED_PAGE_SIZE
+        await self.wait_until_ready()
+        
+        rows = 0
+        for guild in list(self.guilds):
+            # A page at a time, yielding between pages, so a large guild doesn't hold up the loop
+            offset, more = 0, True
+            try:
+                while more:
+                    queued, more = await db.seed_page(guild.id, offset, SEED_PAGE_SIZE)
+                    rows += queued
+                    offset += SEED_PAGE_SIZE
+                    await asyncio.sleep(0)
+            except Exception as e:
+                logger.error(f"Could not seed SQL counters for guild {guild.id}: {e}")
+        logger.info(f"Seeded {rows:,} SQL counter rows for {len(self.guilds)} guilds")
+    
+    @staticmethod
+    def create_lease_store():
+        """Keep the lease wherever the data the singleton loops write is shared
+        
+        With Redis storage every cluster works on the same giveaways, so they
+        all compete for one lease on the server. JSON data is partitioned per
+        cluster, so the lease is too: it only stops processes sharing a
+        cluster's data root from running the loops twice.
+        """
+        storage = CONFIG['storage']
+        if storage['backend'] == 'redis':
+            from utils.redis_database import get_redis_client
+            return RedisLeaseStore(get_redis_client(), storage['redis_prefix'])
+        return SQLiteLeaseStore(data_path(LEASE_FILE))
+    
+    @staticmethod
+    def create_tracer(cluster):
+        settings = CONFIG['tracing']
+        if settings['otlp_url']:
+            exporter = OtlpSpanExporter(settings['otlp_url'])
+        else:
+            name, extension = os.path.splitext(settings['file'])
+            trace_file = f"{name}-{cluster.cluster_id}{extension}" if cluster else settings['file']
+            exporter = JsonlSpanExporter(os.path.join(BOT_DIR, trace_file))
+        return Tracer(
+            exporter,
+            sample_rate=settings['sample_rate'],
+            slow_threshold_ms=settings['slow_threshold_ms'],
+            linger=settings['linger'],
+            ignore_events=settings['ignore_events']
+        )
+    
+    async def setup_hook(self):
+        """Load all cogs before the first gateway event is dispatched
+        
+        Unlike on_ready, this runs exactly once per process, not again after
+        every reconnect.
+        """
+        if self.startup_report:
+            self.startup_report.mark('setup_hook')
+        
+        # First, so blocking cog setup is caught too
+        if self.watchdog:
+            self.watchdog.start()
+        if self.tracer:
+            self.tracer.start()
+        if self.rest_accountant:
+            self.rest_accountant.start()
+        
+        self.extension_load_results = await load_extensions(
+            self,
+            CONFIG['cogs'],
+            dependencies=CONFIG.get('cog_dependencies')
+        )
+        if self.startup_report:
+            self.startup_report.extensions = self.extension_load_results
+        
+        # Cogs register their IPC handlers while loading
+        if self.cluster_ipc:
+            await self.cluster_ipc.start()
+        if self.events:
+            await self.events.start()
+        
+        # Cogs registered their singleton loops while loading
+        if self.leader:
+            self.leader.start()
+        
+        # Set when storage.sql is enabled
+        from utils.database import db
+        self.sql_writer = getattr(db, 'writer', None)
+        if self.sql_writer:
+            await self.sql_writer.start()
+            if CONFIG['storage']['sql']['seed_on_start']:
+                self.sql_seed_task = asyncio.create_task(self.seed_sql_counters())
+        
+        if self.snapshot:
+            self.snapshot.start()
+        
+        # None until the database is first used, so an unloaded database isn't snapshotted
+        if self.store_snapshots:
+            if hasattr(db, 'db_file'):
+                self.store_snapshots.register(db.db_file, lambda: db._data, 'database')
+            self.store_snapshots.start()
+        
+        if self.collect_metrics:
+            self.register_metrics()
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not serve metrics on port {self.metrics_server.port}: {e}")
+                self.metrics_server = None
+        
+        if self.startup_report:
+            self.startup_report.mark('setup_hook_done')
+    
+    async def login(self, token):
+        if self.startup_report:
+            self.startup_report.mark('login')
+        await super().login(token)
+        if self.startup_report:
+            self.startup_report.mark('login_done')
+    
+    async def connect(self, *, reconnect=True):
+        if self.startup_report:
+            self.startup_report.mark('connect')
+        await super().connect(reconnect=reconnect)
+    
+    def add_view(self, view, *, message_id=None):
+        if not self.startup_report or self.startup_report.finished:
+            return super().add_view(view, message_id=message_id)
+        start = time.perf_counter()
+        super().add_view(view, message_id=message_id)
+        self.startup_report.add_view_time(time.perf_counter() - start)
+    
+    def register_metrics(self):
+        """Read the bot's own gauges at scrape time"""
+        GUILDS.labels().set_function(lambda: len(self.guilds))
+        GATEWAY_LATENCY.labels().set_function(lambda: self.latency)
+        if self.events:
+            QUEUE_DEPTH.labels('events').set_function(lambda: self.events.backlog)
+        if self.sql_writer:
+            QUEUE_DEPTH.labels('sql_counters').set_function(lambda: self.sql_writer.pending)
+    
+    def dispatch(self, event, /, *args, **kwargs):
+        # Dispatched for every gateway event, before it is parsed
+        if event == 'socket_event_type' and self.collect_metrics:
+            GATEWAY_EVENTS.labels(args[0]).inc()
+        if self.startup_report and not self.startup_report.finished:
+            self.record_startup(event, args)
+        super().dispatch(event, *args, **kwargs)
+    
+    def record_startup(self, event, args):
+        """Mark the first READY, and print the startup report at the first on_ready"""
+        if event == 'socket_event_type' and args[0] == 'READY':
+            self.startup_report.mark('READY')
+        elif event == 'ready':
+            print(self.startup_report.finish(CONFIG['startup']['budgets']), flush=True)
+    
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        """Run a listener, named for REST accounting, timed for the metrics and the profiler, and traced"""
+        cog = handler_cog(coro)
+        if self.tracer:
+            coro = traced(coro, f"listener {cog}.{event_name}")
+        if self.profiler:
+            coro = self.profiler.wrap_listener(coro, event_name, cog)
+        
+        with handler_scope(cog, event_name):
+            if not self.collect_metrics:
+                return await super()._run_event(coro, event_name, *args, **kwargs)
+            
+            start = time.perf_counter()
+            try:
+                await super()._run_event(coro, event_name, *args, **kwargs)
+            finally:
+                LISTENER_SECONDS.labels(cog, event_name).observe(time.perf_counter() - start)
+    
+    async def invoke(self, ctx):
+        """Run a command, named for REST accounting, timed by the profiler and traced"""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        
+        cog = ctx.cog.qualified_name if ctx.cog else 'bot'
+        name = ctx.command.qualified_name
+        guild_id = ctx.guild.id if ctx.guild else None
+        with handler_scope(cog, name), span(f"command {name}", guild_id=guild_id) as command_span:
+            if self.profiler:
+                await self.profiler.run(super().invoke(ctx), 'command', cog, name, guild_id)
+            else:
+                await super().invoke(ctx)
+            
+            # Command errors go to on_command_error instead of propagating
+            if ctx.command_failed:
+                command_span.fail("command failed")
+                if self.profiler:
+                    self.profiler.add_error('command', cog, name)
+    
+    async def close(self):
+        if self.metrics_server:
+            await self.metrics_server.close()
+        if self.snapshot:
+            await self.snapshot.stop()
+        if self.store_snapshots:
+            await self.store_snapshots.stop()
+        if self.leader:
+            await self.leader.stop()
+        if self.cluster_ipc:
+            await self.cluster_ipc.close()
+        if self.events:
+            await self.events.close()
+        if self.sql_seed_task:
+            self.sql_seed_task.cancel()
+        if self.sql_writer:
+            await self.sql_writer.close()
+        if self.tracer:
+            await self.tracer.close()
+        if self.rest_accountant:
+            await self.rest_accountant.close()
+        if self.watchdog:
+            await self.watchdog.stop()
+        await super().close()
 
-# Initialize the bot
-bot = commands.Bot(command_prefix=CONFIG['prefix'], intents=intents, help_command=None)
+class MultipurposeBot(MultipurposeBotMixin, commands.Bot):
+    """Single-shard bot"""
+
+class ShardedMultipurposeBot(MultipurposeBotMixin, commands.AutoShardedBot):
+    """Bot running several shards in one process"""
+
+# Shards: all of them when sharding is enabled, or the range the cluster launcher assigned
+cluster = ClusterInfo.from_env()
+if cluster:
+    bot_class = ShardedMultipurposeBot
+    shard_options = {'shard_ids': cluster.shard_ids, 'shard_count': cluster.shard_count}
+    logger.info(f"Running as cluster {cluster.cluster_id} with shards {format_shard_ids(cluster.shard_ids)} of {cluster.shard_count}")
+elif CONFIG['sharding']['enabled']:
+    bot_class = ShardedMultipurposeBot
+    shard_options = {'shard_count': CONFIG['sharding']['shard_count']}
+else:
+    bot_class = MultipurposeBot
+    shard_options = {}
+
+# Initialize the bot; the status is sent with IDENTIFY so it survives reconnects
+bot = bot_class(
+    command_prefix=CONFIG['prefix'],
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    # In memory budget mode guilds are chunked on demand by utils.member_cache.ensure_chunked
+    chunk_guilds_at_startup=not CONFIG['memory']['budget_mode'],
+    max_messages=CONFIG['memory']['max_messages'],
+    help_command=None,
+    activity=discord.Activity(
+        type=discord.ActivityType.watching,
+        name=f"for {CONFIG['prefix']}help"
+    ),
+    cluster=cluster,
+    startup_report=startup_report,
+    **shard_options
+)
 
 # Event: Bot is ready
 @bot.event
 async def on_ready():
     logger.info(f'Bot logged in as {bot.user.name} (ID: {bot.user.id})')
     logger.info(f'Running with prefix: {CONFIG["prefix"]}')
-    
-    # Load all cogs
-    for extension in CONFIG['cogs']:
-        try:
-            await bot.load_extension(f'cogs.{extension}')
-            logger.info(f'Loaded extension: {extension}')
-        except Exception as e:
-            logger.error(f'Failed to load extension {extension}: {e}')
-    
-    # Set the bot's status
-    await bot.change_presence(activity=discord.Activity(
-        type=discord.ActivityType.watching, 
-        name=f"for {CONFIG['prefix']}help"
-    ))
-    
+    if bot.cluster:
+        logger.info(f'Cluster {bot.cluster.cluster_id} ready with {len(bot.guilds)} guilds')
     logger.info('Bot is ready!')
 
 # Event: Handle command errors
@@ -61,15 +424,43 @@ async def on_command_error(ctx, error):
 
 # Run the bot
 async def main():
+    if startup_report:
+        startup_report.mark('main')
     try:
         token = os.getenv("DISCORD_TOKEN")
+        
+        # Local testing against utils/fake_discord.py instead of Discord
+        if os.getenv(FAKE_DISCORD_ENV):
+            use_fake_discord(os.getenv(FAKE_DISCORD_ENV))
+            token = token or 'fake-token'
+        
         if not token:
             logger.critical("No Discord token found in environment variables!")
-            return
+            return EXIT_CONFIG_ERROR
+        
+        # The cluster launcher and run_bot.py stop the bot with SIGTERM; close cleanly so the
+        # IPC socket is removed and storage is flushed
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass
+        
+        # Set by run_bot.py, which restarts the bot if these stop
+        if os.getenv(HEARTBEAT_ENV):
+            asyncio.create_task(write_heartbeats(bot, os.getenv(HEARTBEAT_ENV), CONFIG['supervisor']['heartbeat_interval']))
         
         await bot.start(token)
+    except discord.LoginFailure as e:
+        logger.critical(f"Failed to log in: {e}")
+        return EXIT_CONFIG_ERROR
     except Exception as e:
         logger.critical(f"Failed to start bot: {e}")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the bot")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print where startup time went once the bot is ready (see utils/startup.py)")
+    parser.parse_args()
+    sys.exit(asyncio.run(main()))
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Serve the dashboard's live event stream
+
+Reads every bot process's event socket and streams the events to browsers
+at /api/v1/events (see utils/event_stream.py):
+
+    python events_server.py
+    python events_server.py --host 127.0.0.1 --port 5001
+    curl -N 'localhost:5001/api/v1/events?guild=<guild_id>&events=level_up,moderation'
+
+The dashboard (app.py) serves the rest of /api/v1; route /api/v1/events to
+this server in the reverse proxy in front of both, with response buffering
+off. Each open stream is a coroutine here rather than a dashboard thread.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+from config import CONFIG
+from utils.event_stream import EventServer
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('discord_bot')
+
+
+async def main():
+    settings = CONFIG['events']
+    parser = argparse.ArgumentParser(description="Stream the bot's live events to dashboard browsers")
+    parser.add_argument("--host", default=settings['host'])
+    parser.add_argument("--port", type=int, default=settings['port'])
+    args = parser.parse_args()
+
+    server = EventServer(host=args.host, port=args.port, keepalive=settings['keepalive'])
+    await server.start()
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    await stopped.wait()
+    await server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
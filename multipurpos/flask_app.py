@@ -1,10 +1,13 @@
-from flask import Flask, render_template
+from flask import Flask, make_response, render_template
+
+from utils.static_assets import cacheable_page, init_static_assets
 
 app = Flask(__name__)
+init_static_assets(app)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return cacheable_page(make_response(render_template('index.html')))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
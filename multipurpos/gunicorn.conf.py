@@ -0,0 +1,54 @@
+"""Production serving profile for the dashboard
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment (WEB_CONCURRENCY,
+WEB_THREADS, PORT, ...) without editing this file.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Import the app once in the master: templates, the static asset manifest
+# and config are loaded before forking and shared copy-on-write by workers.
+# This is also what keeps main:app from starting one bot per worker.
+preload_app = True
+
+# Threaded workers: requests mostly wait on the database, so a few processes
+# with several threads each beat many single-threaded processes on memory
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+# /api/v1/events streams stay open as long as a browser is on the page, so
+# they are served by events_server.py instead of holding these threads
+
+# Keep connections open for browsers fetching the page and its assets
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+
+# Recycle workers now and then so a slow leak can't grow without bound
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = os.getenv('WEB_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+# Trust X-Forwarded-* only from the local reverse proxy (ProxyFix in app.py reads them)
+forwarded_allow_ips = os.getenv('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections
+
+    With preload_app the engine is created in the master; a pooled connection
+    inherited across fork would be shared by several processes.
+    """
+    flask_app = worker.app.wsgi()
+    extension = getattr(flask_app, 'extensions', {}).get('sqlalchemy')
+    if extension is not None:
+        with flask_app.app_context():
+            for engine in extension.engines.values():
+                engine.dispose(close=False)
@@ -0,0 +1,321 @@
+"""Load-test the bot against a simulated Discord
+
+Boots the real bot, with every cog in CONFIG['cogs'], in this process
+against utils/fake_discord.py, replays a stream of gateway events at it
+and reports how it kept up: events per second, handler latency
+percentiles, REST calls per event and rate limits hit. No token or network
+is needed, so it runs in CI:
+
+    python load_test.py --scenario messages --events 5000
+    python load_test.py --scenario joins --events 500 --rate 50
+    python load_test.py --scenario reactions --events 2000 --save storm.jsonl
+    python load_test.py --replay storm.jsonl
+    python load_test.py --scenario mixed --json results.json --fail-p99-ms 250
+
+Scenarios are described in utils/load_scenarios.py. The fake enforces
+Discord's default limits of 5 requests per 5 seconds per route and 50 per
+second overall, so a flood shows which cogs queue on rate limits. The fake
+runs on its own thread and event loop, so serving it doesn't queue behind
+the bot's handlers. All data is written to a temporary directory.
+"""
+import argparse
+import asyncio
+import collections
+import copy
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from config import CONFIG
+from utils.fake_discord import FakeDiscord, use_fake_discord
+from utils.load_scenarios import SCENARIOS, load_stream, percentile, save_stream
+from utils.storage import DATA_ROOT_ENV
+
+
+class FakeDiscordThread:
+    """Runs a FakeDiscord on its own thread and event loop"""
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fake-discord', daemon=True)
+
+    def start(self):
+        """Start serving
+
+        Returns:
+            str: The fake's base URL
+        """
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.fake.start(), self.loop).result()
+
+    async def run(self, coro):
+        """Run a coroutine on the fake's loop and wait for it from another loop"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.fake.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+async def replay(fake, stream, rate, speed):
+    """Send a stream's events to the bot
+
+    Args:
+        fake (FakeDiscord): The fake the bot is connected to
+        stream (list): (event, data, at) records
+        rate (float): Events per second for records without a time; 0 sends them as fast as possible
+        speed (float): Multiplier for the pace of records with a time
+
+    Returns:
+        int: Events that could not be sent because their shard wasn't connected
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    missed = 0
+    for index, (event, data, at) in enumerate(stream):
+        due = at / speed if at is not None else (index / rate if rate else 0)
+        delay = start + due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not await fake.send_event(event, data):
+            missed += 1
+    return missed
+
+
+async def wait_until_quiet(done, timeout, poll=0.05, settle=3):
+    """Wait until done() holds and no listener tasks are left, several polls in a row
+
+    Returns:
+        bool: False on timeout
+    """
+    deadline = time.monotonic() + timeout
+    quiet = 0
+    while time.monotonic() < deadline:
+        # discord.py names the task of every listener call after its event
+        busy = any(task.get_name().startswith('discord.py: ') for task in asyncio.all_tasks())
+        quiet = quiet + 1 if done() and not busy else 0
+        if quiet >= settle:
+            return True
+        await asyncio.sleep(poll)
+    return False
+
+
+def latency_summary(walls):
+    walls = sorted(walls)
+    return {
+        'calls': len(walls),
+        'p50_ms': round(percentile(walls, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(walls, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(walls, 0.99) * 1000, 2),
+        'max_ms': round(walls[-1] * 1000, 2) if walls else 0.0,
+    }
+
+
+def build_report(name, stream, missed, received, elapsed, completed, fake, bot):
+    """Summarize a run
+
+    Returns:
+        dict: Throughput, handler latency, REST and error figures
+    """
+    by_handler = collections.defaultdict(list)
+    by_kind = collections.defaultdict(list)
+    for kind, handler, wall in bot.profiler.samples:
+        by_handler[(kind, handler)].append(wall)
+        by_kind[kind].append(wall)
+
+    handlers = [
+        {'handler': handler, 'kind': kind, **latency_summary(walls)}
+        for (kind, handler), walls in by_handler.items()
+    ]
+    handlers.sort(key=lambda entry: entry['p99_ms'], reverse=True)
+
+    return {
+        'scenario': name,
+        'events': len(stream),
+        'events_by_type': dict(collections.Counter(event for event, _, _ in stream)),
+        'missed': missed,
+        'received': received,
+        'completed': completed,
+        'seconds': round(elapsed, 3),
+        'events_per_second': round(received / elapsed, 1) if elapsed else 0.0,
+        'listeners': latency_summary(by_kind['listener']),
+        'commands': latency_summary(by_kind['command']),
+        'handlers': handlers,
+        'handler_errors': sum(stats.errors for stats in bot.profiler.handlers.values()),
+        'rest': {
+            'calls': fake.rest_calls,
+            'per_event': round(fake.rest_calls / max(received, 1), 3),
+            'ratelimited': fake.rest_statuses.get(429, 0),
+            'statuses': {str(status): count for status, count in sorted(fake.rest_statuses.items())},
+            'routes': dict(fake.rest_routes.most_common()),
+        },
+        'loop_blocks': bot.watchdog.blocks if bot.watchdog else None,
+    }
+
+
+def print_report(report, top=10):
+    listeners, commands = report['listeners'], report['commands']
+    rest = report['rest']
+    print(f"\nScenario {report['scenario']}: {report['received']:,}/{report['events']:,} events handled in "
+          f"{report['seconds']:.2f}s = {report['events_per_second']:,.1f} events/s"
+          f"{'' if report['completed'] else ' (TIMED OUT before the bot caught up)'}")
+    print(f"Listeners: {listeners['calls']:,} calls, p50 {listeners['p50_ms']:.1f}ms, p90 {listeners['p90_ms']:.1f}ms, "
+          f"p99 {listeners['p99_ms']:.1f}ms, max {listeners['max_ms']:.1f}ms")
+    if commands['calls']:
+        print(f"Commands:  {commands['calls']:,} calls, p50 {commands['p50_ms']:.1f}ms, p99 {commands['p99_ms']:.1f}ms, "
+              f"max {commands['max_ms']:.1f}ms")
+    print(f"REST: {rest['calls']:,} calls, {rest['per_event']:.3f} per event, {rest['ratelimited']:,} rate limited, "
+          f"statuses {rest['statuses']}")
+    print(f"Handler errors: {report['handler_errors']:,}"
+          + (f", event loop blocks: {report['loop_blocks']:,}" if report['loop_blocks'] is not None else ""))
+
+    print("\nSlowest handlers by p99:")
+    for entry in report['handlers'][:top]:
+        print(f"  {entry['p99_ms']:>9.1f}ms p99 {entry['p50_ms']:>8.1f}ms p50 {entry['calls']:>7,} calls  "
+              f"{entry['handler']} ({entry['kind']})")
+    print("\nBusiest routes:")
+    for route, count in list(rest['routes'].items())[:top]:
+        print(f"  {count:>7,}  {route}")
+
+
+async def run(args):
+    data_root = tempfile.mkdtemp(prefix='bot-load-test-')
+    os.environ[DATA_ROOT_ENV] = data_root
+
+    # Keep the run off the ports, sockets and files a real bot on this host uses
+    CONFIG['metrics']['port'] = None
+    CONFIG['perf']['enabled'] = True
+    CONFIG['tracing']['file'] = os.path.join(data_root, 'traces.jsonl')
+    CONFIG['sharding']['ipc_dir'] = os.path.join(data_root, 'ipc')
+    if args.shards > 1:
+        CONFIG['sharding'].update(enabled=True, shard_count=args.shards)
+
+    fake = FakeDiscord(
+        shard_count=args.shards,
+        guilds=args.guilds,
+        members_per_guild=args.members,
+        seed=args.seed,
+        route_limit=None if args.no_rate_limits else (5, 5.0),
+        global_limit=None if args.no_rate_limits else 50,
+        response_delay=args.rest_latency_ms / 1000
+    )
+    if args.replay:
+        guilds, stream = load_stream(args.replay)
+        if guilds:
+            fake.guilds = guilds
+            fake.index_guilds()
+        name = os.path.basename(args.replay)
+    else:
+        guilds = copy.deepcopy(fake.guilds)  # Before a join raid adds members
+        stream = SCENARIOS[args.scenario](fake, args.events, random.Random(args.seed))
+        name = args.scenario
+        if args.save:
+            save_stream(args.save, stream, guilds)
+            print(f"Saved {len(stream):,} events to {args.save}")
+
+    server = FakeDiscordThread(fake)
+    use_fake_discord(server.start())
+
+    # Imported late: importing it builds the bot from CONFIG and opens the storage
+    import discord_bot
+    bot = discord_bot.bot
+
+    received = 0
+    dispatch = bot.dispatch
+
+    def counting_dispatch(event, /, *event_args, **kwargs):
+        nonlocal received
+        if event == 'socket_event_type':
+            received += 1
+        dispatch(event, *event_args, **kwargs)
+
+    bot.dispatch = counting_dispatch
+
+    report = None
+    bot_task = asyncio.create_task(bot.start('fake-token'))
+    try:
+        ready = asyncio.create_task(bot.wait_until_ready())
+        await asyncio.wait([ready, bot_task], timeout=args.timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not ready.done():
+            ready.cancel()
+            if bot_task.done():
+                bot_task.result()  # Raise why it stopped
+            raise TimeoutError(f"The bot was not ready within {args.timeout}s")
+
+        # Let startup work (invite caches, chunking) finish before measuring
+        await wait_until_quiet(lambda: fake.rest_inflight == 0, args.timeout)
+        print(f"Bot ready with {len(bot.guilds)} guilds; replaying {len(stream):,} events", flush=True)
+
+        fake.reset_rest_counts()
+        bot.profiler.reset()
+        bot.profiler.samples = []
+        if bot.watchdog:
+            bot.watchdog.reset()
+        received = 0
+
+        started = time.perf_counter()
+        missed = await server.run(replay(fake, stream, args.rate, args.speed))
+        completed = await wait_until_quiet(
+            lambda: received >= len(stream) - missed and fake.rest_inflight == 0, args.timeout
+        )
+        elapsed = time.perf_counter() - started
+
+        report = build_report(name, stream, missed, received, elapsed, completed, fake, bot)
+    finally:
+        await bot.close()
+        await asyncio.gather(bot_task, return_exceptions=True)
+        server.stop()
+        shutil.rmtree(data_root, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"\nReport written to {args.json}")
+
+    if not report['completed'] or report['missed']:
+        return 1
+    if args.fail_p99_ms is not None and report['listeners']['p99_ms'] > args.fail_p99_ms:
+        print(f"\nListener p99 {report['listeners']['p99_ms']:.1f}ms is over the {args.fail_p99_ms:g}ms budget")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the bot against a simulated Discord")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--scenario", choices=sorted(SCENARIOS), default='messages')
+    source.add_argument("--replay", help="JSONL stream to replay instead of a scenario")
+    parser.add_argument("--events", type=int, default=2000, help="events the scenario builds")
+    parser.add_argument("--rate", type=float, default=0, help="events per second; 0 sends as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay timed streams this many times faster")
+    parser.add_argument("--save", help="also write the scenario's stream to this JSONL file")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--members", type=int, default=200, help="members per guild")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rest-latency-ms", type=float, default=0, help="delay before each fake REST response")
+    parser.add_argument("--no-rate-limits", action="store_true", help="let the fake answer every REST call")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the bot to catch up")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--fail-p99-ms", type=float, help="exit 1 if listener p99 latency is over this")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's info logs")
+    args = parser.parse_args()
+
+    # Before discord_bot is imported, whose basicConfig would then do nothing
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,40 @@
-from flask import Flask, render_template
+from flask import Flask, make_response, render_template
 import threading
 import subprocess
 import os
+import sys
 import logging
 
+from utils.static_assets import cacheable_page, init_static_assets
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('main')
 
 app = Flask(__name__)
+init_static_assets(app)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return cacheable_page(make_response(render_template('index.html')))
 
 @app.route('/bot')
 def bot_info():
     return "The Discord bot is configured and running in the background."
 
 def start_discord_bot():
-    """Start the Discord bot in a separate process"""
+    """Start the Discord bot under its supervisor in a separate process
+    
+    The supervisor (run_bot.py) drains the bot's output into logs/bot.log and
+    restarts it if it crashes. Its own output is inherited rather than piped:
+    a pipe nobody reads fills up and blocks the writer.
+    """
     logger.info("Starting Discord bot...")
     try:
-        subprocess.Popen(["python", "start_discord_bot.py"], 
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT)
-        logger.info("Discord bot process started")
+        subprocess.Popen([sys.executable, "run_bot.py", "--no-echo"],
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        logger.info("Discord bot supervisor started")
     except Exception as e:
         logger.error(f"Failed to start Discord bot: {e}")
 
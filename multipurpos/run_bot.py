@@ -1,34 +1,78 @@
-import os
-import subprocess
-import threading
-import time
+"""Run the bot under a supervisor
+
+Starts discord_bot.py as a child process, keeps its output in rotating log
+files, restarts it with exponential backoff if it exits or stops
+heartbeating, and serves health endpoints:
+
+    python run_bot.py
+    python run_bot.py --health-port 8081 --no-echo
+    python run_bot.py --startup-report   # the bot logs where its startup time went
+    curl localhost:8081/healthz    # 200 while the bot is running or restarting
+    curl localhost:8081/readyz     # 200 once the bot is connected to Discord
+
+SIGTERM or Ctrl+C stops the bot gracefully (it closes and flushes storage)
+before the supervisor exits.
+"""
+import argparse
+import asyncio
 import logging
+import os
+import signal
+import sys
+
+from config import CONFIG
+from utils.startup import STARTUP_REPORT_ENV
+from utils.supervisor import BotSupervisor
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger('bot_runner')
+logger = logging.getLogger('supervisor')
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def main():
+    settings = CONFIG['supervisor']
+    parser = argparse.ArgumentParser(description="Run the bot with restarts, log rotation and health checks")
+    parser.add_argument("--health-host", default=settings['health_host'])
+    parser.add_argument("--health-port", type=int, default=settings['health_port'], help="0 disables the endpoints")
+    parser.add_argument("--log-file", default=settings['log_file'], help="relative to the bot directory")
+    parser.add_argument("--no-echo", action="store_true", help="only write the bot's output to the log file")
+    parser.add_argument("--startup-report", action="store_true", help="have the bot report its startup phases on every start")
+    args = parser.parse_args()
+
+    supervisor = BotSupervisor(
+        [sys.executable, os.path.join(BOT_DIR, 'discord_bot.py')],
+        cwd=BOT_DIR,
+        log_file=os.path.join(BOT_DIR, args.log_file),
+        heartbeat_file=os.path.join(BOT_DIR, settings['heartbeat_file']),
+        env={STARTUP_REPORT_ENV: '1'} if args.startup_report else None,
+        echo=settings['echo'] and not args.no_echo,
+        max_bytes=settings['max_bytes'],
+        backup_count=settings['backup_count'],
+        min_backoff=settings['min_backoff'],
+        max_backoff=settings['max_backoff'],
+        stable_after=settings['stable_after'],
+        stop_timeout=settings['stop_timeout'],
+        hang_timeout=settings['hang_timeout'],
+        startup_timeout=settings['startup_timeout']
+    )
+
+    runner = None
+    if args.health_port:
+        runner = await supervisor.start_health_server(args.health_host, args.health_port)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(supervisor.stop()))
+
+    await supervisor.run()
+
+    if runner:
+        await runner.cleanup()
+    return 1 if supervisor.gave_up else 0
 
-def run_discord_bot():
-    """Run the Discord bot in a separate process"""
-    logger.info("Starting Discord bot...")
-    try:
-        subprocess.run(["python", "discord_bot.py"])
-    except Exception as e:
-        logger.error(f"Error running Discord bot: {e}")
 
 if __name__ == "__main__":
-    # Start the Discord bot in a separate thread
-    bot_thread = threading.Thread(target=run_discord_bot)
-    bot_thread.daemon = True  # This makes the thread exit when the main program exits
-    bot_thread.start()
-    
-    logger.info("Discord bot thread started.")
-    logger.info("The web server is running in the main process.")
-    
-    # Keep the script running to keep the bot thread alive
-    try:
-        while True:
-            time.sleep(10)  # Sleep to prevent CPU usage
-    except KeyboardInterrupt:
-        logger.info("Shutting down...")
\ No newline at end of file
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,44 @@
+import pytest
+
+from utils.fake_redis import FakeRedisServer
+from utils.redis_client import RedisClient
+from utils.storage import DATA_ROOT_ENV
+
+
+@pytest.fixture(scope='session')
+def redis_url():
+    """URL of an in-process fake Redis server shared by the session"""
+    server = FakeRedisServer()
+    url = server.start()
+    yield url
+    server.stop()
+
+
+@pytest.fixture
+def redis_client(redis_url):
+    """A client on an emptied fake server"""
+    client = RedisClient.from_url(redis_url)
+    client.execute('FLUSHDB')
+    yield client
+    client.close()
+
+
+@pytest.fixture(autouse=True)
+def data_root(tmp_path, monkeypatch):
+    """Keep every test's data files in its own temporary directory"""
+    monkeypatch.setenv(DATA_ROOT_ENV, str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """A bot built from the default config (per-handler timing off), never connected"""
+    import discord
+
+    from config import CONFIG
+    from discord_bot import MultipurposeBot
+
+    # Nothing listening on ports or writing trace files
+    monkeypatch.setitem(CONFIG['metrics'], 'port', None)
+    monkeypatch.setitem(CONFIG['tracing'], 'enabled', False)
+    return MultipurposeBot(command_prefix='!', intents=discord.Intents.none(), help_command=None)
@@ -0,0 +1,91 @@
+"""Channel counters must roll hourly buckets over and survive a reload"""
+import json
+from datetime import datetime, timedelta, timezone
+
+from discord.utils import time_snowflake
+
+from utils.channel_stats import BUCKET_RETENTION_HOURS, ChannelMessageCounters
+
+CHANNEL = 10
+NOW = datetime(2026, 3, 2, 12, 30, tzinfo=timezone.utc)
+
+
+def snowflake(hours_ago, minutes=0):
+    return time_snowflake(NOW - timedelta(hours=hours_ago, minutes=minutes))
+
+
+def test_hourly_buckets_roll_over(data_root):
+    counters = ChannelMessageCounters()
+    for hours_ago in (0, 0, 1, 23, 24, 30):
+        counters.record_message(CHANNEL, snowflake(hours_ago))
+
+    stats = counters.get_stats(CHANNEL, now=NOW.timestamp())
+    assert stats['total'] == 6
+    assert stats['last_hour'] == 2
+    assert stats['last_day'] == 4  # 24 and 30 hours ago are outside the last 24 buckets
+    assert stats['per_hour'] == 4 / 24
+
+    # An hour later the current bucket is empty and 23 hours ago has left the day
+    later = counters.get_stats(CHANNEL, now=(NOW + timedelta(hours=1)).timestamp())
+    assert [later['last_hour'], later['last_day'], later['total']] == [0, 3, 6]
+
+
+def test_prune_keeps_the_total(data_root):
+    counters = ChannelMessageCounters()
+    counters.record_message(CHANNEL, snowflake(BUCKET_RETENTION_HOURS + 1))
+    counters.record_message(CHANNEL, snowflake(BUCKET_RETENTION_HOURS - 1))
+
+    counters.prune(now=NOW.timestamp())
+    assert len(counters.channels[CHANNEL]['hours']) == 1
+    assert counters.get_stats(CHANNEL, now=NOW.timestamp())['total'] == 2
+
+
+def test_deletes_only_uncount_messages_sent_while_online(data_root):
+    counters = ChannelMessageCounters()
+    counters.online = [[snowflake(10), snowflake(8)]]
+    counters.session[0] = snowflake(2)
+    counters.record_message(CHANNEL, snowflake(9))
+    counters.record_message(CHANNEL, snowflake(1))
+    counters.record_message(CHANNEL, snowflake(0))
+
+    counters.record_deletes(CHANNEL, [
+        snowflake(12),  # Before the first tracked message, not backfilled
+        snowflake(5),   # Sent while the bot was offline
+        snowflake(9, minutes=-1),  # In a previous online period
+        snowflake(0),   # In this session
+    ])
+    assert counters.channels[CHANNEL]['total'] == 1
+
+    # A backfill covers everything before its snowflake
+    counters.record_backfill(CHANNEL, snowflake(9, minutes=30), 5)
+    counters.record_deletes(CHANNEL, [snowflake(12)])
+    assert counters.channels[CHANNEL]['total'] == 5
+
+
+def test_reload_from_file(data_root):
+    counters = ChannelMessageCounters()
+    counters.online = [[snowflake(10), snowflake(8)]]
+    counters.record_message(CHANNEL, snowflake(0))
+    counters.record_message(CHANNEL, snowflake(1))
+    counters.record_backfill(CHANNEL + 1, snowflake(3), 7)
+    assert counters.save()
+    assert not counters.save()  # Nothing changed since
+
+    path = data_root / 'data' / 'channel_stats.json'
+    data = json.loads(path.read_text())
+    assert data['online'][0] == [snowflake(10), snowflake(8)]
+    assert data['online'][-1] == counters.session  # This run is remembered as an online period
+
+    reloaded = ChannelMessageCounters()
+    assert reloaded.channels == counters.channels
+    assert reloaded.online == data['online']
+
+
+def test_load_file_without_online_periods(data_root):
+    path = data_root / 'data' / 'channel_stats.json'
+    path.parent.mkdir(parents=True)
+    path.write_text(json.dumps({str(CHANNEL): [3, 100, 1, {'500': 3}]}))
+
+    counters = ChannelMessageCounters()
+    assert counters.online == []
+    assert counters.channels == {CHANNEL: {'total': 3, 'since': 100, 'backfilled': True, 'hours': {500: 3}}}
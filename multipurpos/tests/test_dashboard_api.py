@@ -0,0 +1,131 @@
+"""The dashboard API must page through lists without gaps or repeats and honour its ETags"""
+import pytest
+from flask import Flask
+
+from config import CONFIG
+from utils.dashboard_api import TTLCache, encode_cursor, init_dashboard_api
+from utils.snapshot import SORT_KEYS, SnapshotReader, _write_atomic, encode_snapshot
+
+GUILD = '100'
+
+
+def make_snapshot(sequence, members=120):
+    levels = [{'user_id': str(index), 'level': index % 7, 'xp': index * 10} for index in range(members)]
+    levels.sort(key=SORT_KEYS['levels'])
+    return {
+        'version': 1,
+        'sequence': sequence,
+        'generated_at': '2026-03-02T12:00:00',
+        'guilds': {GUILD: {'name': 'Test', 'member_count': members, 'levels': levels, 'giveaways': []}},
+    }
+
+
+@pytest.fixture
+def api(tmp_path):
+    path = str(tmp_path / 'snapshot.json')
+    _write_atomic(path, encode_snapshot(make_snapshot(1)))
+
+    app = Flask(__name__)
+    init_dashboard_api(app, SnapshotReader([path], check_interval=0))
+    client = app.test_client()
+    client.publish = lambda snapshot: _write_atomic(path, encode_snapshot(snapshot))
+    client.cache = app.extensions['dashboard_api']['cache']
+    return client
+
+
+def test_pages_cover_the_list_once(api):
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = api.get(f'/api/v1/guilds/{GUILD}/levels', query_string={'cursor': cursor} if cursor else {})
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['data']) <= CONFIG['dashboard_api']['page_size']
+        seen += body['data']
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert seen == make_snapshot(1)['guilds'][GUILD]['levels']
+
+
+def test_page_boundary_survives_a_new_snapshot(api):
+    first = api.get(f'/api/v1/guilds/{GUILD}/levels', query_string={'limit': 10}).get_json()
+    last = first['data'][-1]
+
+    # Members above the boundary are added; the next page still starts right after the last item
+    snapshot = make_snapshot(2)
+    snapshot['guilds'][GUILD]['levels'][:0] = [{'user_id': 'new', 'level': 99, 'xp': 0}]
+    api.publish(snapshot)
+
+    second = api.get(f'/api/v1/guilds/{GUILD}/levels', query_string={'limit': 10, 'cursor': first['next_cursor']})
+    levels = snapshot['guilds'][GUILD]['levels']
+    start = levels.index(last) + 1
+    assert second.get_json()['data'] == levels[start:start + 10]
+
+
+def test_limits(api):
+    def count(limit):
+        response = api.get(f'/api/v1/guilds/{GUILD}/levels', query_string={'limit': limit})
+        return response.status_code, len(response.get_json().get('data', []))
+
+    assert count(0) == (200, 1)
+    assert count(1000) == (200, min(120, CONFIG['dashboard_api']['max_page_size']))
+    assert count('ten') == (400, 0)
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor', 'e30', encode_cursor({'user_id': 1}), encode_cursor(['x', 'y'])])
+def test_bad_cursors(api, cursor):
+    response = api.get(f'/api/v1/guilds/{GUILD}/levels', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unknown_guild_and_section(api):
+    assert api.get('/api/v1/guilds/999/levels').status_code == 404
+    assert api.get(f'/api/v1/guilds/{GUILD}/secrets').status_code == 404
+    assert api.get(f'/api/v1/guilds/{GUILD}/messages', query_string={'period': 'weekly'}).status_code == 400
+
+
+def test_if_none_match(api):
+    url = f'/api/v1/guilds/{GUILD}/levels'
+    first = api.get(url)
+    etag = first.headers['ETag']
+
+    cached = api.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+    assert cached.headers['ETag'] == etag
+
+    # Another page is another resource
+    assert api.get(url, query_string={'limit': 5}, headers={'If-None-Match': etag}).status_code == 200
+
+    # A new snapshot changes every ETag
+    api.publish(make_snapshot(2))
+    fresh = api.get(url, headers={'If-None-Match': etag})
+    assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
+    assert fresh.get_json()['snapshot']['sequence'] == [2]
+
+
+def test_per_endpoint_ttls(api):
+    ttls = CONFIG['dashboard_api']['cache_ttl']
+    assert api.get('/api/v1/guilds').headers['Cache-Control'] == f"public, max-age={ttls['guilds']}"
+    assert api.get(f'/api/v1/guilds/{GUILD}/giveaways').headers['Cache-Control'] == f"public, max-age={ttls['giveaways']}"
+    assert api.get(f'/api/v1/guilds/{GUILD}/levels').headers['Cache-Control'] == f"public, max-age={ttls['default']}"
+
+    # Built by the first request, then served from the cache
+    hits, misses = api.cache.hits, api.cache.misses
+    assert api.get('/api/v1/guilds').data == api.get('/api/v1/guilds').data
+    assert (api.cache.hits, api.cache.misses) == (hits + 2, misses)
+
+
+def test_ttl_cache_expiry_and_eviction():
+    cache = TTLCache(max_entries=2)
+    cache.set('fresh', 1, 60)
+    cache.set('expired', 2, -1)
+    assert cache.get('fresh') == 1
+    assert cache.get('expired') is None
+
+    # 'fresh' was used last, so the next entry evicts 'expired'
+    cache.set('new', 3, 60)
+    assert list(cache.entries) == ['fresh', 'new']
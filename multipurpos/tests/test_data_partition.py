@@ -0,0 +1,155 @@
+"""Partitioning must put every guild's data in exactly one cluster and lose nothing"""
+import json
+import os
+
+import pytest
+
+from utils.cluster import shard_for_guild, shard_ranges
+from utils.data_partition import (
+    GUILD_KEYED, _merge, _merge_channel_stats, _split, check_layout, guild_of, partition_data, read_layout
+)
+
+# Guilds spread over shards: the shard comes from the bits above the 22nd
+GUILDS = [100000000000000000 + (i << 22) + i for i in range(12)]
+
+
+def owner_for(shard_count, clusters):
+    cluster_of_shard = {
+        shard_id: index for index, shard_ids in enumerate(shard_ranges(shard_count, clusters)) for shard_id in shard_ids
+    }
+    return lambda guild_id: cluster_of_shard[shard_for_guild(guild_id, shard_count)]
+
+
+def depth_0():
+    """Like the settings files: guild entries at the top level"""
+    value = {str(guild_id): {'channel': guild_id + 1, 'enabled': True} for guild_id in GUILDS}
+    value['version'] = 2
+    return value
+
+
+def depth_1():
+    """Like bot_database.json and levels.json: guild entries inside top-level sections"""
+    return {
+        'levels': {str(guild_id): {'1': {'xp': 10, 'level': 1}} for guild_id in GUILDS},
+        'invites': {str(guild_id): {} for guild_id in GUILDS[:3]},
+        'giveaways': {},
+        'settings': {'prefix': '!'},
+        'version': 2,
+        **{f'guild_{guild_id}': {'multiplier': 2} for guild_id in GUILDS[:4]},
+        **{f'user_{guild_id}_5': {'xp': 3} for guild_id in GUILDS[4:8]},
+    }
+
+
+SAMPLES = {0: depth_0, 1: depth_1}
+
+
+def test_samples_cover_every_depth():
+    assert set(GUILD_KEYED.values()) == set(SAMPLES)
+
+
+def guild_keys(value, depth):
+    """Every guild key in a file's contents, with the path to it"""
+    keys = []
+    for key, item in value.items():
+        if guild_of(key) is not None:
+            keys.append(((key,), guild_of(key)))
+        elif depth > 0 and isinstance(item, dict):
+            keys += [((key, *path), guild_id) for path, guild_id in guild_keys(item, depth - 1)]
+    return keys
+
+
+@pytest.mark.parametrize('depth', sorted(SAMPLES))
+@pytest.mark.parametrize('clusters', [1, 2, 3, 4])
+def test_split_then_merge_round_trips(depth, clusters):
+    value = SAMPLES[depth]()
+    owner = owner_for(8, clusters)
+    parts = _split(value, owner, clusters, depth)
+
+    assert len(parts) == clusters
+    assert _merge(parts, depth) == value
+
+    # Each guild's entries are in its owning cluster's part only
+    for index, part in enumerate(parts):
+        for _, guild_id in guild_keys(part, depth):
+            assert owner(guild_id) == index
+    assert sum(len(guild_keys(part, depth)) for part in parts) == len(guild_keys(value, depth))
+
+
+@pytest.mark.parametrize('depth', sorted(SAMPLES))
+@pytest.mark.parametrize('before, after', [((4, 2), (6, 3)), ((6, 3), (4, 2)), ((8, 4), (1, 1))])
+def test_change_of_cluster_count_round_trips(depth, before, after):
+    value = SAMPLES[depth]()
+    parts = _split(value, owner_for(*before), before[1], depth)
+    parts = _split(_merge(parts, depth), owner_for(*after), after[1], depth)
+    assert _merge(parts, depth) == value
+
+
+def test_merge_prefers_the_newest_source():
+    older = {'levels': {str(GUILDS[0]): {'xp': 1}}, 'version': 1}
+    newer = {'levels': {str(GUILDS[0]): {'xp': 2}, str(GUILDS[1]): {'xp': 5}}, 'version': 2}
+    assert _merge([older, newer], 1) == {'levels': {str(GUILDS[0]): {'xp': 2}, str(GUILDS[1]): {'xp': 5}}, 'version': 2}
+
+
+def test_merge_channel_stats_keeps_the_largest_total():
+    first = {'online': [[1, 2]], 'channels': {'10': [5, 100, 0, {}], '11': [1, 100, 0, {}]}}
+    second = {'12': [2, 100, 1, {'7': 2}], '10': [3, 100, 0, {}]}  # Written before online periods were kept
+    assert _merge_channel_stats([first, second]) == {
+        'online': [],
+        'channels': {'10': [5, 100, 0, {}], '11': [1, 100, 0, {}], '12': [2, 100, 1, {'7': 2}]}
+    }
+
+
+def write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(value, f)
+
+
+def read_roots(data_root, names):
+    """Merge the cluster roots' files back into one view of the data"""
+    merged = {}
+    for name in names:
+        root = os.path.join(data_root, name)
+        for directory, _, files in os.walk(root):
+            for file in files:
+                relative = os.path.relpath(os.path.join(directory, file), root)
+                with open(os.path.join(directory, file)) as f:
+                    merged.setdefault(relative, []).append(json.load(f))
+    return merged
+
+
+def test_repartition_keeps_every_file(tmp_path):
+    base_root = tmp_path / 'bot'
+    data_root = str(tmp_path / 'clusters')
+    original = {
+        'bot_database.json': depth_1(),
+        'data/polls_data.json': depth_0(),
+        'data/levels.json': depth_1(),
+        f'data/guild_{GUILDS[5]}_levels.json': {'5': {'xp': 1}},
+        'data/channel_stats.json': {'online': [[1, 2]], 'channels': {'10': [5, 100, 0, {}]}},
+        'data/unknown.json': {'anything': 1},
+    }
+    for name, value in original.items():
+        write_json(str(base_root / name), value)
+
+    assert check_layout(data_root, str(base_root), 4, ['a', 'b']) is not None  # Unpartitioned data
+
+    for shard_count, clusters in [(4, 2), (6, 3)]:
+        names = [f'cluster-{index}-of-{clusters}' for index in range(clusters)]
+        partition_data(data_root, str(base_root), shard_count, names, shard_ranges(shard_count, clusters))
+        assert read_layout(data_root)['clusters'] == clusters
+        assert check_layout(data_root, str(base_root), shard_count, names) is None
+
+        files = read_roots(data_root, names)
+        for name, value in original.items():
+            if name in GUILD_KEYED:
+                assert _merge(files[name], GUILD_KEYED[name]) == value
+            elif name == 'data/channel_stats.json':
+                assert files[name] == [{'online': [], 'channels': value['channels']}] * clusters
+            elif name.startswith('data/guild_'):
+                assert files[name] == [value]  # Only in the owning cluster
+            else:
+                assert files[name] == [value] * clusters
+
+    # The previous layout's roots were moved aside, not deleted
+    assert any(name.startswith('previous-') for name in os.listdir(data_root))
@@ -0,0 +1,112 @@
+"""Readers that fall behind must be told what they missed, and a stream must not cost a thread"""
+import asyncio
+import threading
+
+import aiohttp
+
+from utils.event_stream import EventHub, EventPublisher, EventServer
+
+
+def test_dropped_counts_reach_subscriptions(tmp_path):
+    path = str(tmp_path / 'events.sock')
+
+    async def main():
+        # Read the socket from the test rather than the hub's discovery task
+        hub = EventHub(pattern=str(tmp_path / 'undiscovered*.sock'))
+        subscriptions = hub.subscribe(), hub.subscribe(guild_id=1), hub.subscribe(events=['level_up'])
+
+        publisher = EventPublisher(path, queue_size=2)
+        await publisher.start()
+        reading = asyncio.create_task(hub._read(path))
+        while not publisher.readers:
+            await asyncio.sleep(0.01)
+
+        # Published without yielding, so the reader's queue overflows before anything is written
+        for event, guild_id in [('level_up', 1), ('moderation', 2), ('level_up', 2), ('poll_vote', 1), ('poll_vote', 1)]:
+            publisher.publish(event, guild_id)
+        while hub.received < 2:
+            await asyncio.sleep(0.01)
+
+        await publisher.close()
+        await reading
+
+        # The first three were dropped; each subscription hears about those it would have received
+        summaries = []
+        for subscription in subscriptions:
+            events, dropped = await subscription.get(0)
+            summaries.append(([event['event'] for event in events], dropped))
+        return publisher.dropped, summaries
+
+    dropped, (everything, one_guild, level_ups) = asyncio.run(main())
+    assert dropped == 3
+    assert everything == (['poll_vote', 'poll_vote'], 3)
+    assert one_guild == (['poll_vote', 'poll_vote'], 1)
+    assert level_ups == ([], 2)
+
+
+def test_subscriptions_are_capped():
+    hub = EventHub(pattern='/nonexistent/events*.sock', max_subscriptions=2)
+    first = hub.subscribe()
+    hub.subscribe()
+    assert hub.subscribe() is None
+
+    first.close()
+    assert hub.subscribe() is not None
+
+
+def test_server_streams_without_threads(tmp_path):
+    path = str(tmp_path / 'events-0.sock')
+    streams = 50
+
+    async def read_event(response):
+        """Read one server-sent event, skipping the retry line and keep-alives"""
+        lines = []
+        while True:
+            line = (await response.content.readline()).decode().rstrip('\n')
+            if line and not line.startswith(':'):
+                lines.append(line)
+            elif lines and not lines[0].startswith('retry'):
+                return dict(line.split(': ', 1) for line in lines)
+            else:
+                lines = []
+
+    async def main():
+        publisher = EventPublisher(path)
+        await publisher.start()
+        hub = EventHub(pattern=str(tmp_path / 'events-*.sock'), retry_interval=0.05, max_subscriptions=streams)
+        server = EventServer(hub, port=0, keepalive=0.1)
+        await server.start()
+        port = server.runner.addresses[0][1]
+        url = f'http://127.0.0.1:{port}/api/v1/events'
+
+        threads = threading.active_count()
+        async with aiohttp.ClientSession() as session:
+            responses = [await session.get(url, params={'guild': '1'}) for _ in range(streams)]
+            assert all(response.status == 200 for response in responses)
+            assert responses[0].headers['Content-Type'] == 'text/event-stream'
+            assert len(hub.subscriptions) == streams
+            assert threading.active_count() == threads
+
+            # Past the cap a stream is refused rather than queued
+            async with session.get(url) as refused:
+                assert refused.status == 503 and refused.headers['Retry-After'] == '30'
+
+            while not publisher.readers:
+                await asyncio.sleep(0.01)
+            publisher.publish('level_up', 2, user_id='5')  # Another guild's
+            publisher.publish('level_up', 1, user_id='6')
+            received = await asyncio.gather(*(read_event(response) for response in responses))
+
+            # A closed stream is noticed at its next write, at the latest the next keep-alive
+            for response in responses:
+                response.close()
+            while hub.subscriptions:
+                await asyncio.sleep(0.01)
+
+        await server.close()
+        await publisher.close()
+        return received
+
+    received = asyncio.run(main())
+    assert {event['event'] for event in received} == {'level_up'}
+    assert all('"user_id":"6"' in event['data'] for event in received)
@@ -0,0 +1,96 @@
+"""The bucketed join index must agree with a plain sorted list"""
+import bisect
+import random
+
+import pytest
+
+from utils.guild_stats import JoinIndex
+
+
+@pytest.fixture(autouse=True)
+def small_buckets(monkeypatch):
+    """Small buckets so a few dozen keys cross several bucket boundaries"""
+    monkeypatch.setattr(JoinIndex, 'BUCKET_SIZE', 4)
+
+
+def assert_matches(index, reference):
+    assert len(index) == len(reference)
+    assert [key for bucket in index.buckets for key in bucket] == reference
+    assert index.maxes == [bucket[-1] for bucket in index.buckets]
+    assert all(bucket for bucket in index.buckets)
+    for position, key in enumerate(reference):
+        assert index.position(key) == position
+
+
+def test_matches_sorted_list():
+    rng = random.Random(42)
+    # Few distinct join times, so many members share one and only the id orders them
+    keys = [(float(rng.randrange(20)), member_id) for member_id in range(200)]
+    rng.shuffle(keys)
+
+    index = JoinIndex(keys[:50])
+    reference = sorted(keys[:50])
+    assert_matches(index, reference)
+
+    for key in keys[50:]:
+        index.add(key)
+        bisect.insort(reference, key)
+    assert_matches(index, reference)
+    assert max(len(bucket) for bucket in index.buckets) <= 2 * JoinIndex.BUCKET_SIZE
+
+    for key in rng.sample(keys, 150):
+        index.remove(key)
+        reference.remove(key)
+        assert index.position(key) is None
+    assert_matches(index, reference)
+
+
+def test_bucket_split():
+    index = JoinIndex()
+    keys = [(1.0, member_id) for member_id in range(2 * JoinIndex.BUCKET_SIZE + 1)]
+    for key in keys:
+        index.add(key)
+
+    # The bucket split in two once it passed twice the bucket size
+    assert [len(bucket) for bucket in index.buckets] == [4, 5]
+    assert index.position(keys[3]) == 3
+    assert index.position(keys[4]) == 4
+    assert_matches(index, keys)
+
+
+def test_bucket_boundaries():
+    keys = [(float(member_id), member_id) for member_id in range(12)]
+    index = JoinIndex(keys)
+    assert [bucket[-1] for bucket in index.buckets] == [keys[3], keys[7], keys[11]]
+
+    # Between two buckets a key goes in the later one; past the end, the last one
+    index.add((3.5, 100))
+    index.add((20.0, 101))
+    assert index.position((3.5, 100)) == 4
+    assert index.position((20.0, 101)) == 13
+
+    # Removing a bucket's maximum moves the maximum; emptying it drops the bucket
+    for key in keys[4:8]:
+        index.remove(key)
+    reference = sorted(keys[:4] + keys[8:] + [(3.5, 100), (20.0, 101)])
+    assert_matches(index, reference)
+    assert len(index.buckets) == 3
+
+
+def test_missing_keys():
+    index = JoinIndex([(1.0, 1), (2.0, 2)])
+    assert index.position((1.0, 3)) is None
+    assert index.position((5.0, 1)) is None
+    index.remove((1.0, 3))
+    index.remove((5.0, 1))
+    assert_matches(index, [(1.0, 1), (2.0, 2)])
+
+    index.remove((1.0, 1))
+    index.remove((2.0, 2))
+    assert len(index) == 0 and index.position((1.0, 1)) is None
+    index.add((3.0, 3))
+    assert_matches(index, [(3.0, 3)])
+
+    # Members without a join date sort last
+    index.add((float('inf'), 4))
+    assert index.position((float('inf'), 4)) == 1
@@ -0,0 +1,53 @@
+"""Singleton loops must follow the lease, even when it is lost and won back quickly"""
+import asyncio
+
+from discord.ext import tasks
+
+from utils.leader import LeaderElector, SQLiteLeaseStore
+
+
+def test_lose_then_win_restarts_loops(tmp_path):
+    async def main():
+        runs = []
+
+        @tasks.loop(seconds=0.01)
+        async def singleton():
+            runs.append(1)
+
+        store = SQLiteLeaseStore(str(tmp_path / 'leases.db'))
+        elector = LeaderElector(store, 'test', ttl=60, holder='a')
+        elector.register(singleton)
+
+        await elector._tick()
+        assert elector.is_leader and singleton.is_running()
+        first = singleton.get_task()
+
+        # Lost and won back before the cancelled loop task has finished
+        elector._lose("renewal rejected")
+        assert singleton.is_running()
+        await elector._win({'token': 2, 'handover_seconds': 0.0})
+
+        assert singleton.is_running()
+        assert singleton.get_task() is not first and first.cancelled()
+        await asyncio.sleep(0.05)
+        assert runs
+
+        elector._lose("done", expected=True)
+        await asyncio.gather(singleton.get_task(), return_exceptions=True)
+        assert not singleton.is_running()
+
+    asyncio.run(main())
+
+
+def test_fence_needs_the_current_lease(tmp_path):
+    store = SQLiteLeaseStore(str(tmp_path / 'leases.db'))
+    assert not store.fence('test', 1, 'giveaways')  # No lease yet
+
+    first = store.try_acquire('test', 'a', 60, now=1000)['token']
+    assert store.fence('test', first, 'giveaways', now=1010)
+    assert not store.fence('test', first, 'giveaways', now=1061)  # Expired
+
+    second = store.try_acquire('test', 'b', 60, now=1100)['token']
+    assert not store.fence('test', first, 'giveaways', now=1110)
+    assert store.fence('test', second, 'giveaways', now=1110)
+    assert store.fence('test', second, 'polls', now=1110)
@@ -0,0 +1,94 @@
+"""Metrics must render in the Prometheus text format, stay bounded, and reach only local scrapers"""
+import asyncio
+
+from discord.ext import commands
+from flask import Flask
+
+from utils.metrics import LISTENER_SECONDS, Registry, init_metrics_endpoint
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram('test_seconds', 'Test latency', ['cog'], buckets=(0.1, 1, 0.5))
+    for value in (0.05, 0.1, 0.3, 0.7, 2):
+        histogram.labels('Levels').observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        '# HELP test_seconds Test latency',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{cog="Levels",le="0.1"} 2',  # A value on a bound is counted in it
+        'test_seconds_bucket{cog="Levels",le="0.5"} 3',
+        'test_seconds_bucket{cog="Levels",le="1"} 4',
+        'test_seconds_bucket{cog="Levels",le="+Inf"} 5',
+        'test_seconds_sum{cog="Levels"} 3.15',
+        'test_seconds_count{cog="Levels"} 5',
+    ]
+
+
+def test_series_overflow_into_other():
+    registry = Registry()
+    counter = registry.counter('test_total', 'Test count', ['route', 'status'], max_series=2)
+    counter.labels('a', '200').inc()
+    counter.labels('b', '200').inc(2)
+    counter.labels('c', '200').inc(3)
+    counter.labels('d', '500').inc(4)
+    counter.labels('a', '200').inc()  # Existing series still update
+
+    assert set(counter.series) == {('a', '200'), ('b', '200'), ('other', 'other')}
+    assert counter.labels('other', 'other').value == 7
+    assert 'test_total{route="other",status="other"} 7' in registry.render()
+
+
+def test_text_format():
+    registry = Registry()
+    registry.counter('test_events_total', 'Events received')
+    gauge = registry.gauge('test_depth', 'Queue depth', ['queue'])
+    gauge.labels('say "hi"\\\n').set(1.5)
+    gauge.labels('callback').set_function(lambda: 1 / 0)
+
+    assert registry.render() == (
+        '# HELP test_events_total Events received\n'
+        '# TYPE test_events_total counter\n'
+        'test_events_total 0\n'  # Unlabelled metrics are exported before their first update
+        '# HELP test_depth Queue depth\n'
+        '# TYPE test_depth gauge\n'
+        'test_depth{queue="say \\"hi\\"\\\\\\n"} 1.5\n'
+        'test_depth{queue="callback"} NaN\n'
+    )
+    # Modules reloading get the same metric back, but not under another type
+    assert registry.counter('test_events_total', 'Events received') is registry.metrics['test_events_total']
+
+
+def test_endpoint_only_answers_local_scrapers():
+    app = Flask(__name__)
+    init_metrics_endpoint(app, Registry(), token='secret')
+    client = app.test_client()
+
+    def status(remote_addr, **headers):
+        return client.get('/metrics', environ_base={'REMOTE_ADDR': remote_addr}, headers=headers).status_code
+
+    assert status('127.0.0.1') == 200
+    assert status('::1') == 200
+    assert status('203.0.113.5') == 404
+    assert status('127.0.0.1', **{'X-Forwarded-For': '203.0.113.5'}) == 404  # Through the reverse proxy
+    assert status('203.0.113.5', Authorization='Bearer secret') == 200
+    assert status('203.0.113.5', Authorization='Bearer wrong') == 404
+
+
+def test_listener_latency_without_the_profiler(bot):
+    class Probe(commands.Cog):
+        @commands.Cog.listener()
+        async def on_probe(self):
+            await asyncio.sleep(0.01)
+
+    async def main():
+        async with bot:
+            await bot.add_cog(Probe())
+            bot.dispatch('probe')
+            await asyncio.sleep(0.1)
+
+    assert bot.profiler is None and bot.collect_metrics
+    asyncio.run(main())
+    series = LISTENER_SECONDS.labels('Probe', 'on_probe')
+    assert series.count == 1 and series.sum >= 0.01
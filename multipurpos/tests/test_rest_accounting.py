@@ -0,0 +1,58 @@
+"""Discord API requests must be attributed to the listener or command making them, with profiling off"""
+import asyncio
+from types import SimpleNamespace
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+from discord.http import Route
+
+from utils.rest_accounting import caller_name
+
+
+async def request(bot):
+    # The bot never logged in, so the request fails, but it is still accounted
+    try:
+        await bot.http.request(Route('GET', '/channels/{channel_id}', channel_id=10))
+    except Exception:
+        pass
+
+
+class Probe(commands.Cog):
+    @commands.command()
+    async def probe(self, ctx):
+        await request(ctx.bot)
+
+    @commands.Cog.listener()
+    async def on_probe(self, bot):
+        await request(bot)
+
+
+def callers(bot):
+    return {key: stats.requests for key, stats in bot.rest_accountant.callers.items()}
+
+
+def test_command_and_listener_requests_are_attributed(bot):
+    async def main():
+        async with bot:
+            await bot.add_cog(Probe())
+
+            message = SimpleNamespace(
+                _state=bot._connection, guild=None, author=None, channel=None, content='!probe', attachments=[]
+            )
+            ctx = commands.Context(
+                message=message, bot=bot, view=StringView(''), prefix='!', command=bot.get_command('probe'),
+                invoked_with='probe'
+            )
+            await bot.invoke(ctx)
+            assert not ctx.command_failed
+
+            bot.dispatch('probe', bot)
+            await asyncio.sleep(0.1)
+
+            # Outside any handler
+            await request(bot)
+            assert caller_name() == 'background'
+
+    assert bot.profiler is None and bot.rest_accountant
+    asyncio.run(main())
+    assert callers(bot) == {'Probe.probe': 1, 'Probe.on_probe': 1, 'background': 1}
@@ -0,0 +1,82 @@
+"""The SQL mirror must hold the primary database's totals, including those from before it was enabled"""
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import create_engine, select
+
+from utils.database import JsonDatabase
+from utils.sql_models import InviteStat, LevelStat, MessageStat
+from utils.sql_store import CounterWriter, SqlMirroredDatabase, create_sql_engine
+
+GUILD = '100'
+
+
+def read_tables(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        levels = {row.user_id: (row.xp, row.level) for row in conn.execute(select(LevelStat))}
+        messages = {(row.user_id, row.day): row.count for row in conn.execute(select(MessageStat))}
+        invites = {row.inviter_id: row.joins for row in conn.execute(select(InviteStat))}
+    engine.dispose()
+    return levels, messages, invites
+
+
+def test_mirror_matches_existing_counters(tmp_path):
+    url = f"sqlite:///{tmp_path / 'counters.db'}"
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    # Counted before the mirror was turned on
+    primary = JsonDatabase()
+    for _ in range(5):
+        primary.increment_message_count(GUILD, '1')
+    primary.increment_message_count(GUILD, '2')
+    primary.add_user_xp(GUILD, '2', 250)
+    primary.track_invite(GUILD, '3', '30')
+
+    async def mirror():
+        writer = CounterWriter(create_sql_engine(url), flush_interval=3600)
+        db = SqlMirroredDatabase(primary, writer)
+        await writer.start()
+        db.seed(GUILD)
+        db.increment_message_count(GUILD, '1')
+        db.add_user_xp(GUILD, '1', 10)
+        await writer.close()
+
+    asyncio.run(mirror())
+    levels, messages, invites = read_tables(url)
+
+    assert messages == {('1', ''): 6, ('1', today): 6, ('2', ''): 1, ('2', today): 1}
+    assert levels == {'1': (10, 0), '2': (250, 2)}
+    assert invites == {'3': 1}
+
+
+def test_seed_in_pages(tmp_path):
+    url = f"sqlite:///{tmp_path / 'counters.db'}"
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    primary = JsonDatabase()
+    for index in range(7):
+        user_id = str(index + 1)
+        for _ in range(index + 1):
+            primary.increment_message_count(GUILD, user_id)
+        primary.add_user_xp(GUILD, user_id, 100 * index)
+        primary.track_invite(GUILD, user_id, str(index + 50))
+
+    async def mirror():
+        writer = CounterWriter(create_sql_engine(url), flush_interval=3600)
+        db = SqlMirroredDatabase(primary, writer)
+        await writer.start()
+        assert db.seed_page(GUILD, 0, 3) == (9, True)
+        assert db.seed_page(GUILD, 6, 3) == (3, False)
+        assert db.seed(GUILD, limit=3) == 21
+        await writer.close()
+
+    asyncio.run(mirror())
+    levels, messages, invites = read_tables(url)
+
+    assert len(levels) == 7 and levels['7'] == (600, primary.get_user_level(GUILD, '7')['level'])
+    assert messages == {
+        **{(str(count), ''): count for count in range(1, 8)},
+        **{(str(count), today): count for count in range(1, 8)},
+    }
+    assert invites == {str(index + 1): 1 for index in range(7)}
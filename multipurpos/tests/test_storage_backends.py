@@ -0,0 +1,270 @@
+"""The Redis storage backend must behave exactly like the JSON one
+
+Each test runs the same calls against JsonDatabase and RedisDatabase (on
+the fake Redis server) and compares what they return.
+"""
+import asyncio
+import copy
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.database import AsyncDatabase, JsonDatabase
+from utils.leader import SINGLETON_LEASE
+from utils.redis_database import RedisDatabase
+
+GUILD = '100'
+
+
+@pytest.fixture
+def backends(redis_client):
+    return JsonDatabase(), RedisDatabase(redis_client, prefix='test:')
+
+
+def run_both(backends, calls):
+    """Run calls(db) on both backends and check they yielded the same
+
+    Args:
+        calls (callable): Generator function taking a database and yielding results
+
+    Returns:
+        list: The results
+    """
+    # JsonDatabase returns its live dicts, so each result is copied before the next call can change it
+    json_results, redis_results = ([copy.deepcopy(result) for result in calls(db)] for db in backends)
+    assert json_results == redis_results
+    return json_results
+
+
+def leaderboard_entries(entries, key):
+    """Leaderboard entries as a set, ignoring order between tied scores and zero rows"""
+    return {tuple(sorted(entry.items())) for entry in entries if entry[key]}
+
+
+def test_autorole(backends):
+    def calls(db):
+        yield db.get_autorole(GUILD)
+        yield db.set_autorole(GUILD, 555)
+        yield db.get_autorole(GUILD)
+        yield db.remove_autorole(GUILD)
+        yield db.remove_autorole(GUILD)
+        yield db.get_autorole(GUILD)
+
+    run_both(backends, calls)
+
+
+def test_levels(backends):
+    def calls(db):
+        yield [db.add_user_xp(GUILD, user_id, 40) for user_id in ('1', '2', '1', '3', '1')]
+        yield db.get_user_level(GUILD, '1')
+        yield db.get_user_level(GUILD, 'missing')
+        yield {(user_id, data['xp'], data['level']) for user_id, data in db.get_level_leaderboard(GUILD, 3)}
+
+    results = run_both(backends, calls)
+    assert results[0] == [False, False, False, False, True]
+
+
+def test_tickets(backends):
+    def calls(db):
+        yield db.create_ticket(GUILD, '900', '1')
+        yield db.get_ticket(GUILD, '900')['status']
+        yield db.close_ticket(GUILD, '900')
+        yield db.get_ticket(GUILD, '900')['status']
+        yield db.close_ticket(GUILD, 'missing')
+        yield db.get_ticket(GUILD, 'missing')
+        yield sorted(db.get_guild_tickets(GUILD))
+
+    run_both(backends, calls)
+
+
+def test_invites(backends):
+    def calls(db):
+        db.track_invite(GUILD, '1', '10')
+        db.track_invite(GUILD, '1', '11', is_fake=True)
+        db.track_invite(GUILD, '2', '12', is_rejoin=True)
+        yield db.track_leave(GUILD, '10')
+        yield db.track_leave(GUILD, 'missing')
+        yield db.has_invitee(GUILD, '12')
+        yield db.has_invitee(GUILD, 'missing')
+        yield db.get_inviter(GUILD, '12')
+        yield db.get_inviter(GUILD, 'missing')
+        yield db.get_invite_stats(GUILD, '1')
+        yield db.get_invite_stats(GUILD, '2')
+        yield db.get_invite_stats(GUILD, 'missing')
+        yield leaderboard_entries(db.get_invite_leaderboard(GUILD), 'total')
+
+    run_both(backends, calls)
+
+
+def test_message_counts(backends):
+    def calls(db):
+        for user_id in ('1', '1', '2', '3', '1', '2'):
+            db.increment_message_count(GUILD, user_id)
+        yield db.get_message_stats(GUILD, '1')
+        yield leaderboard_entries(db.get_message_leaderboard(GUILD), 'count')
+        yield leaderboard_entries(db.get_message_leaderboard(GUILD, period='today'), 'count')
+        yield db.reset_message_stats(GUILD, '3')
+        yield db.reset_message_stats(GUILD, 'missing')
+        yield db.get_message_stats(GUILD, '3')
+        yield leaderboard_entries(db.get_message_leaderboard(GUILD), 'count')
+
+    results = run_both(backends, calls)
+    assert results[0]['all_time'] == 3
+
+
+def test_leaderboard_pages(backends):
+    def calls(db):
+        for index in range(7):
+            user_id = str(index + 1)
+            for _ in range(index + 1):
+                db.increment_message_count(GUILD, user_id)
+            db.add_user_xp(GUILD, user_id, 10 * (index + 1))
+            db.track_invite(GUILD, user_id, str(index + 50))
+            db.track_invite(GUILD, '1', str(index + 70))
+        yield [[user_id for user_id, _ in db.get_level_leaderboard(GUILD, 3, offset=offset)] for offset in (0, 3, 6, 9)]
+        yield [[entry['user_id'] for entry in db.get_message_leaderboard(GUILD, 3, offset=offset)] for offset in (0, 3, 6)]
+        yield [entry['user_id'] for entry in db.get_invite_leaderboard(GUILD, 2, offset=0)][:1]
+        yield db.get_invite_stats_many(GUILD, ['1', '2', 'missing'])
+        yield db.get_message_stats_many(GUILD, ['7', 'missing'])
+        yield db.get_message_stats_many(GUILD, [])
+
+    results = run_both(backends, calls)
+    assert results[0] == [['7', '6', '5'], ['4', '3', '2'], ['1'], []]
+    assert results[1] == [['7', '6', '5'], ['4', '3', '2'], ['1']]
+
+
+def test_reaction_roles(backends):
+    def calls(db):
+        db.set_reaction_role(GUILD, '700', 1, '👍')
+        db.set_reaction_role(GUILD, '700', 2, '👎')
+        db.set_reaction_role(GUILD, '700', 3, '👍')
+        yield db.get_reaction_roles(GUILD, '700')
+        yield db.remove_reaction_role(GUILD, '700', '👎')
+        yield db.remove_reaction_role(GUILD, '700', 'missing')
+        yield db.get_guild_reaction_roles(GUILD)
+        yield db.get_all_reaction_roles()
+        yield db.delete_reaction_roles(GUILD, '700')
+        yield db.delete_reaction_roles(GUILD, '700')
+        yield db.get_reaction_roles(GUILD, '700')
+
+    run_both(backends, calls)
+
+
+def test_giveaways(backends):
+    end_time = datetime.now() + timedelta(hours=1)
+
+    def calls(db):
+        db.create_giveaway(GUILD, '800', '801', 'Nitro', '1', end_time, winners=2)
+        yield db.add_giveaway_participant(GUILD, '801', '1')
+        yield db.add_giveaway_participant(GUILD, '801', '1')
+        yield db.add_giveaway_participant(GUILD, '801', '2')
+        yield db.remove_giveaway_participant(GUILD, '801', '2')
+        yield db.add_giveaway_participant(GUILD, 'missing', '1')
+        giveaway = db.get_giveaway(GUILD, '801')
+        yield giveaway['prize'], giveaway['winners'], sorted(giveaway['participants'])
+        yield [(entry['guild_id'], entry['message_id']) for entry in db.get_active_giveaways()]
+        yield db.get_giveaway(GUILD, 'missing')
+
+    run_both(backends, calls)
+
+
+def test_end_giveaway_is_fenced(backends):
+    end_time = datetime.now() + timedelta(hours=1)
+
+    def calls(db):
+        for message_id in ('801', '802'):
+            db.create_giveaway(GUILD, '800', message_id, 'Nitro', '1', end_time)
+        old = db.leases.try_acquire(SINGLETON_LEASE, 'old', 60)['token']
+        yield db.end_giveaway(GUILD, '801', fencing_token=old)
+        # Only the first end succeeds, so only one process announces winners
+        yield db.end_giveaway(GUILD, '801', fencing_token=old)
+
+        # A stale leader's token is refused once the lease has moved on
+        db.leases.release(SINGLETON_LEASE, 'old', old)
+        new = db.leases.try_acquire(SINGLETON_LEASE, 'new', 60)['token']
+        yield new > old
+        yield db.end_giveaway(GUILD, '802', fencing_token=old)
+        yield db.get_giveaway(GUILD, '802').get('ended')
+        yield db.end_giveaway(GUILD, '802', fencing_token=new)
+        yield db.get_giveaway(GUILD, '802').get('ended')
+        yield db.end_giveaway(GUILD, 'missing')
+
+    assert run_both(backends, calls) == [True, False, True, False, None, True, True, False]
+
+
+def test_end_giveaway_is_fenced_across_processes():
+    """Processes sharing a data root each have their own copy of the data, but one lease file"""
+    end_time = datetime.now() + timedelta(hours=1)
+    stale, leader = JsonDatabase(), JsonDatabase()
+    stale.create_giveaway(GUILD, '800', '801', 'Nitro', '1', end_time)
+    leader.create_giveaway(GUILD, '800', '801', 'Nitro', '1', end_time)
+
+    # The stale process held the lease, then stalled past its expiry
+    old = stale.leases.try_acquire(SINGLETON_LEASE, 'stale', 60, now=time.time() - 120)['token']
+    new = leader.leases.try_acquire(SINGLETON_LEASE, 'leader', 60)['token']
+
+    assert leader.end_giveaway(GUILD, '801', fencing_token=new)
+    assert not stale.end_giveaway(GUILD, '801', fencing_token=old)
+    assert not stale.get_giveaway(GUILD, '801').get('ended')
+
+    # Even with the new leader gone, the old token stays refused
+    leader.leases.release(SINGLETON_LEASE, 'leader', new)
+    assert not stale.end_giveaway(GUILD, '801', fencing_token=old)
+
+
+def test_async_database(backends):
+    json_db, redis_db = backends
+    json_async, redis_async = AsyncDatabase(json_db, blocking=False), AsyncDatabase(redis_db, blocking=True)
+    calling_threads = {}
+
+    def record_thread(db):
+        original = db.add_user_xp
+
+        def add_user_xp(*args):
+            calling_threads[type(db).__name__] = threading.current_thread()
+            return original(*args)
+        db.add_user_xp = add_user_xp
+
+    record_thread(json_db)
+    record_thread(redis_db)
+
+    async def calls(db):
+        return [
+            [await db.add_user_xp(GUILD, '1', 60) for _ in range(3)],
+            await db.get_user_level(GUILD, '1'),
+        ]
+
+    async def main():
+        return await calls(json_async), await calls(redis_async)
+
+    json_results, redis_results = asyncio.run(main())
+    assert json_results == redis_results == [[False, True, False], {'level': 1, 'xp': 180}]
+
+    # The Redis round trips ran off the event loop's thread; the in-memory JSON calls on it
+    assert calling_threads['JsonDatabase'] is threading.main_thread()
+    assert calling_threads['RedisDatabase'] is not threading.main_thread()
+    assert json_async.db_file == json_db.db_file
+
+
+def test_copy_guild(backends):
+    def calls(db):
+        for user_id in ('1', '1', '2'):
+            db.increment_message_count(GUILD, user_id)
+            db.add_user_xp(GUILD, user_id, 70)
+        db.track_invite(GUILD, '1', '10')
+        source = db.copy_guild(GUILD)
+        yield leaderboard_entries(source.get_message_leaderboard(GUILD), 'count')
+        yield source.get_level_leaderboard(GUILD)
+        yield leaderboard_entries(source.get_invite_leaderboard(GUILD), 'total')
+
+    run_both(backends, calls)
+
+
+def test_copy_guild_is_unaffected_by_new_members():
+    db = JsonDatabase()
+    db.increment_message_count(GUILD, '1')
+    source = db.copy_guild(GUILD)
+    db.increment_message_count(GUILD, '2')
+    assert [entry['user_id'] for entry in source.get_message_leaderboard(GUILD)] == ['1']
@@ -0,0 +1,117 @@
+"""A store snapshot must only ever be used while it matches its JSON; otherwise the JSON is read"""
+import asyncio
+import json
+import os
+
+import pytest
+
+from config import CONFIG
+from utils import store_snapshot
+from utils.store_snapshot import (
+    StoreSnapshots, _HEADER, encode_store_snapshot, file_signature, load_json_store, snapshot_path,
+    snapshot_signature, write_store_snapshot
+)
+
+DATA = {'123': {'levels': {'1': {'xp': 10, 'level': 1}}, 'enabled': True, 'ratio': 0.5, 'tags': ['a', None]}}
+
+
+@pytest.fixture(autouse=True)
+def snapshots_enabled(monkeypatch):
+    monkeypatch.setitem(CONFIG['storage']['snapshots'], 'enabled', True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'store.json')
+    save(path, DATA)
+    return path
+
+
+def save(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+
+def plant(path, data):
+    """Write a snapshot of different data that claims to match the JSON, to tell which file was read"""
+    with open(snapshot_path(path), 'wb') as f:
+        f.write(encode_store_snapshot(data, file_signature(path)))
+
+
+def test_loads_a_current_snapshot(store):
+    assert write_store_snapshot(store, DATA) > 0
+    assert write_store_snapshot(store, DATA) == 0  # The JSON hasn't changed since
+    assert load_json_store(store) == DATA
+
+    plant(store, {'from': 'snapshot'})
+    assert load_json_store(store) == {'from': 'snapshot'}
+
+
+def test_stale_snapshot_falls_back_to_json(store):
+    write_store_snapshot(store, DATA)
+    changed = {**DATA, '456': {}}
+    save(store, changed)
+    assert snapshot_signature(store) != file_signature(store)
+    assert load_json_store(store) == changed
+
+
+@pytest.mark.parametrize('damage', ['checksum', 'truncated payload', 'truncated header', 'format', 'python', 'magic'])
+def test_damaged_snapshot_falls_back_to_json(store, damage):
+    plant(store, {'from': 'snapshot'})
+    with open(snapshot_path(store), 'rb') as f:
+        raw = bytearray(f.read())
+
+    if damage == 'checksum':
+        raw[-1] ^= 0xFF
+    elif damage == 'truncated payload':
+        raw = raw[:-3]
+    elif damage == 'truncated header':
+        raw = raw[:_HEADER.size - 1]
+    elif damage == 'format':
+        raw[4:6] = (store_snapshot.FORMAT_VERSION + 1).to_bytes(2, 'little')
+    elif damage == 'python':
+        raw[8:24] = b'other-python'.ljust(16, b'\0')
+    else:
+        raw[:4] = b'JSON'
+    with open(snapshot_path(store), 'wb') as f:
+        f.write(raw)
+
+    assert load_json_store(store) == DATA
+    if damage in ('format', 'python', 'magic', 'truncated header'):
+        assert snapshot_signature(store) is None  # So the next write replaces it
+
+
+def test_disabled_snapshots_are_ignored(store, monkeypatch):
+    plant(store, {'from': 'snapshot'})
+    monkeypatch.setitem(CONFIG['storage']['snapshots'], 'enabled', False)
+    assert load_json_store(store) == DATA
+
+
+def test_missing_json_still_raises(tmp_path):
+    path = str(tmp_path / 'missing.json')
+    assert write_store_snapshot(path, DATA) == 0
+    with pytest.raises(FileNotFoundError):
+        load_json_store(path)
+
+
+def test_snapshot_never_holds_unsaved_changes(store):
+    data = json.loads(json.dumps(DATA))
+    snapshots = StoreSnapshots()
+    snapshots.register(store, lambda: data, 'Test')
+
+    async def main():
+        writing = asyncio.create_task(snapshots.write_all())
+        await asyncio.sleep(0)  # write_all has read the store and is writing the file
+        data['unsaved'] = True  # A change its owner hasn't saved yet
+        return await writing
+
+    assert asyncio.run(main()) > 0
+    assert load_json_store(store) == DATA
+
+
+def test_conflicting_owners_are_not_snapshotted(store):
+    snapshots = StoreSnapshots()
+    snapshots.register(store, lambda: DATA, 'First')
+    snapshots.register(store, lambda: DATA, 'Second')
+    assert asyncio.run(snapshots.write_all()) == 0
+    assert not os.path.exists(snapshot_path(store))
@@ -0,0 +1,78 @@
+"""The supervisor must keep all of the bot's output and restart it only when a restart can help"""
+import asyncio
+import sys
+import time
+
+from utils.supervisor import EXIT_CONFIG_ERROR, BotSupervisor, backoff_delay
+
+
+def make_supervisor(tmp_path, script, **kwargs):
+    return BotSupervisor(
+        [sys.executable, '-c', script], str(tmp_path), str(tmp_path / 'bot.log'), str(tmp_path / 'heartbeat.json'),
+        echo=False, min_backoff=0.05, max_backoff=0.05, stop_timeout=2, **kwargs
+    )
+
+
+def test_backoff_delay():
+    assert [backoff_delay(failures, 1, 300) for failures in range(6)] == [1, 1, 2, 4, 8, 16]
+    assert backoff_delay(20, 1, 300) == 300
+    assert backoff_delay(3, 0.5, 1) == 1
+
+
+def test_drain_keeps_lines_over_the_limit(tmp_path):
+    supervisor = make_supervisor(tmp_path, '')
+
+    async def main():
+        stream = asyncio.StreamReader(limit=16)
+
+        async def write():
+            stream.feed_data(b'short\n' + b'a' * 40 + b'\n')
+            # Fed a little at a time, so the limit is passed before the newline arrives
+            for _ in range(5):
+                stream.feed_data(b'b' * 10)
+                await asyncio.sleep(0)
+            stream.feed_data(b'\ntail')
+            stream.feed_eof()
+
+        await asyncio.gather(supervisor._drain(stream), write())
+
+    asyncio.run(main())
+    lines = (tmp_path / 'bot.log').read_text().splitlines()
+    assert lines[0] == 'short'
+    assert lines[-1] == 'tail'
+    assert ''.join(lines[1:-1]) == 'a' * 40 + 'b' * 50
+    assert all(set(line) in ({'a'}, {'b'}) for line in lines[1:-1])
+
+
+def test_restarts_on_stale_heartbeat(tmp_path):
+    # Writes one heartbeat that is already old, then hangs
+    script = (
+        "import json, os, time\n"
+        "json.dump({'pid': os.getpid(), 'time': time.time() - 1000}, open(os.environ['BOT_HEARTBEAT_FILE'], 'w'))\n"
+        "print('started', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    supervisor = make_supervisor(tmp_path, script, hang_timeout=0.3)
+
+    async def main():
+        task = asyncio.create_task(supervisor.run())
+        deadline = time.monotonic() + 20
+        while supervisor.restarts < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await supervisor.stop()
+        await task
+
+    asyncio.run(main())
+    assert supervisor.restarts >= 2
+    assert supervisor.last_exit_code != 0 and not supervisor.gave_up
+    assert (tmp_path / 'bot.log').read_text().count('started') >= 2
+
+
+def test_config_error_stops_restarts(tmp_path):
+    supervisor = make_supervisor(tmp_path, f"import sys; print('no token'); sys.exit({EXIT_CONFIG_ERROR})")
+
+    asyncio.run(asyncio.wait_for(supervisor.run(), 20))
+    assert supervisor.last_exit_code == EXIT_CONFIG_ERROR
+    assert supervisor.gave_up and supervisor.restarts == 0
+    assert not supervisor.status()['alive']
+    assert (tmp_path / 'bot.log').read_text() == 'no token\n'
@@ -0,0 +1,52 @@
+"""Show traces the bot exported to its JSONL trace file
+
+    python traces.py --slowest 10            # the ten slowest traces, as span trees
+    python traces.py --name "command gstart" # only traces containing a matching span
+    python traces.py --trace <trace id>      # one trace
+
+See utils/tracing.py for what is traced and when a trace is exported.
+"""
+import argparse
+import os
+import sys
+
+from config import CONFIG
+from utils.tracing import format_trace, load_traces
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show exported traces as span trees")
+    parser.add_argument("--file", default=CONFIG['tracing']['file'], help="relative to the bot directory")
+    parser.add_argument("--slowest", type=int, default=5, help="how many traces to show")
+    parser.add_argument("--name", help="only traces with a span whose name contains this")
+    parser.add_argument("--trace", help="show one trace by id")
+    args = parser.parse_args()
+
+    traces = load_traces(os.path.join(BOT_DIR, args.file))
+    if args.trace:
+        traces = {args.trace: traces.get(args.trace, [])}
+    if args.name:
+        traces = {
+            trace_id: spans for trace_id, spans in traces.items()
+            if any(args.name in span['name'] for span in spans)
+        }
+
+    def duration(spans):
+        return max(span['start'] * 1000 + span['duration_ms'] for span in spans) - min(span['start'] * 1000 for span in spans)
+
+    shown = sorted((spans for spans in traces.values() if spans), key=duration, reverse=True)[:args.slowest]
+    if not shown:
+        print("No matching traces")
+        return 1
+
+    for spans in shown:
+        print(f"trace {spans[0]['trace_id']}  {duration(spans):.1f}ms, {len(spans)} spans")
+        print(format_trace(spans))
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
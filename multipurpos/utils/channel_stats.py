@@ -0,0 +1,221 @@
+import json
+import os
+import logging
+import time
+
+import discord
+
+from utils.storage import data_path
+
+logger = logging.getLogger('discord_bot')
+
+# Hourly activity buckets older than this are dropped when saving
+BUCKET_RETENTION_HOURS = 24 * 7
+
+# Online periods remembered for deciding which deleted messages were counted
+MAX_ONLINE_PERIODS = 1000
+
+
+class ChannelMessageCounters:
+    """Per-channel message counters maintained from gateway events
+
+    Each channel keeps an exact running total, the snowflake of the first
+    message it tracked, and hourly buckets for recent activity rates. The
+    counters are persisted as compact JSON so reading them never needs a
+    history fetch.
+
+    Messages sent while the bot was offline are never counted, so the
+    snowflake ranges the bot was online for are kept too, and a deleted
+    message is only uncounted if it was sent in one of them (or before a
+    backfilled channel's first tracked message).
+    """
+
+    def __init__(self, file_path=None):
+        """Initialize the counters
+
+        Args:
+            file_path (str): Path to the JSON file for counter storage
+                (defaults to data/channel_stats.json under the data root)
+        """
+        self.file_path = file_path or data_path('data/channel_stats.json')
+        self.channels = {}
+        self.online = []  # [first snowflake, last snowflake] of previous runs
+        self.session = [discord.utils.time_snowflake(discord.utils.utcnow()), None]
+        self.dirty = False
+
+        # Ensure the directory exists
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+        self.load()
+
+    def load(self):
+        """Load counters from the JSON file"""
+        try:
+            if os.path.exists(self.file_path):
+                with open(self.file_path, 'r') as f:
+                    data = json.load(f)
+
+                # Files from before online periods were kept hold only the channels
+                channels = data['channels'] if 'channels' in data else data
+                self.online = [list(period) for period in data.get('online', [])]
+
+                # Stored as [total, since, backfilled, {hour: count}] to keep the file small
+                self.channels = {
+                    int(channel_id): {
+                        'total': total,
+                        'since': since,
+                        'backfilled': bool(backfilled),
+                        'hours': {int(hour): count for hour, count in hours.items()}
+                    }
+                    for channel_id, (total, since, backfilled, hours) in channels.items()
+                }
+                logger.info(f"Loaded message counters for {len(self.channels)} channels")
+        except Exception as e:
+            logger.error(f"Error loading channel message counters: {e}")
+            self.channels = {}
+            self.online = []
+
+    def save(self):
+        """Save counters to the JSON file if anything changed
+
+        Returns:
+            bool: True if the file was written
+        """
+        if not self.dirty:
+            return False
+
+        self.prune()
+        self.session[1] = discord.utils.time_snowflake(discord.utils.utcnow())
+        data = {
+            'online': (self.online + [self.session])[-MAX_ONLINE_PERIODS:],
+            'channels': {
+                str(channel_id): [entry['total'], entry['since'], int(entry['backfilled']), entry['hours']]
+                for channel_id, entry in self.channels.items()
+            }
+        }
+
+        try:
+            with open(self.file_path, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            self.dirty = False
+            return True
+        except Exception as e:
+            logger.error(f"Error saving channel message counters: {e}")
+            return False
+
+    def prune(self, now=None):
+        """Drop hourly buckets older than the retention window"""
+        cutoff = self._hour(now or time.time()) - BUCKET_RETENTION_HOURS
+        for entry in self.channels.values():
+            stale = [hour for hour in entry['hours'] if hour <= cutoff]
+            for hour in stale:
+                del entry['hours'][hour]
+
+    @staticmethod
+    def _hour(timestamp):
+        """Get the hour bucket for a UNIX timestamp"""
+        return int(timestamp // 3600)
+
+    def _entry(self, channel_id, message_id):
+        """Get the counter entry for a channel, starting it at this message if new"""
+        entry = self.channels.get(channel_id)
+        if entry is None:
+            entry = {'total': 0, 'since': message_id, 'backfilled': False, 'hours': {}}
+            self.channels[channel_id] = entry
+        return entry
+
+    def record_message(self, channel_id, message_id):
+        """Count a newly created message
+
+        Args:
+            channel_id (int): The channel the message was sent in
+            message_id (int): The message snowflake
+        """
+        entry = self._entry(channel_id, message_id)
+        hour = self._hour(discord.utils.snowflake_time(message_id).timestamp())
+
+        entry['total'] += 1
+        entry['hours'][hour] = entry['hours'].get(hour, 0) + 1
+        self.dirty = True
+
+    def was_counted(self, entry, message_id):
+        """Whether a message was counted: sent while the bot was online, or covered by a backfill"""
+        if message_id < entry['since']:
+            return entry['backfilled']
+        if message_id >= self.session[0]:
+            return True
+        return any(start <= message_id <= end for start, end in self.online)
+
+    def record_deletes(self, channel_id, message_ids):
+        """Uncount deleted messages
+
+        Messages that were never counted are skipped: those older than the
+        first tracked one in a channel that wasn't backfilled, and those
+        sent while the bot was offline.
+
+        Args:
+            channel_id (int): The channel the messages were deleted from
+            message_ids: Snowflakes of the deleted messages
+        """
+        entry = self.channels.get(channel_id)
+        if entry is None:
+            return
+
+        for message_id in message_ids:
+            if not self.was_counted(entry, message_id):
+                continue
+
+            entry['total'] = max(entry['total'] - 1, 0)
+
+            hour = self._hour(discord.utils.snowflake_time(message_id).timestamp())
+            if entry['hours'].get(hour):
+                entry['hours'][hour] -= 1
+
+            self.dirty = True
+
+    def record_backfill(self, channel_id, before_id, count):
+        """Add the messages counted by a one-time history backfill
+
+        Args:
+            channel_id (int): The backfilled channel
+            before_id (int): The snowflake the backfill counted up to
+            count (int): The number of messages found before it
+        """
+        entry = self._entry(channel_id, before_id)
+        entry['total'] += count
+        entry['since'] = min(entry['since'], before_id)
+        entry['backfilled'] = True
+        self.dirty = True
+
+    def forget(self, channel_id):
+        """Remove a channel's counters"""
+        if self.channels.pop(channel_id, None) is not None:
+            self.dirty = True
+
+    def get_stats(self, channel_id, now=None):
+        """Get message statistics for a channel
+
+        Args:
+            channel_id (int): The channel to look up
+            now (float): Current UNIX timestamp (defaults to time.time())
+
+        Returns:
+            dict: total, backfilled, since, last_hour, last_day and per_hour
+                (average over the last 24 hours), or None if the channel is untracked
+        """
+        entry = self.channels.get(channel_id)
+        if entry is None:
+            return None
+
+        current_hour = self._hour(now or time.time())
+        hours = entry['hours']
+        last_day = sum(count for hour, count in hours.items() if hour > current_hour - 24)
+
+        return {
+            'total': entry['total'],
+            'backfilled': entry['backfilled'],
+            'since': entry['since'],
+            'last_hour': hours.get(current_hour, 0),
+            'last_day': last_day,
+            'per_hour': last_day / 24
+        }
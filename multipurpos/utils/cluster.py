@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger('discord_bot')
+
+# Environment the cluster launcher (cluster.py) passes to each cluster process
+CLUSTER_ID_ENV = 'BOT_CLUSTER_ID'
+CLUSTER_COUNT_ENV = 'BOT_CLUSTER_COUNT'
+SHARD_IDS_ENV = 'BOT_SHARD_IDS'
+SHARD_COUNT_ENV = 'BOT_SHARD_COUNT'
+IPC_DIR_ENV = 'BOT_IPC_DIR'
+
+# Seconds to wait for another cluster to answer before leaving it out
+IPC_TIMEOUT = 2.0
+
+
+def shard_ranges(shard_count, clusters):
+    """Split shards into contiguous ranges, one per cluster
+
+    Range sizes differ by at most one shard.
+
+    Args:
+        shard_count (int): Total number of shards
+        clusters (int): Number of clusters to split them over
+
+    Returns:
+        list: One range of shard IDs per cluster
+    """
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+
+    ranges = []
+    start = 0
+    for index in range(clusters):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+
+    return ranges
+
+
+def shard_for_guild(guild_id, shard_count):
+    """Get the shard Discord routes a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+
+def format_shard_ids(shard_ids):
+    """Format a contiguous range of shard IDs as 'first-last'"""
+    return f"{shard_ids[0]}-{shard_ids[-1]}"
+
+
+def parse_shard_ids(value):
+    """Parse shard IDs formatted by format_shard_ids"""
+    first, _, last = value.partition('-')
+    return list(range(int(first), int(last or first) + 1))
+
+
+def socket_path(ipc_dir, cluster_id):
+    """Get the unix socket a cluster listens on"""
+    return os.path.join(ipc_dir, f'cluster-{cluster_id}.sock')
+
+
+class ClusterInfo:
+    """Which shards this process runs, as assigned by the cluster launcher"""
+
+    def __init__(self, cluster_id, cluster_count, shard_ids, shard_count, ipc_dir):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_ids = list(shard_ids)
+        self.shard_count = shard_count
+        self.ipc_dir = ipc_dir
+
+    @classmethod
+    def from_env(cls):
+        """Read the cluster assignment from the environment
+
+        Returns:
+            ClusterInfo: The assignment, or None when not started by the launcher
+        """
+        if CLUSTER_ID_ENV not in os.environ:
+            return None
+
+        return cls(
+            cluster_id=int(os.environ[CLUSTER_ID_ENV]),
+            cluster_count=int(os.environ[CLUSTER_COUNT_ENV]),
+            shard_ids=parse_shard_ids(os.environ[SHARD_IDS_ENV]),
+            shard_count=int(os.environ[SHARD_COUNT_ENV]),
+            ipc_dir=os.environ[IPC_DIR_ENV]
+        )
+
+    def to_env(self):
+        """Get the environment variables that describe this assignment"""
+        return {
+            CLUSTER_ID_ENV: str(self.cluster_id),
+            CLUSTER_COUNT_ENV: str(self.cluster_count),
+            SHARD_IDS_ENV: format_shard_ids(self.shard_ids),
+            SHARD_COUNT_ENV: str(self.shard_count),
+            IPC_DIR_ENV: self.ipc_dir
+        }
+
+    def __repr__(self):
+        return (
+            f"<ClusterInfo {self.cluster_id + 1}/{self.cluster_count} "
+            f"shards={format_shard_ids(self.shard_ids)} of {self.shard_count}>"
+        )
+
+
+async def ipc_request(ipc_dir, cluster_id, op, timeout=IPC_TIMEOUT):
+    """Send one request to a cluster
+
+    Args:
+        ipc_dir (str): Directory holding the cluster sockets
+        cluster_id (int): The cluster to ask
+        op (str): The request name, e.g. 'stats'
+        timeout (float): Seconds to wait for the answer
+
+    Returns:
+        The response data, or None if the cluster didn't answer
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(socket_path(ipc_dir, cluster_id)),
+            timeout
+        )
+        writer.write(json.dumps({'op': op}).encode() + b'\n')
+        await writer.drain()
+
+        response = json.loads(await asyncio.wait_for(reader.readline(), timeout))
+        if not response.get('ok'):
+            logger.warning(f"Cluster {cluster_id} could not answer {op}: {response.get('error')}")
+            return None
+        return response['data']
+    except (OSError, asyncio.TimeoutError, ValueError) as e:
+        logger.warning(f"Cluster {cluster_id} did not answer {op}: {e or type(e).__name__}")
+        return None
+    finally:
+        if writer:
+            writer.close()
+
+
+class ClusterIPC:
+    """Request/response channel between the cluster processes
+
+    Every cluster listens on a unix socket in the IPC directory and answers
+    newline-delimited JSON requests ({"op": name}) with the registered
+    handler's result. Cogs register handlers for the data they can share,
+    e.g. Utility answers 'stats' so botinfo can report totals for the whole
+    bot rather than just this process's shards.
+    """
+
+    def __init__(self, info):
+        self.info = info
+        self.handlers = {}  # Op -> async function returning JSON-serializable data
+        self.server = None
+
+    def register(self, op, handler):
+        """Answer requests for an op with an async handler"""
+        self.handlers[op] = handler
+
+    def unregister(self, op):
+        """Stop answering requests for an op"""
+        self.handlers.pop(op, None)
+
+    async def start(self):
+        """Start listening for requests from other clusters"""
+        os.makedirs(self.info.ipc_dir, exist_ok=True)
+        path = socket_path(self.info.ipc_dir, self.info.cluster_id)
+
+        # Left behind if the previous process for this cluster was killed
+        if os.path.exists(path):
+            os.remove(path)
+
+        self.server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        logger.info(f"Cluster {self.info.cluster_id} listening for IPC on {path}")
+
+    async def close(self):
+        """Stop listening and remove the socket"""
+        if self.server is None:
+            return
+
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+
+        path = socket_path(self.info.ipc_dir, self.info.cluster_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    async def _handle_connection(self, reader, writer):
+        """Answer one request"""
+        try:
+            line = await asyncio.wait_for(reader.readline(), IPC_TIMEOUT)
+            request = json.loads(line)
+            response = await self._answer(request.get('op'))
+        except (asyncio.TimeoutError, ValueError) as e:
+            response = {'ok': False, 'error': f"Bad request: {e or type(e).__name__}"}
+
+        try:
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        except OSError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, op):
+        """Run the handler for an op"""
+        handler = self.handlers.get(op)
+        if handler is None:
+            return {'ok': False, 'error': f"Unknown op {op}"}
+
+        try:
+            return {'ok': True, 'data': await handler()}
+        except Exception as e:
+            logger.error(f"Error answering IPC {op}: {e}")
+            return {'ok': False, 'error': str(e)}
+
+    async def request_all(self, op):
+        """Ask every cluster, including this one, concurrently
+
+        Args:
+            op (str): The request name
+
+        Returns:
+            dict: Cluster ID -> response data (None for clusters that didn't answer)
+        """
+        async def ask(cluster_id):
+            if cluster_id == self.info.cluster_id:
+                response = await self._answer(op)
+                return response['data'] if response['ok'] else None
+            return await ipc_request(self.info.ipc_dir, cluster_id, op)
+
+        cluster_ids = range(self.info.cluster_count)
+        responses = await asyncio.gather(*(ask(cluster_id) for cluster_id in cluster_ids))
+        return dict(zip(cluster_ids, responses))
@@ -0,0 +1,180 @@
+"""JSON API over the bot's published snapshot (see utils/snapshot.py)
+
+    GET /api/v1/guilds
+    GET /api/v1/guilds/<guild_id>/levels?limit=50&cursor=...
+    GET /api/v1/guilds/<guild_id>/invites
+    GET /api/v1/guilds/<guild_id>/messages?period=all_time|today
+    GET /api/v1/guilds/<guild_id>/giveaways
+    GET /api/v1/guilds/<guild_id>/warnings
+
+Lists are paginated with opaque cursors: pass a response's next_cursor to
+get the following page. Every response carries an ETag derived from the
+snapshot it was built from, so If-None-Match requests are answered with 304
+without building anything, and built responses are cached per endpoint for
+a short TTL.
+
+The live event stream, /api/v1/events, is not served here: each open
+stream would hold one of the dashboard's worker threads, so it has its own
+async server (events_server.py, see utils/event_stream.py).
+"""
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Blueprint, Response, abort, jsonify, request
+
+from config import CONFIG
+from utils.metrics import observe_cache
+from utils.snapshot import SnapshotReader
+
+LIST_SECTIONS = {
+    'levels': 'levels',
+    'invites': 'invites',
+    'giveaways': 'giveaways',
+    'warnings': 'warnings',
+}
+MESSAGE_PERIODS = ('all_time', 'today')
+
+
+class TTLCache:
+    """A size-bounded cache whose entries expire after a per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # Key -> (expires at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                observe_cache('dashboard_api', False)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            observe_cache('dashboard_api', True)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def encode_cursor(key):
+    """Make an opaque cursor from a sort key"""
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Read a cursor made by encode_cursor
+
+    Returns:
+        list: The sort key
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(key, list):
+        raise ValueError("Cursor is not a sort key")
+    return key
+
+
+def init_dashboard_api(app, reader=None, url_prefix='/api/v1'):
+    """Register the API on a Flask app
+
+    Args:
+        app (Flask): The dashboard app
+        reader (SnapshotReader): Snapshot source (defaults to the configured files)
+        url_prefix (str): Where the endpoints are mounted
+
+    Returns:
+        SnapshotReader: The reader the endpoints use
+    """
+    settings = CONFIG['dashboard_api']
+    reader = reader or SnapshotReader()
+    cache = TTLCache(settings['cache_entries'])
+    blueprint = Blueprint('dashboard_api', __name__, url_prefix=url_prefix)
+
+    def cached(endpoint, build):
+        """Serve a response for the current snapshot, from the cache when possible"""
+        snapshot = reader.get()
+        ttl = settings['cache_ttl'].get(endpoint, settings['cache_ttl']['default'])
+        etag = hashlib.sha1(f"{snapshot.etag_base}:{request.full_path}".encode()).hexdigest()[:20]
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={ttl}'}
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        body = cache.get(etag)
+        if body is None:
+            payload = build(snapshot)
+            payload['snapshot'] = {'sequence': list(snapshot.sequences), 'generated_at': snapshot.generated_at}
+            body = json.dumps(payload, separators=(',', ':'))
+            cache.set(etag, body, ttl)
+
+        return Response(body, mimetype='application/json', headers=headers)
+
+    def page_args():
+        try:
+            limit = min(max(int(request.args.get('limit', settings['page_size'])), 1), settings['max_page_size'])
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except (TypeError, ValueError):
+            abort(400, description="Invalid limit or cursor")
+        return limit, after
+
+    def list_section(guild_id, section):
+        limit, after = page_args()
+
+        def build(snapshot):
+            if guild_id not in snapshot.guilds:
+                abort(404, description="Unknown guild")
+            try:
+                items, last_key = snapshot.page(guild_id, section, after, limit)
+            except TypeError:
+                abort(400, description="Cursor does not belong to this list")
+            return {'data': items, 'next_cursor': encode_cursor(last_key) if last_key else None}
+
+        return cached(section, build)
+
+    @blueprint.route('/guilds')
+    def guilds():
+        def build(snapshot):
+            return {'data': [
+                {'id': guild_id, 'name': guild['name'], 'member_count': guild['member_count']}
+                for guild_id, guild in sorted(snapshot.guilds.items())
+            ]}
+        return cached('guilds', build)
+
+    @blueprint.route('/guilds/<guild_id>/<section>')
+    def guild_section(guild_id, section):
+        if section not in LIST_SECTIONS:
+            abort(404)
+        return list_section(guild_id, LIST_SECTIONS[section])
+
+    @blueprint.route('/guilds/<guild_id>/messages')
+    def messages(guild_id):
+        period = request.args.get('period', 'all_time')
+        if period not in MESSAGE_PERIODS:
+            abort(400, description=f"period must be one of {', '.join(MESSAGE_PERIODS)}")
+        return list_section(guild_id, f'messages_{period}')
+
+    @blueprint.errorhandler(400)
+    @blueprint.errorhandler(404)
+    def error(e):
+        return jsonify({'error': e.description}), e.code
+
+    app.register_blueprint(blueprint)
+    app.extensions['dashboard_api'] = {'reader': reader, 'cache': cache}
+    return reader
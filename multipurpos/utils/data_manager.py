@@ -2,6 +2,10 @@ import json
 import os
 import logging
 import asyncio
+from config import CONFIG
+from utils.store_snapshot import load_json_store
+from utils.metrics import STORAGE_FLUSH_BYTES, STORAGE_FLUSH_ERRORS, time_flush
+from utils.tracing import span
 
 logger = logging.getLogger('discord_bot')
 
@@ -13,6 +17,7 @@ class DataManager:
             file_path (str): Path to the JSON file for data storage
         """
         self.file_path = file_path
+        self.store = os.path.splitext(os.path.basename(file_path))[0]  # Metrics label
         self.data = {}
         self.lock = asyncio.Lock()
         
@@ -26,8 +31,7 @@ class DataManager:
         """Load data from the JSON file."""
         try:
             if os.path.exists(self.file_path):
-                with open(self.file_path, 'r') as f:
-                    self.data = json.load(f)
+                self.data = load_json_store(self.file_path)
             else:
                 # Create the file with empty data
                 self._save_data()
@@ -39,9 +43,11 @@ class DataManager:
     def _save_data(self):
         """Save data to the JSON file."""
         try:
-            with open(self.file_path, 'w') as f:
+            with span('storage.save', store=self.store), time_flush(self.store), open(self.file_path, 'w') as f:
                 json.dump(self.data, f, indent=4)
+                STORAGE_FLUSH_BYTES.labels(self.store).inc(f.tell())
         except Exception as e:
+            STORAGE_FLUSH_ERRORS.labels(self.store).inc()
             logger.error(f"Failed to save data to {self.file_path}: {e}")
     
     async def get(self, key, default=None):
@@ -110,3 +116,20 @@ class DataManager:
         """
         async with self.lock:
             return self.data.copy()
+
+def open_data_manager(file_path):
+    """Open a data manager for the configured storage backend
+    
+    Args:
+        file_path (str): Path to the JSON file; with Redis storage, its name
+            becomes the namespace
+    
+    Returns:
+        DataManager or RedisDataManager: The data manager
+    """
+    storage = CONFIG['storage']
+    if storage['backend'] == 'redis':
+        from utils.redis_database import RedisDataManager, get_redis_client
+        namespace = os.path.splitext(os.path.basename(file_path))[0]
+        return RedisDataManager(get_redis_client(), namespace, storage['redis_prefix'])
+    return DataManager(file_path)
@@ -0,0 +1,281 @@
+"""Split the bot's data files between cluster data directories
+
+Each cluster keeps its own data root (see utils.storage), and a guild's
+data must be in the root of the cluster running its shard. partition_data
+merges the data a deployment has now, from the single-process data
+directory and/or the cluster roots of an earlier layout, and writes one
+root per cluster for a new shard and cluster count:
+
+    python cluster.py --clusters 4 --shards 16 --partition-data
+
+The layout the roots were written for is recorded in layout.json under
+sharding.data_root, and the launcher refuses to start clusters whose
+roots don't match it (see check_layout), instead of starting them with
+empty or misplaced data.
+
+Files are split by guild where their layout is known (GUILD_KEYED and the
+per-guild level files). Files keyed by something else are copied to every
+cluster, which is harmless since a cluster only ever touches its own
+guilds' entries. Previous cluster roots are moved aside, not deleted, and
+the single-process data directory is left as it is.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+from utils.cluster import shard_for_guild
+
+logger = logging.getLogger('discord_bot')
+
+LAYOUT_FILE = 'layout.json'
+CLUSTER_DIR = re.compile(r'^cluster-(\d+)-of-(\d+)$')
+
+# Files whose guild entries are split, and how deep: at depth 0 the top-level
+# keys are guild keys; at depth 1 so are the keys of each top-level mapping
+# that isn't itself a guild's entry (bot_database.json's sections)
+GUILD_KEYED = {
+    'bot_database.json': 1,
+    'data/moderation_settings.json': 0,
+    'data/polls_data.json': 0,
+    'data/role_menus.json': 0,
+    'data/welcome_settings.json': 0,
+    'data/logging_settings.json': 1,
+    'data/levels.json': 1,
+}
+PER_GUILD_FILE = re.compile(r'^data/guild_(\d+)_levels\.json$')
+
+# Rebuilt by each cluster, so not carried over
+SKIPPED = re.compile(r'(^data/leases\.db.*|^data/dashboard_snapshot\.json|\.snap$|\.tmp$)')
+
+# Guild IDs as store keys: the ID itself, or the Levels cog's guild_<id> and user_<guild>_<user>
+GUILD_KEY = re.compile(r'^(?:guild_)?(\d{15,22})$|^user_(\d{15,22})_\d+$')
+
+
+def guild_of(key):
+    """Get the guild ID a store key belongs to, or None if it isn't a guild key"""
+    match = GUILD_KEY.match(str(key))
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+def read_layout(data_root):
+    """Get the layout the cluster roots were written for, or None if there is none"""
+    try:
+        with open(os.path.join(data_root, LAYOUT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def cluster_dirs(data_root):
+    """Get the cluster roots under data_root"""
+    if not os.path.isdir(data_root):
+        return []
+    return sorted(
+        os.path.join(data_root, name) for name in os.listdir(data_root)
+        if CLUSTER_DIR.match(name) and os.path.isdir(os.path.join(data_root, name))
+    )
+
+
+def data_files(root):
+    """Get the data files under a data root, as paths relative to it"""
+    files = []
+    if os.path.isfile(os.path.join(root, 'bot_database.json')):
+        files.append('bot_database.json')
+    data_dir = os.path.join(root, 'data')
+    if os.path.isdir(data_dir):
+        files += [
+            f'data/{name}' for name in sorted(os.listdir(data_dir))
+            if os.path.isfile(os.path.join(data_dir, name)) and not SKIPPED.search(f'data/{name}')
+        ]
+    return files
+
+
+def check_layout(data_root, base_root, shard_count, cluster_names):
+    """Check the cluster roots hold data for this shard and cluster count
+
+    Args:
+        data_root (str): sharding.data_root
+        base_root (str): The single-process data directory
+        shard_count (int): Total shards about to run
+        cluster_names (list): The cluster root names about to be used
+
+    Returns:
+        str: Why the clusters shouldn't start, or None if they can
+    """
+    layout = read_layout(data_root)
+    if layout is not None:
+        if layout['shard_count'] != shard_count or layout['clusters'] != len(cluster_names):
+            return (
+                f"The cluster data in {data_root} was partitioned for {layout['shard_count']} shards in "
+                f"{layout['clusters']} clusters, not {shard_count} in {len(cluster_names)}"
+            )
+        return None
+
+    # No layout: only a fresh install may start without partitioning
+    existing = [path for path in cluster_dirs(data_root) if data_files(path)]
+    if data_files(base_root) or existing:
+        return f"There is bot data that hasn't been partitioned for {shard_count} shards in {len(cluster_names)} clusters"
+    return None
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _split(value, owner, targets, depth):
+    """Split a mapping's guild entries by owning cluster
+
+    Args:
+        value: The file's (merged) contents
+        owner (callable): Guild ID -> cluster index
+        targets (int): Number of clusters
+        depth (int): Levels of non-guild keys to split below (see GUILD_KEYED)
+
+    Returns:
+        list: The contents for each cluster
+    """
+    if not isinstance(value, dict):
+        return [value] * targets
+
+    parts = [{} for _ in range(targets)]
+    for key, item in value.items():
+        guild_id = guild_of(key)
+        if guild_id is not None:
+            parts[owner(guild_id)][key] = item
+        elif depth > 0 and isinstance(item, dict):
+            for part, split_item in zip(parts, _split(item, owner, targets, depth - 1)):
+                part[key] = split_item
+        else:
+            for part in parts:
+                part[key] = item
+    return parts
+
+
+def _merge(values, depth):
+    """Merge a file's contents from several sources, newest source last
+
+    Guild entries come from whichever source has them (the newest if several
+    do); other keys are merged the same way down to the split depth.
+    """
+    if not all(isinstance(value, dict) for value in values):
+        return values[-1]
+
+    merged = {}
+    for value in values:
+        for key, item in value.items():
+            if depth > 0 and guild_of(key) is None and isinstance(item, dict) and isinstance(merged.get(key), dict):
+                merged[key] = _merge([merged[key], item], depth - 1)
+            else:
+                merged[key] = item
+    return merged
+
+
+def _merge_channel_stats(values):
+    """Merge channel counters copied to several clusters, keeping each channel's largest total
+
+    The online periods are dropped: they differ per cluster, and without
+    them deletes of older messages are skipped rather than over-counted.
+    """
+    channels = {}
+    for value in values:
+        entries = value['channels'] if 'channels' in value else value
+        for channel_id, entry in entries.items():
+            if channel_id not in channels or entry[0] > channels[channel_id][0]:
+                channels[channel_id] = entry
+    return {'online': [], 'channels': channels}
+
+
+def _write(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(value, f, indent=4)
+
+
+def partition_data(data_root, base_root, shard_count, cluster_names, shard_ranges):
+    """Merge the current data and write one data root per cluster
+
+    Args:
+        data_root (str): sharding.data_root, holding the cluster roots
+        base_root (str): The single-process data directory
+        shard_count (int): Total shards of the new layout
+        cluster_names (list): Root directory names of the new clusters
+        shard_ranges (list): Shard IDs of each new cluster
+
+    Returns:
+        dict: Files written per cluster root name
+    """
+    # Sources, oldest first so newer copies of an entry win: the single-process
+    # data only if it was never partitioned, then the previous cluster roots
+    sources = [] if read_layout(data_root) else [base_root]
+    sources += cluster_dirs(data_root)
+    sources = [source for source in sources if data_files(source)]
+    sources.sort(key=lambda source: max(os.path.getmtime(os.path.join(source, name)) for name in data_files(source)))
+
+    cluster_of_shard = {shard_id: index for index, shard_ids in enumerate(shard_ranges) for shard_id in shard_ids}
+
+    def owner(guild_id):
+        return cluster_of_shard[shard_for_guild(guild_id, shard_count)]
+
+    files = {}  # Relative path -> [(source, absolute path)]
+    for source in sources:
+        for name in data_files(source):
+            files.setdefault(name, []).append(os.path.join(source, name))
+
+    staging = os.path.join(data_root, '.partition')
+    shutil.rmtree(staging, ignore_errors=True)
+    written = {name: [] for name in cluster_names}
+
+    for name, paths in sorted(files.items()):
+        per_guild = PER_GUILD_FILE.match(name)
+        if per_guild:
+            # Newest copy, to the owning cluster only
+            target = cluster_names[owner(int(per_guild.group(1)))]
+            os.makedirs(os.path.join(staging, target, 'data'), exist_ok=True)
+            shutil.copy2(paths[-1], os.path.join(staging, target, name))
+            written[target].append(name)
+            continue
+
+        if name == 'data/channel_stats.json':
+            parts = [_merge_channel_stats([_load(path) for path in paths])] * len(cluster_names)
+        elif name in GUILD_KEYED:
+            depth = GUILD_KEYED[name]
+            parts = _split(_merge([_load(path) for path in paths], depth), owner, len(cluster_names), depth)
+        else:
+            logger.warning(f"Copying {name} to every cluster: how it is keyed isn't known")
+            for target in cluster_names:
+                os.makedirs(os.path.dirname(os.path.join(staging, target, name)), exist_ok=True)
+                shutil.copy2(paths[-1], os.path.join(staging, target, name))
+                written[target].append(name)
+            continue
+
+        for target, part in zip(cluster_names, parts):
+            _write(os.path.join(staging, target, name), part)
+            written[target].append(name)
+
+    # Only now touch the live roots: move the old ones aside, then the new ones in
+    previous = cluster_dirs(data_root)
+    if previous:
+        backup = os.path.join(data_root, f'previous-{time.strftime("%Y%m%d-%H%M%S")}')
+        os.makedirs(backup)
+        for path in previous:
+            os.rename(path, os.path.join(backup, os.path.basename(path)))
+        logger.info(f"Moved {len(previous)} previous cluster roots to {backup}")
+
+    for target in cluster_names:
+        os.makedirs(os.path.join(staging, target), exist_ok=True)
+        os.rename(os.path.join(staging, target), os.path.join(data_root, target))
+    os.rmdir(staging)
+
+    _write(os.path.join(data_root, LAYOUT_FILE), {
+        'shard_count': shard_count,
+        'clusters': len(cluster_names),
+        'partitioned_at': time.time(),
+        'sources': sources
+    })
+    return written
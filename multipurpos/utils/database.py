@@ -1,16 +1,65 @@
+import asyncio
+import contextvars
+import functools
+import heapq
 import json
 import os
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from config import CONFIG
+from utils.leader import LEASE_FILE, SINGLETON_LEASE, SQLiteLeaseStore
+from utils.metrics import STORAGE_FLUSH_BYTES, STORAGE_FLUSH_ERRORS, time_flush
+from utils.storage import data_path
+from utils.store_snapshot import load_json_store
+from utils.tracing import span
 
 logger = logging.getLogger('discord_bot')
 
 class JsonDatabase:
     """Simple JSON file-based database for storing bot data"""
     
-    def __init__(self):
-        """Initialize the database"""
-        self.data = {
+    def __init__(self, data=None):
+        """Initialize the database
+        
+        The file is parsed on first use rather than here: the global db is
+        created when utils.database is imported, and a large database would
+        otherwise hold up every import of it, and with it startup.
+        
+        Args:
+            data (dict): Contents to use instead of the file's, for read-only copies (see copy_guild)
+        """
+        self._data = data
+        self._load_lock = threading.RLock()
+        self._leases = None
+        self.db_file = data_path('bot_database.json')
+        if os.path.dirname(self.db_file):
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+    
+    @property
+    def data(self):
+        """The database contents, loaded from the file on first access"""
+        if self._data is None:
+            with self._load_lock:
+                if self._data is None:
+                    self._load_data()
+        return self._data
+    
+    @data.setter
+    def data(self, value):
+        self._data = value
+    
+    @property
+    def leases(self):
+        """The lease store fenced writes are checked against, shared by processes using this data root"""
+        if self._leases is None:
+            self._leases = SQLiteLeaseStore(data_path(LEASE_FILE))
+        return self._leases
+    
+    def _load_data(self):
+        """Load data from the JSON file"""
+        data = {
             'autoroles': {},
             'levels': {},
             'tickets': {},
@@ -19,35 +68,49 @@ class JsonDatabase:
             'reaction_roles': {},
             'giveaways': {}
         }
-        self.db_file = 'bot_database.json'
-        self._load_data()
-    
-    def _load_data(self):
-        """Load data from the JSON file"""
         if os.path.exists(self.db_file):
             try:
-                with open(self.db_file, 'r') as f:
-                    self.data = json.load(f)
+                data = load_json_store(self.db_file)
                 logger.info(f"Database loaded from {self.db_file}")
             except json.JSONDecodeError:
                 logger.error(f"Failed to decode JSON from {self.db_file}, using default data")
             except Exception as e:
                 logger.error(f"Error loading database: {e}")
+            self._data = data
         else:
             logger.info(f"Database file {self.db_file} not found, creating new database")
+            self._data = data
             self._save_data()
     
     def _save_data(self):
         """Save data to the JSON file"""
         try:
-            with open(self.db_file, 'w') as f:
+            with span('storage.save', store='database'), time_flush('database'), open(self.db_file, 'w') as f:
                 json.dump(self.data, f, indent=4)
+                STORAGE_FLUSH_BYTES.labels('database').inc(f.tell())
             logger.info(f"Database saved to {self.db_file}")
             return True
         except Exception as e:
+            STORAGE_FLUSH_ERRORS.labels('database').inc()
             logger.error(f"Error saving database: {e}")
             return False
     
+    def copy_guild(self, guild_id):
+        """Copy a guild's leaderboard data, to read it off the event loop
+        
+        Only the guild's mappings of members are copied, which is quick;
+        the member records are shared, and stay safe to read from another
+        thread while this database keeps changing them.
+        
+        Returns:
+            JsonDatabase: A database holding the guild's levels, invites and message counts
+        """
+        guild_id = str(guild_id)
+        return JsonDatabase({
+            section: {guild_id: dict(self.data.get(section, {}).get(guild_id, {}))}
+            for section in ('levels', 'invites', 'message_counts')
+        })
+    
     # Autorole methods
     def set_autorole(self, guild_id, role_id):
         """Set an autorole for a guild"""
@@ -103,19 +166,13 @@ class JsonDatabase:
         # Return True if user leveled up
         return new_level > old_level
     
-    def get_level_leaderboard(self, guild_id, limit=10):
+    def get_level_leaderboard(self, guild_id, limit=10, offset=0):
         """Get the level leaderboard for a guild"""
         guild_id = str(guild_id)
         guild_levels = self.data.get('levels', {}).get(guild_id, {})
         
-        # Sort users by level and then by XP
-        sorted_users = sorted(
-            guild_levels.items(),
-            key=lambda x: (x[1]['level'], x[1]['xp']),
-            reverse=True
-        )
-        
-        return sorted_users[:limit]
+        # Top users by level and then by XP
+        return heapq.nlargest(offset + limit, guild_levels.items(), key=lambda x: (x[1]['level'], x[1]['xp']))[offset:]
     
     # Ticket methods
     def create_ticket(self, guild_id, channel_id, user_id):
@@ -151,6 +208,11 @@ class JsonDatabase:
         guild_id, channel_id = str(guild_id), str(channel_id)
         return self.data.get('tickets', {}).get(guild_id, {}).get(channel_id)
     
+    def get_guild_tickets(self, guild_id):
+        """Get all tickets for a guild, keyed by channel ID"""
+        guild_id = str(guild_id)
+        return self.data.get('tickets', {}).get(guild_id, {})
+    
     # Invite methods
     def track_invite(self, guild_id, inviter_id, invitee_id, is_fake=False, is_rejoin=False):
         """Track an invite"""
@@ -204,6 +266,28 @@ class JsonDatabase:
         
         return False
     
+    def get_inviter(self, guild_id, user_id):
+        """Get the ID of the member whose invite a user joined through, or None"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        for inviter_id, inviter_data in self.data.get('invites', {}).get(guild_id, {}).items():
+            for invitee in inviter_data.get('invitees', []):
+                if invitee.get('user_id') == user_id:
+                    return inviter_id
+        
+        return None
+    
+    def has_invitee(self, guild_id, user_id):
+        """Check whether a user was tracked joining through an invite before"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        for inviter_data in self.data.get('invites', {}).get(guild_id, {}).values():
+            for invitee in inviter_data.get('invitees', []):
+                if invitee.get('user_id') == user_id:
+                    return True
+        
+        return False
+    
     def get_invite_stats(self, guild_id, user_id):
         """Get invite statistics for a user"""
         guild_id, user_id = str(guild_id), str(user_id)
@@ -229,7 +313,11 @@ class JsonDatabase:
             'rejoins': inviter_data['rejoins']
         }
     
-    def get_invite_leaderboard(self, guild_id, limit=10):
+    def get_invite_stats_many(self, guild_id, user_ids):
+        """Get invite statistics for several users, in the order given"""
+        return [self.get_invite_stats(guild_id, user_id) for user_id in user_ids]
+    
+    def get_invite_leaderboard(self, guild_id, limit=10, offset=0):
         """Get the invite leaderboard for a guild"""
         guild_id = str(guild_id)
         guild_invites = self.data.get('invites', {}).get(guild_id, {})
@@ -245,10 +333,8 @@ class JsonDatabase:
                 'total': total
             })
         
-        # Sort by total invites
-        leaderboard.sort(key=lambda x: x['total'], reverse=True)
-        
-        return leaderboard[:limit]
+        # Top users by total invites
+        return heapq.nlargest(offset + limit, leaderboard, key=lambda x: x['total'])[offset:]
     
     # Message tracking methods
     def increment_message_count(self, guild_id, user_id):
@@ -280,6 +366,23 @@ class JsonDatabase:
         
         return self._save_data()
     
+    def reset_message_stats(self, guild_id, user_id):
+        """Reset a user's message counts
+        
+        Returns:
+            bool: False if the user had no message counts
+        """
+        guild_id, user_id = str(guild_id), str(user_id)
+        
+        if user_id in self.data.get('message_counts', {}).get(guild_id, {}):
+            self.data['message_counts'][guild_id][user_id] = {
+                'all_time': 0,
+                'daily': {}
+            }
+            return self._save_data()
+        
+        return False
+    
     def get_message_stats(self, guild_id, user_id):
         """Get message statistics for a user"""
         guild_id, user_id = str(guild_id), str(user_id)
@@ -297,7 +400,11 @@ class JsonDatabase:
             'today': today_count
         }
     
-    def get_message_leaderboard(self, guild_id, limit=10, period='all_time'):
+    def get_message_stats_many(self, guild_id, user_ids):
+        """Get message statistics for several users, in the order given"""
+        return [self.get_message_stats(guild_id, user_id) for user_id in user_ids]
+    
+    def get_message_leaderboard(self, guild_id, limit=10, period='all_time', offset=0):
         """Get the message leaderboard for a guild"""
         guild_id = str(guild_id)
         guild_messages = self.data.get('message_counts', {}).get(guild_id, {})
@@ -321,10 +428,8 @@ class JsonDatabase:
                     'count': count
                 })
         
-        # Sort by message count
-        leaderboard.sort(key=lambda x: x['count'], reverse=True)
-        
-        return leaderboard[:limit]
+        # Top users by message count
+        return heapq.nlargest(offset + limit, leaderboard, key=lambda x: x['count'])[offset:]
     
     # Reaction roles methods
     def set_reaction_role(self, guild_id, message_id, role_id, emoji):
@@ -358,6 +463,25 @@ class JsonDatabase:
         guild_id, message_id = str(guild_id), str(message_id)
         return self.data.get('reaction_roles', {}).get(guild_id, {}).get(message_id, [])
     
+    def get_guild_reaction_roles(self, guild_id):
+        """Get a guild's reaction roles, as {message_id: roles}"""
+        guild_id = str(guild_id)
+        return self.data.get('reaction_roles', {}).get(guild_id, {})
+    
+    def get_all_reaction_roles(self):
+        """Get every guild's reaction roles, as {guild_id: {message_id: roles}}"""
+        return self.data.get('reaction_roles', {})
+    
+    def delete_reaction_roles(self, guild_id, message_id):
+        """Remove all reaction roles for a message"""
+        guild_id, message_id = str(guild_id), str(message_id)
+        
+        if message_id in self.data.get('reaction_roles', {}).get(guild_id, {}):
+            del self.data['reaction_roles'][guild_id][message_id]
+            return self._save_data()
+        
+        return False
+    
     def remove_reaction_role(self, guild_id, message_id, emoji):
         """Remove a reaction role"""
         guild_id, message_id = str(guild_id), str(message_id)
@@ -439,16 +563,108 @@ class JsonDatabase:
         
         return active_giveaways
     
-    def end_giveaway(self, guild_id, message_id):
-        """Mark a giveaway as ended"""
+    def end_giveaway(self, guild_id, message_id, fencing_token=None):
+        """Mark a giveaway as ended, if nothing else has
+        
+        Args:
+            guild_id: The guild ID
+            message_id: The giveaway message ID
+            fencing_token: The singleton lease token of the process ending it;
+                refused unless it still holds the lease and no newer token
+                has ended a giveaway (checked in the lease store, since other
+                processes on this data root don't see this one's memory)
+        
+        Returns:
+            bool: Whether this call ended it, and so should announce the winners
+        """
         guild_id, message_id = str(guild_id), str(message_id)
+        giveaway = self.data.get('giveaways', {}).get(guild_id, {}).get(message_id)
+        if giveaway is None or giveaway.get('ended'):
+            return False
         
-        if message_id in self.data.get('giveaways', {}).get(guild_id, {}):
-            self.data['giveaways'][guild_id][message_id]['ended'] = True
-            self.data['giveaways'][guild_id][message_id]['end_time'] = datetime.now().isoformat()
-            return self._save_data()
+        if fencing_token is not None and not self.leases.fence(SINGLETON_LEASE, fencing_token, 'giveaways'):
+            return False
         
-        return False
+        giveaway['ended'] = True
+        giveaway['end_time'] = datetime.now().isoformat()
+        # Ended in memory either way, so don't leave it unannounced if saving fails
+        self._save_data()
+        return True
+
+class AsyncDatabase:
+    """The database API as coroutines, so a slow storage server can't stall the event loop
+    
+    Wraps JsonDatabase, RedisDatabase or SqlMirroredDatabase; every method
+    is awaited (await db.get_autorole(guild_id)). JsonDatabase's methods run
+    inline: reads come from memory, but every write also rewrites the whole
+    file with a synchronous json.dump (_save_data) on the event loop, which
+    grows with the database. The Redis backend makes a network round trip
+    per call, so its methods run in a worker thread, like
+    RedisDataManager's; the thread is a single one, so writes still reach
+    the server in the order they were made. Attributes that aren't methods
+    (db_file, writer, ...) are the wrapped database's.
+    """
+    
+    def __init__(self, database, blocking):
+        """Initialize the wrapper
+        
+        Args:
+            database: The synchronous database
+            blocking (bool): Whether its methods do network I/O and must run off the loop
+        """
+        self.database = database
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database') if blocking else None
+    
+    def __getattr__(self, name):
+        value = getattr(self.database, name)
+        if not callable(value):
+            return value
+        
+        if self.executor is None:
+            async def call(*args, **kwargs):
+                return value(*args, **kwargs)
+        else:
+            async def call(*args, **kwargs):
+                # Run with the caller's context, as asyncio.to_thread does, so spans nest under it
+                context = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.executor, functools.partial(context.run, value, *args, **kwargs)
+                )
+        
+        call.__name__ = name
+        call.__doc__ = value.__doc__
+        # Cache it; later lookups don't reach __getattr__
+        setattr(self, name, call)
+        return call
+
+def create_database():
+    """Create the database for the configured storage backend
+    
+    Returns:
+        AsyncDatabase: The database (JsonDatabase, RedisDatabase or
+            SqlMirroredDatabase), with awaitable methods
+    """
+    storage = CONFIG['storage']
+    blocking = storage['backend'] == 'redis'
+    if blocking:
+        from utils.redis_database import RedisDatabase, get_redis_client
+        database = RedisDatabase(get_redis_client(), storage['redis_prefix'])
+    else:
+        database = JsonDatabase()
+    
+    sql = storage['sql']
+    if sql['enabled']:
+        # Imported here so SQLAlchemy is only needed when this is turned on
+        from utils.sql_store import CounterWriter, SqlMirroredDatabase, create_sql_engine, get_database_url
+        engine = create_sql_engine(
+            get_database_url(sql['url']),
+            pool_size=sql['pool_size'],
+            max_overflow=sql['max_overflow']
+        )
+        writer = CounterWriter(engine, flush_interval=sql['flush_interval_ms'] / 1000, max_batch=sql['max_batch'])
+        database = SqlMirroredDatabase(database, writer)
+    
+    return AsyncDatabase(database, blocking)
 
 # Create a global instance of the database
-db = JsonDatabase()
+db = create_database()
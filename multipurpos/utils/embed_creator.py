@@ -2,6 +2,117 @@ import discord
 import datetime
 from config import CONFIG
 
+# Themed embed styles, resolved from CONFIG once instead of on every call
+THEMES = {
+    theme: {
+        'colour': discord.Colour(CONFIG['colors'][theme]),
+        'prefix': f"{CONFIG['emojis'][theme]} "
+    }
+    for theme in ('success', 'error', 'warning', 'info')
+}
+
+RANK_MEDALS = ("🥇", "🥈", "🥉")
+
+
+class EmbedPrototype:
+    """The static part of an embed, resolved once
+    
+    The colour object, static strings and static fields are prepared up front,
+    and build() creates each embed through the public discord.Embed API, so
+    every embed is new and callers are free to modify what they get back.
+    """
+    
+    __slots__ = ('colour', 'title', 'description', 'footer', 'fields')
+    
+    def __init__(self, color, title=None, description=None, footer=None, fields=()):
+        """Initialize the prototype
+        
+        Args:
+            color: The embed color as an int
+            title: Static title, if every embed built from this shares it
+            description: Static description, if every embed built from this shares it
+            footer: Static footer text
+            fields: Static (name, value, inline) tuples placed after any per-call fields
+        """
+        self.colour = discord.Colour(color)
+        self.title = title
+        self.description = description
+        self.footer = footer
+        self.fields = tuple(fields)
+    
+    def build(self, fields=None, thumbnail=None, footer=None, title=None, description=None):
+        """Build a new embed from the prototype
+        
+        Args:
+            fields: Per-call (name, value, inline) tuples placed before the static fields
+            thumbnail: Thumbnail URL for this embed
+            footer: Footer text replacing the static footer
+            title: Title replacing the static title
+            description: Description replacing the static description
+            
+        Returns:
+            discord.Embed: A new embed that shares no mutable state with the prototype
+        """
+        embed = discord.Embed(
+            title=self.title if title is None else title,
+            description=self.description if description is None else description,
+            colour=self.colour
+        )
+        
+        if thumbnail is not None:
+            embed.set_thumbnail(url=thumbnail)
+        for name, value, inline in fields or ():
+            embed.add_field(name=name, value=value, inline=inline)
+        for name, value, inline in self.fields:
+            embed.add_field(name=name, value=value, inline=inline)
+        if footer is not None or self.footer is not None:
+            embed.set_footer(text=self.footer if footer is None else footer)
+        
+        return embed
+
+
+PROTOTYPES = {
+    'invite_stats': EmbedPrototype(
+        CONFIG['colors']['default'],
+        fields=[(
+            "What counts as...",
+            "**Regular**: Real users who stayed\n"
+            "**Fake**: New accounts or potential alts\n"
+            "**Left**: Users who have left the server",
+            True
+        )],
+        footer="Invite someone new today!"
+    ),
+    'giveaway': EmbedPrototype(CONFIG['colors']['default'], title="🎉 GIVEAWAY 🎉"),
+    'level_up': EmbedPrototype(CONFIG['colors']['success'], title="⬆️ Level Up!"),
+    'leaderboard': EmbedPrototype(CONFIG['colors']['default'], description="Top members in the server:"),
+    'leaderboard_empty': EmbedPrototype(
+        CONFIG['colors']['default'],
+        description="Top members in the server:",
+        fields=[("No data available", "No members have earned XP yet.", False)]
+    ),
+    'ticket': EmbedPrototype(
+        CONFIG['colors']['info'],
+        description="Thank you for creating a support ticket! Staff will be with you shortly.",
+        fields=[(
+            "Instructions",
+            "Please describe your issue in detail, and a staff member will assist you soon.\n"
+            "To close this ticket when resolved, use the `.close` command.",
+            False
+        )]
+    ),
+    'message_stats': EmbedPrototype(CONFIG['colors']['info']),
+    'reaction_role': EmbedPrototype(
+        CONFIG['colors']['default'],
+        fields=[(
+            "Instructions",
+            "React with the emoji for the role you want to receive or remove.",
+            False
+        )]
+    ),
+}
+
+
 class EmbedCreator:
     @staticmethod
     def create_invite_stats_embed(member, stats):
@@ -19,37 +130,19 @@ class EmbedCreator:
         fake_invites = stats.get('fake', 0)
         left_invites = stats.get('left', 0)
         
-        embed = discord.Embed(
+        # The explanation field and footer come from the prototype
+        return PROTOTYPES['invite_stats'].build(
+            fields=[(
+                "Invite Breakdown",
+                f"✅ **{regular_invites}** Regular\n"
+                f"❌ **{fake_invites}** Fake\n"
+                f"🚶 **{left_invites}** Left",
+                True
+            )],
             title=f"📨 Invite Statistics for {member.display_name}",
             description=f"{member.mention} has invited **{total_invites}** members to this server.",
-            color=CONFIG['colors']['default']
+            thumbnail=member.display_avatar.url
         )
-        
-        # Set user avatar as thumbnail
-        embed.set_thumbnail(url=member.display_avatar.url)
-        
-        # Add invite breakdown
-        embed.add_field(
-            name="Invite Breakdown",
-            value=f"✅ **{regular_invites}** Regular\n"
-                  f"❌ **{fake_invites}** Fake\n"
-                  f"🚶 **{left_invites}** Left",
-            inline=True
-        )
-        
-        # Add information about invites
-        embed.add_field(
-            name="What counts as...",
-            value="**Regular**: Real users who stayed\n"
-                  "**Fake**: New accounts or potential alts\n"
-                  "**Left**: Users who have left the server",
-            inline=True
-        )
-        
-        # Add footer
-        embed.set_footer(text="Invite someone new today!")
-        
-        return embed
     
     @staticmethod
     def create_giveaway_embed(prize, end_time, host, winners_count):
@@ -64,35 +157,18 @@ class EmbedCreator:
         Returns:
             discord.Embed: The giveaway embed
         """
-        embed = discord.Embed(
-            title="🎉 GIVEAWAY 🎉",
+        return PROTOTYPES['giveaway'].build(
+            fields=[
+                ("Time Remaining", f"Ends: <t:{int(end_time.timestamp())}:R>", True),
+                ("Winners", f"{winners_count} {'winner' if winners_count == 1 else 'winners'}", True)
+            ],
             description=f"**Prize: {prize}**\n\n"
                         f"React with 🎉 to enter!\n\n"
                         f"Hosted by: {host.mention}",
-            color=CONFIG['colors']['default']
+            thumbnail=host.display_avatar.url,
+            footer=f"Ends at • {end_time.strftime('%Y-%m-%d %H:%M:%S UTC')}"
         )
         
-        # Add end time and winners info
-        embed.add_field(
-            name="Time Remaining",
-            value=f"Ends: <t:{int(end_time.timestamp())}:R>",
-            inline=True
-        )
-        
-        embed.add_field(
-            name="Winners",
-            value=f"{winners_count} {'winner' if winners_count == 1 else 'winners'}",
-            inline=True
-        )
-        
-        # Set user avatar as thumbnail
-        embed.set_thumbnail(url=host.display_avatar.url)
-        
-        # Add footer
-        embed.set_footer(text=f"Ends at • {end_time.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-        
-        return embed
-        
     @staticmethod
     def create_embed(title, description, color=None):
         """Create a styled embed with the given information
@@ -115,6 +191,25 @@ class EmbedCreator:
         )
         
         return embed
+    
+    @staticmethod
+    def create_themed_embed(theme, title, description):
+        """Create an embed styled with one of the THEMES
+        
+        Args:
+            theme: One of 'success', 'error', 'warning' or 'info'
+            title: The embed title, without the theme emoji
+            description: The embed description
+            
+        Returns:
+            discord.Embed: The created embed
+        """
+        style = THEMES[theme]
+        return discord.Embed(
+            title=f"{style['prefix']}{title}",
+            description=description,
+            colour=style['colour']
+        )
         
     @staticmethod
     def create_level_up_embed(user, level):
@@ -127,16 +222,10 @@ class EmbedCreator:
         Returns:
             discord.Embed: The level-up embed
         """
-        embed = discord.Embed(
-            title="⬆️ Level Up!",
+        return PROTOTYPES['level_up'].build(
             description=f"**{user.mention}** Your Level Increased to **{level}**. Chat More!",
-            color=CONFIG['colors']['success']
+            thumbnail=user.display_avatar.url
         )
-        
-        # Set user avatar as thumbnail
-        embed.set_thumbnail(url=user.display_avatar.url)
-        
-        return embed
     
     @staticmethod
     def create_success_embed(title, description):
@@ -149,13 +238,7 @@ class EmbedCreator:
         Returns:
             discord.Embed: The created embed
         """
-        embed = EmbedCreator.create_embed(
-            title=f"{CONFIG['emojis']['success']} {title}",
-            description=description,
-            color=CONFIG['colors']['success']
-        )
-        
-        return embed
+        return EmbedCreator.create_themed_embed('success', title, description)
     
     @staticmethod
     def create_error_embed(title, description):
@@ -168,13 +251,7 @@ class EmbedCreator:
         Returns:
             discord.Embed: The created embed
         """
-        embed = EmbedCreator.create_embed(
-            title=f"{CONFIG['emojis']['error']} {title}",
-            description=description,
-            color=CONFIG['colors']['error']
-        )
-        
-        return embed
+        return EmbedCreator.create_themed_embed('error', title, description)
     
     @staticmethod
     def create_warning_embed(title, description):
@@ -187,13 +264,7 @@ class EmbedCreator:
         Returns:
             discord.Embed: The created embed
         """
-        embed = EmbedCreator.create_embed(
-            title=f"{CONFIG['emojis']['warning']} {title}",
-            description=description,
-            color=CONFIG['colors']['warning']
-        )
-        
-        return embed
+        return EmbedCreator.create_themed_embed('warning', title, description)
 
     @staticmethod
     def create_info_embed(title, description):
@@ -206,13 +277,7 @@ class EmbedCreator:
         Returns:
             discord.Embed: The created embed
         """
-        embed = EmbedCreator.create_embed(
-            title=f"{CONFIG['emojis']['info']} {title}",
-            description=description,
-            color=CONFIG['colors']['info']
-        )
-        
-        return embed
+        return EmbedCreator.create_themed_embed('info', title, description)
         
     @staticmethod
     def create_basic_embed(title, description, color=None):
@@ -239,35 +304,21 @@ class EmbedCreator:
         Returns:
             discord.Embed: The leaderboard embed
         """
-        embed = discord.Embed(
-            title=f"{leaderboard_type} Leaderboard",
-            description="Top members in the server:",
-            color=CONFIG['colors']['default']
-        )
+        title = f"{leaderboard_type} Leaderboard"
         
-        # Add empty field to create space if needed
         if len(entries) == 0:
-            embed.add_field(name="No data available", value="No members have earned XP yet.", inline=False)
-            return embed
+            return PROTOTYPES['leaderboard_empty'].build(title=title)
             
         # Format leaderboard entries
-        value = ""
-        for i, entry in enumerate(entries):
-            medal = ""
-            if i == 0:
-                medal = "🥇"
-            elif i == 1:
-                medal = "🥈"
-            elif i == 2:
-                medal = "🥉"
-            else:
-                medal = f"{i+1}."
-                
-            value += f"{medal} <@{entry['user_id']}> - **{entry['count']}**\n"
-            
-        embed.add_field(name="Rankings", value=value, inline=False)
-        
-        return embed
+        lines = [
+            f"{RANK_MEDALS[i] if i < 3 else f'{i+1}.'} <@{entry['user_id']}> - **{entry['count']}**\n"
+            for i, entry in enumerate(entries)
+        ]
+        
+        return PROTOTYPES['leaderboard'].build(
+            fields=[("Rankings", "".join(lines), False)],
+            title=title
+        )
         
     @staticmethod
     def create_ticket_embed(user, ticket_number, guild_name):
@@ -281,27 +332,17 @@ class EmbedCreator:
         Returns:
             discord.Embed: The ticket embed
         """
-        embed = discord.Embed(
+        # The instructions field comes from the prototype
+        return PROTOTYPES['ticket'].build(
+            fields=[
+                ("User", user.mention, True),
+                ("Server", guild_name, True),
+                ("Created", f"<t:{int(datetime.datetime.now().timestamp())}:R>", True)
+            ],
             title=f"Support Ticket #{ticket_number}",
-            description=f"Thank you for creating a support ticket! Staff will be with you shortly.",
-            color=CONFIG['colors']['info']
+            thumbnail=user.display_avatar.url
         )
         
-        embed.add_field(name="User", value=user.mention, inline=True)
-        embed.add_field(name="Server", value=guild_name, inline=True)
-        embed.add_field(name="Created", value=f"<t:{int(datetime.datetime.now().timestamp())}:R>", inline=True)
-        
-        embed.add_field(
-            name="Instructions",
-            value="Please describe your issue in detail, and a staff member will assist you soon.\n"
-                  "To close this ticket when resolved, use the `.close` command.",
-            inline=False
-        )
-        
-        embed.set_thumbnail(url=user.display_avatar.url)
-        
-        return embed
-        
     @staticmethod
     def create_message_stats_embed(user, message_count, user_rank=None, total_users=None):
         """Create a message stats embed for a user
@@ -315,34 +356,24 @@ class EmbedCreator:
         Returns:
             discord.Embed: The message stats embed
         """
-        embed = discord.Embed(
-            title=f"📊 Message Statistics for {user.display_name}",
-            description=f"{user.mention} has sent **{message_count}** messages in this server.",
-            color=CONFIG['colors']['info']
-        )
-        
-        # Set user avatar as thumbnail
-        embed.set_thumbnail(url=user.display_avatar.url)
+        fields = []
         
         # Add rank if provided
         if user_rank is not None and total_users is not None:
             rank_text = f"#{user_rank} out of {total_users} members"
             
             # Add medal for top 3
-            if user_rank == 1:
-                rank_text = f"🥇 {rank_text}"
-            elif user_rank == 2:
-                rank_text = f"🥈 {rank_text}"
-            elif user_rank == 3:
-                rank_text = f"🥉 {rank_text}"
+            if 1 <= user_rank <= 3:
+                rank_text = f"{RANK_MEDALS[user_rank - 1]} {rank_text}"
                 
-            embed.add_field(
-                name="Rank",
-                value=rank_text,
-                inline=True
-            )
+            fields.append(("Rank", rank_text, True))
         
-        return embed
+        return PROTOTYPES['message_stats'].build(
+            fields=fields,
+            title=f"📊 Message Statistics for {user.display_name}",
+            description=f"{user.mention} has sent **{message_count}** messages in this server.",
+            thumbnail=user.display_avatar.url
+        )
         
     @staticmethod
     def create_reaction_role_embed(title, description, role_mappings):
@@ -356,27 +387,11 @@ class EmbedCreator:
         Returns:
             discord.Embed: The reaction role embed
         """
-        embed = discord.Embed(
-            title=title,
-            description=description,
-            color=CONFIG['colors']['default']
-        )
-        
         # Add reaction instructions
-        instructions = ""
-        for emoji, role_name in role_mappings.items():
-            instructions += f"{emoji} - {role_name}\n"
-            
-        embed.add_field(
-            name="Available Roles",
-            value=instructions,
-            inline=False
-        )
+        instructions = "".join(f"{emoji} - {role_name}\n" for emoji, role_name in role_mappings.items())
         
-        embed.add_field(
-            name="Instructions",
-            value="React with the emoji for the role you want to receive or remove.",
-            inline=False
+        return PROTOTYPES['reaction_role'].build(
+            fields=[("Available Roles", instructions, False)],
+            title=title,
+            description=description
         )
-        
-        return embed
\ No newline at end of file
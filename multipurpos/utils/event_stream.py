@@ -0,0 +1,411 @@
+"""Live guild activity from the bot to the dashboard
+
+The bot side (EventPublisher) serves a unix socket in the IPC directory and
+writes each event to every connected reader as a JSON line. The web side
+(EventHub) keeps one connection per bot process and fans events out to any
+number of browser subscriptions, which EventServer streams as server-sent
+events at /api/v1/events.
+
+EventServer is an aiohttp app run on its own (events_server.py) rather than
+a route of the Flask dashboard: a stream stays open as long as the browser
+is on the page, and on the dashboard's threaded workers each one would hold
+a thread. Here a stream is a coroutine and a socket, so one process serves
+thousands of them.
+
+Nobody downstream can slow the bot down. Every connection and every
+subscription has a bounded buffer. When a reader falls behind, its oldest
+events are dropped and it is told how many it missed: the publisher sends a
+socket reader the count per guild and event type ahead of its next events,
+and the hub passes those counts on to the subscriptions that wanted them.
+"""
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from collections import Counter, deque
+
+from aiohttp import web
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def events_socket_path(cluster=None):
+    """Get the socket this process publishes events on"""
+    ipc_dir = os.path.join(BOT_DIR, CONFIG['sharding']['ipc_dir'])
+    name = f"events-{cluster.cluster_id}.sock" if cluster else "events.sock"
+    return os.path.join(ipc_dir, name)
+
+
+def publish_event(bot, event, guild_id, **data):
+    """Publish an event if the bot has a publisher; safe to call from any cog"""
+    publisher = getattr(bot, 'events', None)
+    if publisher:
+        publisher.publish(event, guild_id, **data)
+
+
+def publish_moderation(bot, ctx, action, user, reason=None):
+    """Publish a moderation action taken by a command"""
+    publish_event(
+        bot, 'moderation', ctx.guild.id,
+        action=action,
+        user_id=str(user.id),
+        moderator_id=str(ctx.author.id),
+        reason=reason
+    )
+
+
+class _Connection:
+    """A reader's pending lines, and an event set when there are some"""
+
+    def __init__(self):
+        self.pending = deque()  # (guild id, event, line)
+        self.dropped = Counter()  # (guild id, event) -> events dropped since the last write
+        self.ready = asyncio.Event()
+        self.task = asyncio.current_task()
+
+    def take(self):
+        """Get the bytes to write: a dropped notice, if any, then the pending lines"""
+        lines = []
+        if self.dropped:
+            notice = [[guild_id, event, count] for (guild_id, event), count in self.dropped.items()]
+            lines.append(json.dumps({'dropped': notice}, separators=(',', ':')).encode() + b'\n')
+            self.dropped.clear()
+        lines.extend(line for _, _, line in self.pending)
+        self.pending.clear()
+        return b''.join(lines)
+
+
+class EventPublisher:
+    """Serves events to local readers without ever waiting on them"""
+
+    def __init__(self, path, queue_size=1000):
+        """Initialize the publisher
+
+        Args:
+            path (str): Unix socket to listen on
+            queue_size (int): Events buffered per reader before the oldest are dropped
+        """
+        self.path = path
+        self.queue_size = queue_size
+        self.readers = set()  # _Connection per connected reader
+        self.server = None
+        self.sequence = 0
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def backlog(self):
+        """Events queued for the slowest reader"""
+        return max((len(connection.pending) for connection in self.readers), default=0)
+
+    async def start(self):
+        """Start accepting readers"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Left behind by a killed process
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"Publishing live events on {self.path}")
+
+    async def close(self):
+        """Stop serving and disconnect readers"""
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        tasks = [connection.task for connection in self.readers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _serve(self, reader, writer):
+        connection = _Connection()
+        self.readers.add(connection)
+        try:
+            while True:
+                await connection.ready.wait()
+                connection.ready.clear()
+                writer.write(connection.take())
+                # Blocks only this connection's task; publish() keeps queueing and dropping
+                await writer.drain()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass  # Reader went away, or we are closing
+        finally:
+            self.readers.discard(connection)
+            writer.close()
+
+    def publish(self, event, guild_id, **data):
+        """Queue an event for every reader
+
+        Args:
+            event (str): Event type, e.g. 'level_up'
+            guild_id (int): The guild it happened in
+            **data: JSON-serializable details
+        """
+        self.sequence += 1
+        self.published += 1
+        guild_id = str(guild_id)
+        line = json.dumps({
+            'id': self.sequence,
+            'event': event,
+            'guild_id': guild_id,
+            'time': time.time(),
+            'data': data
+        }, separators=(',', ':')).encode() + b'\n'
+
+        for connection in self.readers:
+            if len(connection.pending) >= self.queue_size:
+                dropped_guild, dropped_event, _ = connection.pending.popleft()
+                connection.dropped[dropped_guild, dropped_event] += 1
+                self.dropped += 1
+            connection.pending.append((guild_id, event, line))
+            connection.ready.set()
+
+
+class Subscription:
+    """One browser's view of the event stream, with a drop-oldest buffer"""
+
+    def __init__(self, hub, guild_id=None, events=None, buffer_size=256):
+        self.hub = hub
+        self.guild_id = str(guild_id) if guild_id else None
+        self.events = set(events) if events else None
+        self.buffer = deque(maxlen=buffer_size)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    def wants(self, guild_id, event):
+        if self.guild_id and guild_id != self.guild_id:
+            return False
+        return self.events is None or event in self.events
+
+    def push(self, event):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1  # The deque discards the oldest event
+        self.buffer.append(event)
+        self.ready.set()
+
+    def missed(self, count):
+        """Count events dropped before they reached this subscription"""
+        self.dropped += count
+        self.ready.set()
+
+    async def get(self, timeout):
+        """Wait for events
+
+        Returns:
+            tuple: (events, how many were dropped since the last call)
+        """
+        if not self.buffer and not self.dropped:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        events = list(self.buffer)
+        self.buffer.clear()
+        dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """Reads every bot process's event socket and fans events out to subscriptions
+
+    Everything runs on one event loop: start() begins looking for sockets,
+    with a reader task per bot process.
+    """
+
+    def __init__(self, pattern=None, buffer_size=256, retry_interval=3, max_subscriptions=None):
+        """Initialize the hub
+
+        Args:
+            pattern (str): Glob of sockets to read (defaults to every events socket in the IPC directory)
+            buffer_size (int): Events buffered per subscription
+            retry_interval (float): Seconds between looking for new or restarted bot processes
+            max_subscriptions (int): Subscriptions open at once before subscribe() refuses more (None for no limit)
+        """
+        self.pattern = pattern or os.path.join(BOT_DIR, CONFIG['sharding']['ipc_dir'], 'events*.sock')
+        self.buffer_size = buffer_size
+        self.max_subscriptions = max_subscriptions
+        self.retry_interval = retry_interval
+        self.subscriptions = set()
+        self.readers = {}  # Socket path -> task
+        self.task = None
+        self.received = 0
+
+    def start(self):
+        """Start reading the bot processes' sockets"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._discover())
+
+    async def close(self):
+        """Stop reading"""
+        tasks = [task for task in [self.task, *self.readers.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        self.readers = {}
+
+    def subscribe(self, guild_id=None, events=None):
+        """Start receiving events, optionally only one guild's or some types
+
+        Returns:
+            Subscription: Call close() when done, or None if max_subscriptions are already open
+        """
+        if self.max_subscriptions is not None and len(self.subscriptions) >= self.max_subscriptions:
+            return None
+        subscription = Subscription(self, guild_id, events, self.buffer_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+
+    async def _discover(self):
+        """Start a reader for each bot process's socket as it appears"""
+        while True:
+            for path in glob.glob(self.pattern):
+                task = self.readers.get(path)
+                if task is None or task.done():
+                    self.readers[path] = asyncio.create_task(self._read(path))
+            await asyncio.sleep(self.retry_interval)
+
+    async def _read(self, path):
+        """Read one socket until it closes"""
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+        except OSError as e:
+            logger.debug(f"Could not connect to event socket {path}: {e}")
+            return
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                if 'dropped' in message:
+                    self._dispatch_dropped(message['dropped'])
+                else:
+                    self._dispatch(message)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Event socket {path} closed: {e}")
+        finally:
+            writer.close()
+
+    def _dispatch(self, event):
+        self.received += 1
+        for subscription in list(self.subscriptions):
+            if subscription.wants(event['guild_id'], event['event']):
+                subscription.push(event)
+
+    def _dispatch_dropped(self, dropped):
+        """Tell subscriptions about events the publisher dropped before sending them"""
+        for subscription in list(self.subscriptions):
+            count = sum(n for guild_id, event, n in dropped if subscription.wants(guild_id, event))
+            if count:
+                subscription.missed(count)
+
+
+def format_sse(event, data, event_id=None):
+    """Format one server-sent event"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventServer:
+    """Serves the hub's events at /api/v1/events as server-sent events
+
+        GET /api/v1/events?guild=<guild_id>&events=level_up,moderation
+    """
+
+    def __init__(self, hub=None, host='127.0.0.1', port=5001, keepalive=15, url_prefix='/api/v1'):
+        """Initialize the server
+
+        Args:
+            hub (EventHub): Live event source (defaults to every bot process's event socket)
+            host (str): Interface to listen on
+            port (int): Port to listen on
+            keepalive (float): Seconds between keep-alive comments on idle streams
+            url_prefix (str): Where the endpoint is mounted, matching the dashboard API's
+        """
+        self.hub = hub or EventHub(
+            buffer_size=CONFIG['events']['client_buffer'],
+            max_subscriptions=CONFIG['events']['max_streams']
+        )
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.url_prefix = url_prefix
+        self.runner = None
+
+    async def _handle_events(self, request):
+        types = request.query.get('events')
+        subscription = self.hub.subscribe(
+            guild_id=request.query.get('guild'),
+            events=types.split(',') if types else None
+        )
+        if subscription is None:
+            return web.json_response(
+                {'error': "Too many open event streams, try again later"}, status=503, headers={'Retry-After': '30'}
+            )
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            # Tell proxies not to buffer or cache the stream
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        try:
+            await response.prepare(request)
+            await response.write(b"retry: 3000\n\n")
+            while True:
+                events, dropped = await subscription.get(self.keepalive)
+                chunks = []
+                if dropped:
+                    # The client read too slowly and its oldest events were discarded
+                    chunks.append(format_sse('dropped', {'count': dropped}))
+                elif not events:
+                    chunks.append(": keep-alive\n\n")
+                chunks.extend(format_sse(event['event'], event, event['id']) for event in events)
+                await response.write(''.join(chunks).encode())
+        except ConnectionError:
+            pass  # The browser went away
+        finally:
+            subscription.close()
+        return response
+
+    def make_app(self):
+        """Build the aiohttp app, which starts and stops the hub with it"""
+        app = web.Application()
+        app.router.add_get(f'{self.url_prefix}/events', self._handle_events)
+
+        async def hub_context(app):
+            self.hub.start()
+            yield
+            await self.hub.close()
+
+        app.cleanup_ctx.append(hub_context)
+        return app
+
+    async def start(self):
+        """Start serving"""
+        # Streams only end when the browser leaves, so don't wait long for them on shutdown
+        self.runner = web.AppRunner(self.make_app(), access_log=None, shutdown_timeout=1)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Serving live events on http://{self.host}:{self.port}{self.url_prefix}/events")
+
+    async def close(self):
+        """Stop serving and disconnect every stream"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+
+from discord.ext import commands
+
+from utils.startup import loading_extension
+
+logger = logging.getLogger('discord_bot')
+
+
+def plan_load_waves(extensions, dependencies=None):
+    """Group extensions into waves that can be loaded concurrently
+
+    Every extension is placed in the first wave after all of its
+    dependencies. Extensions in the same wave don't depend on each other.
+
+    Args:
+        extensions: Extension names in configured order
+        dependencies: Optional dict mapping an extension to the extensions it needs loaded first
+
+    Returns:
+        list: Lists of extension names, in load order
+    """
+    dependencies = dependencies or {}
+    remaining = list(extensions)
+    done = set()
+    waves = []
+
+    while remaining:
+        wave = [
+            name for name in remaining
+            if all(dep in done or dep not in extensions for dep in dependencies.get(name, ()))
+        ]
+        if not wave:
+            # A dependency cycle; load the rest together rather than not at all
+            logger.warning(f"Circular cog dependencies between: {', '.join(remaining)}")
+            wave = remaining
+
+        waves.append(wave)
+        done.update(wave)
+        remaining = [name for name in remaining if name not in done]
+
+    return waves
+
+
+async def load_extension_timed(bot, name, package='cogs'):
+    """Load one extension, isolating failures
+
+    Args:
+        bot: The bot to load the extension into
+        name: The extension name, relative to package
+        package: The package containing the extensions
+
+    Returns:
+        dict: name, loaded, seconds and error (None if it loaded)
+    """
+    start = time.perf_counter()
+    error = None
+    loading_extension.set(name)  # Each extension loads in its own task, so this is per extension
+
+    try:
+        await bot.load_extension(f'{package}.{name}')
+    except commands.ExtensionAlreadyLoaded:
+        return {'name': name, 'loaded': True, 'seconds': 0.0, 'error': None}
+    except commands.ExtensionFailed as e:
+        # Unwrap to the exception raised by the cog itself
+        error = f"{type(e.original).__name__}: {e.original}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    seconds = time.perf_counter() - start
+    if error:
+        logger.error(f'Failed to load extension {name} after {seconds * 1000:.1f}ms: {error}')
+    else:
+        logger.info(f'Loaded extension: {name} ({seconds * 1000:.1f}ms)')
+
+    return {'name': name, 'loaded': error is None, 'seconds': seconds, 'error': error}
+
+
+async def load_extensions(bot, extensions, dependencies=None, package='cogs'):
+    """Load extensions concurrently, wave by wave
+
+    A failing extension is logged and skipped without affecting the others.
+
+    Args:
+        bot: The bot to load the extensions into
+        extensions: Extension names in configured order
+        dependencies: Optional dict mapping an extension to the extensions it needs loaded first
+        package: The package containing the extensions
+
+    Returns:
+        list: One result dict per extension (see load_extension_timed)
+    """
+    start = time.perf_counter()
+    results = []
+
+    for wave in plan_load_waves(extensions, dependencies):
+        results.extend(await asyncio.gather(*(load_extension_timed(bot, name, package) for name in wave)))
+
+    loaded = sum(1 for result in results if result['loaded'])
+    logger.info(
+        f"Loaded {loaded}/{len(results)} extensions in {(time.perf_counter() - start) * 1000:.1f}ms"
+    )
+
+    slowest = sorted(results, key=lambda result: result['seconds'], reverse=True)[:3]
+    logger.info("Slowest extensions: " + ", ".join(
+        f"{result['name']} ({result['seconds'] * 1000:.1f}ms)" for result in slowest
+    ))
+
+    return results
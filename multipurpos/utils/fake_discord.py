@@ -0,0 +1,610 @@
+"""A fake Discord gateway and REST API for running the bot locally
+
+Serves enough of the API for discord.py to log in, identify every shard
+and receive a set of generated guilds, so sharding and clustering can be
+exercised without a token or a Discord connection:
+
+    python cluster.py --fake-gateway --clusters 2 --shards 4
+
+It also answers the REST routes the cogs use most (sending and editing
+messages, reactions, roles, invites), counts every call by route and
+enforces per-route and global rate limits with Discord's headers, so
+discord.py's rate limit handling runs as it would in production. Gateway
+events can be built and sent to the right shard for load tests:
+
+    python load_test.py --scenario messages --events 5000
+"""
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import random
+import re
+import time
+import zlib
+
+import aiohttp
+import yarl
+from aiohttp import web
+
+logger = logging.getLogger('discord_bot')
+
+# Environment variable pointing bot processes at a running FakeDiscord
+FAKE_DISCORD_ENV = 'BOT_FAKE_DISCORD_URL'
+
+DISCORD_EPOCH = 1420070400000
+
+# Gateway opcodes
+OP_DISPATCH = 0
+OP_HEARTBEAT = 1
+OP_IDENTIFY = 2
+OP_RESUME = 6
+OP_REQUEST_MEMBERS = 8
+OP_INVALID_SESSION = 9
+OP_HELLO = 10
+OP_HEARTBEAT_ACK = 11
+
+
+def make_snowflake(timestamp_ms, increment=0):
+    """Build a snowflake for a UNIX timestamp in milliseconds"""
+    return ((timestamp_ms - DISCORD_EPOCH) << 22) | (increment & 0xFFF)
+
+
+def use_fake_discord(url):
+    """Point discord.py's REST and gateway clients at a FakeDiscord
+
+    Must be called before the bot logs in.
+
+    Args:
+        url (str): The FakeDiscord base URL, e.g. http://127.0.0.1:8765
+    """
+    from discord.gateway import DiscordWebSocket
+    from discord.http import Route
+
+    Route.BASE = f"{url}/api/v10"
+    DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"{url.replace('http', 'ws', 1)}/gateway")
+    logger.warning(f"Using the fake Discord API at {url}")
+
+
+def _json_response(data, status=200, headers=None):
+    """Build a JSON response discord.py recognizes (it wants the bare content type, no charset)"""
+    return web.Response(body=json.dumps(data).encode(), status=status, content_type='application/json', headers=headers)
+
+
+# Path segments whose following snowflake names a parameter, e.g. channels/{channel_id}
+_ROUTE_PARAMETERS = {
+    'channels': 'channel_id',
+    'guilds': 'guild_id',
+    'messages': 'message_id',
+    'members': 'user_id',
+    'users': 'user_id',
+    'roles': 'role_id',
+    'webhooks': 'webhook_id',
+    'invites': 'code',
+    'reactions': 'emoji',
+}
+_MAJOR_PARAMETERS = ('channel_id', 'guild_id', 'webhook_id')
+
+
+def route_template(path):
+    """Split a REST path into its route template and the major parameter rate limits are scoped to
+
+    Args:
+        path (str): The path after /api/v10/, e.g. 'channels/123/messages'
+
+    Returns:
+        tuple: (template such as 'channels/{channel_id}/messages', major parameter value or None)
+    """
+    segments = path.split('/')
+    major = None
+    for index in range(1, len(segments)):
+        parameter = _ROUTE_PARAMETERS.get(segments[index - 1])
+        if parameter and (segments[index].isdigit() or parameter in ('emoji', 'code')):
+            if major is None and parameter in _MAJOR_PARAMETERS:
+                major = segments[index]
+            segments[index] = f"{{{parameter}}}"
+    return '/'.join(segments), major
+
+
+class _RateLimitWindow:
+    """A fixed window of requests, like one of Discord's rate limit buckets"""
+
+    __slots__ = ('limit', 'per', 'remaining', 'reset_at')
+
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset_at = 0.0
+
+    def hit(self, now):
+        """Take a request from the window
+
+        Returns:
+            bool: False if the window is exhausted
+        """
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.per
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+
+class FakeDiscord:
+    """Generated guilds served over a minimal gateway and REST API"""
+
+    def __init__(self, shard_count=1, guilds=10, members_per_guild=50, seed=0,
+                 route_limit=(5, 5.0), global_limit=50, response_delay=0.0):
+        """Generate the fake data
+
+        Args:
+            shard_count (int): Shards to recommend from /gateway/bot
+            guilds (int): Number of guilds to generate
+            members_per_guild (int): Members in each guild, besides the bot
+            seed (int): Random seed, so runs are repeatable
+            route_limit (tuple): (requests, seconds) allowed per route and channel or guild; None disables
+            global_limit (int): Requests allowed per second over all routes; None disables
+            response_delay (float): Seconds to wait before answering each REST call, to model latency
+        """
+        self.shard_count = shard_count
+        self.route_limit = route_limit
+        self.global_limit = global_limit
+        self.response_delay = response_delay
+        self.rng = random.Random(seed)
+        self.url = None
+        self.runner = None
+
+        now_ms = int(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+        self.bot_user = self._user(make_snowflake(now_ms - 10 ** 9), 'FakeBot', bot=True)
+        self.application = {
+            'id': self.bot_user['id'],
+            'name': 'FakeBot',
+            'description': '',
+            'icon': None,
+            'bot_public': True,
+            'bot_require_code_grant': False,
+            'owner': self._user(make_snowflake(now_ms - 2 * 10 ** 9), 'owner'),
+            'verify_key': '',
+            'flags': 0
+        }
+
+        # Consecutive timestamps spread guilds round-robin over the shards
+        user_pool = [make_snowflake(now_ms - 3 * 10 ** 9 + index) for index in range(members_per_guild * 4)]
+        self.guilds = [
+            self._guild(make_snowflake(now_ms + index), index, self.rng.sample(user_pool, members_per_guild))
+            for index in range(guilds)
+        ]
+
+        self.sockets = {}  # Shard ID -> connected WebSocketResponse
+        self.identifies = {}  # Shard ID -> number of IDENTIFYs received
+        self.sequence = 0
+        self.next_id = make_snowflake(now_ms + 10 ** 9)
+
+        # REST calls, by "METHOD route template" and by status
+        self.rest_calls = 0
+        self.rest_routes = collections.Counter()
+        self.rest_statuses = collections.Counter()
+        self.rest_inflight = 0
+        self.rate_limit_windows = {}  # (route, major parameter) -> _RateLimitWindow
+        self.global_window = _RateLimitWindow(global_limit, 1.0) if global_limit else None
+        self.index_guilds()
+
+    def index_guilds(self):
+        """Index the guilds' channels and members for the REST routes; call after changing self.guilds"""
+        self.channel_guilds = {}  # Channel ID -> guild payload
+        self.members = {}  # (guild ID, user ID) -> member payload
+        for guild in self.guilds:
+            for channel in guild['channels']:
+                self.channel_guilds[channel['id']] = guild
+            for member in guild['members']:
+                self.members[(guild['id'], member['user']['id'])] = member
+
+    def snowflake(self):
+        """Make a new unique ID"""
+        self.next_id += 1
+        return str(self.next_id)
+
+    def reset_rest_counts(self):
+        """Start counting REST calls again, e.g. once the bot has started up"""
+        self.rest_calls = 0
+        self.rest_routes.clear()
+        self.rest_statuses.clear()
+
+    @staticmethod
+    def _user(user_id, name, bot=False):
+        return {
+            'id': str(user_id),
+            'username': name,
+            'discriminator': '0',
+            'global_name': None,
+            'avatar': None,
+            'bot': bot
+        }
+
+    def _member(self, user, role_ids, joined_at):
+        return {
+            'user': user,
+            'roles': [str(role_id) for role_id in role_ids],
+            'joined_at': joined_at,
+            'deaf': False,
+            'mute': False,
+            'flags': 0
+        }
+
+    def _guild(self, guild_id, index, member_ids):
+        """Build a GUILD_CREATE payload with a full member list"""
+        bot_role_id = guild_id + 1
+        member_role_id = guild_id + 2
+        channel_id = guild_id + 3
+        joined_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).isoformat()
+
+        roles = [
+            {'id': str(guild_id), 'name': '@everyone', 'permissions': '104324673', 'position': 0},
+            {'id': str(member_role_id), 'name': 'Member', 'permissions': '0', 'position': 1},
+            {'id': str(bot_role_id), 'name': 'FakeBot', 'permissions': '8', 'position': 2}
+        ]
+        for role in roles:
+            role.update({'color': 0, 'hoist': False, 'managed': False, 'mentionable': False})
+
+        members = [self._member(self.bot_user, [bot_role_id], joined_at)]
+        for member_id in member_ids:
+            role_ids = [member_role_id] if self.rng.random() < 0.5 else []
+            members.append(self._member(self._user(member_id, f'user{member_id % 100000}'), role_ids, joined_at))
+
+        return {
+            'id': str(guild_id),
+            'name': f'Fake Guild {index}',
+            'owner_id': members[-1]['user']['id'],
+            'icon': None,
+            'splash': None,
+            'features': [],
+            'member_count': len(members),
+            'large': len(members) > 250,
+            'joined_at': joined_at,
+            'unavailable': False,
+            'verification_level': 0,
+            'default_message_notifications': 0,
+            'explicit_content_filter': 0,
+            'mfa_level': 0,
+            'nsfw_level': 0,
+            'premium_tier': 0,
+            'preferred_locale': 'en-US',
+            'system_channel_flags': 0,
+            'roles': roles,
+            'emojis': [],
+            'stickers': [],
+            'channels': [{
+                'id': str(channel_id),
+                'type': 0,
+                'name': 'general',
+                'position': 0,
+                'permission_overwrites': []
+            }],
+            'threads': [],
+            'members': members,
+            'presences': [],
+            'voice_states': [],
+            'stage_instances': [],
+            'guild_scheduled_events': []
+        }
+
+    def member_of(self, guild, user_id):
+        """Get a member payload without its user, as message and reaction events carry it"""
+        member = self.members.get((guild['id'], str(user_id)))
+        return {key: value for key, value in member.items() if key != 'user'} if member else None
+
+    def message(self, channel_id, author, content, embeds=(), message_id=None, with_member=True):
+        """Build a message payload, as MESSAGE_CREATE sends and the message routes return
+
+        Args:
+            channel_id (str): Channel the message is in
+            author (dict): User payload of the author
+            content (str): Message text
+            embeds (list): Embed payloads
+            message_id (str): The message's ID; a new one if omitted
+            with_member (bool): Include the author's member payload, as gateway events do
+        """
+        guild = self.channel_guilds.get(str(channel_id))
+        data = {
+            'id': message_id or self.snowflake(),
+            'channel_id': str(channel_id),
+            'author': author,
+            'content': content,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'edited_timestamp': None,
+            'tts': False,
+            'mention_everyone': False,
+            'mentions': [],
+            'mention_roles': [],
+            'attachments': [],
+            'embeds': list(embeds),
+            'pinned': False,
+            'type': 0,
+            'flags': 0
+        }
+        if guild:
+            data['guild_id'] = guild['id']
+            member = self.member_of(guild, author['id']) if with_member else None
+            if member:
+                data['member'] = member
+        return data
+
+    def message_create(self, guild, user_id, content):
+        """Build a MESSAGE_CREATE event from a member in the guild's first channel"""
+        author = self.members[(guild['id'], str(user_id))]['user']
+        return 'MESSAGE_CREATE', self.message(guild['channels'][0]['id'], author, content)
+
+    def member_join(self, guild, account_age=datetime.timedelta(days=365)):
+        """Build a GUILD_MEMBER_ADD event for a new user
+
+        The member is not added to the guild payload: streams are built before
+        the bot connects, and a member already in GUILD_CREATE makes discord.py
+        discard the join. They are indexed so REST lookups of them work.
+
+        Args:
+            guild (dict): Guild payload
+            account_age (datetime.timedelta): How old the joining account is
+        """
+        created_ms = int((datetime.datetime.now(datetime.timezone.utc) - account_age).timestamp() * 1000)
+        self.next_id += 1
+        user_id = make_snowflake(created_ms, self.next_id)
+        member = self._member(self._user(user_id, f'user{user_id % 100000}'), [],
+                              datetime.datetime.now(datetime.timezone.utc).isoformat())
+        self.members[(guild['id'], str(user_id))] = member
+        return 'GUILD_MEMBER_ADD', {**member, 'guild_id': guild['id']}
+
+    def reaction_add(self, guild, user_id, message_id, emoji='👍'):
+        """Build a MESSAGE_REACTION_ADD event from a member on a message in the guild's first channel"""
+        return 'MESSAGE_REACTION_ADD', {
+            'user_id': str(user_id),
+            'channel_id': guild['channels'][0]['id'],
+            'message_id': str(message_id),
+            'guild_id': guild['id'],
+            'member': self.members[(guild['id'], str(user_id))],
+            'emoji': {'id': None, 'name': emoji},
+            'burst': False,
+            'type': 0
+        }
+
+    def shard_of(self, guild_id):
+        """Get the shard Discord routes a guild's events to"""
+        return (int(guild_id) >> 22) % self.shard_count
+
+    async def send_event(self, event, data):
+        """Send an event to the shard its guild is on
+
+        Returns:
+            bool: False if that shard isn't connected
+        """
+        guild_id = data.get('guild_id') or (data.get('id') if event.startswith('GUILD_') else None)
+        ws = self.sockets.get(self.shard_of(guild_id) if guild_id else 0)
+        if ws is None or ws.closed:
+            return False
+        await self.dispatch(ws, event, data)
+        return True
+
+    def guilds_for_shard(self, shard_id):
+        """Get the guilds Discord would route to a shard"""
+        return [guild for guild in self.guilds if self.shard_of(guild['id']) == shard_id]
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start serving
+
+        Returns:
+            str: The base URL to pass to use_fake_discord
+        """
+        app = web.Application()
+        app.router.add_get('/gateway', self._gateway)
+        app.router.add_route('*', '/api/v10/{path:.*}', self._rest)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        logger.info(f"Fake Discord serving {len(self.guilds)} guilds over {self.shard_count} shards at {self.url}")
+        return self.url
+
+    async def close(self):
+        """Disconnect every shard and stop serving"""
+        for ws in list(self.sockets.values()):
+            await ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _rest(self, request):
+        """Answer a REST call, enforcing rate limits and counting it by route"""
+        path = request.match_info['path']
+        template, major = route_template(path)
+        self.rest_calls += 1
+        self.rest_routes[f"{request.method} /{template}"] += 1
+        self.rest_inflight += 1
+        try:
+            if self.response_delay:
+                await asyncio.sleep(self.response_delay)
+            retry_after, headers = self._take_rate_limit(request.method, template, major)
+            if retry_after is None:
+                response = await self._answer(request, path, template, headers)
+            else:
+                response = _json_response(
+                    {'message': 'You are being rate limited.', 'retry_after': retry_after,
+                     'global': 'X-RateLimit-Global' in headers},
+                    status=429,
+                    headers=headers
+                )
+            self.rest_statuses[response.status] += 1
+            return response
+        finally:
+            self.rest_inflight -= 1
+
+    def _take_rate_limit(self, method, template, major):
+        """Take a request from the global and route windows
+
+        Returns:
+            tuple: (seconds to retry after, or None if the request may go ahead; rate limit headers)
+        """
+        now = time.monotonic()
+        # discord.py takes a 429 without a Via header for a Cloudflare ban
+        limited = {'Via': '1.1 google'}
+        if self.global_window and not self.global_window.hit(now):
+            retry_after = self.global_window.reset_at - now
+            return retry_after, {**limited, 'Retry-After': f"{retry_after:.3f}",
+                                 'X-RateLimit-Global': 'true', 'X-RateLimit-Scope': 'global'}
+        if not self.route_limit:
+            return None, {}
+
+        key = (f"{method} {template}", major)
+        window = self.rate_limit_windows.get(key)
+        if window is None:
+            window = self.rate_limit_windows[key] = _RateLimitWindow(*self.route_limit)
+        allowed = window.hit(now)
+        reset_after = window.reset_at - now
+        headers = {
+            'X-RateLimit-Limit': str(window.limit),
+            'X-RateLimit-Remaining': str(window.remaining),
+            'X-RateLimit-Reset': f"{time.time() + reset_after:.3f}",
+            'X-RateLimit-Reset-After': f"{reset_after:.3f}",
+            'X-RateLimit-Bucket': f"{zlib.crc32(key[0].encode()):08x}",
+        }
+        if allowed:
+            return None, headers
+        return reset_after, {**headers, **limited, 'Retry-After': f"{reset_after:.3f}", 'X-RateLimit-Scope': 'user'}
+
+    @staticmethod
+    async def _request_json(request):
+        """Read a request's JSON body, including the payload_json part of a file upload"""
+        if not request.can_read_body:
+            return {}
+        if request.content_type == 'multipart/form-data':
+            form = await request.post()
+            return json.loads(form.get('payload_json') or '{}')
+        try:
+            return await request.json()
+        except ValueError:
+            return {}
+
+    async def _answer(self, request, path, template, headers):
+        """Answer the routes discord.py needs to log in and the ones cogs use most"""
+        method = request.method
+        gateway_url = f"{self.url.replace('http', 'ws', 1)}/gateway"
+        segments = path.split('/')
+
+        def respond(data=None, status=200):
+            if data is None:
+                return web.Response(status=204, headers=headers)
+            return _json_response(data, status, headers)
+
+        if path == 'users/@me':
+            return respond(self.bot_user)
+        if path == 'oauth2/applications/@me':
+            return respond(self.application)
+        if path == 'gateway':
+            return respond({'url': gateway_url})
+        if path == 'gateway/bot':
+            return respond({
+                'url': gateway_url,
+                'shards': self.shard_count,
+                'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 1}
+            })
+
+        if template in ('channels/{channel_id}/messages', 'channels/{channel_id}/messages/{message_id}') and method in ('POST', 'PATCH'):
+            body = await self._request_json(request)
+            message_id = segments[3] if len(segments) > 3 else None
+            return respond(self.message(segments[1], self.bot_user, body.get('content') or '',
+                                        embeds=body.get('embeds') or [], message_id=message_id, with_member=False))
+        if template == 'channels/{channel_id}/messages/{message_id}' and method == 'GET':
+            return respond(self.message(segments[1], self.bot_user, '', message_id=segments[3], with_member=False))
+        if template in ('guilds/{guild_id}/invites', 'channels/{channel_id}/invites') and method == 'GET':
+            return respond([])
+        if template == 'guilds/{guild_id}/audit-logs':
+            return respond({'audit_log_entries': [], 'users': [], 'webhooks': [], 'integrations': [],
+                            'threads': [], 'application_commands': [], 'auto_moderation_rules': [],
+                            'guild_scheduled_events': []})
+        if template == 'guilds/{guild_id}/members/{user_id}' and method in ('GET', 'PATCH'):
+            member = self.members.get((segments[1], segments[3]))
+            if member is None:
+                return respond({'message': 'Unknown Member', 'code': 10007}, status=404)
+            return respond(member)
+        if template == 'users/{user_id}' and method == 'GET':
+            return respond(self._user(int(segments[1]), f'user{int(segments[1]) % 100000}'))
+        if template == 'channels/{channel_id}/typing' or method in ('PUT', 'DELETE'):
+            # Reactions, role changes, deletions and pins all answer with no content
+            return respond()
+
+        return _json_response({'message': f'Unknown route {method} /{path}', 'code': 0}, status=404)
+
+    async def dispatch(self, ws, event, data):
+        """Send a dispatch event over a shard's connection"""
+        self.sequence += 1
+        await ws.send_str(json.dumps({'op': OP_DISPATCH, 't': event, 's': self.sequence, 'd': data}))
+
+    async def _gateway(self, request):
+        """Run one shard's gateway session"""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'op': OP_HELLO, 'd': {'heartbeat_interval': 41250}})
+
+        shard_id = None
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                continue
+
+            payload = json.loads(message.data)
+            op = payload.get('op')
+
+            if op == OP_HEARTBEAT:
+                await ws.send_json({'op': OP_HEARTBEAT_ACK})
+            elif op == OP_IDENTIFY:
+                shard_id = await self._identify(ws, payload['d'])
+            elif op == OP_RESUME:
+                # Sessions aren't kept, so make the shard identify again
+                await ws.send_json({'op': OP_INVALID_SESSION, 'd': False})
+            elif op == OP_REQUEST_MEMBERS:
+                await self._send_members(ws, payload['d'])
+
+        if shard_id is not None and self.sockets.get(shard_id) is ws:
+            del self.sockets[shard_id]
+        return ws
+
+    async def _identify(self, ws, data):
+        """Send READY and a GUILD_CREATE for every guild on the shard"""
+        shard_id, shard_count = data.get('shard') or (0, 1)
+        if shard_count != self.shard_count:
+            logger.warning(f"Shard {shard_id} identified with {shard_count} shards, expected {self.shard_count}")
+
+        self.sockets[shard_id] = ws
+        self.identifies[shard_id] = self.identifies.get(shard_id, 0) + 1
+        guilds = self.guilds_for_shard(shard_id)
+
+        await self.dispatch(ws, 'READY', {
+            'v': 10,
+            'user': self.bot_user,
+            'guilds': [{'id': guild['id'], 'unavailable': True} for guild in guilds],
+            'session_id': f"fake-{shard_id}-{self.identifies[shard_id]}",
+            'resume_gateway_url': f"{self.url.replace('http', 'ws', 1)}/gateway",
+            'shard': [shard_id, shard_count],
+            'application': {'id': self.application['id'], 'flags': 0}
+        })
+        for guild in guilds:
+            await self.dispatch(ws, 'GUILD_CREATE', guild)
+
+        return shard_id
+
+    async def _send_members(self, ws, data):
+        """Answer a member chunk request with the guild's full member list"""
+        guild_ids = data['guild_id'] if isinstance(data['guild_id'], list) else [data['guild_id']]
+        for guild in self.guilds:
+            if guild['id'] in map(str, guild_ids):
+                await self.dispatch(ws, 'GUILD_MEMBERS_CHUNK', {
+                    'guild_id': guild['id'],
+                    'members': guild['members'],
+                    'chunk_index': 0,
+                    'chunk_count': 1,
+                    'nonce': data.get('nonce')
+                })
+
@@ -0,0 +1,432 @@
+"""An in-process Redis-protocol server for local runs and checks
+
+Implements the subset of commands the storage adapters use (strings,
+hashes, sets, sorted sets, expiry, WATCH/MULTI/EXEC) over real sockets, so RedisClient and
+the adapters are exercised exactly as against a real server:
+
+    server = FakeRedisServer()
+    url = server.start()     # redis://127.0.0.1:<port>/0
+    ...
+    server.stop()
+"""
+import fnmatch
+import logging
+import socket
+import socketserver
+import threading
+import time
+
+from utils.redis_client import RespReader
+
+logger = logging.getLogger('discord_bot')
+
+
+def _format_score(score):
+    """Format a sorted set score the way Redis replies with it"""
+    return str(int(score)) if score == int(score) else repr(score)
+
+
+class _CommandError(Exception):
+    pass
+
+
+class FakeRedisStore:
+    """The keyspace and command implementations, shared by all connections"""
+
+    WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+    # Commands that don't modify their keys, so don't fail transactions watching them
+    READ_ONLY = frozenset({
+        'PING', 'SELECT', 'AUTH', 'EXISTS', 'KEYS', 'TTL', 'GET', 'HGET', 'HMGET', 'HEXISTS', 'HGETALL',
+        'HKEYS', 'HLEN', 'SMEMBERS', 'SISMEMBER', 'SCARD', 'ZSCORE', 'ZCARD', 'ZREVRANGE'
+    })
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}  # Key -> UNIX timestamp
+        self.versions = {}  # Key -> number of times it was modified, for WATCH
+        self.lock = threading.Lock()
+        self.commands_run = 0
+
+    def execute(self, args):
+        """Run one command
+
+        Returns:
+            The reply value (bytes-able types, lists, None, ints or _CommandError)
+        """
+        with self.lock:
+            return self._run(args)
+
+    def watch(self, keys):
+        """Get the current versions of keys, for a later execute_transaction"""
+        with self.lock:
+            for key in keys:
+                self._get(key, object)
+            return {key: self.versions.get(key, 0) for key in keys}
+
+    def execute_transaction(self, commands, watched):
+        """Run queued commands atomically, unless a watched key changed
+
+        Args:
+            commands (list): The commands queued since MULTI
+            watched (dict): Key -> version, from watch()
+
+        Returns:
+            list: One reply per command, or None if the transaction was aborted
+        """
+        with self.lock:
+            for key, version in watched.items():
+                self._get(key, object)
+                if self.versions.get(key, 0) != version:
+                    return None
+            return [self._run(command) for command in commands]
+
+    def _run(self, args):
+        name = args[0].upper()
+        handler = getattr(self, f'cmd_{name.lower()}', None)
+        if handler is None:
+            return _CommandError(f"ERR unknown command '{name}'")
+
+        self.commands_run += 1
+        try:
+            reply = handler(*args[1:])
+        except _CommandError as e:
+            return e
+        except (TypeError, ValueError) as e:
+            return _CommandError(f"ERR wrong arguments for '{name}': {e}")
+
+        if name == 'FLUSHDB':
+            self._touch(list(self.versions))
+        elif name == 'DEL':
+            self._touch(args[1:])
+        elif name not in self.READ_ONLY:
+            self._touch(args[1:2])
+        return reply
+
+    def _touch(self, keys):
+        for key in keys:
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _get(self, key, kind):
+        """Get a live key's value, checking its type"""
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            del self.expires[key]
+            self._touch([key])
+
+        value = self.data.get(key)
+        if value is not None and kind is not object and type(value) is not kind:
+            raise _CommandError(self.WRONGTYPE)
+        return value
+
+    def _get_or_create(self, key, kind):
+        value = self._get(key, kind)
+        if value is None:
+            value = kind()
+            self.data[key] = value
+        return value
+
+    def _drop_if_empty(self, key):
+        if not self.data.get(key):
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    # Connection and keyspace
+
+    def cmd_ping(self, *args):
+        return args[0] if args else 'PONG'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_auth(self, *args):
+        return 'OK'
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            self._get(key, object)
+            if self.data.pop(key, None) is not None:
+                removed += 1
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_exists(self, *keys):
+        return sum(1 for key in keys if self._get(key, object) is not None)
+
+    def cmd_keys(self, pattern):
+        return [key for key in list(self.data) if self._get(key, object) is not None and fnmatch.fnmatchcase(key, pattern)]
+
+    def cmd_expire(self, key, seconds):
+        if self._get(key, object) is None:
+            return 0
+        self.expires[key] = time.time() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key):
+        if self._get(key, object) is None:
+            return -2
+        if key not in self.expires:
+            return -1
+        return int(self.expires[key] - time.time())
+
+    # Strings
+
+    def cmd_get(self, key):
+        return self._get(key, str)
+
+    def cmd_set(self, key, value):
+        self._get(key, object)
+        self.data[key] = value
+        self.expires.pop(key, None)
+        return 'OK'
+
+    def cmd_incrby(self, key, amount):
+        value = int(self._get(key, str) or 0) + int(amount)
+        self.data[key] = str(value)
+        return value
+
+    # Hashes
+
+    def cmd_hget(self, key, field):
+        return (self._get(key, dict) or {}).get(field)
+
+    def cmd_hmget(self, key, *fields):
+        value = self._get(key, dict) or {}
+        return [value.get(field) for field in fields]
+
+    def cmd_hset(self, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise _CommandError("ERR wrong number of arguments for 'hset' command")
+        fields = self._get_or_create(key, dict)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+
+    def cmd_hsetnx(self, key, field, value):
+        fields = self._get_or_create(key, dict)
+        if field in fields:
+            return 0
+        fields[field] = value
+        return 1
+
+    def cmd_hdel(self, key, *fields_to_remove):
+        fields = self._get(key, dict) or {}
+        removed = sum(1 for field in fields_to_remove if fields.pop(field, None) is not None)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_hexists(self, key, field):
+        return int(field in (self._get(key, dict) or {}))
+
+    def cmd_hgetall(self, key):
+        reply = []
+        for field, value in (self._get(key, dict) or {}).items():
+            reply.extend((field, value))
+        return reply
+
+    def cmd_hkeys(self, key):
+        return list(self._get(key, dict) or {})
+
+    def cmd_hlen(self, key):
+        return len(self._get(key, dict) or {})
+
+    def cmd_hincrby(self, key, field, amount):
+        fields = self._get_or_create(key, dict)
+        try:
+            value = int(fields.get(field, 0)) + int(amount)
+        except ValueError:
+            raise _CommandError("ERR hash value is not an integer")
+        fields[field] = str(value)
+        return value
+
+    # Sets
+
+    def cmd_sadd(self, key, *members):
+        values = self._get_or_create(key, set)
+        before = len(values)
+        values.update(members)
+        return len(values) - before
+
+    def cmd_srem(self, key, *members):
+        values = self._get(key, set) or set()
+        removed = sum(1 for member in members if member in values)
+        values.difference_update(members)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_smembers(self, key):
+        return sorted(self._get(key, set) or ())
+
+    def cmd_sismember(self, key, member):
+        return int(member in (self._get(key, set) or ()))
+
+    def cmd_scard(self, key):
+        return len(self._get(key, set) or ())
+
+    # Sorted sets (stored as member -> score dicts)
+
+    def cmd_zadd(self, key, *pairs):
+        scores = self._get_or_create(key, _SortedSet)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            added += member not in scores
+            scores[member] = float(score)
+        return added
+
+    def cmd_zincrby(self, key, amount, member):
+        scores = self._get_or_create(key, _SortedSet)
+        scores[member] = scores.get(member, 0.0) + float(amount)
+        return _format_score(scores[member])
+
+    def cmd_zrem(self, key, *members):
+        scores = self._get(key, _SortedSet) or {}
+        removed = sum(1 for member in members if scores.pop(member, None) is not None)
+        self._drop_if_empty(key)
+        return removed
+
+    def cmd_zscore(self, key, member):
+        score = (self._get(key, _SortedSet) or {}).get(member)
+        return None if score is None else _format_score(score)
+
+    def cmd_zcard(self, key):
+        return len(self._get(key, _SortedSet) or {})
+
+    def cmd_zrevrange(self, key, start, stop, *options):
+        scores = self._get(key, _SortedSet) or {}
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+        start, stop = int(start), int(stop)
+        if stop < 0:
+            stop += len(ranked)
+        ranked = ranked[start:stop + 1]
+
+        if options and options[0].upper() == 'WITHSCORES':
+            reply = []
+            for member, score in ranked:
+                reply.extend((member, _format_score(score)))
+            return reply
+        return [member for member, _ in ranked]
+
+
+class _SortedSet(dict):
+    """Marks a dict as a sorted set so type checks can tell it from a hash"""
+
+
+def _encode_reply(value):
+    """Encode a reply value as RESP"""
+    if isinstance(value, _CommandError):
+        return b'-%s\r\n' % str(value).encode()
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, bool):
+        return b':%d\r\n' % int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if value in ('OK', 'PONG', 'QUEUED'):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, str):
+        data = value.encode()
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(_encode_reply(item) for item in value)
+    raise TypeError(f"Can't encode reply {value!r}")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # Replies are written one at a time; don't let Nagle hold them back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reader = RespReader(self.rfile)
+        store = self.server.store
+
+        # Transaction state is per connection, as in Redis
+        watched = {}
+        queued = None
+
+        while True:
+            try:
+                command = reader.read()
+            except (ConnectionError, OSError):
+                return
+
+            if not isinstance(command, list) or not command:
+                self.wfile.write(b'-ERR protocol error\r\n')
+                return
+
+            name = str(command[0]).upper()
+            if name == 'MULTI':
+                reply = _CommandError("ERR MULTI calls can not be nested") if queued is not None else 'OK'
+                if queued is None:
+                    queued = []
+            elif name == 'EXEC':
+                if queued is None:
+                    reply = _CommandError("ERR EXEC without MULTI")
+                else:
+                    reply = store.execute_transaction(queued, watched)
+                    queued = None
+                    watched = {}
+            elif name == 'DISCARD':
+                reply = _CommandError("ERR DISCARD without MULTI") if queued is None else 'OK'
+                queued = None
+                watched = {}
+            elif name == 'WATCH':
+                if queued is not None:
+                    reply = _CommandError("ERR WATCH inside MULTI is not allowed")
+                else:
+                    watched.update(store.watch(command[1:]))
+                    reply = 'OK'
+            elif name == 'UNWATCH':
+                watched = {}
+                reply = 'OK'
+            elif queued is not None:
+                queued.append(command)
+                reply = 'QUEUED'
+            else:
+                reply = store.execute(command)
+
+            self.wfile.write(_encode_reply(reply))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeRedisServer:
+    """Serves a FakeRedisStore on a local TCP port from a background thread"""
+
+    def __init__(self, store=None):
+        self.store = store or FakeRedisStore()
+        self.server = None
+        self.thread = None
+
+    def start(self, host='127.0.0.1', port=0):
+        """Start serving
+
+        Returns:
+            str: A redis:// URL for RedisClient.from_url
+        """
+        self.server = _Server((host, port), _Handler)
+        self.server.store = self.store
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-redis', daemon=True)
+        self.thread.start()
+
+        host, port = self.server.server_address
+        logger.info(f"Fake Redis server listening on {host}:{port}")
+        return f"redis://{host}:{port}/0"
+
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,260 @@
+import bisect
+import logging
+from collections import Counter
+
+import discord
+
+logger = logging.getLogger('discord_bot')
+
+
+def _join_key(member):
+    """Get the join-order sort key for a member
+
+    Members without a join date sort last, like they did in userinfo.
+    """
+    joined_at = member.joined_at
+    return (joined_at.timestamp() if joined_at else float('inf'), member.id)
+
+
+def _role_ids(member):
+    """Get the IDs of a member's roles, not counting @everyone"""
+    return [role.id for role in member.roles if not role.is_default()]
+
+
+def _is_online(member):
+    """Check whether a member counts as online"""
+    return member.status != discord.Status.offline
+
+
+class JoinIndex:
+    """Join-order keys kept sorted in buckets of around BUCKET_SIZE
+
+    A single sorted list makes every insert and removal shift the keys
+    after it, which is O(n) on large guilds. With buckets only one bucket
+    shifts, and finding a position sums the bucket sizes before it.
+    """
+
+    BUCKET_SIZE = 1000
+
+    __slots__ = ('buckets', 'maxes', 'length')
+
+    def __init__(self, keys=()):
+        """Initialize the index
+
+        Args:
+            keys: Join keys in any order
+        """
+        keys = sorted(keys)
+        self.buckets = [keys[i:i + self.BUCKET_SIZE] for i in range(0, len(keys), self.BUCKET_SIZE)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.length = len(keys)
+
+    def __len__(self):
+        return self.length
+
+    def add(self, key):
+        """Insert a key in order"""
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+            self.length = 1
+            return
+
+        # Keys past the last maximum, like new joins, go in the last bucket
+        index = min(bisect.bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket = self.buckets[index]
+        bisect.insort(bucket, key)
+        self.maxes[index] = bucket[-1]
+        self.length += 1
+
+        if len(bucket) > 2 * self.BUCKET_SIZE:
+            half = len(bucket) // 2
+            self.buckets[index:index + 1] = [bucket[:half], bucket[half:]]
+            self.maxes[index:index + 1] = [bucket[half - 1], bucket[-1]]
+
+    def remove(self, key):
+        """Remove a key if it is indexed"""
+        index = bisect.bisect_left(self.maxes, key)
+        if index == len(self.buckets):
+            return
+        bucket = self.buckets[index]
+        position = bisect.bisect_left(bucket, key)
+        if position == len(bucket) or bucket[position] != key:
+            return
+
+        del bucket[position]
+        self.length -= 1
+        if bucket:
+            self.maxes[index] = bucket[-1]
+        else:
+            del self.buckets[index]
+            del self.maxes[index]
+
+    def position(self, key):
+        """Get a key's 0-based position, or None if it isn't indexed"""
+        index = bisect.bisect_left(self.maxes, key)
+        if index == len(self.buckets):
+            return None
+        bucket = self.buckets[index]
+        position = bisect.bisect_left(bucket, key)
+        if position == len(bucket) or bucket[position] != key:
+            return None
+        return sum(len(earlier) for earlier in self.buckets[:index]) + position
+
+
+class GuildStats:
+    """Member statistics for one guild, kept up to date from gateway events"""
+
+    __slots__ = ('humans', 'bots', 'online', 'role_counts', 'join_index', 'complete')
+
+    def __init__(self, guild):
+        """Build the statistics with one pass over the guild's cached members
+
+        Args:
+            guild: The discord.Guild to build statistics for
+        """
+        self.humans = 0
+        self.bots = 0
+        self.online = 0
+        self.role_counts = Counter()
+
+        for member in guild.members:
+            self._count(member, 1)
+        self.join_index = JoinIndex(_join_key(member) for member in guild.members)
+
+        # Built before member chunking finished, so rebuild once it has
+        self.complete = guild.chunked
+
+    def _count(self, member, delta):
+        """Add (delta=1) or remove (delta=-1) a member from the counters"""
+        if member.bot:
+            self.bots += delta
+        else:
+            self.humans += delta
+
+        if _is_online(member):
+            self.online += delta
+
+        for role_id in _role_ids(member):
+            self.role_counts[role_id] += delta
+
+    def add_member(self, member):
+        """Add a member who joined"""
+        self._count(member, 1)
+        self.join_index.add(_join_key(member))
+
+    def remove_member(self, member):
+        """Remove a member who left"""
+        self._count(member, -1)
+        self.join_index.remove(_join_key(member))
+
+    def update_presence(self, before, after):
+        """Update the online count for a presence change"""
+        was_online, is_online = _is_online(before), _is_online(after)
+        if was_online != is_online:
+            self.online += 1 if is_online else -1
+
+    def update_roles(self, before, after):
+        """Update per-role counts for a member's role change"""
+        before_roles, after_roles = set(_role_ids(before)), set(_role_ids(after))
+
+        for role_id in after_roles - before_roles:
+            self.role_counts[role_id] += 1
+        for role_id in before_roles - after_roles:
+            self.role_counts[role_id] -= 1
+
+    def join_position(self, member):
+        """Get a member's 1-based join position
+
+        Returns:
+            int: The position, or None if the member isn't indexed
+        """
+        position = self.join_index.position(_join_key(member))
+        return None if position is None else position + 1
+
+    def role_member_count(self, role_id):
+        """Get the number of members with a role"""
+        return self.role_counts.get(role_id, 0)
+
+
+class GuildStatsTracker:
+    """Per-guild member statistics, built lazily and then maintained incrementally
+
+    The first lookup for a guild costs one pass over its members; after that
+    the owning cog feeds member join, leave, presence and role events in so
+    serverinfo, userinfo, roleinfo and botinfo never scan member lists.
+    """
+
+    def __init__(self):
+        self.guilds = {}  # Guild ID -> GuildStats
+
+    def get(self, guild):
+        """Get the statistics for a guild, building them on first use
+
+        Args:
+            guild: The discord.Guild to get statistics for
+
+        Returns:
+            GuildStats: The guild's statistics
+        """
+        stats = self.guilds.get(guild.id)
+        if stats is None or (not stats.complete and guild.chunked):
+            stats = GuildStats(guild)
+            self.guilds[guild.id] = stats
+            logger.info(f"Built member statistics for guild {guild.id} ({len(stats.join_index)} members)")
+        return stats
+
+    def peek(self, guild_id):
+        """Get a guild's statistics only if they were already built"""
+        return self.guilds.get(guild_id)
+
+    def forget(self, guild_id):
+        """Drop a guild's statistics"""
+        self.guilds.pop(guild_id, None)
+
+    def member_joined(self, member):
+        """Record a member joining"""
+        stats = self.peek(member.guild.id)
+        if stats:
+            stats.add_member(member)
+
+    def member_left(self, member):
+        """Record a member leaving"""
+        stats = self.peek(member.guild.id)
+        if stats:
+            stats.remove_member(member)
+
+    def presence_updated(self, before, after):
+        """Record a presence update"""
+        stats = self.peek(after.guild.id)
+        if stats:
+            stats.update_presence(before, after)
+
+    def member_updated(self, before, after):
+        """Record a member update (only role changes matter)"""
+        stats = self.peek(after.guild.id)
+        if stats and before.roles != after.roles:
+            stats.update_roles(before, after)
+
+    def role_deleted(self, role):
+        """Drop the count for a deleted role"""
+        stats = self.peek(role.guild.id)
+        if stats:
+            stats.role_counts.pop(role.id, None)
+
+    def total_humans(self, guilds):
+        """Count human members across guilds, as botinfo reports them
+
+        Guilds that haven't been chunked (memory budget mode) are counted by
+        their member_count, bots included, rather than chunking them all.
+
+        Args:
+            guilds: The guilds to count
+
+        Returns:
+            int: The summed human member counts
+        """
+        return sum(
+            self.get(guild).humans if guild.chunked else (guild.member_count or 0)
+            for guild in guilds
+        )
@@ -0,0 +1,272 @@
+"""Gateway intents planner
+
+Works out the smallest set of gateway intents (and member cache flags) the
+configured cogs need, from the listeners they register and the intents they
+declare. Run from the multipurpos directory for a report:
+
+    python -m utils.intents_planner [--members N] [--no-presences]
+"""
+import argparse
+import importlib
+import inspect
+import logging
+
+import discord
+from discord.ext import commands
+
+from config import CONFIG
+
+logger = logging.getLogger('discord_bot')
+
+# Intents each gateway listener needs to receive its events
+LISTENER_INTENTS = {
+    'on_message': ('guild_messages', 'dm_messages'),
+    'on_message_edit': ('guild_messages', 'dm_messages'),
+    'on_message_delete': ('guild_messages', 'dm_messages'),
+    'on_bulk_message_delete': ('guild_messages',),
+    'on_raw_message_edit': ('guild_messages', 'dm_messages'),
+    'on_raw_message_delete': ('guild_messages', 'dm_messages'),
+    'on_raw_bulk_message_delete': ('guild_messages',),
+    'on_reaction_add': ('guild_reactions', 'dm_reactions'),
+    'on_reaction_remove': ('guild_reactions', 'dm_reactions'),
+    'on_reaction_clear': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_add': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_remove': ('guild_reactions', 'dm_reactions'),
+    'on_raw_reaction_clear': ('guild_reactions', 'dm_reactions'),
+    'on_member_join': ('members',),
+    'on_member_remove': ('members',),
+    'on_raw_member_remove': ('members',),
+    'on_member_update': ('members',),
+    'on_user_update': ('members',),
+    'on_presence_update': ('presences', 'members'),
+    'on_member_ban': ('moderation',),
+    'on_member_unban': ('moderation',),
+    'on_audit_log_entry_create': ('moderation',),
+    'on_invite_create': ('invites',),
+    'on_invite_delete': ('invites',),
+    'on_voice_state_update': ('voice_states',),
+    'on_typing': ('guild_typing', 'dm_typing'),
+    'on_raw_typing': ('guild_typing', 'dm_typing'),
+    'on_guild_emojis_update': ('emojis_and_stickers',),
+    'on_guild_stickers_update': ('emojis_and_stickers',),
+    'on_webhooks_update': ('webhooks',),
+    'on_integration_create': ('integrations',),
+    'on_integration_update': ('integrations',),
+    'on_scheduled_event_create': ('guild_scheduled_events',),
+    'on_scheduled_event_update': ('guild_scheduled_events',),
+    'on_scheduled_event_delete': ('guild_scheduled_events',),
+}
+
+# Prefix commands are parsed from message content
+COMMAND_INTENTS = ('guild_messages', 'dm_messages', 'message_content')
+
+# Without this, guild, channel and role caches are empty
+BASE_INTENTS = ('guilds',)
+
+# Rough gateway events per 1,000 members per hour, for an active community
+# guild. Only used to estimate what dropping an intent saves.
+EVENT_RATES = {
+    'presences': 6000,
+    'guild_typing': 900,
+    'guild_messages': 600,
+    'guild_reactions': 150,
+    'voice_states': 60,
+    'members': 20,
+    'dm_typing': 10,
+    'dm_messages': 10,
+    'dm_reactions': 2,
+    'emojis_and_stickers': 0.1,
+    'guild_scheduled_events': 0.1,
+    'invites': 0.5,
+    'moderation': 0.5,
+    'webhooks': 0.2,
+    'integrations': 0.1,
+    'auto_moderation_configuration': 0.1,
+    'auto_moderation_execution': 1,
+    'guild_polls': 1,
+    'dm_polls': 0.1,
+}
+
+# The individual intent flags; the rest are aliases or groups of these
+CANONICAL_FLAGS = (
+    'guilds', 'members', 'moderation', 'emojis_and_stickers', 'integrations',
+    'webhooks', 'invites', 'voice_states', 'presences', 'guild_messages',
+    'dm_messages', 'guild_reactions', 'dm_reactions', 'guild_typing', 'dm_typing',
+    'message_content', 'guild_scheduled_events', 'auto_moderation_configuration',
+    'auto_moderation_execution', 'guild_polls', 'dm_polls'
+)
+
+
+class IntentsPlan:
+    """The intents a set of cogs needs, and why"""
+
+    def __init__(self):
+        self.intents = discord.Intents.none()
+        self.reasons = {}  # Intent -> list of "Cog.listener" style reasons
+        self.skipped = {}  # Optional intent -> cogs that would have used it
+
+    def require(self, intent, reason):
+        """Turn on an intent, recording what needs it"""
+        setattr(self.intents, intent, True)
+        self.reasons.setdefault(intent, []).append(reason)
+
+    def skip(self, intent, reason):
+        """Record an optional intent that was left off"""
+        self.skipped.setdefault(intent, []).append(reason)
+
+    @property
+    def member_cache_flags(self):
+        """The smallest member cache that still works with these intents"""
+        return discord.MemberCacheFlags.from_intents(self.intents)
+
+
+def enabled_flags(intents):
+    """Get the canonical intent flags enabled in an Intents object"""
+    return [flag for flag in CANONICAL_FLAGS if getattr(intents, flag)]
+
+
+def find_cog_classes(extensions, package='cogs'):
+    """Import extensions and find the Cog classes they define
+
+    Args:
+        extensions: Extension names, relative to package
+        package: The package containing the extensions
+
+    Returns:
+        list: (extension name, Cog class) pairs
+    """
+    cog_classes = []
+
+    for name in extensions:
+        try:
+            module = importlib.import_module(f'{package}.{name}')
+        except Exception as e:
+            logger.error(f"Intents planner could not import {name}: {e}")
+            continue
+
+        for _, obj in inspect.getmembers(module, inspect.isclass):
+            if issubclass(obj, commands.Cog) and obj is not commands.Cog and obj.__module__ == module.__name__:
+                cog_classes.append((name, obj))
+
+    return cog_classes
+
+
+def plan_intents(extensions, include_optional=True, package='cogs'):
+    """Compute the minimal intents for a set of cogs
+
+    Cogs can declare intents their listeners don't imply with a
+    ``required_intents`` class attribute. Intents in ``optional_intents`` are
+    only enabled when include_optional is set; cogs are expected to degrade
+    gracefully without them.
+
+    Args:
+        extensions: Extension names, relative to package
+        include_optional: Whether to enable intents cogs only optionally use
+        package: The package containing the extensions
+
+    Returns:
+        IntentsPlan: The computed plan
+    """
+    plan = IntentsPlan()
+
+    for intent in BASE_INTENTS:
+        plan.require(intent, 'discord.py cache')
+
+    for name, cog_class in find_cog_classes(extensions, package):
+        cog_name = cog_class.__cog_name__
+        optional = set(getattr(cog_class, 'optional_intents', ()))
+
+        for listener_name, _ in cog_class.__cog_listeners__:
+            for intent in LISTENER_INTENTS.get(listener_name, ()):
+                reason = f"{cog_name}.{listener_name}"
+                if intent in optional and not include_optional:
+                    plan.skip(intent, reason)
+                else:
+                    plan.require(intent, reason)
+
+        for intent in getattr(cog_class, 'required_intents', ()):
+            plan.require(intent, f"{cog_name} (declared)")
+
+        if cog_class.__cog_commands__:
+            for intent in COMMAND_INTENTS:
+                plan.require(intent, f"{cog_name} commands")
+
+    return plan
+
+
+def estimate_event_volume(intents, members):
+    """Estimate gateway events per hour for the given intents
+
+    Args:
+        intents: The discord.Intents to estimate for
+        members: Total members across all guilds
+
+    Returns:
+        float: Estimated events per hour
+    """
+    return sum(EVENT_RATES.get(flag, 0) for flag in enabled_flags(intents)) * members / 1000
+
+
+def format_report(plan, current, members):
+    """Format a human-readable comparison of the planned and current intents
+
+    Args:
+        plan: The IntentsPlan to report on
+        current: The discord.Intents currently configured
+        members: Total members across all guilds, for the volume estimate
+
+    Returns:
+        str: The report
+    """
+    lines = ["Planned intents:"]
+    for flag in enabled_flags(plan.intents):
+        reasons = plan.reasons.get(flag, [])
+        shown = ", ".join(reasons[:4]) + (f" (+{len(reasons) - 4} more)" if len(reasons) > 4 else "")
+        lines.append(f"  {flag:<32} {shown}")
+
+    for flag, reasons in plan.skipped.items():
+        if not getattr(plan.intents, flag):
+            lines.append(f"  {flag:<32} OFF (optional for {', '.join(reasons)})")
+
+    dropped = [flag for flag in enabled_flags(current) if not getattr(plan.intents, flag)]
+    added = [flag for flag in enabled_flags(plan.intents) if not getattr(current, flag)]
+    lines.append("")
+    lines.append(f"Dropped vs current: {', '.join(dropped) or 'none'}")
+    if added:
+        lines.append(f"Missing from current: {', '.join(added)}")
+
+    flags = plan.member_cache_flags
+    lines.append(f"Member cache flags: joined={flags.joined} voice={flags.voice}")
+
+    current_volume = estimate_event_volume(current, members)
+    planned_volume = estimate_event_volume(plan.intents, members)
+    saved = current_volume - planned_volume
+    share = saved / current_volume * 100 if current_volume else 0
+    lines.append(
+        f"Estimated events/hour at {members:,} members: {current_volume:,.0f} -> {planned_volume:,.0f} "
+        f"({share:.0f}% saved)"
+    )
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the minimal gateway intents for the configured cogs")
+    parser.add_argument("--members", type=int, default=10000, help="total members across guilds, for estimates")
+    parser.add_argument("--no-presences", action="store_true", help="leave optional presence tracking off")
+    args = parser.parse_args()
+
+    include_optional = CONFIG['gateway']['presences'] and not args.no_presences
+    plan = plan_intents(CONFIG['cogs'], include_optional=include_optional)
+
+    # What discord_bot.py used before intents were planned
+    current = discord.Intents.default()
+    current.members = True
+    current.message_content = True
+    current.presences = True
+
+    print(format_report(plan, current, args.members))
+
+
+if __name__ == "__main__":
+    main()
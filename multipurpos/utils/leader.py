@@ -0,0 +1,506 @@
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import closing
+
+logger = logging.getLogger('discord_bot')
+
+# The lease the bot's singleton loops run under, and where it is kept with JSON storage
+SINGLETON_LEASE = 'singleton-loops'
+LEASE_FILE = 'data/leases.db'
+
+
+class SQLiteLeaseStore:
+    """Leases kept in a SQLite file shared by the contending processes
+
+    Every change runs in an IMMEDIATE transaction, so two processes can
+    never both acquire the same lease. Each new holder gets a fencing token
+    one higher than the last; the token of a lease that expired or moved to
+    another process is never valid again.
+
+    The same file keeps the fences (see fence): the newest token that wrote
+    each resource, since the processes sharing the lease don't share their
+    in-memory data.
+    """
+
+    def __init__(self, path):
+        """Initialize the store
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "name TEXT PRIMARY KEY, holder TEXT, token INTEGER, "
+                "expires_at REAL, released_at REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fences ("
+                "name TEXT, resource TEXT, token INTEGER, PRIMARY KEY (name, resource))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def try_acquire(self, name, holder, ttl, now=None):
+        """Take a lease if it is free, expired or released
+
+        Args:
+            name (str): The lease name
+            holder (str): ID of the process taking it
+            ttl (float): Seconds until the lease expires unless renewed
+            now (float): Current UNIX timestamp (defaults to time.time())
+
+        Returns:
+            dict: token and handover_seconds (time the lease sat unheld
+                before this takeover, None for a brand new lease), or None
+                if another process holds it
+        """
+        now = now or time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT holder, token, expires_at, released_at FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+
+            if row is None:
+                token, handover = 1, None
+                connection.execute(
+                    "INSERT INTO leases (name, holder, token, expires_at, released_at) VALUES (?, ?, ?, ?, NULL)",
+                    (name, holder, token, now + ttl)
+                )
+            else:
+                previous_holder, previous_token, expires_at, released_at = row
+                if released_at is None and expires_at > now:
+                    connection.execute("ROLLBACK")
+                    return None
+
+                token = previous_token + 1
+                handover = max(now - (released_at or expires_at), 0.0)
+                connection.execute(
+                    "UPDATE leases SET holder = ?, token = ?, expires_at = ?, released_at = NULL WHERE name = ?",
+                    (holder, token, now + ttl, name)
+                )
+
+            connection.execute("COMMIT")
+            return {'token': token, 'handover_seconds': handover}
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def renew(self, name, holder, token, ttl, now=None):
+        """Extend a held lease
+
+        Returns:
+            bool: False if the lease expired or was taken over
+        """
+        now = now or time.time()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND holder = ? AND token = ? "
+                "AND released_at IS NULL AND expires_at > ?",
+                (now + ttl, name, holder, token, now)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name, holder, token, now=None):
+        """Give a lease up early so another process can take it immediately"""
+        now = now or time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE leases SET expires_at = ?, released_at = ? WHERE name = ? AND holder = ? AND token = ?",
+                (now, now, name, holder, token)
+            )
+
+    def is_valid(self, name, holder, token, now=None):
+        """Check a fencing token still belongs to the current, unexpired lease"""
+        now = now or time.time()
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM leases WHERE name = ? AND holder = ? AND token = ? "
+                "AND released_at IS NULL AND expires_at > ?",
+                (name, holder, token, now)
+            ).fetchone()
+        return row is not None
+
+    def fence(self, name, token, resource, now=None):
+        """Record a write to a resource under a lease, if the token may still write it
+
+        The lease check and the fence update are one IMMEDIATE transaction,
+        so once a newer holder has taken the lease or written the resource,
+        an older token is refused even if its process hasn't noticed yet.
+
+        Args:
+            name (str): The lease the writer holds
+            token (int): The writer's fencing token
+            resource (str): What is being written, e.g. 'giveaways'
+            now (float): Current UNIX timestamp (defaults to time.time())
+
+        Returns:
+            bool: Whether the write may go ahead
+        """
+        now = now or time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            held = connection.execute(
+                "SELECT 1 FROM leases WHERE name = ? AND token = ? AND released_at IS NULL AND expires_at > ?",
+                (name, token, now)
+            ).fetchone()
+            row = connection.execute(
+                "SELECT token FROM fences WHERE name = ? AND resource = ?", (name, resource)
+            ).fetchone()
+            if held is None or (row is not None and token < row[0]):
+                connection.execute("ROLLBACK")
+                return False
+
+            connection.execute(
+                "INSERT OR REPLACE INTO fences (name, resource, token) VALUES (?, ?, ?)",
+                (name, resource, token)
+            )
+            connection.execute("COMMIT")
+            return True
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+
+class RedisLeaseStore:
+    """Leases kept on the Redis server shared by every cluster
+
+    Used with the Redis storage backend, where all clusters read and write
+    the same giveaways; a SQLite file under a cluster's own data root would
+    give each cluster a lease of its own. Every change is a WATCH/MULTI/EXEC
+    check-and-set on the lease's hash, with the same semantics as
+    SQLiteLeaseStore.
+    """
+
+    def __init__(self, client, prefix=''):
+        """Initialize the store
+
+        Args:
+            client (RedisClient): The shared client
+            prefix (str): Prepended to the lease keys
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, name):
+        return f"{self.prefix}lease:{name}"
+
+    def fence_keys(self, name):
+        """Keys a transaction using fence_commands must watch"""
+        return [self._key(name), f"{self.prefix}fence:{name}"]
+
+    @staticmethod
+    def _read(read, key):
+        reply = read('HGETALL', key)
+        lease = dict(zip(reply[::2], reply[1::2]))
+        if not lease:
+            return None
+        return {
+            'holder': lease['holder'],
+            'token': int(lease['token']),
+            'expires_at': float(lease['expires_at']),
+            'released_at': float(lease['released_at']) if lease['released_at'] else None
+        }
+
+    @staticmethod
+    def _held(lease, holder, token, now):
+        return (
+            lease is not None and lease['holder'] == holder and lease['token'] == token
+            and lease['released_at'] is None and lease['expires_at'] > now
+        )
+
+    def try_acquire(self, name, holder, ttl, now=None):
+        """Take a lease if it is free, expired or released (see SQLiteLeaseStore.try_acquire)"""
+        now = now or time.time()
+        key = self._key(name)
+        result = {}
+
+        def build(read):
+            lease = self._read(read, key)
+            if lease is None:
+                token, handover = 1, None
+            elif lease['released_at'] is None and lease['expires_at'] > now:
+                return None
+            else:
+                token = lease['token'] + 1
+                handover = max(now - (lease['released_at'] or lease['expires_at']), 0.0)
+
+            result.update(token=token, handover_seconds=handover)
+            return [('HSET', key, 'holder', holder, 'token', token, 'expires_at', now + ttl, 'released_at', '')]
+
+        if self.client.transaction([key], build) is None:
+            return None
+        return result
+
+    def renew(self, name, holder, token, ttl, now=None):
+        """Extend a held lease
+
+        Returns:
+            bool: False if the lease expired or was taken over
+        """
+        now = now or time.time()
+        key = self._key(name)
+
+        def build(read):
+            if not self._held(self._read(read, key), holder, token, now):
+                return None
+            return [('HSET', key, 'expires_at', now + ttl)]
+
+        return self.client.transaction([key], build) is not None
+
+    def release(self, name, holder, token, now=None):
+        """Give a lease up early so another process can take it immediately"""
+        now = now or time.time()
+        key = self._key(name)
+
+        def build(read):
+            lease = self._read(read, key)
+            if lease is None or lease['holder'] != holder or lease['token'] != token:
+                return None
+            return [('HSET', key, 'expires_at', now, 'released_at', now)]
+
+        self.client.transaction([key], build)
+
+    def is_valid(self, name, holder, token, now=None):
+        """Check a fencing token still belongs to the current, unexpired lease"""
+        now = now or time.time()
+        return self._held(self._read(self.client.execute, self._key(name)), holder, token, now)
+
+    def fence_commands(self, read, name, token, resource, now=None):
+        """Check a token may still write a resource, inside a transaction (see SQLiteLeaseStore.fence)
+
+        Args:
+            read (callable): The transaction's read function; fence_keys(name) must be watched
+
+        Returns:
+            list: Commands recording the write, to queue with it, or None if it is refused
+        """
+        now = now or time.time()
+        lease_key, fence_key = self.fence_keys(name)
+        lease = self._read(read, lease_key)
+        if lease is None or lease['token'] != token or lease['released_at'] is not None or lease['expires_at'] <= now:
+            return None
+        if token < int(read('HGET', fence_key, resource) or 0):
+            return None
+        return [('HSET', fence_key, resource, token)]
+
+
+class LeaderElector:
+    """Holds a lease so background loops run on exactly one process
+
+    Processes sharing a lease store compete for the lease; the holder keeps
+    renewing it, and if it stops (crash, hang, shutdown) another process
+    takes over once it expires or is released. Registered tasks.Loop objects
+    only run while this process is the leader.
+    """
+
+    def __init__(self, store, name, ttl=15.0, renew_interval=5.0, holder=None):
+        """Initialize the elector
+
+        Args:
+            store: The lease store (e.g. SQLiteLeaseStore)
+            name (str): The lease to compete for
+            ttl (float): Seconds a lease lasts without renewal; bounds failover time
+            renew_interval (float): Seconds between renewals and takeover attempts
+            holder (str): ID for this process (defaults to hostname:pid)
+        """
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}"
+
+        self.token = None
+        self.lease_expires = 0.0
+        self.loops = []
+        self.task = None
+        self.metrics = {
+            'elections_won': 0,
+            'leases_lost': 0,
+            'renewals': 0,
+            'renewal_failures': 0,
+            'last_handover_seconds': None,
+            'leader_since': None
+        }
+
+    @property
+    def is_leader(self):
+        return self.token is not None
+
+    def register(self, loop):
+        """Run a tasks.Loop only while this process holds the lease"""
+        self.loops.append(loop)
+        if self.is_leader and not loop.is_running():
+            loop.start()
+
+    def unregister(self, loop):
+        """Stop managing a loop and cancel it"""
+        if loop in self.loops:
+            self.loops.remove(loop)
+        loop.cancel()
+
+    def start(self):
+        """Start competing for the lease"""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop competing, and release the lease so the next leader needn't wait for it to expire"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+        if self.is_leader:
+            token = self.token
+            self._lose("shutting down", expected=True)
+            try:
+                await asyncio.to_thread(self.store.release, self.name, self.holder, token)
+            except Exception as e:
+                logger.error(f"Error releasing lease {self.name}: {e}")
+
+    async def validate(self):
+        """Check with the store that this process still holds the lease
+
+        Call before side effects that must not happen twice; a process that
+        stalled past its lease expiry will fail this even before its next
+        renewal notices.
+
+        Returns:
+            bool: True if the fencing token is still current
+        """
+        return await self.current_token() is not None
+
+    async def current_token(self):
+        """Get the fencing token, checking with the store that it is still current
+
+        Returns:
+            int: The token, or None if this process doesn't hold the lease
+        """
+        token = self.token
+        if token is None:
+            return None
+
+        try:
+            valid = await asyncio.to_thread(self.store.is_valid, self.name, self.holder, token)
+        except Exception as e:
+            logger.error(f"Error validating lease {self.name}: {e}")
+            return None
+        return token if valid else None
+
+    async def _run(self):
+        while True:
+            try:
+                await self._tick()
+            except Exception as e:
+                logger.error(f"Error maintaining lease {self.name}: {e}")
+                # Can't reach the store, so assume someone else takes over once it expires
+                if self.is_leader and time.time() >= self.lease_expires:
+                    self._lose("lease expired while the store was unreachable")
+
+            await asyncio.sleep(self.renew_interval)
+
+    async def _tick(self):
+        """Renew the lease if held, otherwise try to take it"""
+        if self.is_leader:
+            renewed = await asyncio.to_thread(self.store.renew, self.name, self.holder, self.token, self.ttl)
+            if renewed:
+                self.metrics['renewals'] += 1
+                self.lease_expires = time.time() + self.ttl
+                return
+
+            self.metrics['renewal_failures'] += 1
+            self._lose("renewal rejected")
+
+        lease = await asyncio.to_thread(self.store.try_acquire, self.name, self.holder, self.ttl)
+        if lease:
+            await self._win(lease)
+
+    async def _win(self, lease):
+        self.token = lease['token']
+        self.lease_expires = time.time() + self.ttl
+        self.metrics['elections_won'] += 1
+        self.metrics['leader_since'] = time.time()
+        if lease['handover_seconds'] is not None:
+            self.metrics['last_handover_seconds'] = lease['handover_seconds']
+
+        handover = f", {lease['handover_seconds']:.1f}s after the previous leader" if lease['handover_seconds'] is not None else ""
+        logger.info(f"Became leader for {self.name} with token {self.token}{handover}")
+
+        # Loops cancelled when the lease was last lost may still be finishing;
+        # start() refuses a loop until its previous task is done
+        stopping = [loop.get_task() for loop in self.loops if loop.is_running()]
+        for task in stopping:
+            task.cancel()
+        await asyncio.gather(*stopping, return_exceptions=True)
+
+        for loop in self.loops:
+            if not loop.is_running():
+                loop.start()
+
+    def _lose(self, reason, expected=False):
+        if expected:
+            logger.info(f"Stepping down as leader for {self.name} (token {self.token}): {reason}")
+        else:
+            logger.warning(f"Lost leadership of {self.name} (token {self.token}): {reason}")
+            self.metrics['leases_lost'] += 1
+        self.token = None
+        self.metrics['leader_since'] = None
+
+        for loop in self.loops:
+            loop.cancel()
+
+
+def start_singleton_loop(bot, loop):
+    """Start a tasks.Loop that must only run in one process
+
+    Runs it directly if the bot isn't doing leader election.
+    """
+    elector = getattr(bot, 'leader', None)
+    if elector is None:
+        loop.start()
+    else:
+        elector.register(loop)
+
+
+def cancel_singleton_loop(bot, loop):
+    """Cancel a loop started with start_singleton_loop"""
+    elector = getattr(bot, 'leader', None)
+    if elector is None:
+        loop.cancel()
+    else:
+        elector.unregister(loop)
+
+
+async def lease_token(bot):
+    """Check this process holds the singleton lease, and get the token to fence writes with
+
+    Pass the token to the storage write that commits a singleton side
+    effect, which then refuses it once a newer leader has written; the
+    lease can move between this check and that write.
+
+    Returns:
+        tuple: (held, token); token is None if the bot isn't doing leader election
+    """
+    elector = getattr(bot, 'leader', None)
+    if elector is None:
+        return True, None
+    token = await elector.current_token()
+    return token is not None, token
@@ -0,0 +1,147 @@
+"""Gateway event streams for load tests
+
+Scenarios build events against a FakeDiscord's guilds:
+
+- messages: a message flood, chatter from random members of every guild,
+  some of it prefix commands
+- joins: a join raid, accounts (many of them new) joining one guild
+- reactions: a reaction storm, members of one guild piling onto a message
+- mixed: all three interleaved, closer to ordinary traffic
+
+A stream is a list of (event, data, at) records, where `at` is seconds from
+the start of the stream or None to send at the load test's rate. Streams
+save to and load from JSONL, one {"t", "d", "at"} object per line, so a
+synthetic stream can be replayed exactly, and so can a recorded one: a
+recording may start with GUILD_CREATE records, which become the fake's
+guilds.
+"""
+import datetime
+import json
+import math
+
+from config import CONFIG
+
+DEFAULT_COMMANDS = ('ping', 'level', 'userinfo', 'serverinfo')
+_WORDS = ('hello', 'anyone', 'here', 'gg', 'lol', 'what', 'is', 'the', 'best', 'way', 'to', 'level', 'up', 'nice')
+
+
+def _members(guild):
+    """IDs of a guild's human members"""
+    return [member['user']['id'] for member in guild['members'] if not member['user'].get('bot')]
+
+
+def message_flood(fake, events, rng, command_ratio=0.02, commands=DEFAULT_COMMANDS):
+    """Messages from random members of every guild
+
+    Args:
+        fake (FakeDiscord): Fake whose guilds the messages go to
+        events (int): Messages to build
+        rng (random.Random): Randomness, seeded for repeatable streams
+        command_ratio (float): Share of messages that are commands
+        commands (tuple): Commands to pick from
+    """
+    members = {guild['id']: _members(guild) for guild in fake.guilds}
+    stream = []
+    for _ in range(events):
+        guild = rng.choice(fake.guilds)
+        if rng.random() < command_ratio:
+            content = f"{CONFIG['prefix']}{rng.choice(commands)}"
+        else:
+            content = ' '.join(rng.choices(_WORDS, k=rng.randint(1, 12)))
+        stream.append((*fake.message_create(guild, rng.choice(members[guild['id']]), content), None))
+    return stream
+
+
+def join_raid(fake, events, rng, new_account_ratio=0.8):
+    """Accounts joining one guild, most of them days old
+
+    Args:
+        fake (FakeDiscord): Fake whose first guild is raided
+        events (int): Joins to build
+        rng (random.Random): Randomness, seeded for repeatable streams
+        new_account_ratio (float): Share of accounts created in the last week
+    """
+    guild = fake.guilds[0]
+    stream = []
+    for _ in range(events):
+        days = rng.uniform(0, 7) if rng.random() < new_account_ratio else rng.uniform(30, 2000)
+        stream.append((*fake.member_join(guild, datetime.timedelta(days=days)), None))
+    return stream
+
+
+def reaction_storm(fake, events, rng, emojis=('👍', '🎉', '🔥')):
+    """Members of one guild reacting to a single message
+
+    Args:
+        fake (FakeDiscord): Fake whose first guild's message is reacted to
+        events (int): Reactions to build
+        rng (random.Random): Randomness, seeded for repeatable streams
+        emojis (tuple): Emojis to react with
+    """
+    guild = fake.guilds[0]
+    members = _members(guild)
+    message_id = fake.snowflake()
+    return [
+        (*fake.reaction_add(guild, rng.choice(members), message_id, rng.choice(emojis)), None)
+        for _ in range(events)
+    ]
+
+
+def mixed(fake, events, rng):
+    """Mostly messages, with some joins and reactions mixed in"""
+    stream = (
+        message_flood(fake, math.ceil(events * 0.85), rng)
+        + join_raid(fake, math.ceil(events * 0.05), rng, new_account_ratio=0.1)
+        + reaction_storm(fake, math.ceil(events * 0.10), rng)
+    )
+    rng.shuffle(stream)
+    return stream[:events]
+
+
+SCENARIOS = {
+    'messages': message_flood,
+    'joins': join_raid,
+    'reactions': reaction_storm,
+    'mixed': mixed,
+}
+
+
+def save_stream(path, stream, guilds=None):
+    """Write a stream as JSONL
+
+    Args:
+        path (str): File to write
+        stream (list): (event, data, at) records
+        guilds (list): GUILD_CREATE payloads to write first, so the stream replays against the same guilds
+    """
+    with open(path, 'w') as f:
+        for guild in guilds or ():
+            f.write(json.dumps({'t': 'GUILD_CREATE', 'd': guild, 'at': None}) + '\n')
+        for event, data, at in stream:
+            f.write(json.dumps({'t': event, 'd': data, 'at': at}) + '\n')
+
+
+def load_stream(path):
+    """Read a JSONL stream
+
+    Returns:
+        tuple: (GUILD_CREATE payloads from the start of the file, the remaining (event, data, at) records)
+    """
+    guilds, stream = [], []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record['t'] == 'GUILD_CREATE' and not stream:
+                guilds.append(record['d'])
+            else:
+                stream.append((record['t'], record['d'], record.get('at')))
+    return guilds, stream
+
+
+def percentile(values, fraction):
+    """Get a percentile of sorted values by the nearest-rank method"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
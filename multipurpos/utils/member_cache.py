@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import resource
+import time
+
+from utils.metrics import observe_cache
+
+logger = logging.getLogger('discord_bot')
+
+# Rough in-memory size of one cached object, for memstats estimates
+MEMBER_BYTES = 1200
+MESSAGE_BYTES = 2500
+
+_chunk_locks = {}  # Guild ID -> asyncio.Lock
+
+
+async def ensure_chunked(bot, guild):
+    """Request a guild's full member list the first time something needs it
+
+    With chunk_guilds_at_startup off (memory budget mode), guilds start with
+    only the members seen in events. Commands that need the whole member list
+    call this first; guilds that never use them never get chunked.
+
+    Args:
+        bot: The bot the guild belongs to
+        guild: The discord.Guild to chunk
+
+    Returns:
+        bool: True if the guild's members are fully cached
+    """
+    observe_cache('member_chunks', guild.chunked)
+    if guild.chunked:
+        return True
+
+    if not bot.intents.members:
+        return False
+
+    lock = _chunk_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
+        # Another command may have chunked it while we waited
+        if guild.chunked:
+            return True
+
+        start = time.perf_counter()
+        try:
+            await guild.chunk(cache=True)
+        except Exception as e:
+            logger.error(f"Error chunking guild {guild.id}: {e}")
+            return False
+
+        logger.info(
+            f"Chunked guild {guild.id} on demand: {len(guild.members)} members "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+        return True
+
+
+def get_rss_bytes():
+    """Get the process's current resident set size
+
+    Returns:
+        int: RSS in bytes (peak RSS where the current value isn't available)
+    """
+    try:
+        with open(f'/proc/{os.getpid()}/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_stats(bot):
+    """Collect per-guild cache sizes
+
+    Args:
+        bot: The bot to report on
+
+    Returns:
+        dict: 'guilds' (per-guild dicts sorted by estimated size), plus
+            totals for members, messages, estimated bytes and rss
+    """
+    messages_per_guild = {}
+    for message in bot.cached_messages:
+        if message.guild:
+            messages_per_guild[message.guild.id] = messages_per_guild.get(message.guild.id, 0) + 1
+
+    guilds = []
+    for guild in bot.guilds:
+        cached_members = len(guild.members)
+        cached_messages = messages_per_guild.get(guild.id, 0)
+        guilds.append({
+            'id': guild.id,
+            'name': guild.name,
+            'member_count': guild.member_count or 0,
+            'cached_members': cached_members,
+            'chunked': guild.chunked,
+            'cached_messages': cached_messages,
+            'estimated_bytes': cached_members * MEMBER_BYTES + cached_messages * MESSAGE_BYTES
+        })
+
+    guilds.sort(key=lambda entry: entry['estimated_bytes'], reverse=True)
+
+    return {
+        'guilds': guilds,
+        'cached_members': sum(entry['cached_members'] for entry in guilds),
+        'cached_messages': sum(entry['cached_messages'] for entry in guilds),
+        'estimated_bytes': sum(entry['estimated_bytes'] for entry in guilds),
+        'rss': get_rss_bytes()
+    }
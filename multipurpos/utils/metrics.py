@@ -0,0 +1,406 @@
+"""Prometheus-style metrics for the bot and the dashboard
+
+A small registry rendered in the Prometheus text format, so any scraper
+(Prometheus, VictoriaMetrics, the Datadog agent, ...) can read it without a
+client library. The bot serves its registry on a local port (see
+MetricsServer); the dashboard serves its own at /metrics to scrapers on
+the same host, or with a token (see init_metrics_endpoint).
+
+Names are stable and label values come from bounded sets: event types,
+cog names, route templates, status codes. Never label by user, channel or
+guild id. As a backstop, each metric holds at most max_series label
+combinations; further ones are counted under the value "other".
+"""
+import bisect
+import hmac
+import logging
+import math
+import os
+import threading
+import time
+
+from aiohttp import web
+
+logger = logging.getLogger('discord_bot')
+
+OVERFLOW_LABEL = 'other'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# The dashboard serves /metrics to these, and to requests with this token (see scrape_allowed)
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+METRICS_TOKEN_ENV = 'METRICS_TOKEN'
+
+# Seconds; suits both listeners (mostly sub-millisecond) and REST calls (tens to hundreds of ms)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if value != value:
+        return 'NaN'  # Python's 'nan' isn't valid in the text format
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """A named family of series, one per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), max_series=100):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self.series = {}  # Label values -> child
+        self.lock = threading.Lock()
+        self.overflowed = False
+
+    def labels(self, *values):
+        """Get the series for a combination of label values
+
+        Args:
+            *values: One value per label name, in order
+
+        Returns:
+            The series (call inc/set/observe on it)
+        """
+        child = self.series.get(values)
+        if child is not None:
+            return child
+
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+
+        with self.lock:
+            if values not in self.series and len(self.series) >= self.max_series:
+                if not self.overflowed:
+                    self.overflowed = True
+                    logger.warning(f"Metric {self.name} reached {self.max_series} series; "
+                                   f"counting new label values as '{OVERFLOW_LABEL}'")
+                values = (OVERFLOW_LABEL,) * len(self.labelnames)
+            child = self.series.get(values)
+            if child is None:
+                child = self.series[values] = self._child()
+            return child
+
+    def remove(self, *values):
+        """Drop a series, e.g. a callback gauge owned by an unloading cog"""
+        with self.lock:
+            self.series.pop(values, None)
+
+    def _child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value) for every series"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+# Updates are unlocked: they run on the bot's event loop, and on the dashboard
+# an occasional lost increment between threads is cheaper than a lock per call
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """A value that only goes up; rate() it for per-second figures"""
+
+    kind = 'counter'
+
+    def _child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increment the unlabelled series"""
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self.series.items()):
+            yield '', values, (), child.value
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from a callable at scrape time; it must be cheap and must not block"""
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception as e:
+            logger.debug(f"Gauge callback failed: {e}")
+            return math.nan
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, set directly or read from a callback"""
+
+    kind = 'gauge'
+
+    def _child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        """Set the unlabelled series"""
+        self.labels().set(value)
+
+    def samples(self):
+        for values, child in list(self.series.items()):
+            yield '', values, (), child.get()
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, for latency percentiles"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), max_series=100, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Observe into the unlabelled series"""
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(child.counts)):
+                cumulative += count
+                yield '_bucket', values, (('le', _format_value(float(bound))),), cumulative
+            yield '_sum', values, (), child.sum
+            yield '_count', values, (), child.count
+
+
+class Registry:
+    """The metrics of one process"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        # Modules and cogs may be reloaded; they get the existing metric back
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+                if not metric.labelnames:
+                    metric.labels()  # Export unlabelled metrics at zero before their first update
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=(), max_series=100):
+        return self._get_or_create(Counter, name, documentation, labelnames, max_series)
+
+    def gauge(self, name, documentation, labelnames=(), max_series=100):
+        return self._get_or_create(Gauge, name, documentation, labelnames, max_series)
+
+    def histogram(self, name, documentation, labelnames=(), max_series=100, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, max_series, buckets)
+
+    def render(self):
+        """Render every metric in the Prometheus text format
+
+        Returns:
+            str: The exposition
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+# Bot process
+GATEWAY_EVENTS = REGISTRY.counter(
+    'bot_gateway_events_total', 'Gateway dispatch events received, by type', ['event'], max_series=200)
+LISTENER_SECONDS = REGISTRY.histogram(
+    'bot_listener_duration_seconds', 'Time to run an event listener, by cog and event', ['cog', 'event'], max_series=300)
+STORAGE_FLUSH_SECONDS = REGISTRY.histogram(
+    'bot_storage_flush_duration_seconds', 'Time to write a store to its backend', ['store'])
+STORAGE_FLUSH_BYTES = REGISTRY.counter(
+    'bot_storage_flush_bytes_total', 'Bytes written by store flushes', ['store'])
+STORAGE_FLUSH_ROWS = REGISTRY.counter(
+    'bot_storage_flush_rows_total', 'Rows written by batched store flushes', ['store'])
+STORAGE_FLUSH_ERRORS = REGISTRY.counter(
+    'bot_storage_flush_errors_total', 'Store flushes that failed', ['store'])
+QUEUE_DEPTH = REGISTRY.gauge(
+    'bot_queue_depth', 'Items waiting in an internal queue or timer set', ['queue'])
+CACHE_REQUESTS = REGISTRY.counter(
+    'bot_cache_requests_total', 'Cache lookups, by cache and hit or miss', ['cache', 'result'])
+REST_REQUESTS = REGISTRY.counter(
+    'bot_rest_requests_total', 'HTTP requests to the Discord API, by route template and status',
+    ['route', 'status'], max_series=1000)
+REST_SECONDS = REGISTRY.histogram(
+    'bot_rest_request_duration_seconds', 'Discord API request time, by route template', ['route'], max_series=300)
+REST_WAIT_SECONDS = REGISTRY.histogram(
+    'bot_rest_ratelimit_wait_seconds', 'Time Discord API requests waited on rate limits, by route template',
+    ['route'], max_series=300)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'bot_event_loop_lag_seconds', 'How late a timer scheduled on the event loop fired',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+LOOP_BLOCKS = REGISTRY.counter(
+    'bot_event_loop_blocks_total', 'Times the event loop was blocked past the watchdog threshold')
+GUILDS = REGISTRY.gauge('bot_guilds', 'Guilds this process serves')
+GATEWAY_LATENCY = REGISTRY.gauge('bot_gateway_latency_seconds', 'Gateway heartbeat latency')
+
+
+def observe_cache(cache, hit):
+    """Count a cache lookup"""
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def time_flush(store):
+    """Time a store flush: `with time_flush('database'): ...`"""
+    return _Timer(STORAGE_FLUSH_SECONDS.labels(store))
+
+
+class MetricsServer:
+    """Serves a registry at /metrics on a local port"""
+
+    def __init__(self, host='127.0.0.1', port=9108, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.runner = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(body=self.registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self):
+        """Start serving"""
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        """Stop serving"""
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def scrape_allowed(remote_addr, headers, token=None):
+    """Decide whether a request to the dashboard's /metrics may be answered
+
+    The dashboard is public, so only scrapers on this host get the metrics:
+    requests from a loopback address that didn't come through the reverse
+    proxy (which adds X-Forwarded-For). With a token set, requests carrying
+    `Authorization: Bearer <token>` are answered from anywhere.
+
+    Args:
+        remote_addr (str): The connecting address
+        headers: The request headers
+        token (str): Bearer token for remote scrapers (None allows local ones only)
+
+    Returns:
+        bool: Whether to serve the metrics
+    """
+    if token:
+        scheme, _, credentials = headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+            return True
+    return remote_addr in LOCAL_ADDRESSES and 'X-Forwarded-For' not in headers
+
+
+def init_metrics_endpoint(app, registry=REGISTRY, token=None):
+    """Serve a registry from a Flask app at /metrics, to local scrapers (see scrape_allowed)
+
+    Under gunicorn each worker has its own registry, and a scrape reaches
+    whichever worker accepts it; sum across scrapes, not within one.
+
+    Args:
+        app (Flask): The dashboard app
+        registry (Registry): Metrics to serve (this process's, by default)
+        token (str): Bearer token for remote scrapers (defaults to METRICS_TOKEN)
+    """
+    from flask import Response, abort, request
+
+    token = token or os.getenv(METRICS_TOKEN_ENV)
+
+    @app.route('/metrics')
+    def metrics():
+        if not scrape_allowed(request.remote_addr, request.headers, token):
+            abort(404)
+        return Response(registry.render(), headers={'Content-Type': CONTENT_TYPE})
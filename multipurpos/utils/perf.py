@@ -0,0 +1,290 @@
+"""Per-handler timing for listeners and commands
+
+Every event listener and prefix command runs through HandlerProfiler,
+which splits its wall time into:
+
+- cpu: time the handler's own code ran on the event loop (measured per
+  coroutine step, so time other tasks ran in between is excluded)
+- rest: time spent awaiting Discord API requests, rate-limit waits included
+- other: everything else awaited (database threads, locks, sleeps, the gateway)
+
+Handlers slower than the threshold are logged with their event and guild,
+and `.perf` shows the top offenders. A listener's figures include any
+command it invokes, so Bot.on_message covers every prefix command.
+"""
+import contextvars
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger('discord_bot')
+
+SORT_FIELDS = ('cpu', 'wall', 'rest', 'max', 'calls', 'errors', 'slow')
+
+# Timing of the handler the current task is running, for its REST time
+_current_timing = contextvars.ContextVar('handler_timing', default=None)
+
+# Name of the handler the current task is running, set with or without profiling
+_current_handler = contextvars.ContextVar('handler', default=None)
+
+
+class _Timing:
+    __slots__ = ('cog', 'name', 'cpu', 'rest')
+
+    def __init__(self, cog, name):
+        self.cog = cog
+        self.name = name
+        self.cpu = 0.0
+        self.rest = 0.0
+
+
+def current_handler():
+    """Name the listener or command the current task is running, e.g. 'Giveaway.gstart'
+
+    Returns:
+        str: The handler, or None outside one
+    """
+    return _current_handler.get()
+
+
+class _HandlerScope:
+    __slots__ = ('name', 'token')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.token = _current_handler.set(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_handler.reset(self.token)
+
+
+def handler_scope(cog, name):
+    """Name the handler the current task runs for current_handler(): `with handler_scope(cog, name): ...`
+
+    Cheap enough for every event, so the bot sets it whether or not the profiler is on.
+    """
+    return _HandlerScope(f"{cog}.{name}")
+
+
+class _StepTimer:
+    """Await a coroutine, adding the time each of its steps runs to a timing"""
+
+    __slots__ = ('coro', 'timing')
+
+    def __init__(self, coro, timing):
+        self.coro = coro
+        self.timing = timing
+
+    def __await__(self):
+        coro, timing = self.coro, self.timing
+        value, error = None, None
+        while True:
+            start = time.perf_counter()
+            try:
+                yielded = coro.send(value) if error is None else coro.throw(error)
+            except StopIteration as stop:
+                timing.cpu += time.perf_counter() - start
+                return stop.value
+            except BaseException:
+                timing.cpu += time.perf_counter() - start
+                raise
+            timing.cpu += time.perf_counter() - start
+
+            # Hand the future to the task and pass back whatever it resumes us with
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class HandlerStats:
+    """Running totals for one listener or command"""
+
+    __slots__ = ('kind', 'cog', 'name', 'calls', 'wall', 'cpu', 'rest', 'max', 'errors', 'slow')
+
+    def __init__(self, kind, cog, name):
+        self.kind = kind
+        self.cog = cog
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rest = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.slow = 0
+
+    @property
+    def label(self):
+        return f"{self.cog}.{self.name}"
+
+
+def guild_id_of(args):
+    """Find the guild an event is about from its arguments, if any"""
+    for arg in args:
+        if isinstance(arg, discord.Guild):
+            return arg.id
+        guild_id = getattr(arg, 'guild_id', None)  # Raw event payloads
+        if guild_id is not None:
+            return guild_id
+        guild = getattr(arg, 'guild', None)
+        if guild is not None:
+            return guild.id
+    return None
+
+
+def handler_cog(func):
+    """Name the cog a listener belongs to ('bot' for the bot's own)"""
+    cog = getattr(func, '__self__', None)
+    return cog.qualified_name if isinstance(cog, commands.Cog) else 'bot'
+
+
+class HandlerProfiler:
+    """Times listeners and commands and keeps per-handler totals"""
+
+    def __init__(self, slow_threshold_ms=250, slow_log_interval=10):
+        """Initialize the profiler
+
+        Args:
+            slow_threshold_ms (float): Handlers taking longer than this are logged
+            slow_log_interval (float): Minimum seconds between slow logs for one handler
+        """
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.slow_log_interval = slow_log_interval
+        self.handlers = {}  # (kind, cog, name) -> HandlerStats
+        self.last_slow_log = {}  # (kind, cog, name) -> (logged at, slow calls not logged since)
+        self.since = time.time()
+        self.samples = None  # Set to a list to also keep every call's (kind, handler, wall), as load_test.py does
+
+    def instrument_http(self, bot):
+        """Attribute the bot's Discord API request time to the handler making it"""
+        request = bot.http.request
+
+        async def timed_request(route, **kwargs):
+            timing = _current_timing.get()
+            if timing is None:
+                return await request(route, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await request(route, **kwargs)
+            finally:
+                timing.rest += time.perf_counter() - start
+
+        bot.http.request = timed_request
+
+    async def run(self, coro, kind, cog, name, guild_id=None):
+        """Await a handler's coroutine and record its timing
+
+        Args:
+            coro: The handler's coroutine
+            kind (str): 'listener' or 'command'
+            cog (str): Cog name ('bot' for the bot's own handlers)
+            name (str): Event or command name
+            guild_id (int): Guild the event or command came from, for the slow log
+
+        Returns:
+            Whatever the coroutine returns
+        """
+        timing = _Timing(cog, name)
+        token = _current_timing.set(timing)
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await _StepTimer(coro, timing)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            _current_timing.reset(token)
+            self.record(kind, cog, name, wall, timing, failed, guild_id)
+
+    def record(self, kind, cog, name, wall, timing, failed=False, guild_id=None):
+        key = (kind, cog, name)
+        stats = self.handlers.get(key)
+        if stats is None:
+            stats = self.handlers[key] = HandlerStats(kind, cog, name)
+
+        stats.calls += 1
+        stats.wall += wall
+        stats.cpu += timing.cpu
+        stats.rest += timing.rest
+        stats.max = max(stats.max, wall)
+        if failed:
+            stats.errors += 1
+        if self.samples is not None:
+            self.samples.append((kind, f"{cog}.{name}", wall))
+
+        if wall >= self.slow_threshold:
+            stats.slow += 1
+            self._log_slow(key, wall, timing, guild_id)
+
+    def _log_slow(self, key, wall, timing, guild_id):
+        now = time.monotonic()
+        logged_at, skipped = self.last_slow_log.get(key, (0.0, 0))
+        if now - logged_at < self.slow_log_interval:
+            self.last_slow_log[key] = (logged_at, skipped + 1)
+            return
+        self.last_slow_log[key] = (now, 0)
+
+        kind, cog, name = key
+        fields = {
+            'kind': kind,
+            'handler': f"{cog}.{name}",
+            'guild_id': guild_id,
+            'wall_ms': round(wall * 1000, 1),
+            'cpu_ms': round(timing.cpu * 1000, 1),
+            'rest_ms': round(timing.rest * 1000, 1),
+            'other_ms': round(max(wall - timing.cpu - timing.rest, 0) * 1000, 1),
+            'suppressed': skipped,
+        }
+        logger.warning(
+            "Slow handler " + " ".join(f"{field}={value}" for field, value in fields.items()),
+            extra={'perf': fields}
+        )
+
+    def add_error(self, kind, cog, name):
+        """Count a failure the handler handled itself (e.g. a command error sent to the user)"""
+        stats = self.handlers.get((kind, cog, name))
+        if stats:
+            stats.errors += 1
+
+    def wrap_listener(self, coro, event_name, cog_name=None):
+        """Wrap a listener so calling it runs through the profiler
+
+        Args:
+            coro: The listener
+            event_name (str): Event it handles
+            cog_name (str): Its cog, if coro is already wrapped and handler_cog can't tell
+        """
+        cog_name = cog_name or handler_cog(coro)
+
+        async def profiled(*args, **kwargs):
+            return await self.run(coro(*args, **kwargs), 'listener', cog_name, event_name, guild_id_of(args))
+
+        return profiled
+
+    def top(self, sort='cpu', limit=10, kind=None):
+        """Get the handlers with the highest totals
+
+        Args:
+            sort (str): One of SORT_FIELDS
+            limit (int): How many to return
+            kind (str): Only 'listener' or 'command' handlers
+
+        Returns:
+            list: HandlerStats, highest first
+        """
+        handlers = [stats for stats in self.handlers.values() if kind is None or stats.kind == kind]
+        handlers.sort(key=lambda stats: getattr(stats, sort), reverse=True)
+        return handlers[:limit]
+
+    def reset(self):
+        self.handlers.clear()
+        self.last_slow_log.clear()
+        self.since = time.time()
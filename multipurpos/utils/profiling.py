@@ -0,0 +1,357 @@
+"""On-demand CPU and memory profiles of the running bot
+
+`.profile` and `.memprofile` use these to look inside a live process:
+
+- sample_stacks: a thread samples every thread's Python stack a hundred
+  times a second. Nothing runs on the event loop while it collects; the
+  cost is the sampling itself and a 1ms GIL switch interval (5ms normally)
+  for the window. The result is a collapsed-stack file (one
+  "frame;frame;frame count" line per stack), which flamegraph.pl,
+  speedscope and inferno all read, and a top-functions summary.
+- profile_calls: cProfile on the loop thread, for exact call counts. It
+  slows every call the loop makes, so keep the window short. It is also
+  the fallback where stacks can't be sampled (sys._current_frames is
+  CPython only). cProfile only records caller/callee pairs, so it gives
+  a pstats dump (for snakeviz or gprof2dot) instead of collapsed stacks.
+- memory_diff: two tracemalloc snapshots a window apart, diffed by line,
+  with the growth also written as collapsed stacks weighted by bytes.
+  Tracing slows every allocation during the window, and each snapshot
+  pauses the loop while it copies the traces.
+
+Only one profile runs at a time, because cProfile and tracemalloc are
+process-wide. Windows are capped by profiling.max_seconds.
+"""
+import asyncio
+import collections
+import cProfile
+import gzip
+import io
+import logging
+import marshal
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+import discord
+
+logger = logging.getLogger('discord_bot')
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LIB_DIRS = sorted({sysconfig.get_paths()[key] for key in ('purelib', 'platlib', 'stdlib')}, key=len, reverse=True)
+
+# Frames the loop thread sits in while it waits for I/O
+_IDLE_FILES = ('selectors.py',)
+
+# GIL switch interval while sampling stacks, in seconds
+SAMPLE_SWITCH_INTERVAL = 0.001
+
+_lock = asyncio.Lock()
+
+
+class ProfileBusy(Exception):
+    """Another profile is already running"""
+
+
+def busy():
+    """Whether a profile is running"""
+    return _lock.locked()
+
+
+def _short_path(filename):
+    """Shorten a path to be relative to the bot, site-packages or the stdlib"""
+    if filename.startswith(BOT_DIR + os.sep):
+        return os.path.relpath(filename, BOT_DIR)
+    for lib_dir in _LIB_DIRS:
+        if filename.startswith(lib_dir + os.sep):
+            return os.path.relpath(filename, lib_dir)
+    return filename
+
+
+def _label(code):
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _task_label(task):
+    """Name a task for a stack root; numbered default names would split every stack"""
+    if task is None:
+        return "no task"
+    name = task.get_name()
+    return "Task" if name.startswith("Task-") else name
+
+
+class StackProfile:
+    """Stack samples from sample_stacks"""
+
+    def __init__(self, stacks, seconds, interval, loop_thread):
+        self.stacks = stacks  # (thread name, task name or None, code objects outermost first) -> samples
+        self.seconds = seconds
+        self.interval = interval
+        self.loop_thread = loop_thread
+        self.samples = sum(stacks.values())
+
+    def collapsed(self):
+        """Render the samples as collapsed stacks, the input format of flame graph tools"""
+        lines = collections.Counter()
+        for (thread, task, codes), count in self.stacks.items():
+            roots = [thread] if task is None else [thread, task]
+            lines[';'.join(roots + [_label(code) for code in codes])] += count
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(lines.items())) + '\n'
+
+    def summary(self, limit=30):
+        """Summarize where the loop thread spent its samples
+
+        Args:
+            limit (int): Functions per list
+
+        Returns:
+            str: Per-thread sample counts and the loop thread's top functions by own and total samples
+        """
+        threads = collections.Counter()
+        own = collections.Counter()
+        total = collections.Counter()
+        tasks = collections.Counter()
+        loop_samples = idle = 0
+        for (thread, task, codes), count in self.stacks.items():
+            threads[thread] += count
+            if thread != self.loop_thread or not codes:
+                continue
+            loop_samples += count
+            if codes[-1].co_filename.endswith(_IDLE_FILES):
+                idle += count
+                continue
+            own[_label(codes[-1])] += count
+            for label in {_label(code) for code in codes}:
+                total[label] += count
+            tasks[task or "no task"] += count
+
+        busy_samples = loop_samples - idle
+        lines = [
+            f"{self.samples:,} samples over {self.seconds:.0f}s every {self.interval * 1000:.0f}ms",
+            "",
+            "Samples per thread:",
+        ]
+        lines += [f"  {count:>8,}  {thread}" for thread, count in threads.most_common()]
+        if loop_samples:
+            # Samples land on idle a little more often than they should: see sample_stacks
+            lines += ["", f"Event loop thread ({self.loop_thread}): busy in {busy_samples / loop_samples:.1%} of samples"]
+
+        def ranked(title, counter):
+            lines.extend(["", f"{title}:"])
+            for label, count in counter.most_common(limit):
+                lines.append(f"  {count:>8,} {count / busy_samples:>6.1%}  {label}")
+
+        if busy_samples:
+            ranked("Busy samples by task", tasks)
+            ranked("Top functions by own samples", own)
+            ranked("Top functions by total samples (including callees)", total)
+        return '\n'.join(lines) + '\n'
+
+
+def _sample(loop, loop_thread_id, seconds, interval, stacks, stop):
+    """Sample every other thread's stack until the window ends (runs on a worker thread)"""
+    me = threading.get_ident()
+    next_sample = time.monotonic()
+    deadline = next_sample + seconds
+    while next_sample < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            task = _task_label(asyncio.current_task(loop)) if thread_id == loop_thread_id else None
+            stacks[(names.get(thread_id, str(thread_id)), task, tuple(codes))] += 1
+
+        next_sample += interval
+        if stop.wait(max(next_sample - time.monotonic(), 0)):
+            return
+
+
+async def sample_stacks(seconds, interval=0.01):
+    """Sample every thread's stack for a window without running anything on the loop
+
+    Args:
+        seconds (float): How long to sample
+        interval (float): Seconds between samples
+
+    Returns:
+        StackProfile: The samples
+
+    Raises:
+        ProfileBusy: Another profile is running
+    """
+    if busy():
+        raise ProfileBusy()
+    async with _lock:
+        stacks = collections.Counter()
+        stop = threading.Event()
+        started = time.monotonic()
+        # The sampler waits up to the switch interval (5ms by default) for the GIL, so loop
+        # steps shorter than that would finish first and be missed. 1ms catches most of them;
+        # shorter would make every thread in the process hand the GIL over far more often
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, SAMPLE_SWITCH_INTERVAL))
+        try:
+            await asyncio.to_thread(
+                _sample, asyncio.get_running_loop(), threading.get_ident(), seconds, interval, stacks, stop
+            )
+        finally:
+            stop.set()  # If we were cancelled, the worker thread is still sampling
+            sys.setswitchinterval(switch_interval)
+        return StackProfile(stacks, time.monotonic() - started, interval, threading.current_thread().name)
+
+
+async def profile_calls(seconds):
+    """Run cProfile on the loop thread for a window
+
+    Args:
+        seconds (float): How long to profile
+
+    Returns:
+        cProfile.Profile: The disabled profile
+
+    Raises:
+        ProfileBusy: Another profile, or another profiler such as a debugger, is running
+    """
+    if busy() or sys.getprofile() is not None:
+        raise ProfileBusy()
+    async with _lock:
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        return profile
+
+
+def call_report(profile, limit=40):
+    """Render a cProfile profile
+
+    Args:
+        profile (cProfile.Profile): A finished profile
+        limit (int): Functions per list
+
+    Returns:
+        tuple: (summary text by cumulative and own time, pstats dump bytes)
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.strip_dirs()
+    for sort in ('cumulative', 'tottime'):
+        stream.write(f"Top {limit} by {sort}:\n")
+        stats.sort_stats(sort).print_stats(limit)
+
+    profile.create_stats()
+    return stream.getvalue(), marshal.dumps(profile.stats)
+
+
+class MemoryProfile:
+    """Two tracemalloc snapshots taken a window apart"""
+
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, before, after, seconds, traced, peak, started):
+        self.before = before.filter_traces(self.FILTERS)
+        self.after = after.filter_traces(self.FILTERS)
+        self.seconds = seconds
+        self.traced = traced
+        self.peak = peak
+        self.started = started
+
+    def summary(self, limit=30):
+        """Summarize what grew over the window, by line
+
+        Returns:
+            str: Traced totals and the lines whose allocations grew the most
+        """
+        diff = self.after.compare_to(self.before, 'lineno')
+        growth = sum(stat.size_diff for stat in diff)
+        lines = [
+            f"Memory growth over {self.seconds:.0f}s: {growth / 1048576:+.2f} MiB traced",
+            f"Traced now: {self.traced / 1048576:.1f} MiB, peak {self.peak / 1048576:.1f} MiB",
+        ]
+        if self.started:
+            lines.append("tracemalloc was started for this profile, so only allocations made during the window are counted")
+        lines += ["", f"Top {limit} lines by growth:"]
+        for stat in diff[:limit]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {stat.size_diff / 1024:>+10,.1f} KiB {stat.count_diff:>+9,} blocks  "
+                f"{_short_path(frame.filename)}:{frame.lineno}"
+            )
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        """Render the growth as collapsed stacks weighted by bytes"""
+        lines = []
+        for stat in self.after.compare_to(self.before, 'traceback'):
+            if stat.size_diff <= 0:
+                continue
+            stack = ';'.join(f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+            lines.append(f"{stack} {stat.size_diff}")
+        return '\n'.join(lines) + '\n'
+
+
+async def memory_diff(seconds, frames=15):
+    """Diff tracemalloc snapshots taken a window apart
+
+    tracemalloc is started for the window (and stopped after) unless it was
+    already tracing, e.g. with PYTHONTRACEMALLOC set.
+
+    Args:
+        seconds (float): Window between the snapshots
+        frames (int): Stack depth to record per allocation
+
+    Returns:
+        MemoryProfile: The snapshots
+
+    Raises:
+        ProfileBusy: Another profile is running
+    """
+    if busy():
+        raise ProfileBusy()
+    async with _lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(frames)
+        try:
+            # Taken on the loop: copying the traces holds the GIL, so a thread wouldn't free the loop
+            before = tracemalloc.take_snapshot()
+            await asyncio.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        return MemoryProfile(before, after, seconds, traced, peak, started)
+
+
+def attachment(filename, data, size_limit):
+    """Make an attachment, gzipped if it is too big to upload as is
+
+    Args:
+        filename (str): Attachment name
+        data (str | bytes): Contents
+        size_limit (int): Upload limit in bytes
+
+    Returns:
+        discord.File: The attachment
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    if len(data) > size_limit:
+        data, filename = gzip.compress(data), filename + '.gz'
+    return discord.File(io.BytesIO(data), filename=filename)
@@ -0,0 +1,257 @@
+import logging
+import socket
+import threading
+from urllib.parse import urlparse
+
+from utils.tracing import span
+
+logger = logging.getLogger('discord_bot')
+
+
+class RedisError(Exception):
+    """An error reply from the server"""
+
+
+def encode_command(args):
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, float):
+            data = repr(arg).encode()
+        else:
+            data = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+class RespReader:
+    """Reads RESP replies from a socket file"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self):
+        """Read one reply
+
+        Returns:
+            Strings are decoded to str; error replies are returned as
+            RedisError instances so a pipeline can report them per command.
+        """
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            return RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self.stream.read(length + 2)[:-2]
+            return data.decode()
+        if kind == b'*':
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self.read() for _ in range(length)]
+
+        raise ConnectionError(f"Unexpected reply type {kind!r}")
+
+
+class RedisClient:
+    """Minimal blocking client for Redis-protocol servers
+
+    Only what the storage adapters need: single commands and pipelines over
+    one connection, reconnecting if it drops. Safe to share between threads.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url):
+        """Create a client from a redis://[:password@]host[:port][/db] URL"""
+        parsed = urlparse(url)
+        return cls(
+            host=parsed.hostname or '127.0.0.1',
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip('/') or 0),
+            password=parsed.password
+        )
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = RespReader(self.sock.makefile('rb'))
+
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for reply in self._send(setup):
+            if isinstance(reply, RedisError):
+                raise reply
+
+    def _send(self, commands):
+        """Write commands in one batch and read their replies"""
+        self.sock.sendall(b''.join(encode_command(command) for command in commands))
+        return [self.reader.read() for _ in commands]
+
+    def close(self):
+        with self.lock:
+            if self.sock:
+                self.sock.close()
+            self.sock = None
+            self.reader = None
+
+    def execute_many(self, commands):
+        """Send several commands in one round trip
+
+        Args:
+            commands: Sequence of argument tuples, e.g. [('HSET', key, field, value)]
+
+        Returns:
+            list: One reply per command (RedisError instances for failed commands)
+        """
+        if not commands:
+            return []
+
+        with span(f"redis {commands[0][0]}", commands=len(commands)), self.lock:
+            for attempt in (1, 2):
+                try:
+                    if self.sock is None:
+                        self._connect()
+                    return self._send(commands)
+                except (OSError, ConnectionError) as e:
+                    # The connection is unusable now; reconnect once, then give up
+                    if self.sock:
+                        self.sock.close()
+                    self.sock = None
+                    if attempt == 2:
+                        raise
+                    logger.warning(f"Redis connection lost ({e}), reconnecting")
+
+    def execute(self, *args):
+        """Run one command
+
+        Returns:
+            The reply
+
+        Raises:
+            RedisError: If the server returned an error
+        """
+        reply = self.execute_many([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def pipeline(self):
+        """Start a batch of commands sent in one round trip"""
+        return Pipeline(self)
+
+    def transaction(self, keys, build, retries=10):
+        """Run a check-and-set as an optimistic WATCH/MULTI/EXEC transaction
+
+        The connection is held for the whole transaction, and it is retried
+        from the start if another client modifies a watched key before EXEC.
+
+        Args:
+            keys: Keys the check depends on
+            build (callable): Called with a read(*args) function that runs a
+                command immediately; returns the commands to run atomically,
+                or None to write nothing
+            retries (int): Attempts before giving up on a contended key
+
+        Returns:
+            list: One reply per command, or None if build returned None
+
+        Raises:
+            RedisError: If the server returned an error, or the keys stayed contended
+        """
+        def read(*args):
+            reply = self._send([args])[0]
+            if isinstance(reply, RedisError):
+                raise reply
+            return reply
+
+        with span("redis transaction", keys=len(keys)), self.lock:
+            try:
+                if self.sock is None:
+                    self._connect()
+
+                for _ in range(retries):
+                    read('WATCH', *keys)
+                    try:
+                        commands = build(read)
+                    except Exception:
+                        read('UNWATCH')
+                        raise
+                    if commands is None:
+                        read('UNWATCH')
+                        return None
+
+                    # Replies: OK for MULTI, QUEUED per command, then EXEC's
+                    replies = self._send([('MULTI',), *commands, ('EXEC',)])
+                    for reply in replies:
+                        if isinstance(reply, RedisError):
+                            raise reply
+                    if replies[-1] is not None:
+                        return replies[-1]
+            except (OSError, ConnectionError):
+                # Whether EXEC ran is unknown, so don't retry; reconnect on the next command
+                if self.sock:
+                    self.sock.close()
+                self.sock = None
+                raise
+
+        raise RedisError(f"Transaction on {', '.join(map(str, keys))} kept conflicting")
+
+
+class Pipeline:
+    """Queued commands sent together by execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        # pipeline.hset(key, field, value) queues ('HSET', key, field, value);
+        # del_ stands in for DEL, a Python keyword
+        def queue(*args):
+            self.commands.append((name.rstrip('_').upper(), *args))
+            return self
+        return queue
+
+    def execute(self):
+        """Send the queued commands
+
+        Returns:
+            list: One reply per command
+
+        Raises:
+            RedisError: If any command failed
+        """
+        commands, self.commands = self.commands, []
+        replies = self.client.execute_many(commands)
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
@@ -0,0 +1,509 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+from config import CONFIG
+from utils.leader import SINGLETON_LEASE, RedisLeaseStore
+from utils.redis_client import RedisClient
+
+logger = logging.getLogger('discord_bot')
+
+# Daily message leaderboards are only read for today
+DAILY_BOARD_TTL = 2 * 24 * 3600
+
+_client = None
+
+
+def get_redis_client():
+    """Get the shared client for the configured server (REDIS_URL overrides the config)"""
+    global _client
+    if _client is None:
+        url = os.getenv('REDIS_URL') or CONFIG['storage']['redis_url']
+        _client = RedisClient.from_url(url)
+        logger.info(f"Using Redis storage at {_client.host}:{_client.port}/{_client.db}")
+    return _client
+
+
+def _hash_to_dict(reply):
+    """Convert an HGETALL reply to a dict"""
+    return dict(zip(reply[::2], reply[1::2]))
+
+
+class RedisDatabase:
+    """JsonDatabase's API on a Redis-protocol server
+
+    Several bot processes and the dashboard can share one server instead of
+    each rewriting a JSON file. Records map onto native types so updates are
+    single atomic commands rather than read-modify-write cycles:
+
+    - hashes for per-user records (levels, invite and message counters)
+    - sorted sets for the level, invite and message leaderboards
+    - sets for giveaway participants and the guild indexes
+
+    Writes that touch several keys go out as one pipeline.
+    """
+
+    def __init__(self, client, prefix='bot:'):
+        """Initialize the database
+
+        Args:
+            client (RedisClient): Connection to the server
+            prefix (str): Prefix for every key, so several bots can share a server
+        """
+        self.client = client
+        self.prefix = prefix
+        # The lease store create_lease_store() makes for this server, to check fencing tokens against
+        self.leases = RedisLeaseStore(client, prefix)
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(str(part) for part in parts)
+
+    def copy_guild(self, guild_id):
+        """Get a database to read a guild's leaderboards from off the event loop
+
+        Every read goes to the server, so unlike JsonDatabase.copy_guild
+        there is nothing to copy.
+        """
+        return self
+
+    # Autorole methods
+    def set_autorole(self, guild_id, role_id):
+        """Set an autorole for a guild"""
+        self.client.execute('HSET', self._key('autoroles'), guild_id, json.dumps(role_id))
+        return True
+
+    def get_autorole(self, guild_id):
+        """Get the autorole for a guild"""
+        value = self.client.execute('HGET', self._key('autoroles'), guild_id)
+        return json.loads(value) if value is not None else None
+
+    def remove_autorole(self, guild_id):
+        """Remove the autorole for a guild"""
+        return self.client.execute('HDEL', self._key('autoroles'), guild_id) == 1
+
+    # Levels methods
+    def get_user_level(self, guild_id, user_id):
+        """Get a user's level and XP"""
+        record = _hash_to_dict(self.client.execute('HGETALL', self._key('level', guild_id, user_id)))
+        return {'level': int(record.get('level', 0)), 'xp': int(record.get('xp', 0))}
+
+    def add_user_xp(self, guild_id, user_id, xp_to_add=1):
+        """Add XP to a user and return whether they leveled up"""
+        record_key = self._key('level', guild_id, user_id)
+
+        pipe = self.client.pipeline()
+        pipe.hincrby(record_key, 'xp', xp_to_add)
+        pipe.zincrby(self._key('levels', guild_id), xp_to_add, user_id)
+        xp = pipe.execute()[0]
+
+        # Simple level formula: level = xp // 100
+        old_level = (xp - xp_to_add) // 100
+        new_level = xp // 100
+        self.client.execute('HSET', record_key, 'level', new_level)
+
+        return new_level > old_level
+
+    def get_level_leaderboard(self, guild_id, limit=10, offset=0):
+        """Get the level leaderboard for a guild"""
+        user_ids = self.client.execute('ZREVRANGE', self._key('levels', guild_id), offset, offset + limit - 1)
+
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.hgetall(self._key('level', guild_id, user_id))
+
+        leaderboard = []
+        for user_id, reply in zip(user_ids, pipe.execute()):
+            record = _hash_to_dict(reply)
+            leaderboard.append((user_id, {'level': int(record.get('level', 0)), 'xp': int(record.get('xp', 0))}))
+        return leaderboard
+
+    # Ticket methods
+    def create_ticket(self, guild_id, channel_id, user_id):
+        """Create a new ticket"""
+        ticket = {
+            'user_id': str(user_id),
+            'created_at': datetime.now().isoformat(),
+            'status': 'open'
+        }
+        self.client.execute('HSET', self._key('tickets', guild_id), channel_id, json.dumps(ticket))
+        return True
+
+    def close_ticket(self, guild_id, channel_id):
+        """Close a ticket"""
+        ticket = self.get_ticket(guild_id, channel_id)
+        if ticket is None:
+            return False
+
+        ticket['status'] = 'closed'
+        ticket['closed_at'] = datetime.now().isoformat()
+        self.client.execute('HSET', self._key('tickets', guild_id), channel_id, json.dumps(ticket))
+        return True
+
+    def get_ticket(self, guild_id, channel_id):
+        """Get ticket information"""
+        value = self.client.execute('HGET', self._key('tickets', guild_id), channel_id)
+        return json.loads(value) if value is not None else None
+
+    def get_guild_tickets(self, guild_id):
+        """Get all tickets for a guild, keyed by channel ID"""
+        tickets = _hash_to_dict(self.client.execute('HGETALL', self._key('tickets', guild_id)))
+        return {channel_id: json.loads(value) for channel_id, value in tickets.items()}
+
+    # Invite methods
+    def track_invite(self, guild_id, inviter_id, invitee_id, is_fake=False, is_rejoin=False):
+        """Track an invite"""
+        counters_key = self._key('invites', guild_id, inviter_id)
+        invitee = {
+            'inviter_id': str(inviter_id),
+            'joined_at': datetime.now().isoformat(),
+            'is_fake': is_fake,
+            'is_rejoin': is_rejoin
+        }
+
+        pipe = self.client.pipeline()
+        pipe.hincrby(counters_key, 'joins', 1)
+        pipe.hincrby(counters_key, 'fake', int(is_fake))
+        pipe.hincrby(counters_key, 'rejoins', int(is_rejoin))
+        pipe.hincrby(counters_key, 'left', 0)
+        # Fake invites don't count towards the leaderboard total
+        pipe.zincrby(self._key('invite_board', guild_id), 0 if is_fake else 1, inviter_id)
+        pipe.hset(self._key('invitees', guild_id), invitee_id, json.dumps(invitee))
+        pipe.execute()
+        return True
+
+    def track_leave(self, guild_id, user_id):
+        """Track a user leaving"""
+        value = self.client.execute('HGET', self._key('invitees', guild_id), user_id)
+        if value is None:
+            return False
+
+        inviter_id = json.loads(value)['inviter_id']
+        pipe = self.client.pipeline()
+        pipe.hincrby(self._key('invites', guild_id, inviter_id), 'left', 1)
+        pipe.zincrby(self._key('invite_board', guild_id), -1, inviter_id)
+        pipe.execute()
+        return True
+
+    def get_inviter(self, guild_id, user_id):
+        """Get the ID of the member whose invite a user joined through, or None"""
+        value = self.client.execute('HGET', self._key('invitees', guild_id), user_id)
+        return json.loads(value)['inviter_id'] if value is not None else None
+
+    def has_invitee(self, guild_id, user_id):
+        """Check whether a user was tracked joining through an invite before"""
+        return self.client.execute('HEXISTS', self._key('invitees', guild_id), user_id) == 1
+
+    def get_invite_stats(self, guild_id, user_id):
+        """Get invite statistics for a user"""
+        return self._invite_stats(self.client.execute('HGETALL', self._key('invites', guild_id, user_id)))
+
+    def get_invite_stats_many(self, guild_id, user_ids):
+        """Get invite statistics for several users, in the order given, in one round trip"""
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.hgetall(self._key('invites', guild_id, user_id))
+        return [self._invite_stats(reply) for reply in pipe.execute()]
+
+    @staticmethod
+    def _invite_stats(reply):
+        counters = _hash_to_dict(reply)
+        joins, left, fake, rejoins = (int(counters.get(name, 0)) for name in ('joins', 'left', 'fake', 'rejoins'))
+
+        return {
+            'total': max(joins - left - fake, 0),
+            'joins': joins,
+            'left': left,
+            'fake': fake,
+            'rejoins': rejoins
+        }
+
+    def get_invite_leaderboard(self, guild_id, limit=10, offset=0):
+        """Get the invite leaderboard for a guild"""
+        reply = self.client.execute(
+            'ZREVRANGE', self._key('invite_board', guild_id), offset, offset + limit - 1, 'WITHSCORES'
+        )
+        return [
+            {'user_id': user_id, 'total': max(int(float(score)), 0)}
+            for user_id, score in zip(reply[::2], reply[1::2])
+        ]
+
+    # Message tracking methods
+    def increment_message_count(self, guild_id, user_id):
+        """Increment message count for a user"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        daily_board = self._key('message_board', guild_id, today)
+
+        pipe = self.client.pipeline()
+        pipe.hincrby(self._key('messages', guild_id, user_id), 'all_time', 1)
+        pipe.hincrby(self._key('messages', guild_id, user_id), f'daily:{today}', 1)
+        pipe.zincrby(self._key('message_board', guild_id), 1, user_id)
+        pipe.zincrby(daily_board, 1, user_id)
+        pipe.expire(daily_board, DAILY_BOARD_TTL)
+        pipe.execute()
+        return True
+
+    def reset_message_stats(self, guild_id, user_id):
+        """Reset a user's message counts
+
+        Returns:
+            bool: False if the user had no message counts
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        pipe = self.client.pipeline()
+        pipe.del_(self._key('messages', guild_id, user_id))
+        pipe.zrem(self._key('message_board', guild_id), user_id)
+        pipe.zrem(self._key('message_board', guild_id, today), user_id)
+        return pipe.execute()[0] == 1
+
+    def get_message_stats(self, guild_id, user_id):
+        """Get message statistics for a user"""
+        return self.get_message_stats_many(guild_id, [user_id])[0]
+
+    def get_message_stats_many(self, guild_id, user_ids):
+        """Get message statistics for several users, in the order given, in one round trip"""
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        pipe = self.client.pipeline()
+        for user_id in user_ids:
+            pipe.hmget(self._key('messages', guild_id, user_id), 'all_time', f'daily:{today}')
+
+        return [
+            {'all_time': int(all_time or 0), 'today': int(today_count or 0)}
+            for all_time, today_count in pipe.execute()
+        ]
+
+    def get_message_leaderboard(self, guild_id, limit=10, period='all_time', offset=0):
+        """Get the message leaderboard for a guild"""
+        if period == 'today':
+            board = self._key('message_board', guild_id, datetime.now().strftime("%Y-%m-%d"))
+        elif period == 'all_time':
+            board = self._key('message_board', guild_id)
+        else:
+            return []
+
+        reply = self.client.execute('ZREVRANGE', board, offset, offset + limit - 1, 'WITHSCORES')
+        return [
+            {'user_id': user_id, 'count': int(float(score))}
+            for user_id, score in zip(reply[::2], reply[1::2])
+        ]
+
+    # Reaction roles methods
+    def set_reaction_role(self, guild_id, message_id, role_id, emoji):
+        """Set a reaction role"""
+        roles = self.get_reaction_roles(guild_id, message_id)
+
+        for role in roles:
+            if role['emoji'] == emoji:
+                # Update existing role
+                role['role_id'] = role_id
+                break
+        else:
+            roles.append({'role_id': role_id, 'emoji': emoji})
+
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('reaction_roles', guild_id), message_id, json.dumps(roles))
+        pipe.sadd(self._key('reaction_role_guilds'), guild_id)
+        pipe.execute()
+        return True
+
+    def get_reaction_roles(self, guild_id, message_id):
+        """Get reaction roles for a message"""
+        value = self.client.execute('HGET', self._key('reaction_roles', guild_id), message_id)
+        return json.loads(value) if value is not None else []
+
+    def get_guild_reaction_roles(self, guild_id):
+        """Get a guild's reaction roles, as {message_id: roles}"""
+        messages = _hash_to_dict(self.client.execute('HGETALL', self._key('reaction_roles', guild_id)))
+        return {message_id: json.loads(value) for message_id, value in messages.items()}
+
+    def get_all_reaction_roles(self):
+        """Get every guild's reaction roles, as {guild_id: {message_id: roles}}"""
+        guild_ids = self.client.execute('SMEMBERS', self._key('reaction_role_guilds'))
+
+        pipe = self.client.pipeline()
+        for guild_id in guild_ids:
+            pipe.hgetall(self._key('reaction_roles', guild_id))
+
+        return {
+            guild_id: {message_id: json.loads(value) for message_id, value in _hash_to_dict(reply).items()}
+            for guild_id, reply in zip(guild_ids, pipe.execute())
+            if reply
+        }
+
+    def delete_reaction_roles(self, guild_id, message_id):
+        """Remove all reaction roles for a message"""
+        return self.client.execute('HDEL', self._key('reaction_roles', guild_id), message_id) == 1
+
+    def remove_reaction_role(self, guild_id, message_id, emoji):
+        """Remove a reaction role"""
+        roles = self.get_reaction_roles(guild_id, message_id)
+        remaining = [role for role in roles if role['emoji'] != emoji]
+        if len(remaining) == len(roles):
+            return False
+
+        self.client.execute('HSET', self._key('reaction_roles', guild_id), message_id, json.dumps(remaining))
+        return True
+
+    # Giveaway methods
+    def create_giveaway(self, guild_id, channel_id, message_id, prize, host_id, end_time, winners=1):
+        """Create a new giveaway"""
+        giveaway = {
+            'channel_id': str(channel_id),
+            'prize': prize,
+            'host_id': str(host_id),
+            'end_time': end_time.isoformat(),
+            'winners': winners
+        }
+
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('giveaways', guild_id), message_id, json.dumps(giveaway))
+        pipe.del_(self._key('giveaway_entries', guild_id, message_id))
+        pipe.sadd(self._key('giveaway_guilds'), guild_id)
+        pipe.execute()
+        return True
+
+    def add_giveaway_participant(self, guild_id, message_id, user_id):
+        """Add a participant to a giveaway"""
+        if not self.client.execute('HEXISTS', self._key('giveaways', guild_id), message_id):
+            return False
+        return self.client.execute('SADD', self._key('giveaway_entries', guild_id, message_id), user_id) == 1
+
+    def remove_giveaway_participant(self, guild_id, message_id, user_id):
+        """Remove a participant from a giveaway"""
+        return self.client.execute('SREM', self._key('giveaway_entries', guild_id, message_id), user_id) == 1
+
+    def get_giveaway(self, guild_id, message_id):
+        """Get giveaway information"""
+        pipe = self.client.pipeline()
+        pipe.hget(self._key('giveaways', guild_id), message_id)
+        pipe.smembers(self._key('giveaway_entries', guild_id, message_id))
+        value, participants = pipe.execute()
+
+        if value is None:
+            return None
+
+        giveaway = json.loads(value)
+        giveaway['participants'] = participants
+        return giveaway
+
+    def get_active_giveaways(self):
+        """Get all active giveaways"""
+        guild_ids = self.client.execute('SMEMBERS', self._key('giveaway_guilds'))
+
+        pipe = self.client.pipeline()
+        for guild_id in guild_ids:
+            pipe.hgetall(self._key('giveaways', guild_id))
+
+        now = datetime.now()
+        active = []
+        for guild_id, reply in zip(guild_ids, pipe.execute()):
+            for message_id, value in _hash_to_dict(reply).items():
+                giveaway = json.loads(value)
+                end_time = datetime.fromisoformat(giveaway['end_time'])
+                if end_time > now:
+                    active.append((guild_id, message_id, end_time, giveaway))
+
+        # Fetch every active giveaway's participants in one round trip
+        pipe = self.client.pipeline()
+        for guild_id, message_id, _, _ in active:
+            pipe.smembers(self._key('giveaway_entries', guild_id, message_id))
+
+        active_giveaways = []
+        for (guild_id, message_id, end_time, giveaway), participants in zip(active, pipe.execute()):
+            giveaway['participants'] = participants
+            active_giveaways.append({
+                'guild_id': guild_id,
+                'message_id': message_id,
+                'channel_id': giveaway['channel_id'],
+                'end_time': end_time,
+                'data': giveaway
+            })
+
+        return active_giveaways
+
+    def end_giveaway(self, guild_id, message_id, fencing_token=None):
+        """Mark a giveaway as ended, if nothing else has (see JsonDatabase.end_giveaway)
+
+        A check-and-set transaction, so processes racing to end the same
+        giveaway can't both succeed; a fencing token is checked against the
+        lease in the same transaction.
+        """
+        key = self._key('giveaways', guild_id)
+        fence_keys = self.leases.fence_keys(SINGLETON_LEASE) if fencing_token is not None else []
+
+        def build(read):
+            value = read('HGET', key, message_id)
+            if value is None:
+                return None
+            giveaway = json.loads(value)
+            if giveaway.get('ended'):
+                return None
+
+            commands = []
+            if fencing_token is not None:
+                commands = self.leases.fence_commands(read, SINGLETON_LEASE, fencing_token, 'giveaways')
+                if commands is None:
+                    return None
+
+            giveaway['ended'] = True
+            giveaway['end_time'] = datetime.now().isoformat()
+            commands.append(('HSET', key, message_id, json.dumps(giveaway)))
+            return commands
+
+        return self.client.transaction([key, *fence_keys], build) is not None
+
+
+class RedisDataManager:
+    """DataManager's API on a Redis-protocol server
+
+    The data lives in one hash per namespace, with JSON-encoded values.
+    Calls run in a worker thread so they don't block the event loop.
+    """
+
+    def __init__(self, client, namespace, prefix='bot:'):
+        """Initialize the data manager
+
+        Args:
+            client (RedisClient): Connection to the server
+            namespace (str): Name of the data set, e.g. the JSON file's name
+            prefix (str): Prefix for every key
+        """
+        self.client = client
+        self.key = f"{prefix}data:{namespace}"
+
+    async def get(self, key, default=None):
+        """Get a value, or default if the key is not set"""
+        value = await asyncio.to_thread(self.client.execute, 'HGET', self.key, str(key))
+        return json.loads(value) if value is not None else default
+
+    async def set(self, key, value):
+        """Set a value"""
+        await asyncio.to_thread(self.client.execute, 'HSET', self.key, str(key), json.dumps(value))
+
+    async def delete(self, key):
+        """Delete a key
+
+        Returns:
+            bool: True if the key was deleted, False otherwise
+        """
+        return await asyncio.to_thread(self.client.execute, 'HDEL', self.key, str(key)) == 1
+
+    async def increment(self, key, amount=1, default=0):
+        """Increment an integer value atomically
+
+        Returns:
+            The new value after incrementing
+        """
+        pipe = self.client.pipeline()
+        pipe.hsetnx(self.key, str(key), json.dumps(default))
+        pipe.hincrby(self.key, str(key), amount)
+        replies = await asyncio.to_thread(pipe.execute)
+        return replies[1]
+
+    async def get_all(self):
+        """Get all data as a dict"""
+        reply = await asyncio.to_thread(self.client.execute, 'HGETALL', self.key)
+        return {key: json.loads(value) for key, value in _hash_to_dict(reply).items()}
@@ -0,0 +1,272 @@
+"""Accounting of the bot's Discord API requests
+
+Hooks discord.py's HTTP client so every request is counted:
+
+- per route template (e.g. "GET /channels/{channel_id}/messages/{message_id}")
+- per caller: the listener or command that made it, or the background
+  loop's task name (the bot names the running handler with
+  utils.perf.handler_scope, whether or not profiling is on)
+- per guild, from the route's guild or channel
+- per caller and route together, which is what finds the loops that burn
+  the rate limit
+
+For each request it records the attempts, any 429s, and the time spent
+waiting on rate limits. That time is the request's wall time minus its
+HTTP attempts: bucket waits, the global lock, and sleeps after a 429.
+The same hook feeds the bot_rest_* metrics.
+
+Every report_interval the totals are logged as a top-N report and start
+again. `.rest` shows the current window.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+
+import aiohttp
+
+from utils.metrics import REST_REQUESTS, REST_SECONDS, REST_WAIT_SECONDS
+from utils.perf import current_handler
+
+logger = logging.getLogger('discord_bot')
+
+REPORT_FIELDS = ('requests', 'ratelimited', 'wait', 'time', 'errors')
+
+# The Discord API request the current task is making
+_current_request = contextvars.ContextVar('rest_request', default=None)
+
+
+class _Request:
+    __slots__ = ('route', 'started', 'attempt_started', 'attempts', 'attempt_time', 'ratelimited')
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.attempt_started = 0.0
+        self.attempts = 0
+        self.attempt_time = 0.0
+        self.ratelimited = 0
+
+
+class RestStats:
+    """Totals for one route, caller, guild or caller and route"""
+
+    __slots__ = ('requests', 'attempts', 'ratelimited', 'wait', 'time', 'errors')
+
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.ratelimited = 0
+        self.wait = 0.0
+        self.time = 0.0
+        self.errors = 0
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'attempts': self.attempts,
+            'ratelimited': self.ratelimited,
+            'wait': round(self.wait, 3),
+            'time': round(self.time, 3),
+            'errors': self.errors,
+        }
+
+
+def caller_name():
+    """Name what is making the current request: a handler, a loop, or 'background'"""
+    handler = current_handler()
+    if handler:
+        return handler
+    task = asyncio.current_task()
+    name = task.get_name() if task else ''
+    # discord.ext.tasks loops are named after their coroutine; other tasks are numbered
+    if name.startswith('discord-ext-tasks: '):
+        return name[len('discord-ext-tasks: '):]
+    return 'background'
+
+
+class RestAccountant:
+    """Counts requests by route, caller and guild, and reports the top ones"""
+
+    def __init__(self, bot, top_n=10, report_interval=3600):
+        """Initialize the accountant
+
+        Args:
+            bot (commands.Bot): The bot, to find a channel's guild
+            top_n (int): Entries per list in reports
+            report_interval (float): Seconds per reporting window
+        """
+        self.bot = bot
+        self.top_n = top_n
+        self.report_interval = report_interval
+        self.task = None
+        self.last_report = None
+        self._reset()
+
+    def _reset(self):
+        self.window_start = time.time()
+        self.routes = {}
+        self.callers = {}
+        self.guilds = {}
+        self.paths = {}  # (caller, route) -> RestStats
+
+    def guild_of(self, route):
+        """Find the guild a request is for from its route, if any"""
+        if route.guild_id is not None:
+            return str(route.guild_id)
+        if route.channel_id is not None:
+            guild = getattr(self.bot.get_channel(int(route.channel_id)), 'guild', None)
+            if guild is not None:
+                return str(guild.id)
+        return None
+
+    def record(self, route_key, caller, guild_id, request, elapsed, failed):
+        """Add one finished request to the totals"""
+        wait = max(elapsed - request.attempt_time, 0.0)
+        groups = [(self.routes, route_key), (self.callers, caller), (self.paths, (caller, route_key))]
+        if guild_id is not None:
+            groups.append((self.guilds, guild_id))
+
+        for totals, key in groups:
+            stats = totals.get(key)
+            if stats is None:
+                stats = totals[key] = RestStats()
+            stats.requests += 1
+            stats.attempts += request.attempts
+            stats.ratelimited += request.ratelimited
+            stats.wait += wait
+            stats.time += elapsed
+            if failed:
+                stats.errors += 1
+
+        REST_WAIT_SECONDS.labels(route_key).observe(wait)
+
+    def report(self, sort='requests'):
+        """Get the top entries of the current window
+
+        Args:
+            sort (str): One of REPORT_FIELDS
+
+        Returns:
+            dict: Window bounds and the top routes, callers, guilds and caller/route paths
+        """
+        def top(totals):
+            ranked = sorted(totals.items(), key=lambda item: getattr(item[1], sort), reverse=True)
+            return [
+                {'key': ' '.join(key) if isinstance(key, tuple) else key, **stats.to_dict()}
+                for key, stats in ranked[:self.top_n]
+            ]
+
+        return {
+            'start': self.window_start,
+            'end': time.time(),
+            'requests': sum(stats.requests for stats in self.routes.values()),
+            'ratelimited': sum(stats.ratelimited for stats in self.routes.values()),
+            'routes': top(self.routes),
+            'callers': top(self.callers),
+            'guilds': top(self.guilds),
+            'paths': top(self.paths),
+        }
+
+    @staticmethod
+    def format_report(report):
+        """Render a report as text, one line per entry"""
+        lines = [
+            f"REST report: {report['requests']:,} requests, {report['ratelimited']:,} rate limited "
+            f"in {(report['end'] - report['start']) / 60:.0f} minutes"
+        ]
+        for section in ('routes', 'callers', 'paths', 'guilds'):
+            lines.append(f"Top {section}:")
+            for entry in report[section]:
+                lines.append(
+                    f"  {entry['requests']:>7,} req {entry['ratelimited']:>5,} 429 "
+                    f"{entry['wait']:>8.1f}s wait {entry['time']:>8.1f}s total  {entry['key']}"
+                )
+        return '\n'.join(lines)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.last_report = self.report()
+            self._reset()
+            if self.last_report['requests']:
+                logger.info(self.format_report(self.last_report))
+
+    def start(self):
+        """Start reporting every report_interval"""
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+def instrument_http(bot, accountant=None):
+    """Count the bot's Discord API requests for the metrics and an accountant
+
+    discord.py waits on rate limits and retries 429s inside
+    HTTPClient.request, so a wrapper around request() sees the whole
+    request and an aiohttp trace sees each attempt.
+
+    Args:
+        bot (commands.Bot): The bot, before it logs in
+        accountant (RestAccountant): Also attribute requests to callers and guilds
+
+    Returns:
+        aiohttp.TraceConfig: Pass as the bot's http_trace option
+    """
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        request = _current_request.get()
+        if request:
+            request.attempt_started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        request = _current_request.get()
+        if request is None:
+            REST_REQUESTS.labels('other', str(params.response.status)).inc()
+            return
+        duration = time.perf_counter() - request.attempt_started
+        request.attempts += 1
+        request.attempt_time += duration
+        if params.response.status == 429:
+            request.ratelimited += 1
+        REST_REQUESTS.labels(request.route, str(params.response.status)).inc()
+        REST_SECONDS.labels(request.route).observe(duration)
+
+    async def on_request_exception(session, context, params):
+        request = _current_request.get()
+        if request:
+            request.attempts += 1
+            request.attempt_time += time.perf_counter() - request.attempt_started
+        REST_REQUESTS.labels(request.route if request else 'other', 'error').inc()
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+
+    send_request = bot.http.request
+
+    async def accounted_request(route, **kwargs):
+        request = _Request(f"{route.method} {route.path}")
+        token = _current_request.set(request)
+        failed = False
+        try:
+            return await send_request(route, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _current_request.reset(token)
+            if accountant:
+                elapsed = time.perf_counter() - request.started
+                accountant.record(request.route, caller_name(), accountant.guild_of(route), request, elapsed, failed)
+
+    bot.http.request = accounted_request
+    return trace
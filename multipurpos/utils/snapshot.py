@@ -0,0 +1,336 @@
+"""Read-only snapshots of bot data for the dashboard
+
+The bot periodically publishes a snapshot of what the dashboard shows
+(leaderboards, invite and message stats, giveaways, warnings) to a file,
+replacing it atomically. The web side loads a snapshot once per change and
+answers every request from it, so dashboard traffic never touches the
+bot's database or its write path.
+
+Sections come from providers: callables taking a guild and returning
+JSON-serializable data. The database-backed sections are built in; cogs
+holding their own data register more (e.g. warnings) the way they register
+cluster IPC handlers.
+"""
+import asyncio
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import CONFIG
+from utils.storage import data_path
+
+logger = logging.getLogger('discord_bot')
+
+SNAPSHOT_VERSION = 1
+
+# Snapshot files to read, separated by os.pathsep; defaults to this process's file and every cluster's
+SNAPSHOT_PATHS_ENV = 'BOT_SNAPSHOT_PATHS'
+
+# Sort order of each list section. Lists are stored in this order, and
+# pagination cursors are the key of the last item returned, so a page
+# boundary stays put when a new snapshot reorders other entries.
+SORT_KEYS = {
+    'levels': lambda entry: (-entry['level'], -entry['xp'], entry['user_id']),
+    'invites': lambda entry: (-entry['total'], entry['user_id']),
+    'messages_all_time': lambda entry: (-entry['count'], entry['user_id']),
+    'messages_today': lambda entry: (-entry['count'], entry['user_id']),
+    'giveaways': lambda entry: (entry['end_time'], entry['message_id']),
+    'warnings': lambda entry: (-entry['count'], entry['user_id']),
+}
+
+
+def _write_atomic(path, data):
+    """Write bytes so readers see either the old file or the new one, never a partial one"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def encode_snapshot(snapshot):
+    """Serialize a snapshot to bytes"""
+    return json.dumps(snapshot, separators=(',', ':')).encode()
+
+
+def decode_snapshot(data):
+    """Parse bytes written by encode_snapshot"""
+    return json.loads(data)
+
+
+class SnapshotPublisher:
+    """Builds and writes the dashboard snapshot on an interval"""
+
+    def __init__(self, bot, path=None, interval=30, leaderboard_size=1000):
+        """Initialize the publisher
+
+        Args:
+            bot (commands.Bot): The bot whose guilds are published
+            path (str): Snapshot file (defaults to the configured one in the data directory)
+            interval (float): Seconds between snapshots
+            leaderboard_size (int): Entries kept per leaderboard
+        """
+        self.bot = bot
+        self.path = path or data_path(CONFIG['dashboard_api']['snapshot_file'])
+        self.interval = interval
+        self.leaderboard_size = leaderboard_size
+        self.providers = {}  # Section name -> callable(guild)
+        self.task = None
+        self.published = 0
+        self.last_build_ms = 0.0
+        self.last_size = 0
+
+    def register(self, section, provider):
+        """Add a section to every guild's snapshot
+
+        Args:
+            section (str): Key in the guild's snapshot
+            provider (callable): Takes a discord.Guild, returns JSON-serializable data
+        """
+        self.providers[section] = provider
+
+    def unregister(self, section):
+        """Stop publishing a section"""
+        self.providers.pop(section, None)
+
+    def _database_sections(self, source, guild_id):
+        """The sections read through the database API
+
+        Runs in a worker thread, on the guild's copy_guild() database, so
+        sorting a large guild's leaderboards doesn't block the event loop.
+        """
+        size = self.leaderboard_size
+        levels = [
+            {'user_id': user_id, 'level': data['level'], 'xp': data['xp']}
+            for user_id, data in source.get_level_leaderboard(guild_id, size)
+        ]
+        invites = [
+            {'user_id': entry['user_id'], **source.get_invite_stats(guild_id, entry['user_id'])}
+            for entry in source.get_invite_leaderboard(guild_id, size)
+            if entry['total']
+        ]
+        messages = {
+            period: [dict(entry) for entry in source.get_message_leaderboard(guild_id, size, period=period) if entry['count']]
+            for period in ('all_time', 'today')
+        }
+        return {
+            'levels': levels,
+            'invites': invites,
+            'messages_all_time': messages['all_time'],
+            'messages_today': messages['today'],
+        }
+
+    async def _giveaways_by_guild(self):
+        from utils.database import db
+
+        giveaways = {}
+        for entry in await db.get_active_giveaways():
+            data = entry['data']
+            giveaways.setdefault(str(entry['guild_id']), []).append({
+                'message_id': str(entry['message_id']),
+                'channel_id': str(data.get('channel_id')),
+                'prize': data.get('prize'),
+                'winners': data.get('winners', 1),
+                'end_time': data.get('end_time'),
+                'entrants': len(data.get('participants', [])),
+            })
+        return giveaways
+
+    async def build(self):
+        """Collect the snapshot, building the leaderboards in a worker thread
+
+        Returns:
+            dict: The snapshot
+        """
+        from utils.database import db
+
+        giveaways = await self._giveaways_by_guild()
+        guilds = {}
+
+        for guild in list(self.bot.guilds):
+            source = await db.copy_guild(guild.id)
+            sections = await asyncio.to_thread(self._database_sections, source, guild.id)
+            sections['giveaways'] = giveaways.get(str(guild.id), [])
+            for section, provider in list(self.providers.items()):
+                try:
+                    sections[section] = provider(guild)
+                except Exception as e:
+                    logger.error(f"Snapshot section {section} failed for guild {guild.id}: {e}")
+
+            for section, key in SORT_KEYS.items():
+                if isinstance(sections.get(section), list):
+                    sections[section].sort(key=key)
+
+            guilds[str(guild.id)] = {
+                'name': guild.name,
+                'member_count': guild.member_count,
+                **sections
+            }
+            await asyncio.sleep(0)
+
+        return {
+            'version': SNAPSHOT_VERSION,
+            'sequence': time.time_ns() // 1_000_000,
+            'generated_at': datetime.utcnow().isoformat(),
+            'guilds': guilds,
+        }
+
+    async def publish(self):
+        """Build and write one snapshot
+
+        Returns:
+            int: Bytes written
+        """
+        start = time.perf_counter()
+        snapshot = await self.build()
+        # The snapshot holds copies only, so it can be serialized off the loop
+        data = await asyncio.to_thread(encode_snapshot, snapshot)
+        await asyncio.to_thread(_write_atomic, self.path, data)
+
+        self.published += 1
+        self.last_build_ms = (time.perf_counter() - start) * 1000
+        self.last_size = len(data)
+        return len(data)
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            try:
+                await self.publish()
+            except Exception as e:
+                logger.error(f"Failed to publish dashboard snapshot: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start publishing in the background"""
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop publishing"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+def default_snapshot_paths():
+    """Snapshot files the dashboard reads: BOT_SNAPSHOT_PATHS, else the local and per-cluster files"""
+    if os.getenv(SNAPSHOT_PATHS_ENV):
+        return os.getenv(SNAPSHOT_PATHS_ENV).split(os.pathsep)
+
+    snapshot_file = CONFIG['dashboard_api']['snapshot_file']
+    bot_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cluster_files = glob.glob(os.path.join(bot_dir, CONFIG['sharding']['data_root'], '*', snapshot_file))
+    return [data_path(snapshot_file)] + sorted(cluster_files)
+
+
+class LoadedSnapshot:
+    """Parsed snapshot data, never modified once loaded
+
+    Only the pagination indexes are added to, lazily; building one twice
+    from two threads gives the same result.
+    """
+
+    def __init__(self, snapshots):
+        """Merge the snapshots of one or more processes
+
+        Args:
+            snapshots (list): Parsed snapshot dicts (each cluster owns different guilds)
+        """
+        self.guilds = {}
+        for snapshot in snapshots:
+            self.guilds.update(snapshot.get('guilds', {}))
+
+        self.sequences = tuple(snapshot.get('sequence', 0) for snapshot in snapshots)
+        self.generated_at = min((snapshot.get('generated_at') for snapshot in snapshots), default=None)
+        self.etag_base = '-'.join(str(sequence) for sequence in self.sequences) or 'empty'
+        self.keys = {}  # (guild_id, section) -> sorted list of sort keys
+
+    def page(self, guild_id, section, after=None, limit=50):
+        """Get a page of a list section
+
+        Args:
+            guild_id (str): The guild
+            section (str): A key of SORT_KEYS
+            after (list): Sort key of the last item on the previous page
+            limit (int): Items per page
+
+        Returns:
+            tuple: (items, sort key of the last item or None if this is the last page)
+        """
+        items = self.guilds.get(guild_id, {}).get(section, [])
+        keys = self.keys.get((guild_id, section))
+        if keys is None:
+            keys = [SORT_KEYS[section](item) for item in items]
+            self.keys[(guild_id, section)] = keys
+
+        start = bisect.bisect_right(keys, tuple(after)) if after is not None else 0
+        page = items[start:start + limit]
+        more = start + limit < len(items)
+        return page, (list(keys[start + limit - 1]) if more else None)
+
+
+class SnapshotReader:
+    """Loads snapshot files when they change; safe to share between threads"""
+
+    def __init__(self, paths=None, check_interval=1.0):
+        """Initialize the reader
+
+        Args:
+            paths (list): Snapshot files (defaults to default_snapshot_paths())
+            check_interval (float): Minimum seconds between checks for a new snapshot
+        """
+        self.paths = paths
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.current = LoadedSnapshot([])
+        self.signature = None
+        self.checked_at = 0.0
+        self.loads = 0
+
+    def _signature(self, paths):
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return tuple(signature)
+
+    def get(self):
+        """Get the latest snapshot, reloading it if a file changed
+
+        Returns:
+            LoadedSnapshot: The snapshot (empty if none has been published)
+        """
+        if time.monotonic() - self.checked_at < self.check_interval:
+            return self.current
+
+        with self.lock:
+            if time.monotonic() - self.checked_at < self.check_interval:
+                return self.current
+
+            paths = self.paths or default_snapshot_paths()
+            signature = self._signature(paths)
+            if signature != self.signature:
+                snapshots = []
+                for path, *_ in signature:
+                    try:
+                        with open(path, 'rb') as f:
+                            snapshots.append(decode_snapshot(f.read()))
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not read snapshot {path}: {e}")
+                self.current = LoadedSnapshot(snapshots)
+                self.signature = signature
+                self.loads += 1
+            self.checked_at = time.monotonic()
+            return self.current
@@ -0,0 +1,50 @@
+"""SQLAlchemy models shared by the bot and the dashboard
+
+The bot writes these tables through utils.sql_store; app.py builds its
+Flask-SQLAlchemy instance on the same Base, so the dashboard can query them
+with db.session like any of its own models.
+"""
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class LevelStat(Base):
+    """A member's XP and level in a guild"""
+    __tablename__ = 'bot_level_stats'
+
+    guild_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    xp: Mapped[int] = mapped_column(Integer, default=0)
+    level: Mapped[int] = mapped_column(Integer, default=0, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class MessageStat(Base):
+    """A member's message count in a guild, all time or for one day
+
+    The all-time row has an empty day.
+    """
+    __tablename__ = 'bot_message_stats'
+
+    guild_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    day: Mapped[str] = mapped_column(String(10), primary_key=True, default='')
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class InviteStat(Base):
+    """Join counters for a member's invites in a guild"""
+    __tablename__ = 'bot_invite_stats'
+
+    guild_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    inviter_id: Mapped[str] = mapped_column(String(20), primary_key=True)
+    joins: Mapped[int] = mapped_column(Integer, default=0)
+    left: Mapped[int] = mapped_column(Integer, default=0)
+    fake: Mapped[int] = mapped_column(Integer, default=0)
+    rejoins: Mapped[int] = mapped_column(Integer, default=0)
@@ -0,0 +1,421 @@
+"""Batched SQL persistence for the bot's hot counters
+
+XP, message counts and invite stats change on nearly every gateway event.
+Instead of one statement per event, CounterWriter coalesces updates in memory
+and flushes them every few hundred milliseconds as one multi-row upsert per
+table, over a bounded async connection pool. The tables (utils.sql_models)
+are the ones the dashboard reads.
+
+SqlMirroredDatabase puts the writer behind the existing database API, so
+cogs keep calling db.add_user_xp() and friends unchanged.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, event, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils.metrics import STORAGE_FLUSH_ERRORS, STORAGE_FLUSH_ROWS, STORAGE_FLUSH_SECONDS
+from utils.sql_models import Base, InviteStat, LevelStat, MessageStat
+
+logger = logging.getLogger('discord_bot')
+
+# Members read from each leaderboard per seed_page call
+SEED_PAGE_SIZE = 1000
+
+# app.py's 'sqlite:///site.db' resolves to the Flask instance folder
+DASHBOARD_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'site.db'
+)
+
+_UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def get_database_url(configured=None):
+    """Get the URL of the database shared with the dashboard
+
+    Args:
+        configured (str): URL from the config, if any
+
+    Returns:
+        str: The configured URL, else DATABASE_URL, else the dashboard's SQLite file
+    """
+    return configured or os.getenv('DATABASE_URL') or f"sqlite:///{DASHBOARD_SQLITE_PATH}"
+
+
+def to_async_url(url):
+    """Switch a database URL to its asyncio driver (asyncpg or aiosqlite)"""
+    scheme, sep, rest = url.partition('://')
+    if scheme in ('postgres', 'postgresql', 'postgresql+psycopg2'):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme == 'sqlite':
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
+
+def create_sql_engine(url, pool_size=5, max_overflow=5, pool_timeout=10):
+    """Create an async engine with a bounded connection pool
+
+    Args:
+        url (str): Database URL; sync driver names are switched to async ones
+        pool_size (int): Connections kept open
+        max_overflow (int): Extra connections allowed under load
+        pool_timeout (int): Seconds to wait for a free connection
+
+    Returns:
+        AsyncEngine: The engine
+    """
+    engine = create_async_engine(
+        to_async_url(url),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        # Same settings as the dashboard's engine
+        pool_recycle=300,
+        pool_pre_ping=True
+    )
+
+    if engine.dialect.name == 'sqlite':
+        # Let the dashboard read while the bot is writing
+        @event.listens_for(engine.sync_engine, 'connect')
+        def _enable_wal(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+
+    return engine
+
+
+class CounterWriter:
+    """Coalesces counter updates and writes them in batched upserts
+
+    Every counter is queued as the member's current value read back from
+    the primary store (the last one queued wins), so SQL always converges
+    on the primary's totals, whatever it held before. A flush happens every
+    flush_interval seconds, or sooner once max_batch rows are pending.
+    """
+
+    def __init__(self, engine, flush_interval=0.5, max_batch=500):
+        """Initialize the writer
+
+        Args:
+            engine (AsyncEngine): Engine from create_sql_engine
+            flush_interval (float): Seconds between flushes
+            max_batch (int): Rows per statement, and the backlog that triggers an early flush
+        """
+        if engine.dialect.name not in _UPSERT_INSERTS:
+            raise ValueError(f"Unsupported database for counter upserts: {engine.dialect.name}")
+
+        self.engine = engine
+        self.insert = _UPSERT_INSERTS[engine.dialect.name]
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self.levels = {}    # (guild_id, user_id) -> (xp, level)
+        self.invites = {}   # (guild_id, inviter_id) -> stats dict
+        self.messages = {}  # (guild_id, user_id, day) -> count; day '' is the all-time count
+        self.resets = set() # (guild_id, user_id) whose message counts are cleared first
+
+        # Updates may be queued from the database worker thread (see AsyncDatabase)
+        self.lock = threading.Lock()
+        self.loop = None
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task = None
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def pending(self):
+        """Number of queued rows"""
+        return len(self.levels) + len(self.invites) + len(self.messages) + len(self.resets)
+
+    def _queued(self):
+        if self.pending >= self.max_batch:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.wakeup.set)
+            else:
+                self.wakeup.set()
+
+    # Queueing (synchronous, called from the database methods)
+
+    def set_level(self, guild_id, user_id, xp, level):
+        """Queue a member's current XP and level"""
+        with self.lock:
+            self.levels[(str(guild_id), str(user_id))] = (xp, level)
+            self._queued()
+
+    def set_messages(self, guild_id, user_id, day, all_time, today):
+        """Queue a member's current all-time count and their count for day"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        with self.lock:
+            self.messages[(guild_id, user_id, '')] = all_time
+            if today:
+                self.messages[(guild_id, user_id, day)] = today
+            self._queued()
+
+    def reset_messages(self, guild_id, user_id):
+        """Queue clearing a member's message counts"""
+        guild_id, user_id = str(guild_id), str(user_id)
+        with self.lock:
+            for key in [key for key in self.messages if key[:2] == (guild_id, user_id)]:
+                del self.messages[key]
+            self.resets.add((guild_id, user_id))
+            self._queued()
+
+    def set_invites(self, guild_id, inviter_id, stats):
+        """Queue an inviter's current join counters"""
+        with self.lock:
+            self.invites[(str(guild_id), str(inviter_id))] = {
+                name: stats[name] for name in ('joins', 'left', 'fake', 'rejoins')
+            }
+            self._queued()
+
+    # Flushing
+
+    def _upsert(self, model, rows, keys):
+        """Build one multi-row INSERT ... ON CONFLICT DO UPDATE"""
+        table = model.__table__
+        stmt = self.insert(table).values(rows)
+        update = {column: stmt.excluded[column] for column in rows[0] if column not in keys}
+        return stmt.on_conflict_do_update(index_elements=keys, set_=update)
+
+    def _chunks(self, rows):
+        for start in range(0, len(rows), self.max_batch):
+            yield rows[start:start + self.max_batch]
+
+    def _statements(self, levels, invites, messages, resets):
+        if resets:
+            yield delete(MessageStat).where(tuple_(MessageStat.guild_id, MessageStat.user_id).in_(list(resets)))
+
+        now = datetime.utcnow()
+        level_rows = [
+            {'guild_id': guild_id, 'user_id': user_id, 'xp': xp, 'level': level, 'updated_at': now}
+            for (guild_id, user_id), (xp, level) in levels.items()
+        ]
+        for rows in self._chunks(level_rows):
+            yield self._upsert(LevelStat, rows, ['guild_id', 'user_id'])
+
+        invite_rows = [
+            {'guild_id': guild_id, 'inviter_id': inviter_id, **stats}
+            for (guild_id, inviter_id), stats in invites.items()
+        ]
+        for rows in self._chunks(invite_rows):
+            yield self._upsert(InviteStat, rows, ['guild_id', 'inviter_id'])
+
+        message_rows = [
+            {'guild_id': guild_id, 'user_id': user_id, 'day': day, 'count': count}
+            for (guild_id, user_id, day), count in messages.items()
+        ]
+        for rows in self._chunks(message_rows):
+            yield self._upsert(MessageStat, rows, ['guild_id', 'user_id', 'day'])
+
+    def _requeue(self, levels, invites, messages, resets):
+        """Put a failed batch back without overwriting anything queued since"""
+        with self.lock:
+            for key, value in levels.items():
+                self.levels.setdefault(key, value)
+            for key, value in invites.items():
+                self.invites.setdefault(key, value)
+            # A reset queued since the batch was taken discards the batch's counts for that member
+            for key, count in messages.items():
+                if key[:2] not in self.resets:
+                    self.messages.setdefault(key, count)
+            self.resets |= resets
+
+    async def flush(self):
+        """Write everything queued so far
+
+        Returns:
+            int: Rows written (0 if nothing was queued or the write failed)
+        """
+        async with self.flush_lock:
+            with self.lock:
+                batch = (self.levels, self.invites, self.messages, self.resets)
+                rows = self.pending
+                if not rows:
+                    return 0
+                self.levels, self.invites, self.messages, self.resets = {}, {}, {}, set()
+
+            start = time.perf_counter()
+            try:
+                async with self.engine.begin() as conn:
+                    for statement in self._statements(*batch):
+                        await conn.execute(statement)
+            except asyncio.CancelledError:
+                # The transaction was rolled back; keep the batch for the final flush
+                self._requeue(*batch)
+                raise
+            except Exception as e:
+                self.failures += 1
+                STORAGE_FLUSH_ERRORS.labels('sql').inc()
+                self._requeue(*batch)
+                logger.error(f"Failed to flush {rows} counter rows to SQL, will retry: {e}")
+                return 0
+
+            elapsed = time.perf_counter() - start
+            STORAGE_FLUSH_SECONDS.labels('sql').observe(elapsed)
+            STORAGE_FLUSH_ROWS.labels('sql').inc(rows)
+            self.last_flush_ms = elapsed * 1000
+            self.flushes += 1
+            self.rows_written += rows
+            return rows
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def start(self):
+        """Create missing tables and start the flush loop"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"SQL counter writer started ({self.engine.dialect.name}, "
+                    f"flushing every {self.flush_interval * 1000:.0f}ms)")
+
+    async def close(self):
+        """Stop the flush loop, write what's left and close the pool"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        await self.engine.dispose()
+
+    def stats(self):
+        """Get the writer's counters
+
+        Returns:
+            dict: Pending rows, flushes, rows written, failures and last flush time
+        """
+        return {
+            'pending': self.pending,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'failures': self.failures,
+            'last_flush_ms': self.last_flush_ms
+        }
+
+
+class SqlMirroredDatabase:
+    """A database whose hot counter updates are also queued for SQL
+
+    Everything is served by the primary database (JsonDatabase or
+    RedisDatabase); the level, message and invite writes additionally
+    queue the member's new values on the writer.
+    """
+
+    def __init__(self, primary, writer):
+        self.primary = primary
+        self.writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+    def add_user_xp(self, guild_id, user_id, xp_to_add=1):
+        """Add XP to a user and return whether they leveled up"""
+        leveled_up = self.primary.add_user_xp(guild_id, user_id, xp_to_add)
+        user_data = self.primary.get_user_level(guild_id, user_id)
+        self.writer.set_level(guild_id, user_id, user_data['xp'], user_data['level'])
+        return leveled_up
+
+    def increment_message_count(self, guild_id, user_id):
+        """Increment message count for a user"""
+        result = self.primary.increment_message_count(guild_id, user_id)
+        stats = self.primary.get_message_stats(guild_id, user_id)
+        self.writer.set_messages(guild_id, user_id, datetime.now().strftime("%Y-%m-%d"), stats['all_time'], stats['today'])
+        return result
+
+    def reset_message_stats(self, guild_id, user_id):
+        """Reset a user's message counts"""
+        result = self.primary.reset_message_stats(guild_id, user_id)
+        if result:
+            self.writer.reset_messages(guild_id, user_id)
+        return result
+
+    def track_invite(self, guild_id, inviter_id, invitee_id, is_fake=False, is_rejoin=False):
+        """Track an invite"""
+        result = self.primary.track_invite(guild_id, inviter_id, invitee_id, is_fake=is_fake, is_rejoin=is_rejoin)
+        self.writer.set_invites(guild_id, inviter_id, self.primary.get_invite_stats(guild_id, inviter_id))
+        return result
+
+    def track_leave(self, guild_id, user_id):
+        """Track a user leaving"""
+        inviter_id = self.primary.get_inviter(guild_id, user_id)
+        result = self.primary.track_leave(guild_id, user_id)
+        if result and inviter_id is not None:
+            self.writer.set_invites(guild_id, inviter_id, self.primary.get_invite_stats(guild_id, inviter_id))
+        return result
+
+    def seed_page(self, guild_id, offset=0, limit=SEED_PAGE_SIZE):
+        """Queue one page of a guild's current counters from the primary
+
+        The mirrored writes only cover members as they become active, so
+        seeding fills in everyone else, and corrects rows written while the
+        primary was changed without the mirror. Only today's daily counts
+        can be read through the database API; earlier days stay as they are.
+
+        Each call reads one page of each leaderboard, and the invite and
+        message counters of that page's members in one batch, so a large
+        guild is seeded a page at a time. A member whose rank changes
+        between pages may be read twice, which is harmless since rows are
+        absolute values; one pushed up past the page being read is picked
+        up by the mirrored write that changed them.
+
+        Args:
+            guild_id: The guild to seed
+            offset (int): Leaderboard rank to start at
+            limit (int): Members per leaderboard page
+
+        Returns:
+            tuple: (rows queued, whether there may be more pages)
+        """
+        levels = self.primary.get_level_leaderboard(guild_id, limit, offset=offset)
+        for user_id, data in levels:
+            self.writer.set_level(guild_id, user_id, data['xp'], data['level'])
+
+        day = datetime.now().strftime("%Y-%m-%d")
+        members = [entry['user_id'] for entry in self.primary.get_message_leaderboard(guild_id, limit, offset=offset)]
+        for user_id, stats in zip(members, self.primary.get_message_stats_many(guild_id, members)):
+            self.writer.set_messages(guild_id, user_id, day, stats['all_time'], stats['today'])
+
+        inviters = [entry['user_id'] for entry in self.primary.get_invite_leaderboard(guild_id, limit, offset=offset)]
+        for user_id, stats in zip(inviters, self.primary.get_invite_stats_many(guild_id, inviters)):
+            self.writer.set_invites(guild_id, user_id, stats)
+
+        more = max(len(levels), len(members), len(inviters)) == limit
+        return len(levels) + len(members) + len(inviters), more
+
+    def seed(self, guild_id, limit=SEED_PAGE_SIZE):
+        """Queue all of a guild's current counters from the primary, page by page (see seed_page)
+
+        Returns:
+            int: Rows queued
+        """
+        rows, offset, more = 0, 0, True
+        while more:
+            queued, more = self.seed_page(guild_id, offset, limit)
+            rows += queued
+            offset += limit
+        return rows
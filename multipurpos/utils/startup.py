@@ -0,0 +1,240 @@
+"""Where startup time goes, printed by `python discord_bot.py --startup-report`
+
+discord_bot.py creates a StartupReport before its other imports, when
+run with --startup-report or with BOT_STARTUP_REPORT set (which is how
+`run_bot.py --startup-report` asks for one). From then until the bot's
+first on_ready it records:
+
+- imports: time per module, with and without the modules it imported,
+  like `python -X importtime`
+- data file loads: every json.load, with the file and the cog (or module)
+  loading it
+- cog setup: per cog, split into its imports, its data loads and the rest
+- view registration: time in bot.add_view
+- login: the REST login and application info, not counting setup_hook
+- READY: from opening the gateway to its READY event
+- guild chunking: from READY to discord.py's on_ready, which waits for
+  every guild to arrive and, unless memory budget mode is on, be chunked
+
+The phases are printed as one report, and a warning is logged for each
+phase over its budget in CONFIG['startup']['budgets']. This module only
+uses the standard library, so it can be imported before anything else.
+"""
+import builtins
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger('discord_bot')
+
+STARTUP_REPORT_ENV = 'BOT_STARTUP_REPORT'
+STARTUP_REPORT_FLAG = '--startup-report'
+
+# The extension being loaded, set by utils.extensions.load_extension_timed
+loading_extension = contextvars.ContextVar('loading_extension', default=None)
+
+PHASES = (
+    ('imports', "Imports and module setup"),
+    ('cog_setup', "Cog setup"),
+    ('views', "View registration"),
+    ('login', "Login"),
+    ('ready', "Gateway READY"),
+    ('chunking', "Guild chunking"),
+)
+
+
+_active = None  # The report being recorded, if any
+
+
+def report_requested(argv=None):
+    """Whether the process was started with --startup-report or BOT_STARTUP_REPORT set"""
+    return STARTUP_REPORT_FLAG in (sys.argv if argv is None else argv) or bool(os.getenv(STARTUP_REPORT_ENV))
+
+
+def note_load(path, seconds, size):
+    """Record a data file loaded without json.load (e.g. from a snapshot) in the active report"""
+    if _active is not None and not _active.finished:
+        _active.loads.append((path, seconds, size, _active._owner()))
+
+
+class StartupReport:
+    """Timings of one process's startup, from creation to finish()"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}
+        self.phases = {}
+        self.imports = {}  # Module -> [seconds including its imports, seconds on its own, what imported it]
+        self.loads = []  # (path, seconds, bytes, owner)
+        self.extensions = []  # load_extension_timed results
+        self.view_seconds = 0.0
+        self.finished = False
+        self.thread_id = threading.get_ident()
+        self._import_stack = []
+        self._original_import = None
+        self._original_json_load = None
+
+    @classmethod
+    def start(cls):
+        """Create a report and start recording imports and data loads"""
+        global _active
+        report = _active = cls()
+        report._original_import = builtins.__import__
+        builtins.__import__ = report._import
+        report._original_json_load = json.load
+        json.load = report._json_load
+        return report
+
+    def _owner(self):
+        """What is running: the extension being loaded, else the module being imported"""
+        if threading.get_ident() != self.thread_id:
+            return f"thread {threading.current_thread().name}"
+        extension = loading_extension.get()
+        if extension:
+            return f"cogs.{extension}"
+        if self._import_stack:
+            return self._import_stack[-1][0]
+        return "bot"
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or self.finished or threading.get_ident() != self.thread_id:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        # [name, seconds spent in the imports it made]
+        frame = [name, 0.0]
+        importer = self._owner()
+        self._import_stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            seconds = time.perf_counter() - start
+            self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1][1] += seconds
+            if name not in self.imports:
+                self.imports[name] = [seconds, seconds - frame[1], importer]
+
+    def _json_load(self, fp, *args, **kwargs):
+        if self.finished:
+            return self._original_json_load(fp, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return self._original_json_load(fp, *args, **kwargs)
+        finally:
+            try:
+                size = fp.tell()
+            except (AttributeError, OSError, ValueError):
+                size = 0
+            self.loads.append((getattr(fp, 'name', '?'), time.perf_counter() - start, size, self._owner()))
+
+    def mark(self, name):
+        """Record when something happened, once"""
+        self.marks.setdefault(name, time.perf_counter())
+
+    def add_view_time(self, seconds):
+        self.view_seconds += seconds
+
+    def finish(self, budgets=None):
+        """Stop recording, work out the phases, log any over budget and return the report
+
+        Args:
+            budgets (dict): Seconds allowed per phase key (see PHASES) and per cog ('per_cog')
+
+        Returns:
+            str: The report
+        """
+        self.finished = True
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+        if json.load == self._json_load:
+            json.load = self._original_json_load
+        self.mark('on_ready')
+
+        marks = self.marks
+        cog_seconds = sum(result['seconds'] for result in self.extensions)
+
+        def between(first, last):
+            if first in marks and last in marks:
+                return marks[last] - marks[first]
+            return None
+
+        login = between('login', 'login_done')
+        if login is not None:
+            login -= between('setup_hook', 'setup_hook_done') or 0.0
+        self.phases = {
+            'imports': marks.get('main', self.started) - self.started,
+            'cog_setup': cog_seconds,
+            'views': self.view_seconds,
+            'login': login,
+            'ready': between('connect', 'READY'),
+            'chunking': between('READY', 'on_ready'),
+        }
+        total = marks['on_ready'] - self.started
+
+        budgets = budgets or {}
+        over = []
+        for key, label in PHASES:
+            seconds, budget = self.phases[key], budgets.get(key)
+            if seconds is not None and budget is not None and seconds > budget:
+                over.append(f"{label} took {seconds:.2f}s, over its {budget:g}s budget")
+        per_cog = budgets.get('per_cog')
+        if per_cog is not None:
+            for result in self.extensions:
+                if result['seconds'] > per_cog:
+                    over.append(f"Cog {result['name']} took {result['seconds']:.2f}s to set up, over its {per_cog:g}s budget")
+        for warning in over:
+            logger.warning(f"Startup budget exceeded: {warning}")
+
+        return self.render(total, budgets, over)
+
+    def render(self, total, budgets, over, limit=15):
+        lines = [f"Startup report: on_ready {total:.2f}s after the report started", ""]
+        for key, label in PHASES:
+            seconds = self.phases[key]
+            budget = budgets.get(key)
+            shown = "not reached" if seconds is None else f"{seconds * 1000:>9.1f}ms"
+            flag = " OVER BUDGET" if seconds is not None and budget is not None and seconds > budget else ""
+            lines.append(f"  {label:<26} {shown:>12}" + (f"   budget {budget * 1000:,.0f}ms{flag}" if budget is not None else ""))
+
+        by_package = {}
+        for name, (_, own, _) in self.imports.items():
+            package = name.split('.')[0]
+            by_package[package] = by_package.get(package, 0.0) + own
+        lines += ["", f"Imports by top-level package ({len(self.imports)} modules):"]
+        for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:limit]:
+            lines.append(f"  {seconds * 1000:>9.1f}ms  {package}")
+        lines += ["", "Slowest modules (own time, cumulative time, imported during):"]
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        for name, (cumulative, own, importer) in slowest:
+            lines.append(f"  {own * 1000:>9.1f}ms {cumulative * 1000:>9.1f}ms  {name}  ({importer})")
+
+        lines += ["", "Data file loads:"]
+        if not self.loads:
+            lines.append("  none")
+        for path, seconds, size, owner in sorted(self.loads, key=lambda load: load[1], reverse=True)[:limit]:
+            lines.append(f"  {seconds * 1000:>9.1f}ms {size / 1048576:>9.2f} MiB  {path}  ({owner})")
+
+        if self.extensions:
+            imports, loads = {}, {}
+            for name, (_, own, importer) in self.imports.items():
+                imports[importer] = imports.get(importer, 0.0) + own
+            for _, seconds, _, owner in self.loads:
+                loads[owner] = loads.get(owner, 0.0) + seconds
+            lines += ["", "Cog setup (total, imports, data loads, rest):"]
+            for result in sorted(self.extensions, key=lambda result: result['seconds'], reverse=True):
+                owner = f"cogs.{result['name']}"
+                rest = result['seconds'] - imports.get(owner, 0.0) - loads.get(owner, 0.0)
+                lines.append(
+                    f"  {result['seconds'] * 1000:>9.1f}ms {imports.get(owner, 0.0) * 1000:>9.1f}ms "
+                    f"{loads.get(owner, 0.0) * 1000:>9.1f}ms {max(rest, 0.0) * 1000:>9.1f}ms  {result['name']}"
+                    + ("" if result['loaded'] else "  (failed)")
+                )
+
+        if over:
+            lines += ["", f"{len(over)} budget(s) exceeded:"] + [f"  {warning}" for warning in over]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,155 @@
+"""Content-hashed, precompressed static assets for the Flask apps
+
+At startup every file under assets/ is read once, hashed and (for text
+formats) gzipped, and then served from memory:
+
+- /assets/images/welcome.<hash>.gif never changes, so it is served with a
+  one-year immutable Cache-Control and browsers don't ask for it again
+- /assets/images/welcome.gif still works but must be revalidated; repeat
+  requests get a 304 from the ETag
+
+Templates link assets with asset_url('images/welcome.gif'), which returns the
+hashed URL. Under gunicorn with preload_app the manifest is built once in the
+master and shared by the forked workers.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from flask import Blueprint, Response, abort, request
+
+logger = logging.getLogger('web')
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+# GIFs and PNGs are already compressed; gzip only helps text formats
+COMPRESSIBLE_TYPES = {'.svg', '.css', '.js', '.html', '.json', '.txt', '.map'}
+MIN_GZIP_SAVING = 0.1
+
+
+class Asset:
+    """One file's contents and its cache metadata"""
+
+    def __init__(self, path, body):
+        """Initialize the asset
+
+        Args:
+            path (str): Path relative to the assets directory, with forward slashes
+            body (bytes): File contents
+        """
+        self.path = path
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        stem, ext = os.path.splitext(path)
+        self.hashed_path = f"{stem}.{self.digest}{ext}"
+
+        self.gzip_body = None
+        if ext.lower() in COMPRESSIBLE_TYPES:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) <= len(body) * (1 - MIN_GZIP_SAVING):
+                self.gzip_body = compressed
+
+
+class AssetManifest:
+    """Maps asset paths to their hashed names and preloaded contents"""
+
+    def __init__(self, root=ASSETS_DIR):
+        self.root = root
+        self.assets = {}  # Path -> Asset
+        self.hashed = {}  # Hashed path -> Asset
+        self.load()
+
+    def load(self):
+        """(Re)read every file under the root"""
+        assets = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(directory, filename)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    assets[path] = Asset(path, f.read())
+
+        self.assets = assets
+        self.hashed = {asset.hashed_path: asset for asset in assets.values()}
+        logger.info(
+            f"Loaded {len(assets)} static assets ({sum(len(asset.body) for asset in assets.values()):,} bytes, "
+            f"{sum(1 for asset in assets.values() if asset.gzip_body)} precompressed)"
+        )
+
+    def url_for(self, path, prefix='/assets'):
+        """Get the cache-busting URL for an asset
+
+        Args:
+            path (str): Path relative to the assets directory, e.g. 'images/welcome.gif'
+
+        Returns:
+            str: The hashed URL, or the plain one for unknown files
+        """
+        asset = self.assets.get(path)
+        return f"{prefix}/{asset.hashed_path if asset else path}"
+
+    def lookup(self, path):
+        """Find an asset by hashed or plain path
+
+        Returns:
+            tuple: (Asset or None, whether the path was the immutable hashed one)
+        """
+        if path in self.hashed:
+            return self.hashed[path], True
+        return self.assets.get(path), False
+
+
+def asset_response(asset, immutable):
+    """Build the response for an asset, honouring Accept-Encoding and If-None-Match
+
+    The gzip and identity representations get different strong ETags, as
+    they are different bytes.
+    """
+    body, etag = asset.body, asset.digest
+    headers = {'Cache-Control': IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE}
+
+    if asset.gzip_body:
+        headers['Vary'] = 'Accept-Encoding'
+        if 'gzip' in request.accept_encodings:
+            body, etag = asset.gzip_body, f"{asset.digest}-gz"
+            headers['Content-Encoding'] = 'gzip'
+
+    response = Response(body, mimetype=asset.mimetype, headers=headers)
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def cacheable_page(response):
+    """Let browsers revalidate a rendered page with its ETag instead of downloading it again"""
+    response.add_etag()
+    response.headers['Cache-Control'] = REVALIDATE_CACHE
+    return response.make_conditional(request)
+
+
+def init_static_assets(app, root=ASSETS_DIR, url_prefix='/assets'):
+    """Serve the assets directory from memory and add asset_url() to templates
+
+    Returns:
+        AssetManifest: The loaded manifest
+    """
+    manifest = AssetManifest(root)
+    blueprint = Blueprint('assets', __name__)
+
+    @blueprint.route(f'{url_prefix}/<path:filename>')
+    def serve_asset(filename):
+        asset, immutable = manifest.lookup(filename)
+        if asset is None:
+            abort(404)
+        return asset_response(asset, immutable)
+
+    app.register_blueprint(blueprint)
+    app.jinja_env.globals['asset_url'] = lambda path: manifest.url_for(path, url_prefix)
+    app.extensions['static_assets'] = manifest
+    return manifest
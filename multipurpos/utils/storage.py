@@ -0,0 +1,34 @@
+import os
+import logging
+
+logger = logging.getLogger('discord_bot')
+
+# Set by the cluster launcher so every cluster keeps its own copy of the data
+# files. A guild belongs to exactly one shard and a shard to exactly one
+# cluster, so this partitions storage by guild and no two processes ever
+# write the same file. utils.data_partition splits existing data this way.
+DATA_ROOT_ENV = 'BOT_DATA_ROOT'
+
+
+def get_data_root():
+    """Get the directory data files are stored under
+
+    Returns:
+        str: The data root, or '' when running as a single process
+    """
+    return os.getenv(DATA_ROOT_ENV, '')
+
+
+def data_path(path):
+    """Resolve a data file path against this process's data root
+
+    Args:
+        path (str): The path relative to the bot directory, e.g. 'data/polls_data.json'
+
+    Returns:
+        str: The path to read and write
+    """
+    root = get_data_root()
+    if not root:
+        return path
+    return os.path.join(root, path)
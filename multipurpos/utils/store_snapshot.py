@@ -0,0 +1,333 @@
+"""Binary snapshots of the JSON stores, for fast cold starts
+
+Every store (bot_database.json, the data managers and the cogs' data/*.json
+files) is kept as pretty-printed JSON, which is slow to parse once it
+grows. The bot also writes each store's contents next to its JSON as a
+binary snapshot (<file>.snap), periodically and when it closes, and
+load_json_store reads the snapshot instead of the JSON when it still
+matches.
+
+The JSON stays the source of truth and is still written on every change,
+so the dashboard, scripts and migrations keep reading it, and losing a
+snapshot loses nothing. A snapshot records the size and modification time
+the JSON file had when it was taken, and is only used while the JSON still
+has them: any later save makes it stale, and the JSON is read instead. It
+is also skipped, with the JSON read instead, when it is corrupt (CRC32
+mismatch), truncated, or from another snapshot format, marshal format or
+Python version.
+
+File layout (little-endian):
+
+    magic            4 bytes   b'BSNP'
+    format version   u16       FORMAT_VERSION
+    marshal version  u16       marshal.version when written
+    python           16 bytes  sys.implementation.cache_tag, NUL padded
+    JSON mtime       u64       nanoseconds
+    JSON size        u64       bytes
+    payload length   u64
+    payload CRC32    u32
+    payload                    marshal.dumps of the store's data
+
+marshal handles exactly the types JSON produces, decodes them several
+times faster than json.load, and the payload is about a quarter the size
+of the indented JSON.
+"""
+import asyncio
+import gc
+import json
+import logging
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+
+from config import CONFIG
+from utils import startup
+
+logger = logging.getLogger('discord_bot')
+
+MAGIC = b'BSNP'
+FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = '.snap'
+_HEADER = struct.Struct('<4sHH16sQQQI')
+_PYTHON_TAG = (sys.implementation.cache_tag or sys.implementation.name).encode()[:16]
+
+
+class SnapshotError(Exception):
+    """A snapshot that can't be used"""
+
+
+def snapshot_path(path):
+    """Get the snapshot file kept next to a JSON store"""
+    return path + SNAPSHOT_SUFFIX
+
+
+def file_signature(path):
+    """Get a file's (modification time in ns, size), which changes whenever it is rewritten"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _gc_paused:
+    """Pause the cyclic GC while building a large tree of containers
+
+    The GC would otherwise run over every container allocated so far,
+    many times over, without finding anything to collect.
+    """
+
+    def __enter__(self):
+        self.enabled = gc.isenabled()
+        gc.disable()
+
+    def __exit__(self, *exc_info):
+        if self.enabled:
+            gc.enable()
+
+
+def encode_store_snapshot(data, signature):
+    """Serialize a store's data to snapshot bytes
+
+    Args:
+        data: The store's data (anything JSON could hold)
+        signature (tuple): file_signature of the JSON it mirrors
+
+    Returns:
+        bytes: Header and payload
+    """
+    payload = marshal.dumps(data)
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, marshal.version, _PYTHON_TAG,
+        signature[0], signature[1], len(payload), zlib.crc32(payload)
+    )
+    return header + payload
+
+
+def decode_store_snapshot(data, signature=None):
+    """Parse snapshot bytes written by encode_store_snapshot
+
+    Args:
+        data (bytes): The snapshot file's contents
+        signature (tuple): file_signature of the JSON now, or None to skip the staleness check
+
+    Returns:
+        The store's data
+
+    Raises:
+        SnapshotError: The snapshot is stale, corrupt or from another format or Python version
+    """
+    if len(data) < _HEADER.size:
+        raise SnapshotError("truncated header")
+    magic, version, marshal_version, python, mtime_ns, size, length, crc = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("not a store snapshot")
+    python = python.rstrip(b'\0')
+    if version != FORMAT_VERSION or marshal_version != marshal.version or python != _PYTHON_TAG:
+        raise SnapshotError(
+            f"written as format {version}, marshal {marshal_version} by {python.decode(errors='replace')}"
+        )
+    if signature is not None and (mtime_ns, size) != tuple(signature):
+        raise SnapshotError("the JSON file changed after the snapshot was taken")
+
+    payload = memoryview(data)[_HEADER.size:]
+    if len(payload) != length:
+        raise SnapshotError(f"payload is {len(payload)} bytes, expected {length}")
+    if zlib.crc32(payload) != crc:
+        raise SnapshotError("checksum mismatch")
+    with _gc_paused():
+        return marshal.loads(payload)
+
+
+def load_json_store(path):
+    """Load a JSON store, from its snapshot when that is still current
+
+    A drop-in for opening the file and calling json.load: it raises what
+    they would when the JSON is missing or invalid and there is no usable
+    snapshot.
+
+    Args:
+        path (str): The store's JSON file
+
+    Returns:
+        The store's data
+    """
+    if CONFIG['storage']['snapshots']['enabled']:
+        snapshot_file = snapshot_path(path)
+        try:
+            start = time.perf_counter()
+            with open(snapshot_file, 'rb') as f:
+                raw = f.read()
+            data = decode_store_snapshot(raw, file_signature(path))
+            seconds = time.perf_counter() - start
+            startup.note_load(snapshot_file, seconds, len(raw))
+            logger.info(f"Loaded {path} from its snapshot in {seconds * 1000:.1f}ms")
+            return data
+        except FileNotFoundError:
+            pass
+        except SnapshotError as e:
+            logger.info(f"Not using the snapshot of {path}: {e}")
+        except Exception as e:
+            logger.warning(f"Could not read the snapshot of {path}, reading the JSON instead: {e}")
+
+    with open(path, 'r') as f, _gc_paused():
+        return json.load(f)
+
+
+def snapshot_signature(path):
+    """Get the JSON signature recorded in a store's snapshot, or None if it has no readable one"""
+    try:
+        with open(snapshot_path(path), 'rb') as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, version, marshal_version, python, mtime_ns, size, _, _ = _HEADER.unpack(header)
+    if (magic, version, marshal_version, python.rstrip(b'\0')) != (MAGIC, FORMAT_VERSION, marshal.version, _PYTHON_TAG):
+        return None
+    return mtime_ns, size
+
+
+def encode_if_changed(path, data):
+    """Serialize a store's snapshot, unless its JSON is missing or unchanged since the last one
+
+    Call it on the thread that changes and saves the store (the event loop):
+    the JSON's signature and the data are then read in one step, between
+    saves, so the snapshot never holds a change its JSON doesn't have yet.
+
+    Args:
+        path (str): The store's JSON file
+        data: The store's data
+
+    Returns:
+        bytes: The snapshot, or None if there is nothing to write
+    """
+    try:
+        signature = file_signature(path)
+    except FileNotFoundError:
+        return None
+    if snapshot_signature(path) == signature:
+        return None
+    return encode_store_snapshot(data, signature)
+
+
+def write_snapshot_file(path, encoded):
+    """Write snapshot bytes next to a store's JSON file, atomically
+
+    Args:
+        path (str): The store's JSON file
+        encoded (bytes): From encode_if_changed
+
+    Returns:
+        int: Bytes written
+    """
+    snapshot_file = snapshot_path(path)
+    tmp_path = f"{snapshot_file}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encoded)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, snapshot_file)
+    return len(encoded)
+
+
+def write_store_snapshot(path, data):
+    """Write a store's snapshot next to its JSON file, if the JSON changed since the last one
+
+    Args:
+        path (str): The store's JSON file
+        data: The store's data
+
+    Returns:
+        int: Bytes written, or 0 if there is no JSON file to mirror or it is unchanged
+    """
+    encoded = encode_if_changed(path, data)
+    return write_snapshot_file(path, encoded) if encoded else 0
+
+
+class StoreSnapshots:
+    """Writes the registered stores' snapshots on an interval and at shutdown
+
+    Stores register the path of their JSON file and a callable returning
+    their current data (or None when there is nothing loaded to write).
+    Two owners registering the same file, e.g. two cogs sharing
+    moderation_settings.json, each hold their own copy of it, and neither
+    copy is known to match the file, so that file is not snapshotted.
+    """
+
+    def __init__(self, interval=600):
+        """Initialize the snapshots
+
+        Args:
+            interval (float): Seconds between snapshots of every store
+        """
+        self.interval = interval
+        self.stores = {}  # Absolute path -> (owner, provider)
+        self.conflicts = set()
+        self.task = None
+        self.written = 0
+        self.last_bytes = 0
+        self.last_ms = 0.0
+
+    def register(self, path, provider, owner):
+        """Snapshot a store
+
+        Args:
+            path (str): The store's JSON file
+            provider (callable): Returns the store's data, or None to skip it this time
+            owner (str): Who keeps the store, e.g. the cog name; registering again replaces its provider
+        """
+        path = os.path.abspath(path)
+        current = self.stores.get(path)
+        if current and current[0] != owner and path not in self.conflicts:
+            logger.warning(f"{owner} and {current[0]} both keep {path}, so it won't be snapshotted")
+            self.conflicts.add(path)
+        self.stores[path] = (owner, provider)
+
+    async def write_all(self):
+        """Write every registered store's snapshot
+
+        Returns:
+            int: Bytes written
+        """
+        start = time.perf_counter()
+        total = 0
+        for path, (owner, provider) in list(self.stores.items()):
+            if path in self.conflicts:
+                continue
+            try:
+                # Serialized here on the loop, between the owner's change and save steps; only the
+                # file write goes to a thread (marshal holds the GIL, so it wouldn't free the loop)
+                data = provider()
+                encoded = encode_if_changed(path, data) if data is not None else None
+                if encoded:
+                    total += await asyncio.to_thread(write_snapshot_file, path, encoded)
+            except Exception as e:
+                logger.error(f"Failed to snapshot {path} ({owner}): {e}")
+
+        self.written += 1
+        self.last_bytes = total
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return total
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.write_all()
+
+    def start(self):
+        """Start writing snapshots in the background"""
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background writes and write a final snapshot of every store"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        total = await self.write_all()
+        logger.info(f"Wrote store snapshots ({total / 1048576:.1f} MiB) in {self.last_ms:.0f}ms")
@@ -0,0 +1,315 @@
+"""Bot process supervision
+
+BotSupervisor runs the bot as a child process and:
+
+- drains its output continuously into a rotating log file, so the child can
+  never block on a full pipe
+- restarts it with exponential backoff when it exits or stops heartbeating
+- stops it with SIGTERM and waits for it to close (and flush storage)
+  before resorting to SIGKILL
+- serves /healthz and /readyz for process managers and load balancers
+
+The bot side is write_heartbeats(): when the supervisor sets
+BOT_HEARTBEAT_FILE, the bot rewrites that file every few seconds from its
+event loop, so a wedged loop shows up as a stale heartbeat.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from logging.handlers import RotatingFileHandler
+
+from aiohttp import web
+
+logger = logging.getLogger('supervisor')
+
+HEARTBEAT_ENV = 'BOT_HEARTBEAT_FILE'
+
+# Exit code for problems a restart can't fix, e.g. a missing token (sysexits EX_CONFIG)
+EXIT_CONFIG_ERROR = 78
+
+# Longest output line kept intact; longer ones are logged in pieces
+MAX_LINE_BYTES = 1024 * 1024
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+async def write_heartbeats(bot, path, interval):
+    """Rewrite the heartbeat file every interval seconds until cancelled
+
+    Args:
+        bot (commands.Bot): The bot whose state is reported
+        path (str): File the supervisor watches
+        interval (float): Seconds between writes
+    """
+    while True:
+        try:
+            _write_json_atomic(path, {
+                'pid': os.getpid(),
+                'time': time.time(),
+                'ready': bot.is_ready(),
+                'guilds': len(bot.guilds),
+                'latency': None if bot.latency != bot.latency else round(bot.latency, 3)  # NaN before connecting
+            })
+        except OSError as e:
+            logger.warning(f"Could not write heartbeat file {path}: {e}")
+        await asyncio.sleep(interval)
+
+
+def read_heartbeat(path):
+    """Read the heartbeat file
+
+    Returns:
+        dict: The last heartbeat, or None if there isn't a readable one
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def backoff_delay(failures, minimum, maximum):
+    """Seconds to wait before restart number `failures` (1 = first restart)"""
+    return min(maximum, minimum * 2 ** max(failures - 1, 0))
+
+
+class BotSupervisor:
+    """Runs and restarts the bot process"""
+
+    def __init__(self, command, cwd, log_file, heartbeat_file, env=None, echo=True,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, min_backoff=1, max_backoff=300,
+                 stable_after=120, stop_timeout=30, hang_timeout=90, startup_timeout=300):
+        """Initialize the supervisor
+
+        Args:
+            command (list): The child's command line
+            cwd (str): The child's working directory
+            log_file (str): Rotating log file for the child's output
+            heartbeat_file (str): File the child writes heartbeats to
+            env (dict): Extra environment variables for the child
+            echo (bool): Also copy the child's output to the supervisor's stdout
+            max_bytes (int): Size at which the log file rotates
+            backup_count (int): Rotated log files kept
+            min_backoff (float): Seconds before the first restart
+            max_backoff (float): Cap on the restart delay
+            stable_after (float): Seconds of uptime after which the backoff resets
+            stop_timeout (float): Seconds to wait after SIGTERM before SIGKILL
+            hang_timeout (float): Seconds without a heartbeat before a running child is restarted
+            startup_timeout (float): Seconds a new child gets to write its first heartbeat
+        """
+        self.command = command
+        self.cwd = cwd
+        self.heartbeat_file = heartbeat_file
+        self.env = env or {}
+        self.echo = echo
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.stop_timeout = stop_timeout
+        self.hang_timeout = hang_timeout
+        self.startup_timeout = startup_timeout
+
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        os.makedirs(os.path.dirname(heartbeat_file) or '.', exist_ok=True)
+        handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.output = logging.getLogger('supervisor.child')
+        self.output.propagate = False
+        self.output.setLevel(logging.INFO)
+        self.output.handlers = [handler]
+
+        self.process = None
+        self.started_at = None
+        self.stopping = False
+        self.stop_requested = asyncio.Event()
+        self.restarts = 0
+        self.failures = 0  # Consecutive short-lived runs
+        self.last_exit_code = None
+        self.gave_up = False
+
+    # Output
+
+    async def _drain(self, stream):
+        """Copy the child's output to the log until it closes its end"""
+        split = False  # The last piece was part of a line over the limit
+        while True:
+            try:
+                line = await stream.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                line = e.partial  # Output closed without a final newline
+            except asyncio.LimitOverrunError as e:
+                # A line over the stream's limit. Unlike readline(), readuntil() leaves it
+                # buffered, so log what it has consumed as one piece and continue the line
+                line = await stream.readexactly(e.consumed)
+                split = True
+            else:
+                if split and line == b'\n':
+                    split = False
+                    continue  # The end of a line already logged in pieces
+                split = False
+            if not line:
+                return
+
+            text = line.decode('utf-8', errors='replace').rstrip('\n')
+            self.output.info(text)
+            if self.echo:
+                print(text, flush=True)
+
+    # Health
+
+    def heartbeat_age(self):
+        """Seconds since the current child's last heartbeat, or None if it hasn't sent one"""
+        heartbeat = read_heartbeat(self.heartbeat_file)
+        if not heartbeat or not self.process or heartbeat.get('pid') != self.process.pid:
+            return None
+        return time.time() - heartbeat['time']
+
+    def status(self):
+        """Get the supervisor's view of the child
+
+        Returns:
+            dict: Liveness, readiness and restart details
+        """
+        running = self.process is not None and self.process.returncode is None
+        heartbeat = read_heartbeat(self.heartbeat_file) if running else None
+        if heartbeat and heartbeat.get('pid') != self.process.pid:
+            heartbeat = None  # Left over from a previous child
+        age = time.time() - heartbeat['time'] if heartbeat else None
+        uptime = time.monotonic() - self.started_at if running else None
+
+        if not running:
+            alive = not self.gave_up and not self.stopping  # Between restarts
+        elif age is None:
+            alive = uptime < self.startup_timeout
+        else:
+            alive = age < self.hang_timeout
+
+        return {
+            'alive': alive,
+            'ready': bool(running and heartbeat and heartbeat.get('ready') and age < self.hang_timeout),
+            'pid': self.process.pid if running else None,
+            'uptime': round(uptime, 1) if uptime is not None else None,
+            'heartbeat_age': round(age, 1) if age is not None else None,
+            'guilds': heartbeat.get('guilds') if heartbeat else None,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code,
+            'gave_up': self.gave_up
+        }
+
+    async def _handle_health(self, request):
+        status = self.status()
+        return web.json_response(status, status=200 if status['alive'] else 503)
+
+    async def _handle_ready(self, request):
+        status = self.status()
+        return web.json_response(status, status=200 if status['ready'] else 503)
+
+    async def start_health_server(self, host, port):
+        """Serve /healthz (liveness) and /readyz (readiness)
+
+        Returns:
+            web.AppRunner: Runner to clean up on shutdown
+        """
+        app = web.Application()
+        app.router.add_get('/healthz', self._handle_health)
+        app.router.add_get('/readyz', self._handle_ready)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Health endpoints on http://{host}:{port}/healthz and /readyz")
+        return runner
+
+    # Process control
+
+    async def _spawn(self):
+        env = dict(os.environ)
+        env.update(self.env)
+        env[HEARTBEAT_ENV] = self.heartbeat_file
+        env['PYTHONUNBUFFERED'] = '1'
+
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            cwd=self.cwd,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=MAX_LINE_BYTES
+        )
+        self.started_at = time.monotonic()
+        logger.info(f"Started bot as PID {self.process.pid}")
+
+    async def _terminate(self, process):
+        """SIGTERM the child, then SIGKILL it if it doesn't exit in time"""
+        if process.returncode is not None:
+            return
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Bot did not exit {self.stop_timeout}s after SIGTERM, killing it")
+            process.kill()
+            await process.wait()
+
+    async def _watch(self, process):
+        """Restart a child whose heartbeat stops, e.g. a blocked event loop"""
+        while process.returncode is None:
+            await asyncio.sleep(min(5, self.hang_timeout / 3))
+            if not self.status()['alive'] and process.returncode is None and not self.stopping:
+                age = self.heartbeat_age()
+                logger.error(
+                    f"Bot PID {process.pid} is unresponsive "
+                    f"({'no heartbeat' if age is None else f'last heartbeat {age:.0f}s ago'}), restarting it"
+                )
+                await self._terminate(process)
+                return
+
+    async def run(self):
+        """Run the child until stop() is called or it exits with a config error"""
+        while not self.stopping:
+            await self._spawn()
+            process = self.process
+            if self.stopping:
+                # stop() ran while the child was starting and signalled the previous one
+                await self._terminate(process)
+            drain = asyncio.create_task(self._drain(process.stdout))
+            watch = asyncio.create_task(self._watch(process))
+
+            code = await process.wait()
+            watch.cancel()
+            await drain  # The child's end is closed, so this finishes with the last lines
+            self.last_exit_code = code
+
+            if self.stopping:
+                logger.info(f"Bot exited with code {code}")
+                break
+            if code == EXIT_CONFIG_ERROR:
+                logger.critical("Bot exited with a configuration error, not restarting")
+                self.gave_up = True
+                break
+
+            uptime = time.monotonic() - self.started_at
+            self.failures = 1 if uptime >= self.stable_after else self.failures + 1
+            delay = backoff_delay(self.failures, self.min_backoff, self.max_backoff)
+            self.restarts += 1
+            logger.warning(f"Bot exited with code {code} after {uptime:.0f}s, restarting in {delay:.0f}s")
+
+            try:
+                await asyncio.wait_for(self.stop_requested.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        """Stop the child gracefully and stop restarting it"""
+        self.stopping = True
+        self.stop_requested.set()
+        if self.process:
+            await self._terminate(self.process)
@@ -0,0 +1,431 @@
+"""Span tracing from gateway events to the REST calls they cause
+
+Every gateway event (bar the noisy ones in tracing.ignore_events) starts a
+trace. Spans nest under it through a context variable that asyncio copies
+into every task the event schedules. Listeners, commands, storage writes,
+Redis round trips and Discord API requests all open spans, so a slow
+`.gstart` or ticket button shows which hop took the time.
+
+Spans are cheap to record; what costs is exporting them. A trace is
+exported when all its spans have ended (plus a short linger for tasks that
+start late, such as view callbacks) and it was sampled, was slow, or
+failed. Exporting happens on a background thread, to a JSONL file or to an
+OTLP/HTTP collector.
+
+    python traces.py --slowest 10     # show the slowest exported traces as trees
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+logger = logging.getLogger('discord_bot')
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error', 'token')
+
+    def __init__(self, trace, parent_id, name, attributes):
+        self.trace = trace
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.token = None
+
+    def set(self, **attributes):
+        """Add attributes, e.g. a response status"""
+        self.attributes.update(attributes)
+
+    def fail(self, message):
+        """Mark the span failed when the error was handled rather than raised"""
+        self.error = message
+
+    def __enter__(self):
+        self.trace.open += 1
+        self.token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current_span.reset(self.token)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.trace.tracer._ended(self)
+        return False
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            'trace_id': f"{self.trace.trace_id:032x}",
+            'span_id': f"{self.span_id:016x}",
+            'parent_id': f"{self.parent_id:016x}" if self.parent_id else None,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class _NoSpan:
+    """Stands in for a span when nothing is being traced"""
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, message):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans of one gateway event and everything it caused"""
+
+    __slots__ = ('tracer', 'trace_id', 'spans', 'open', 'last_end', 'sampled', 'keep', 'finished')
+
+    def __init__(self, tracer, sampled):
+        self.tracer = tracer
+        self.trace_id = random.getrandbits(128)
+        self.spans = []
+        self.open = 0
+        self.last_end = 0.0
+        self.sampled = sampled
+        self.keep = sampled  # Set when a span is slow or fails
+        self.finished = False  # Swept: exported or dropped
+
+
+def span(name, **attributes):
+    """Open a span under the current one: `with span('storage.save', store='levels'):`
+
+    Does nothing outside a trace, so it is safe to use in code that also runs
+    from background loops and scripts.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NO_SPAN
+    return Span(parent.trace, parent.span_id, name, attributes)
+
+
+def traced(func, name, **attributes):
+    """Wrap a coroutine function so each call runs in a span"""
+    async def run(*args, **kwargs):
+        with span(name, **attributes):
+            return await func(*args, **kwargs)
+    return run
+
+
+class Tracer:
+    """Starts traces, collects their spans and hands finished ones to an exporter"""
+
+    def __init__(self, exporter, sample_rate=0.01, slow_threshold_ms=500, linger=2.0,
+                 ignore_events=(), max_spans_per_trace=500):
+        """Initialize the tracer
+
+        Args:
+            exporter (SpanExporter): Where finished traces go
+            sample_rate (float): Share of traces exported regardless of speed
+            slow_threshold_ms (float): Traces with a span at least this slow are always exported
+            linger (float): Seconds a trace stays open after its last span ends, for late tasks
+            ignore_events (iterable): Gateway event types that never start a trace
+            max_spans_per_trace (int): Spans kept per trace; the rest are counted in dropped_spans
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold_ns = slow_threshold_ms * 1_000_000
+        self.linger = linger
+        self.ignore_events = set(ignore_events)
+        self.max_spans_per_trace = max_spans_per_trace
+        self.active = {}  # Trace ID -> Trace still open or lingering
+        self.task = None
+        self.traces = 0
+        self.exported = 0
+        self.dropped_spans = 0
+
+    def start_trace(self, name, **attributes):
+        """Open the root span of a new trace"""
+        trace = Trace(self, random.random() < self.sample_rate)
+        self.active[trace.trace_id] = trace
+        self.traces += 1
+        return Span(trace, None, name, attributes)
+
+    def _ended(self, span):
+        trace = span.trace
+        trace.open -= 1
+        trace.last_end = time.monotonic()
+        if span.end_ns - span.start_ns >= self.slow_threshold_ns or span.error:
+            trace.keep = True
+
+        if len(trace.spans) < self.max_spans_per_trace:
+            trace.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+        if trace.finished:
+            # A task that outlived the linger; follow the trace's decision
+            if trace.keep:
+                self.exporter.export([span])
+            trace.spans.clear()
+
+    def _sweep(self):
+        """Export or drop traces that have finished lingering"""
+        cutoff = time.monotonic() - self.linger
+        for trace_id, trace in list(self.active.items()):
+            if trace.open > 0 or trace.last_end > cutoff:
+                continue
+            del self.active[trace_id]
+            trace.finished = True
+            if trace.keep and trace.spans:
+                self.exporter.export(trace.spans)
+                self.exported += 1
+            trace.spans = []
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.linger / 2)
+            self._sweep()
+
+    def start(self):
+        """Start exporting finished traces"""
+        self.exporter.start()
+        self.task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Export what has finished and stop the exporter"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.linger = 0
+        self._sweep()
+        await asyncio.to_thread(self.exporter.close)
+
+    def instrument_gateway(self, bot):
+        """Start a trace for each gateway event the bot parses
+
+        The parser runs the event's listeners' scheduling (and view callbacks
+        for component interactions), so every task it creates joins the trace.
+        """
+        parsers = bot._connection.parsers
+
+        def traced(event, parser):
+            def parse(data):
+                guild_id = data.get('guild_id') if isinstance(data, dict) else None
+                with self.start_trace(f"gateway {event}", event=event, guild_id=guild_id):
+                    return parser(data)
+            return parse
+
+        for event, parser in list(parsers.items()):
+            if event not in self.ignore_events:
+                parsers[event] = traced(event, parser)
+
+    def instrument_http(self, bot):
+        """Open a span for each Discord API request"""
+        request = bot.http.request
+
+        async def traced_request(route, **kwargs):
+            with span(f"http {route.method} {route.path}") as request_span:
+                try:
+                    return await request(route, **kwargs)
+                except Exception as e:
+                    request_span.set(status=getattr(e, 'status', None))
+                    raise
+
+        bot.http.request = traced_request
+
+
+class SpanExporter:
+    """Buffers spans and writes them from a background thread"""
+
+    def __init__(self, max_queue=10000, batch_size=512, interval=1.0):
+        self.queue = queue.Queue(max_queue)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.thread = None
+        self.dropped = 0
+        self.stopping = threading.Event()
+
+    def export(self, spans):
+        """Queue spans without blocking; drops them if the writer is far behind"""
+        for span in spans:
+            try:
+                self.queue.put_nowait(span.to_dict())
+            except queue.Full:
+                self.dropped += 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    logger.error(f"Failed to export {len(batch)} spans: {e}")
+            elif self.stopping.is_set():
+                return
+
+    def write(self, spans):
+        """Write a batch of span dicts"""
+        raise NotImplementedError
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends spans to a JSON Lines file, one span per line"""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def write(self, spans):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(span, separators=(',', ':'), default=str) + '\n')
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpSpanExporter(SpanExporter):
+    """Posts spans to an OTLP/HTTP collector as JSON (e.g. http://127.0.0.1:4318/v1/traces)"""
+
+    def __init__(self, url, service_name='multipurpos-bot', timeout=5, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def encode(self, spans):
+        """Build an OTLP ExportTraceServiceRequest"""
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'utils.tracing'},
+                'spans': [{
+                    'traceId': span['trace_id'],
+                    'spanId': span['span_id'],
+                    'parentSpanId': span['parent_id'] or '',
+                    'name': span['name'],
+                    'kind': 1,
+                    'startTimeUnixNano': str(int(span['start'] * 1e9)),
+                    'endTimeUnixNano': str(int(span['start'] * 1e9 + span['duration_ms'] * 1e6)),
+                    'attributes': [
+                        {'key': key, 'value': _otlp_value(value)}
+                        for key, value in span['attributes'].items() if value is not None
+                    ],
+                    'status': {'code': 2, 'message': span['error']} if span['error'] else {'code': 1},
+                } for span in spans]
+            }]
+        }]}
+
+    def write(self, spans):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(self.encode(spans), default=str).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def load_traces(path):
+    """Read a JSONL span file back
+
+    Returns:
+        dict: Trace ID -> list of span dicts
+    """
+    traces = {}
+    for file_path in (f"{path}.1", path):
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    span_data = json.loads(line)
+                except ValueError:
+                    continue
+                traces.setdefault(span_data['trace_id'], []).append(span_data)
+    return traces
+
+
+def format_trace(spans):
+    """Render a trace's spans as an indented tree, children in start order
+
+    Returns:
+        str: One line per span with its duration and attributes
+    """
+    children = {}
+    span_ids = {span_data['span_id'] for span_data in spans}
+    for span_data in sorted(spans, key=lambda span_data: span_data['start']):
+        parent = span_data['parent_id'] if span_data['parent_id'] in span_ids else None
+        children.setdefault(parent, []).append(span_data)
+
+    origin = min(span_data['start'] for span_data in spans)
+    lines = []
+
+    def walk(parent, depth):
+        for span_data in children.get(parent, []):
+            attributes = ' '.join(f"{key}={value}" for key, value in span_data['attributes'].items() if value is not None)
+            error = f"  !! {span_data['error']}" if span_data['error'] else ''
+            lines.append(
+                f"{(span_data['start'] - origin) * 1000:>8.1f}ms {span_data['duration_ms']:>9.1f}ms  "
+                f"{'  ' * depth}{span_data['name']}  {attributes}{error}".rstrip()
+            )
+            walk(span_data['span_id'], depth + 1)
+
+    walk(None, 0)
+    return '\n'.join(lines)
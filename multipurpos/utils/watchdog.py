@@ -0,0 +1,176 @@
+"""Event loop watchdog: finds the code that blocks the loop
+
+A task on the loop ticks every interval and records how late each tick
+was (the bot_event_loop_lag_seconds metric). A watchdog thread checks the
+ticks. When one is overdue by more than the threshold, the loop is stuck
+in synchronous code (a json.dump, a sort over every member, a file read),
+and the thread captures the loop thread's Python stack and the running
+task's name while it is still stuck.
+
+Blocks are aggregated by hotspot: the innermost frame in the bot's own
+code. That gives counts, total and worst block time per hotspot, which
+`.blocking` shows. A harness can start a watchdog on its own loop and
+fail when `blocks` is non-zero.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from utils.metrics import LOOP_BLOCKS, LOOP_LAG_SECONDS
+
+logger = logging.getLogger('discord_bot')
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Hotspot:
+    """Blocks attributed to one line of code"""
+
+    __slots__ = ('location', 'count', 'total', 'max', 'task', 'stack', 'logged_at', 'suppressed')
+
+    def __init__(self, location):
+        self.location = location
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.task = None
+        self.stack = None
+        self.logged_at = 0.0
+        self.suppressed = 0
+
+
+def hotspot_of(frames):
+    """Pick the frame to blame: the innermost one in the bot's own code"""
+    for frame in reversed(frames):
+        if frame.filename.startswith(BOT_DIR) and not frame.filename.endswith(os.path.join('utils', 'watchdog.py')):
+            return f"{os.path.relpath(frame.filename, BOT_DIR)}:{frame.lineno} in {frame.name}"
+    frame = frames[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class LoopWatchdog:
+    """Measures loop lag and captures the stack of whatever blocks the loop"""
+
+    def __init__(self, threshold_ms=100, interval=0.1, log_interval=60, max_hotspots=200):
+        """Initialize the watchdog
+
+        Args:
+            threshold_ms (float): How late a tick may be before the loop counts as blocked
+            interval (float): Seconds between ticks
+            log_interval (float): Minimum seconds between full logs for the same hotspot
+            max_hotspots (int): Hotspots kept; blocks elsewhere are still counted in blocks
+        """
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.log_interval = log_interval
+        self.max_hotspots = max_hotspots
+        self.hotspots = {}  # Location -> Hotspot
+        self.blocks = 0
+        self.since = time.time()
+
+        self.loop = None
+        self.loop_thread_id = None
+        self.last_tick = 0.0
+        self.task = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            LOOP_LAG_SECONDS.observe(max(loop.time() - start - self.interval, 0.0))
+            self.last_tick = time.monotonic()
+
+    def _capture(self):
+        """Get the loop thread's stack and task name, or None if the loop moved on meanwhile"""
+        tick = self.last_tick
+        frame = sys._current_frames().get(self.loop_thread_id)
+        task = asyncio.current_task(self.loop)
+        if frame is None or self.last_tick != tick:
+            return None
+        frames = traceback.extract_stack(frame)
+        if frames[-1].filename.endswith('selectors.py'):
+            return None  # Back to waiting for I/O; the tick is about to run
+        return frames, (task.get_name() if task else None)
+
+    def _watch(self):
+        poll = min(self.threshold / 4, self.interval)
+        while not self.stopping.wait(poll):
+            blocked_since = self.last_tick
+            if time.monotonic() - blocked_since < self.interval + self.threshold:
+                continue
+
+            capture = self._capture()
+            if capture is None:
+                continue
+
+            # Wait for the loop to come back, to know how long it was stuck
+            while self.last_tick == blocked_since and not self.stopping.wait(poll):
+                pass
+            self._record(*capture, max(self.last_tick - blocked_since - self.interval, self.threshold))
+
+    def _record(self, frames, task_name, duration):
+        self.blocks += 1
+        LOOP_BLOCKS.inc()
+        location = hotspot_of(frames)
+        hotspot = self.hotspots.get(location)
+        if hotspot is None:
+            if len(self.hotspots) >= self.max_hotspots:
+                return
+            hotspot = self.hotspots[location] = Hotspot(location)
+
+        hotspot.count += 1
+        hotspot.total += duration
+        hotspot.max = max(hotspot.max, duration)
+        hotspot.task = task_name
+        hotspot.stack = ''.join(traceback.format_list(frames[-15:]))
+
+        now = time.monotonic()
+        if now - hotspot.logged_at < self.log_interval:
+            hotspot.suppressed += 1
+            return
+        logger.warning(
+            f"Event loop blocked for {duration * 1000:.0f}ms in task {task_name!r} at {location} "
+            f"({hotspot.suppressed} similar blocks not logged since the last)\n{hotspot.stack}"
+        )
+        hotspot.logged_at = now
+        hotspot.suppressed = 0
+
+    def start(self):
+        """Start watching the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.task = asyncio.create_task(self._tick())
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self.thread.start()
+
+    async def stop(self):
+        """Stop watching"""
+        self.stopping.set()
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.thread:
+            await asyncio.to_thread(self.thread.join)
+            self.thread = None
+
+    def top(self, limit=10, sort='total'):
+        """Get the hotspots that blocked the loop the longest (or most often, with sort='count')"""
+        return sorted(self.hotspots.values(), key=lambda hotspot: getattr(hotspot, sort), reverse=True)[:limit]
+
+    def reset(self):
+        self.hotspots.clear()
+        self.blocks = 0
+        self.since = time.time()